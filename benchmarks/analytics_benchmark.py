@@ -0,0 +1,88 @@
+"""Benchmark spend analytics on a synthetic line-item dataset.
+
+Usage:
+    python -m benchmarks.analytics_benchmark [--items 1000000] [--seed 0]
+"""
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.spend import SpendAnalytics
+
+
+def synthetic_frames(n_items: int, seed: int = 0, items_per_invoice: int = 5,
+                     n_vendors: int = 60, n_products: int = 5000) -> tuple:
+    """Random invoices/items frames in the shape SpendAnalytics.from_frames expects."""
+    rng = np.random.default_rng(seed)
+    n_invoices = max(1, n_items // items_per_invoice)
+
+    days = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365, n_invoices), unit="D")
+    invoices = pd.DataFrame({
+        "invoice_id": np.arange(1, n_invoices + 1),
+        "vendor": np.array([f"Vendor {i}" for i in range(n_vendors)])[rng.integers(0, n_vendors, n_invoices)],
+        "purchase_date": days.strftime("%Y-%m-%d"),
+        "created_at": "",
+        "total": rng.lognormal(4, 1, n_invoices).round(2),
+        "other_expenses": rng.uniform(0, 20, n_invoices).round(2),
+    })
+    items = pd.DataFrame({
+        "invoice_id": rng.integers(1, n_invoices + 1, n_items),
+        "item_name": np.array([f"Part {i}" for i in range(n_products)])[rng.integers(0, n_products, n_items)],
+        "quantity": rng.integers(1, 50, n_items),
+        "price": rng.lognormal(1, 1, n_items).round(2),
+    })
+    return invoices, items
+
+
+def naive_vendor_month(invoices: pd.DataFrame) -> dict:
+    """Row-by-row baseline for spend_by_vendor_month."""
+    totals = defaultdict(float)
+    for vendor, day, total in zip(invoices["vendor"], invoices["purchase_date"], invoices["total"]):
+        totals[(vendor, day[:7])] += total
+    return totals
+
+
+def naive_top_items(items: pd.DataFrame, n: int = 10) -> list:
+    """Row-by-row baseline for top_items."""
+    spend = defaultdict(float)
+    for name, qty, price in zip(items["item_name"], items["quantity"], items["price"]):
+        spend[name] += qty * price
+    return sorted(spend.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+
+def timed(label: str, func, results: list):
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    results.append((label, elapsed))
+    print(f"  {label:<34} {elapsed * 1000:>10.1f} ms")
+    return value
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    opts = parser.parse_args(argv)
+
+    print(f"Generating {opts.items:,} line items...")
+    invoices, items = synthetic_frames(opts.items, opts.seed)
+    print(f"{len(invoices):,} invoices, {len(items):,} line items\n")
+
+    results = []
+    analytics = timed("load (prepare_frames)", lambda: SpendAnalytics.from_frames(invoices, items), results)
+    timed("spend_by_vendor_month", analytics.spend_by_vendor_month, results)
+    timed("spend_by_vendor_month (cached)", analytics.spend_by_vendor_month, results)
+    timed("monthly_spend", analytics.monthly_spend, results)
+    timed("top_items", analytics.top_items, results)
+    timed("outlier_totals", analytics.outlier_totals, results)
+    timed("naive vendor/month loop", lambda: naive_vendor_month(invoices), results)
+    timed("naive top items loop", lambda: naive_top_items(items), results)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""Deterministic synthetic invoice corpus with ground truth.
+
+Every invoice is an email (headers + body) with an optional PDF
+attachment, laid out like McMaster-Carr and Home Depot orders or a
+generic receipt from a vendor only the LLM can read. PDFs are written by
+a tiny built-in writer (standard Helvetica, one text object per table
+cell), so they extract with pdfplumber like real ones, long orders span
+several pages and long descriptions wrap onto a second line.
+
+Invoice ``i`` depends only on (seed, i): a corpus of 1000 starts with
+the corpus of 100. ``write_corpus`` lays groups out exactly as
+monitor_downloader saves them and writes one ground-truth JSON per group:
+
+    <out>/invoices/<message-id>_<internal ms>.txt
+    <out>/invoices/<message-id>_<internal ms>_<attachment>.pdf
+    <out>/truth/<message-id>_<internal ms>.json
+
+Usage:
+    python -m benchmarks.corpus --out data/corpus --invoices 1000 --seed 7
+    python main.py process --invoice-dir data/corpus/invoices
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from src.utils.file_utils import sanitize_filename
+
+LAYOUTS = ("mcmaster_carr", "home_depot", "generic")
+
+_MATERIALS = ["Zinc-Plated Steel", "18-8 Stainless Steel", "Black-Oxide Alloy Steel", "Brass", "Nylon",
+              "Aluminum", "Galvanized Steel", "PTFE", "Neoprene", "Polycarbonate"]
+_PARTS = ["Hex Nut", "Socket Head Screw", "Flat Washer", "Ball Bearing", "Shaft Collar", "Spring Pin",
+          "Hose Clamp", "Pipe Fitting", "Cable Tie", "Threaded Rod", "Wing Nut", "Rivet", "O-Ring",
+          "Shoulder Bolt", "Set Screw", "Lock Washer"]
+_DETAILS = ["1/4\"-20 Thread Size", "M6 x 1 mm Thread", "3/8\" OD", "Packs of 25", "for 1\" Shaft Diameter",
+            "Heat-Treated", "Right-Hand Thread", "Low-Profile Head", "Plain Finish", "Metric"]
+_HD_ITEMS = ["2 in. x 4 in. x 8 ft. Lumber", "1-5/8 in. Drywall Screws (1 lb.)", "Wood Glue 16 oz.",
+             "Painter's Tape 1.88 in.", "Romex 12/2 Wire 50 ft.", "PVC Pipe 1/2 in. x 10 ft.",
+             "Utility Knife", "Caulk Gun", "LED Bulb 60W (4-Pack)", "Shop Towels (6-Roll)"]
+_VENDORS = [("Grainger", "grainger.com"), ("Uline", "uline.com"), ("Fastenal", "fastenal.com"),
+            ("Digi-Key Electronics", "digikey.com"), ("Zoro Tools", "zoro.com"), ("Misumi USA", "misumiusa.com"),
+            ("Global Industrial", "globalindustrial.com"), ("Applied Industrial", "applied.com")]
+_NAMES = ["Alex Kim", "Sam Rivera", "Jordan Lee", "Casey Brown", "Morgan Patel", "Riley Chen"]
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+LINE_HEIGHT = 14
+WRAP_CHARS = 34
+
+
+def _money(value: float) -> str:
+    return f"{value:,.2f}"
+
+
+def _wrap(text: str, width: int = WRAP_CHARS) -> list:
+    lines, current = [], ""
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    return lines + [current] if current else lines
+
+
+def _paginate(header: list, rows: list, footer: list, rows_per_page: int) -> list:
+    """Split table rows (each a list of lines) over pages; header repeats, footer ends the last page."""
+    chunks, current, used = [], [], 0
+    for row in rows:
+        if current and used + len(row) > rows_per_page:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(row)
+        used += len(row)
+    chunks.append(current)
+
+    pages = []
+    for n, chunk in enumerate(chunks, 1):
+        lines = list(header) + [line for row in chunk for line in row]
+        if n == len(chunks):
+            lines += footer
+        lines.append([(430, f"Page {n} of {len(chunks)}")])
+        pages.append(lines)
+    return pages
+
+
+def _mcmaster(i: int, rng: random.Random, items: list, ctx: dict) -> dict:
+    order = str(4000000 + i)
+    shipping = round(rng.uniform(0, 25), 2)
+    merchandise = round(sum(it["line_total"] for it in items), 2)
+    columns = [40, 62, 130, 340, 382, 418, 458, 520]
+    header = [
+        [(40, "McMaster-Carr")],
+        [(40, "Order Date"), (160, ctx["date"].strftime("%m/%d/%y"))],
+        [(40, "McMaster-Carr Number"), (160, order)],
+        [(40, "Ordered By"), (160, ctx["buyer"]), (260, str(rng.randint(100, 999)))],
+        [],
+        list(zip(columns, ["Line", "Product", "Description", "Ordered", "Unit", "Shipped", "Price", "Total"])),
+    ]
+    rows = []
+    for n, it in enumerate(items, 1):
+        desc = _wrap(it["description"])
+        first = list(zip(columns, [str(n), it["part_number"], desc[0], str(it["quantity"]), it["unit"],
+                                   str(it["quantity"]), _money(it["price"]), _money(it["line_total"])]))
+        rows.append([first] + [[(130, extra)] for extra in desc[1:]])
+    footer = [[], [(340, "Merchandise"), (520, _money(merchandise))],
+              [(340, "Shipping"), (520, _money(shipping))], [(340, "Total"), (520, _money(merchandise + shipping))]]
+    for it in items:
+        it["item_name"] = f"{it['part_number']} {it['description']}"
+    return {
+        "vendor": "McMaster-Carr", "sender": "McMaster-Carr <orders@mcmaster.com>",
+        "subject": f"McMaster-Carr Order {order}", "order_number": order,
+        "other_expenses": shipping, "total": round(merchandise + shipping, 2),
+        "filename": f"McMaster-Carr_Order_{order}.pdf",
+        "intro": f"Thank you for your order.\nThe receipt for McMaster-Carr order {order} is attached.\n",
+        "pages": _paginate(header, rows, footer, ctx["rows_per_page"]),
+    }
+
+
+def _home_depot(i: int, rng: random.Random, items: list, ctx: dict) -> dict:
+    order = f"WD{50000000 + i}"
+    subtotal = round(sum(it["line_total"] for it in items), 2)
+    tax = round(subtotal * 0.0825, 2)
+    columns = [40, 120, 380, 430, 510]
+    header = [
+        [(40, "The Home Depot")],
+        [(40, f"Order #{order}")],
+        [(40, f"Order Date: {ctx['date']:%m/%d/%Y}")],
+        [(40, f"Store #{rng.randint(100, 9999)}")],
+        [],
+        list(zip(columns, ["SKU", "Description", "Qty", "Unit Price", "Amount"])),
+    ]
+    rows = []
+    for it in items:
+        desc = _wrap(it["description"], 40)
+        first = list(zip(columns, [it["part_number"], desc[0], str(it["quantity"]),
+                                   f"${_money(it['price'])}", f"${_money(it['line_total'])}"]))
+        rows.append([first] + [[(120, extra)] for extra in desc[1:]])
+    footer = [[], [(380, f"Subtotal: ${_money(subtotal)}")], [(380, f"Sales Tax: ${_money(tax)}")],
+              [(380, f"Total: ${_money(subtotal + tax)}")]]
+    for it in items:
+        it["item_name"] = it["description"]
+    return {
+        "vendor": "The Home Depot", "sender": "The Home Depot <HomeDepot@order.homedepot.com>",
+        "subject": "Your Home Depot Receipt", "order_number": order,
+        "other_expenses": tax, "total": round(subtotal + tax, 2),
+        "filename": f"HomeDepot_Receipt_{order}.pdf",
+        "intro": f"Thanks for shopping with us. Your receipt for order {order} is attached.\n",
+        "pages": _paginate(header, rows, footer, ctx["rows_per_page"]),
+    }
+
+
+def _generic(i: int, rng: random.Random, items: list, ctx: dict) -> dict:
+    vendor, domain = rng.choice(_VENDORS)
+    order = f"{vendor[:3].upper()}-{100000 + i}"
+    subtotal = round(sum(it["line_total"] for it in items), 2)
+    shipping = round(rng.uniform(0, 30), 2)
+    columns = [40, 330, 400, 480]
+    header = [
+        [(40, "INVOICE")],
+        [(40, vendor)],
+        [(40, f"Order # {order}"), (330, f"Date: {ctx['date']:%B %d, %Y}")],
+        [(40, f"Bill to: {ctx['buyer']}")],
+        [],
+        list(zip(columns, ["Description", "Qty", "Unit Price", "Amount"])),
+    ]
+    rows = []
+    for it in items:
+        desc = _wrap(it["description"], 44)
+        first = list(zip(columns, [desc[0], str(it["quantity"]), f"${_money(it['price'])}",
+                                   f"${_money(it['line_total'])}"]))
+        rows.append([first] + [[(40, extra)] for extra in desc[1:]])
+    footer = [[], [(330, "Subtotal"), (480, f"${_money(subtotal)}")],
+              [(330, "Shipping"), (480, f"${_money(shipping)}")],
+              [(330, "Total"), (480, f"${_money(subtotal + shipping)}")]]
+    for it in items:
+        it["item_name"] = it["description"]
+    return {
+        "vendor": vendor, "sender": f"{vendor} Billing <billing@{domain}>",
+        "subject": f"Invoice {order} from {vendor}", "order_number": order,
+        "other_expenses": shipping, "total": round(subtotal + shipping, 2),
+        "filename": f"Invoice_{order}.pdf",
+        "intro": f"Hello {ctx['buyer'].split()[0]},\nPlease find attached your invoice {order}.\n",
+        "pages": _paginate(header, rows, footer, ctx["rows_per_page"]),
+    }
+
+
+_BUILDERS = {"mcmaster_carr": _mcmaster, "home_depot": _home_depot, "generic": _generic}
+
+
+def _items(rng: random.Random, layout: str, count: int) -> list:
+    items = []
+    for _ in range(count):
+        if layout == "home_depot":
+            description = rng.choice(_HD_ITEMS)
+            part = str(rng.randint(100000000, 999999999))
+        else:
+            description = f"{rng.choice(_MATERIALS)} {rng.choice(_PARTS)}"
+            if rng.random() < 0.5:
+                description += f", {rng.choice(_DETAILS)}, {rng.choice(_DETAILS)}"
+            part = f"{rng.randint(90000, 99999)}A{rng.randint(100, 999)}"
+        quantity = rng.choice([1, 1, 2, 4, 5, 10, 25, 50, 100])
+        price = round(rng.lognormvariate(2, 1.1), 2) or 0.01
+        items.append({"part_number": part, "description": description, "quantity": quantity,
+                      "unit": rng.choice(["Each", "Pack", "Box"]), "price": price,
+                      "line_total": round(quantity * price, 2)})
+    return items
+
+
+def text_line(cells: list) -> str:
+    """Render positioned cells as a text line, columns approximated with spaces."""
+    line = ""
+    for x, text in cells:
+        column = int(x / 5.5)
+        line += " " * max(column - len(line), 2 if line else 0) + text
+    return line
+
+
+def invoice(i: int, seed: int = 0, llm_share: float = 0.4, pdf_share: float = 0.7, min_items: int = 1,
+            max_items: int = 8, long_share: float = 0.1, rows_per_page: int = 30) -> dict:
+    """Build invoice ``i`` of the corpus for ``seed``: email fields, PDF bytes and ground truth."""
+    rng = random.Random(seed * 1_000_003 + i)
+    r = rng.random()
+    layout = "generic" if r < llm_share else ("mcmaster_carr" if r < llm_share + (1 - llm_share) / 2 else "home_depot")
+    count = (rng.randint(rows_per_page, 3 * rows_per_page) if rng.random() < long_share
+             else rng.randint(min_items, max_items))
+    items = _items(rng, layout, count)
+    ctx = {
+        "date": datetime(2023, 1, 1) + timedelta(days=rng.randint(0, 729)),
+        "buyer": rng.choice(_NAMES),
+        "rows_per_page": rows_per_page,
+    }
+    doc = _BUILDERS[layout](i, rng, items, ctx)
+
+    received = (ctx["date"] + timedelta(hours=rng.randint(0, 47), minutes=rng.randint(0, 59))).replace(
+        tzinfo=timezone.utc)
+    internal_ms = int(received.timestamp() * 1000)
+    msg_id = f"corpus{seed}x{i:07d}"
+    message_id = f"<{msg_id}@corpus.local>"
+    base = f"{sanitize_filename(message_id.strip('<>'))}_{internal_ms}"
+
+    has_pdf = rng.random() < pdf_share
+    if has_pdf:
+        body = doc["intro"]
+        attachments = [(doc["filename"], "application/pdf", render_pdf(doc["pages"]))]
+    else:
+        body = "\n".join(text_line(line) for page in doc["pages"] for line in page[:-1]) + "\n"
+        attachments = []
+
+    truth = {
+        "base": base,
+        "thread_id": msg_id,
+        "layout": layout,
+        "company_name": doc["vendor"],
+        "purchase_date": ctx["date"].strftime("%Y-%m-%d"),
+        "purchase_receiver": ctx["buyer"],
+        "order_number": doc["order_number"],
+        "total_price": doc["total"],
+        "other_expenses": doc["other_expenses"],
+        "items": [{"item_name": it["item_name"], "quantity": it["quantity"], "price": it["price"],
+                   "line_total": it["line_total"]} for it in items],
+        "pages": len(doc["pages"]) if has_pdf else 0,
+        "wrapped_items": sum(1 for it in items if len(_wrap(it["description"])) > 1) if layout == "mcmaster_carr" else 0,
+    }
+    return {
+        "msg_id": msg_id,
+        "thread_id": msg_id,
+        "message_id": message_id,
+        "internal_ms": internal_ms,
+        "date": format_datetime(received),
+        "subject": doc["subject"],
+        "sender": doc["sender"],
+        "body": body,
+        "attachments": attachments,
+        "base": base,
+        "truth": truth,
+    }
+
+
+def generate(count: int, seed: int = 0, **options):
+    """Yield ``count`` invoices (see ``invoice`` for the options)."""
+    for i in range(count):
+        yield invoice(i, seed, **options)
+
+
+def _pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(pages: list) -> bytes:
+    """Write a minimal PDF: one page per list of lines, each line a list of (x, text) cells.
+
+    Output is byte-for-byte deterministic (no timestamps or IDs).
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 9 Tf"]
+        y = PAGE_HEIGHT - 60
+        for cells in lines:
+            for x, text in cells:
+                ops.append(f"1 0 0 1 {x} {y} Tm ({_pdf_text(text)}) Tj")
+            y -= LINE_HEIGHT
+        ops.append("ET")
+        stream = "\n".join(ops).encode("cp1252", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> "
+                        "/Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, content_ref)).encode("ascii"))
+        kids.append(len(objects))
+    objects[1] = ("<< /Type /Pages /Kids [%s] /Count %d >>"
+                  % (" ".join(f"{k} 0 R" for k in kids), len(kids))).encode("ascii")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def email_text(inv: dict, to: str = "bench@example.com") -> str:
+    """The .txt file monitor_downloader.save_email_text writes for this invoice."""
+    name, _, address = inv["sender"].partition(" <")
+    fields = [
+        ("Subject", inv["subject"]),
+        ("From", inv["sender"]),
+        ("Sender Name", name),
+        ("Sender Email", address.rstrip(">")),
+        ("Reply-To", ""),
+        ("To", to),
+        ("Cc", ""),
+        ("Message-ID", inv["message_id"]),
+        ("Date", inv["date"]),
+        ("Gmail Thread ID", inv["thread_id"]),
+    ]
+    return "".join(f"{k}: {v}\n" for k, v in fields) + "-" * 50 + "\n" + inv["body"]
+
+
+def write_group(inv: dict, invoice_dir: str) -> list:
+    """Write an invoice's .txt and attachments the way the monitor downloader names them."""
+    os.makedirs(invoice_dir, exist_ok=True)
+    paths = [os.path.join(invoice_dir, f"{inv['base']}.txt")]
+    with open(paths[0], "w", encoding="utf-8") as f:
+        f.write(email_text(inv))
+    for filename, _, data in inv["attachments"]:
+        paths.append(os.path.join(invoice_dir, f"{inv['base']}_{sanitize_filename(filename)}"))
+        with open(paths[-1], "wb") as f:
+            f.write(data)
+    return paths
+
+
+def write_corpus(out_dir: str, count: int, seed: int = 0, **options) -> dict:
+    """Write ``count`` invoice groups and their ground truth under ``out_dir``.
+
+    Returns:
+        Summary counts by layout, PDFs and multi-page PDFs.
+    """
+    invoice_dir = os.path.join(out_dir, "invoices")
+    truth_dir = os.path.join(out_dir, "truth")
+    os.makedirs(truth_dir, exist_ok=True)
+
+    summary = {"invoices": 0, "pdfs": 0, "multi_page": 0, "layouts": {k: 0 for k in LAYOUTS}}
+    for inv in generate(count, seed, **options):
+        write_group(inv, invoice_dir)
+        with open(os.path.join(truth_dir, f"{inv['base']}.json"), "w", encoding="utf-8") as f:
+            json.dump(inv["truth"], f, indent=2)
+        summary["invoices"] += 1
+        summary["pdfs"] += bool(inv["attachments"])
+        summary["multi_page"] += inv["truth"]["pages"] > 1
+        summary["layouts"][inv["truth"]["layout"]] += 1
+
+    with open(os.path.join(out_dir, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump({"seed": seed, "count": count, "options": options, "summary": summary}, f, indent=2)
+    return summary
+
+
+def load_truth(out_dir: str) -> dict:
+    """Ground truth of a written corpus, keyed by thread ID."""
+    truth_dir = os.path.join(out_dir, "truth")
+    truth = {}
+    for name in sorted(os.listdir(truth_dir)):
+        with open(os.path.join(truth_dir, name), "r", encoding="utf-8") as f:
+            record = json.load(f)
+        truth[record["thread_id"]] = record
+    return truth
+
+
+def _close(a, b) -> bool:
+    try:
+        return abs(float(a) - float(b)) < 0.005
+    except (TypeError, ValueError):
+        return False
+
+
+def score(truth: dict, extracted: list) -> dict:
+    """Field-level accuracy of extracted invoices against ground truth.
+
+    Args:
+        truth: Ground truth keyed by thread ID (see load_truth).
+        extracted: Invoice dicts with an ``items`` list, as stored; matched
+            to the truth by mail_thread_id, else by order number.
+
+    Returns:
+        Per-field fraction correct over all truth invoices, plus counts.
+    """
+    by_order = {t["order_number"].upper(): t for t in truth.values()}
+    fields = ("found", "company_name", "purchase_date", "order_number", "total_price",
+              "item_count", "item_quantities", "item_prices")
+    correct = {f: 0 for f in fields}
+    seen = set()
+
+    for inv in extracted:
+        t = truth.get(inv.get("mail_thread_id", "")) or by_order.get(str(inv.get("order_number") or "").upper())
+        if t is None or t["thread_id"] in seen:
+            continue
+        seen.add(t["thread_id"])
+        items = inv.get("items") or []
+        correct["found"] += 1
+        correct["company_name"] += str(inv.get("company_name", "")).strip().lower() == t["company_name"].lower()
+        correct["purchase_date"] += inv.get("purchase_date") == t["purchase_date"]
+        correct["order_number"] += str(inv.get("order_number") or "").upper() == t["order_number"].upper()
+        correct["total_price"] += _close(inv.get("total_price"), t["total_price"])
+        correct["item_count"] += len(items) == len(t["items"])
+        correct["item_quantities"] += ([int(i.get("quantity") or 0) for i in items]
+                                       == [i["quantity"] for i in t["items"]])
+        correct["item_prices"] += (len(items) == len(t["items"]) and
+                                   all(_close(a.get("price"), b["price"]) for a, b in zip(items, t["items"])))
+
+    n = max(len(truth), 1)
+    return {"invoices": len(truth), "matched": len(seen),
+            "accuracy": {f: round(correct[f] / n, 4) for f in fields}}
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", required=True, help="corpus directory (invoices/ and truth/ are created)")
+    parser.add_argument("--invoices", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-share", type=float, default=0.4, help="fraction of unknown-vendor invoices")
+    parser.add_argument("--pdf-share", type=float, default=0.7, help="fraction with a PDF attachment")
+    parser.add_argument("--min-items", type=int, default=1)
+    parser.add_argument("--max-items", type=int, default=8)
+    parser.add_argument("--long-share", type=float, default=0.1, help="fraction of multi-page orders")
+    parser.add_argument("--rows-per-page", type=int, default=30)
+    opts = parser.parse_args(argv)
+
+    summary = write_corpus(opts.out, opts.invoices, opts.seed, llm_share=opts.llm_share, pdf_share=opts.pdf_share,
+                           min_items=opts.min_items, max_items=opts.max_items, long_share=opts.long_share,
+                           rows_per_page=opts.rows_per_page)
+    print(f"[CORPUS] {summary['invoices']} invoice(s) in {opts.out}: {summary['layouts']}, "
+          f"{summary['pdfs']} PDF(s), {summary['multi_page']} multi-page")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""End-to-end throughput benchmark against local fakes of Gmail, Sheets and Ollama.
+
+Each scenario runs the real entry points over a synthetic corpus (see
+benchmarks.corpus) in a throwaway data directory and reports
+invoices/sec, per-stage latency percentiles, extraction accuracy
+against the corpus ground truth and peak RSS as JSON:
+
+    backfill    main.backfill(): list + download every message, process, sync
+    monitor     the daemon's poll job (main.monitor) for --cycles cycles, messages arriving between them
+    process_all main.process() over corpus files on disk, sequential (PIPELINE_ENABLED off)
+    pipeline    the same, through the staged pipeline
+
+Scenarios run in separate processes so peak RSS is per scenario.
+
+Usage:
+    python -m benchmarks.e2e_benchmark [--invoices 200] [--ollama-latency-ms 50] [--out result.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest import mock
+
+from benchmarks import corpus
+from benchmarks.fakes import FakeGmail, FakeSheets, OllamaStub, truth_answer
+from src.utils import log
+
+SCENARIOS = ["backfill", "monitor", "process_all", "pipeline"]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageTimer:
+    """Wraps the functions behind each processing stage and records call durations.
+
+    The wrappers are installed on the modules the callers look them up
+    in, so the sequential path and the pipeline are measured the same way.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def _wrap(self, stage: str, func):
+        samples = self.samples.setdefault(stage, [])
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    samples.append(elapsed)
+        return timed
+
+    def install(self, stack: contextlib.ExitStack):
+        from src.downloaders import bulk_downloader, monitor_downloader
+        from src.processors import invoice_processor, llm_extractor, pipeline
+        from src.writers import sheet_sync
+
+        targets = [
+            ("download", bulk_downloader, "download_invoices"),
+            ("download", monitor_downloader, "process_messages"),
+            ("extract", invoice_processor, "load_group"),
+            ("classify", invoice_processor, "passes_classifier"),
+            ("parse", invoice_processor, "route"),
+            ("llm", llm_extractor, "extract"),
+            ("store", pipeline, "store_result"),
+            ("archive", pipeline, "archive_result"),
+            ("sync", sheet_sync, "sync"),
+        ]
+        for stage, module, name in targets:
+            stack.enter_context(mock.patch.object(module, name, self._wrap(stage, getattr(module, name))))
+
+    def summary(self) -> dict:
+        out = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            out[stage] = {
+                "calls": len(ordered),
+                "total_s": round(sum(ordered), 4),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return out
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _environment(stack: contextlib.ExitStack, workdir: str, gmail, sheets, ollama, pipeline_enabled: bool):
+    """Point settings at ``workdir`` and the fakes for the rest of the scenario."""
+    from src.auth import gmail_auth
+    from src.config import settings
+    from src.daemon import jobs
+    from src.downloaders import bulk_downloader
+    from src.processors import llm_extractor
+    from src.writers import sheet_sync, sheets_writer
+
+    overrides = {
+        "INVOICE_DIR": os.path.join(workdir, "invoices"),
+        "OLD_INVOICE_DIR": os.path.join(workdir, "old_invoices"),
+        "PROCESSED_IDS_FILE": os.path.join(workdir, "processed_ids.json"),
+        "INVOICE_DB_FILE": os.path.join(workdir, "invoices.db"),
+        "JOB_QUEUE_FILE": os.path.join(workdir, "jobs.db"),
+        "BLOB_DIR": os.path.join(workdir, "blobs"),
+        "OCR_CACHE_FILE": os.path.join(workdir, "ocr_cache.db"),
+        "PARQUET_EXPORT_DIR": os.path.join(workdir, "export"),
+        "LLM_RETRY_QUEUE_FILE": os.path.join(workdir, "llm_retry_queue.json"),
+        "QUARANTINE_DIR": os.path.join(workdir, "quarantine"),
+        "QUARANTINE_REPORT_FILE": os.path.join(workdir, "quarantine", "report.jsonl"),
+        "REJECTED_FILE": os.path.join(workdir, "rejected.jsonl"),
+        "OLLAMA_URL": f"{ollama.url}/api/chat",
+        "OLLAMA_TAGS_URL": f"{ollama.url}/api/tags",
+        "PIPELINE_ENABLED": pipeline_enabled,
+        "PIPELINE_REPORT_SECONDS": 0,
+    }
+    for name, value in overrides.items():
+        stack.enter_context(mock.patch.object(settings, name, value))
+
+    for module in (gmail_auth, bulk_downloader, jobs):
+        stack.enter_context(mock.patch.object(module, "get_gmail_service", return_value=gmail))
+    for module in (gmail_auth, sheets_writer, sheet_sync):
+        stack.enter_context(mock.patch.object(module, "get_sheets_service", return_value=sheets))
+    llm_extractor.breaker.reset()
+
+
+def _deliver(gmail, invoices: list, internal_ms: int = None):
+    for inv in invoices:
+        gmail.add_message(inv["msg_id"], inv["subject"], inv["sender"], inv["body"],
+                          thread_id=inv["thread_id"], internal_ms=internal_ms or inv["internal_ms"],
+                          attachments=inv["attachments"], message_id=inv["message_id"],
+                          date=None if internal_ms else inv["date"])
+
+
+def _run_monitor(gmail, invoices: list, cycles: int):
+    """Run the monitor's poll job (as main.monitor schedules it) ``cycles`` times, one batch delivered before each."""
+    import main
+    from src.daemon import jobs
+
+    state = jobs.DaemonState(main.process_and_archive_invoices, poll_interval=60)
+    state.load_sheet_ids()
+    for i in range(cycles):
+        _deliver(gmail, invoices[i::cycles], internal_ms=int(time.time() * 1000))
+        jobs.poll(state)
+    state.flush()
+
+
+def _stored_invoices(store) -> list:
+    invoices, items = store.fetch_rows(store.changed_since(None))
+    by_id = {row["id"]: dict(row, items=[]) for row in invoices}
+    for item in items:
+        by_id[item["invoice_id"]]["items"].append(item)
+    return list(by_id.values())
+
+
+def run_scenario(name: str, opts) -> dict:
+    """Run one scenario in a fresh data directory and return its measurements."""
+    import main
+    from src.storage import invoice_store
+
+    invoices = list(corpus.generate(opts.invoices, opts.seed, llm_share=opts.llm_share,
+                                    pdf_share=opts.pdf_share, long_share=opts.long_share))
+    truth = {inv["thread_id"]: inv["truth"] for inv in invoices}
+    answers = {t["order_number"]: truth_answer(t) for t in truth.values()}
+    gmail = FakeGmail(latency=opts.gmail_latency_ms / 1000)
+    sheets = FakeSheets(latency=opts.sheets_latency_ms / 1000)
+    timer = StageTimer()
+    workdir = tempfile.mkdtemp(prefix="invoice-bench-")
+    output = contextlib.nullcontext() if opts.verbose else contextlib.redirect_stdout(io.StringIO())
+    if opts.verbose:
+        log.setup(log_file="")
+    else:
+        logging.getLogger().addHandler(logging.NullHandler())
+
+    try:
+        with OllamaStub(latency=opts.ollama_latency_ms / 1000, answers=answers) as ollama, contextlib.ExitStack() as stack, output:
+            _environment(stack, workdir, gmail, sheets, ollama, pipeline_enabled=(name != "process_all"))
+
+            if name in ("process_all", "pipeline"):
+                from src.config import settings
+                for inv in invoices:
+                    corpus.write_group(inv, settings.INVOICE_DIR)
+            elif name == "backfill":
+                _deliver(gmail, invoices)
+
+            timer.install(stack)
+            start = time.perf_counter()
+            if name == "backfill":
+                main.backfill()
+            elif name == "monitor":
+                _run_monitor(gmail, invoices, opts.cycles)
+            else:
+                main.process()
+            elapsed = time.perf_counter() - start
+
+            store = invoice_store.get_store()
+            stored = store.count()
+            duplicates = len(store.duplicates())
+            accuracy = corpus.score(truth, _stored_invoices(store))
+            store.close()
+            invoice_store._store = None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "scenario": name,
+        "messages": len(invoices),
+        "invoices": stored,
+        "duplicates": duplicates,
+        "sheet_rows": max(len(sheets.rows) - 1, 0),
+        "seconds": round(elapsed, 3),
+        "invoices_per_second": round(stored / elapsed, 2) if elapsed else None,
+        "stages": timer.summary(),
+        "accuracy": accuracy["accuracy"],
+        "api_calls": {
+            "gmail": dict(sorted(gmail.calls.items())),
+            "sheets": dict(sorted(sheets.calls.items())),
+            "ollama": ollama.requests,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=200, help="synthetic messages per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-share", type=float, default=0.4, help="fraction of unknown-vendor (LLM) invoices")
+    parser.add_argument("--pdf-share", type=float, default=0.7, help="fraction of invoices with a PDF attachment")
+    parser.add_argument("--long-share", type=float, default=0.1, help="fraction of multi-page orders")
+    parser.add_argument("--ollama-latency-ms", type=float, default=50)
+    parser.add_argument("--gmail-latency-ms", type=float, default=0)
+    parser.add_argument("--sheets-latency-ms", type=float, default=0)
+    parser.add_argument("--cycles", type=int, default=5, help="monitor polling cycles")
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    parser.add_argument("--in-process", action="store_true", help="run scenarios in this process (shared RSS)")
+    parser.add_argument("--verbose", action="store_true", help="show the application's own output")
+    opts = parser.parse_args(argv)
+
+    results = []
+    for name in opts.scenarios:
+        print(f"[BENCH] {name}: {opts.invoices} message(s)...", file=sys.stderr)
+        if opts.in_process:
+            results.append(run_scenario(name, opts))
+        else:
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                results.append(pool.apply(run_scenario, (name, opts)))
+
+    report = {
+        "benchmark": "e2e",
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": sys.platform,
+        "config": {k: v for k, v in vars(opts).items() if k not in ("out", "verbose", "in_process")},
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if opts.out:
+        with open(opts.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
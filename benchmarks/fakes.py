@@ -0,0 +1,348 @@
+"""In-process stand-ins for Gmail, Google Sheets and Ollama.
+
+They implement just the API surface the downloaders, sheet writers and
+LLM extractor call, with optional per-call latency, so whole runs can be
+timed without network access or credentials.
+"""
+import base64
+import copy
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.config import settings
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+class _Request:
+    """What googleapiclient returns from a method call: work deferred to execute()."""
+
+    def __init__(self, func, latency: float):
+        self._func = func
+        self._latency = latency
+
+    def execute(self):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._func()
+
+
+class _Resource:
+    """Maps API method names to handlers, counting calls per method."""
+
+    def __init__(self, owner, prefix: str, methods: dict):
+        self._owner = owner
+        self._prefix = prefix
+        self._methods = methods
+
+    def __getattr__(self, name):
+        try:
+            handler = self._methods[name]
+        except KeyError:
+            raise AttributeError(f"{self._prefix}.{name} is not faked") from None
+
+        def call(**kwargs):
+            if isinstance(handler, _Resource):
+                return handler
+            self._owner.calls[f"{self._prefix}.{name}"] += 1
+            return _Request(lambda: handler(**kwargs), self._owner.latency)
+        return call
+
+
+class FakeGmail:
+    """Gmail API service holding messages, attachments and a history log.
+
+    Args:
+        latency: Seconds added to every execute() call.
+        page_size: Default maxResults for messages.list, as in the real API.
+    """
+
+    def __init__(self, latency: float = 0.0, page_size: int = 100, email: str = "bench@example.com"):
+        self.latency = latency
+        self.page_size = page_size
+        self.email = email
+        self.messages = {}
+        self.attachments = {}
+        self.history = []
+        self.history_id = 1000
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+        attachments = _Resource(self, "attachments", {"get": self._get_attachment})
+        messages = _Resource(self, "messages", {
+            "list": self._list, "get": self._get, "attachments": attachments,
+        })
+        history = _Resource(self, "history", {"list": self._history})
+        self._users = _Resource(self, "users", {
+            "messages": messages, "history": history, "getProfile": self._profile,
+        })
+
+    def users(self):
+        return self._users
+
+    def add_message(self, msg_id: str, subject: str, sender: str, body: str, thread_id: str = None,
+                    internal_ms: int = None, attachments: list = (), message_id: str = None,
+                    date: str = None) -> dict:
+        """Store a message; ``attachments`` is a list of (filename, mime_type, bytes)."""
+        internal_ms = internal_ms or int(time.time() * 1000)
+        date = date or time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime(internal_ms / 1000))
+        headers = [
+            {"name": "Subject", "value": subject},
+            {"name": "From", "value": sender},
+            {"name": "To", "value": self.email},
+            {"name": "Date", "value": date},
+            {"name": "Message-ID", "value": message_id or f"<{msg_id}@bench.local>"},
+        ]
+        parts = [{"partId": "0", "mimeType": "text/plain", "filename": "",
+                  "body": {"size": len(body), "data": _b64(body.encode("utf-8"))}}]
+        for i, (filename, mime_type, data) in enumerate(attachments, start=1):
+            attach_id = f"att-{msg_id}-{i}"
+            self.attachments[(msg_id, attach_id)] = _b64(data)
+            parts.append({"partId": str(i), "mimeType": mime_type, "filename": filename,
+                          "body": {"size": len(data), "attachmentId": attach_id}})
+
+        message = {
+            "id": msg_id,
+            "threadId": thread_id or msg_id,
+            "internalDate": str(internal_ms),
+            "payload": {"mimeType": "multipart/mixed", "headers": headers, "body": {"size": 0}, "parts": parts},
+        }
+        with self._lock:
+            self.messages[msg_id] = message
+            self.history_id += 1
+            self.history.append((self.history_id, msg_id))
+        return message
+
+    def _list(self, userId, q="", pageToken=None, maxResults=None, **kwargs):
+        m = re.search(r"after:(\d+)", q or "")
+        after_ms = int(m.group(1)) * 1000 if m else 0
+        with self._lock:
+            matching = [
+                {"id": msg["id"], "threadId": msg["threadId"]}
+                for msg in sorted(self.messages.values(), key=lambda x: int(x["internalDate"]), reverse=True)
+                if int(msg["internalDate"]) >= after_ms
+            ]
+        start = int(pageToken or 0)
+        size = maxResults or self.page_size
+        result = {"messages": matching[start:start + size], "resultSizeEstimate": len(matching)}
+        if start + size < len(matching):
+            result["nextPageToken"] = str(start + size)
+        if not result["messages"]:
+            del result["messages"]
+        return result
+
+    def _get(self, userId, id, format=None, **kwargs):
+        with self._lock:
+            return copy.deepcopy(self.messages[id])
+
+    def _get_attachment(self, userId, messageId, id):
+        data = self.attachments[(messageId, id)]
+        return {"attachmentId": id, "size": len(data), "data": data}
+
+    def _history(self, userId, startHistoryId, **kwargs):
+        start = int(startHistoryId)
+        with self._lock:
+            added = [(hid, self.messages[mid]) for hid, mid in self.history if hid > start]
+            current = self.history_id
+        history = [{"id": str(hid), "messagesAdded": [{"message": {"id": msg["id"], "threadId": msg["threadId"]}}]}
+                   for hid, msg in added]
+        return {"history": history, "historyId": str(current)}
+
+    def _profile(self, userId):
+        with self._lock:
+            return {"emailAddress": self.email, "messagesTotal": len(self.messages),
+                    "historyId": str(self.history_id)}
+
+
+_COLUMNS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_RANGE_RE = re.compile(r"^(?:[^!]+!)?([A-Z])(\d*)(?::([A-Z])(\d*))?$")
+
+
+def _parse_range(a1: str) -> tuple:
+    """'Sheet1!A2:K9' -> (first_row, last_row or None, first_col, last_col), zero-based columns."""
+    m = _RANGE_RE.match(a1)
+    if not m:
+        raise ValueError(f"Unsupported range: {a1}")
+    col1, row1, col2, row2 = m.groups()
+    first = int(row1) if row1 else 1
+    last = int(row2) if row2 else (first if row1 and not col2 else None)
+    return first, last, _COLUMNS.index(col1), _COLUMNS.index(col2 or col1)
+
+
+class FakeSheets:
+    """Sheets API service over an in-memory grid (one sheet)."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.rows = []
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        values = _Resource(self, "values", {
+            "get": self._get, "update": self._update, "append": self._append,
+            "batchGet": self._batch_get, "batchUpdate": self._batch_update,
+        })
+        self._spreadsheets = _Resource(self, "spreadsheets", {"values": values})
+
+    def spreadsheets(self):
+        return self._spreadsheets
+
+    def _read(self, a1: str) -> dict:
+        first, last, col1, col2 = _parse_range(a1)
+        end = len(self.rows) if last is None else min(last, len(self.rows))
+        values = [list(r[col1:col2 + 1]) for r in self.rows[first - 1:end]]
+        while values and not any(v not in ("", None) for v in values[-1]):
+            values.pop()
+        return {"range": a1, "values": values} if values else {"range": a1}
+
+    def _write(self, a1: str, values: list):
+        first, _, col1, _ = _parse_range(a1)
+        for offset, row_values in enumerate(values):
+            n = first + offset
+            while len(self.rows) < n:
+                self.rows.append([])
+            row = self.rows[n - 1]
+            row.extend([""] * (col1 + len(row_values) - len(row)))
+            row[col1:col1 + len(row_values)] = list(row_values)
+
+    def _get(self, spreadsheetId, range, **kwargs):
+        with self._lock:
+            return self._read(range)
+
+    def _batch_get(self, spreadsheetId, ranges, **kwargs):
+        with self._lock:
+            return {"valueRanges": [self._read(r) for r in ranges]}
+
+    def _update(self, spreadsheetId, range, body, **kwargs):
+        with self._lock:
+            self._write(range, body["values"])
+        return {"updatedRows": len(body["values"])}
+
+    def _append(self, spreadsheetId, range, body, **kwargs):
+        with self._lock:
+            last = len(self.rows)
+            while last and not any(v not in ("", None) for v in self.rows[last - 1]):
+                last -= 1
+            self._write(f"A{last + 1}", body["values"])
+        return {"updates": {"updatedRows": len(body["values"])}}
+
+    def _batch_update(self, spreadsheetId, body):
+        with self._lock:
+            for entry in body["data"]:
+                self._write(entry["range"], entry["values"])
+        return {"totalUpdatedRows": len(body["data"])}
+
+
+_TOKEN_RE = re.compile(r"[A-Z0-9][A-Z0-9-]{3,}")
+_BATCH_RE = re.compile(r"^=== INVOICE (.+?) ===\n(.*?)^=== END \1 ===", re.M | re.S)
+
+
+def truth_answer(truth: dict) -> dict:
+    """The reply a perfect model would give for a corpus invoice (see benchmarks.corpus)."""
+    return {
+        "mail_thread_id": "",
+        "company_name": truth["company_name"],
+        "purchase_date": truth["purchase_date"],
+        "mail_received_time": "",
+        "purchase_receiver": truth["purchase_receiver"],
+        "order_number": truth["order_number"],
+        "total_price": truth["total_price"],
+        "other_expenses": truth["other_expenses"],
+        "items": [{"item_name": i["item_name"], "quantity": i["quantity"], "price": i["price"]}
+                  for i in truth["items"]],
+    }
+
+
+class OllamaStub:
+    """Local HTTP server answering /api/chat and /api/tags like Ollama.
+
+    The first order number in the prompt that appears in ``answers``
+    selects the reply, sent after ``latency`` seconds, so the extractor's
+    HTTP, JSON and validation code all run; unknown prompts get an empty
+    object, which fails validation like a useless model answer would.
+
+    Args:
+        latency: Seconds to wait before each chat reply.
+        answers: Order number -> invoice dict to answer with.
+    """
+
+    def __init__(self, latency: float = 0.0, answers: dict = None, model: str = None):
+        self.latency = latency
+        self.answers = answers or {}
+        self.model = model or settings.OLLAMA_MODEL
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def answer(self, text: str) -> dict:
+        for token in _TOKEN_RE.findall(text):
+            if token in self.answers:
+                return dict(self.answers[token])
+        return {}
+
+    def _reply(self, payload: dict) -> dict:
+        prompt = payload["messages"][0]["content"]
+        batch = _BATCH_RE.findall(prompt)
+        if batch:
+            answer = {"invoices": [dict(self.answer(body), mail_thread_id=tid) for tid, body in batch]}
+        else:
+            answer = self.answer(prompt)
+        return {"model": self.model, "done": True,
+                "message": {"role": "assistant", "content": json.dumps(answer)}}
+
+    def start(self) -> "OllamaStub":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status: int, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send(200, {"models": [{"name": stub.model}]})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self._send(200, stub._reply(payload))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
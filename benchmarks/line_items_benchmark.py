@@ -0,0 +1,140 @@
+"""Benchmark table-aware line-item extraction against the vendor regexes.
+
+Generates McMaster-Carr and Home Depot orders with benchmarks.corpus
+(a share of them multi-page, long descriptions wrapped onto a second
+line), then extracts their items both ways:
+
+* regex: the vendor parser's own item pattern over read_pdf's flattened
+  text (Home Depot has none, so it finds nothing);
+* table: line_items over pdfplumber word positions (PDF attachments) or
+  the space-aligned email body.
+
+Reports time per invoice and accuracy against the ground truth, overall
+and for multi-page orders: invoices whose item list is exactly right,
+and the share of truth items found with the right name, quantity and
+price. Times are per invoice, split into reading the PDF (read_pdf;
+with table words kept for the table pass) and extracting the items.
+
+Usage:
+    python -m benchmarks.line_items_benchmark [--invoices 300] [--long-share 0.3] [--out items.json]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks import corpus
+from src.config import settings
+from src.processors import file_handler, line_items, vendor_parser
+
+
+def _key(item: dict) -> tuple:
+    return (" ".join(str(item.get("item_name", "")).split()), int(item.get("quantity") or 0),
+            round(float(item.get("price") or 0), 2))
+
+
+def _accuracy(cases: list) -> dict:
+    """Exact-invoice and item-level match rates for (truth items, extracted items) pairs."""
+    exact = found = total = 0
+    for truth, items in cases:
+        want, got = [_key(i) for i in truth], [_key(i) for i in items]
+        exact += want == got
+        found += sum((Counter(want) & Counter(got)).values())
+        total += len(want)
+    return {"invoices": len(cases), "exact_invoices": round(exact / max(len(cases), 1), 4),
+            "item_recall": round(found / max(total, 1), 4)}
+
+
+def load_cases(count: int, seed: int, pdf_share: float, long_share: float, workdir: str) -> list:
+    """Vendor-layout invoices with their PDF written to ``workdir`` (path None for email-only)."""
+    cases = []
+    for inv in corpus.generate(count, seed, llm_share=0.0, pdf_share=pdf_share, long_share=long_share):
+        truth = inv["truth"]
+        path = None
+        if inv["attachments"]:
+            path = os.path.join(workdir, f"{inv['base']}.pdf")
+            with open(path, "wb") as f:
+                f.write(inv["attachments"][0][2])
+        cases.append({"vendor": truth["layout"], "path": path, "body": inv["body"], "truth": truth})
+    return cases
+
+
+def _timed(cases: list, extract) -> tuple:
+    """Read each case's text, then extract its items, as the pipeline does; (items, read s, extract s)."""
+    results, read_seconds, extract_seconds = [], 0.0, 0.0
+    for case in cases:
+        start = time.perf_counter()
+        case["text"] = file_handler.read_pdf(case["path"]) if case["path"] else case["body"]
+        read_done = time.perf_counter()
+        results.append(extract(case))
+        read_seconds += read_done - start
+        extract_seconds += time.perf_counter() - read_done
+    return results, read_seconds, extract_seconds
+
+
+def run(cases: list) -> dict:
+    """Time and score both extractors on ``cases`` (see load_cases).
+
+    Each method's time includes reading the PDF: plain read_pdf for the
+    regex, read_pdf keeping table words (the default) for the table pass.
+    """
+    for case in cases[:20]:
+        # Warm up imports, caches and the page cache so the first method isn't charged for them
+        line_items.extract(case["vendor"], "", [case["path"]] if case["path"] else [])
+    settings.LINE_ITEM_TABLES_ENABLED = False
+    try:
+        regex, regex_read, regex_seconds = _timed(
+            cases, lambda c: vendor_parser.VENDOR_PARSERS[c["vendor"]](c["text"]).get("items", []))
+    finally:
+        settings.LINE_ITEM_TABLES_ENABLED = True
+    table, table_read, table_seconds = _timed(
+        cases, lambda c: line_items.extract(c["vendor"], c["text"], [c["path"]] if c["path"] else []) or [])
+
+    n = max(len(cases), 1)
+    report = {"invoices": len(cases), "pdfs": sum(1 for c in cases if c["path"]),
+              "multi_page": sum(1 for c in cases if c["truth"]["pages"] > 1),
+              "items": sum(len(c["truth"]["items"]) for c in cases)}
+    for name, results, read_seconds, seconds in (("regex", regex, regex_read, regex_seconds),
+                                                 ("table", table, table_read, table_seconds)):
+        pairs = [(c["truth"]["items"], items) for c, items in zip(cases, results)]
+        multi = [pair for c, pair in zip(cases, pairs) if c["truth"]["pages"] > 1]
+        report[name] = {"read_ms_per_invoice": round(read_seconds * 1000 / n, 3),
+                        "extract_ms_per_invoice": round(seconds * 1000 / n, 3),
+                        "all": _accuracy(pairs), "multi_page": _accuracy(multi),
+                        "by_vendor": {v: _accuracy([p for c, p in zip(cases, pairs) if c["vendor"] == v])
+                                      for v in sorted({c["vendor"] for c in cases})}}
+    return report
+
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=300, help="McMaster-Carr and Home Depot orders")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf-share", type=float, default=0.8, help="fraction with a PDF attachment")
+    parser.add_argument("--long-share", type=float, default=0.3, help="fraction of multi-page orders")
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    opts = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="line-items-bench-") as workdir:
+        cases = load_cases(opts.invoices, opts.seed, opts.pdf_share, opts.long_share, workdir)
+        report = run(cases)
+
+    print(f"{report['invoices']} invoice(s), {report['pdfs']} PDF(s), {report['multi_page']} multi-page, "
+          f"{report['items']} item(s)\n")
+    print(f"  {'':<8} {'read ms':>9} {'items ms':>9} {'exact':>8} {'recall':>8} {'multi-page exact':>17} {'recall':>8}")
+    for name in ("regex", "table"):
+        r = report[name]
+        print(f"  {name:<8} {r['read_ms_per_invoice']:>9.2f} {r['extract_ms_per_invoice']:>9.3f} "
+              f"{r['all']['exact_invoices']:>8.1%} "
+              f"{r['all']['item_recall']:>8.1%} {r['multi_page']['exact_invoices']:>17.1%} "
+              f"{r['multi_page']['item_recall']:>8.1%}")
+    if opts.out:
+        with open(opts.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
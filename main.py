@@ -1,169 +1,150 @@
-"""Invoice Tracker - Main Entry Point"""
-import time
-from datetime import datetime, time as dt_time, timedelta
-
-from src.auth.gmail_auth import get_gmail_service
-from src.downloaders import bulk_downloader, monitor_downloader
-from src.processors import invoice_processor, file_handler
-from src.writers import sheets_writer
+"""Invoice Tracker - Main Entry Point
+
+Run ``python main.py <command>`` (see ``--help``) or ``python main.py``
+for the interactive menu. Google API clients, pdfplumber and the LLM
+client are imported inside the commands that need them, so help and
+light commands start quickly.
+"""
+import argparse
+import logging
+import sys
+
 from src.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+def process_and_archive_invoices(skip_ids: set, invoice_dir: str = None, jobs=None) -> int:
+    """Process invoices one-by-one: store locally, archive files, then sync the sheet.
+
+    With a JobQueue (backfill), each group's progress is recorded there,
+    groups waiting out a retry delay are held back and groups left
+    unfinished are scheduled for a retry.
+    """
+    from src.processors import file_handler
+    from src.utils import profiling
+
+    directory = invoice_dir or settings.INVOICE_DIR
+    with profiling.maybe_profile(lambda: len(file_handler.get_invoice_files(invoice_dir=directory))):
+        return _process_and_archive(skip_ids, invoice_dir, jobs)
+
+
+def _process_and_archive(skip_ids: set, invoice_dir: str = None, jobs=None) -> int:
+    from src.processors import invoice_processor, pipeline
+    from src.storage import archive, invoice_store
+    from src.utils import metrics
+    from src.writers import sheet_sync
+
+    if settings.PIPELINE_ENABLED:
+        count = pipeline.run(skip_ids, invoice_dir=invoice_dir, jobs=jobs)
+        metrics.count("invoices_stored", count)
+        metrics.flush()
+        return count
+
+    store = invoice_store.get_store()
+    skip_ids.update(store.thread_ids())
+    hold = jobs.held_groups() if jobs else None
+    seen, failed = [], set()
 
-def process_and_archive_invoices(skip_ids: set, invoice_dir: str = None) -> int:
-    """Process invoices one-by-one: write to Sheets, then archive files."""
     count = 0
-    for r in invoice_processor.process_all(skip_ids, invoice_dir=invoice_dir):
-        if sheets_writer.write_invoice_data(r):
-            count += 1
+    # Files are archived in the background while the next group is extracted
+    with archive.ArchiveWorker() as worker:
+        for r in invoice_processor.process_all(skip_ids, invoice_dir=invoice_dir, hold=hold, seen=seen):
+            invoice_id, created = pipeline.store_result(store, r)
             tid = r.get("mail_thread_id", "")
             if tid:
                 skip_ids.add(tid)
-
-            file_paths = r.get("_file_paths", [])
-            if file_paths:
-                print(f"[MOVE] Archiving {len(file_paths)} file(s) to {settings.OLD_INVOICE_DIR}...")
-                file_handler.move_processed_files(file_paths, settings.OLD_INVOICE_DIR)
+            if created:
+                count += 1
+            if jobs:
+                jobs.advance_group(r["_group"], "written")
+            pipeline.archive_result(store, r, invoice_id, created, worker, jobs, failed)
+
+    if jobs:
+        pipeline.retry_unfinished(jobs, seen, failed)
+    sheet_sync.sync(store)
+    metrics.count("invoices_stored", count)
+    metrics.flush()
     return count
 
 
-def backfill():
-    """Download historical invoices and process them."""
-    print("\n" + "=" * 60)
-    print("STEP 1: Downloading historical invoices")
-    print("=" * 60)
+def backfill(download: bool = True, retry_failed: bool = False):
+    """Download historical invoices and process them, resuming an interrupted backfill.
+
+    ``retry_failed`` gives messages that used up JOB_MAX_ATTEMPTS a fresh
+    set of attempts first; otherwise they stay held back.
+    """
+    from src.downloaders import bulk_downloader
+    from src.storage.job_queue import JobQueue
+    from src.writers import sheets_writer
+
+    logger.info("=" * 60)
+    logger.info("STEP 1: Downloading historical invoices")
+    logger.info("=" * 60)
 
     sheets_writer.init_sheet()
-    bulk_downloader.download_invoices()
+    jobs = JobQueue()
+    try:
+        if retry_failed:
+            logger.info("[QUEUE] Retrying %s message(s) that ran out of attempts", jobs.retry_exhausted())
+        if download:
+            bulk_downloader.download_invoices(jobs)
 
-    existing = sheets_writer.get_existing_thread_ids()
-    print(f"[INFO] {len(existing)} existing entries in Google Sheets")
+        existing = sheets_writer.get_existing_thread_ids()
+        logger.info("[INFO] %s existing entries in Google Sheets", len(existing))
 
-    count = process_and_archive_invoices(existing, invoice_dir=settings.INVOICE_DIR)
+        count = process_and_archive_invoices(existing, invoice_dir=settings.INVOICE_DIR, jobs=jobs)
+        logger.info("[QUEUE] %s", jobs.format_counts())
+    finally:
+        jobs.close()
 
-    print(f"\n[OK] Backfill complete: {count} new invoices")
+    logger.info("[OK] Backfill complete: %s new invoices", count)
     return count
 
 
-def monitor():
-    """Start 24/7 monitoring for new invoice emails."""
-    print("\n" + "=" * 60)
-    print("STEP 2: Starting 24/7 monitor")
-    print(f"Checking every {settings.CHECK_INTERVAL_SECONDS}s - Ctrl+C to stop")
-    print("=" * 60)
+def monitor(interval: int = None):
+    """Start 24/7 monitoring for new invoice emails (the daemon's poll job alone)."""
+    from src.daemon import jobs
 
-    service = get_gmail_service()
-    processed = monitor_downloader.load_processed_ids()
-    excel_ids = sheets_writer.get_existing_thread_ids()
+    interval = interval or settings.CHECK_INTERVAL_SECONDS
+    jobs.run_daemon(process_and_archive_invoices, {"poll": {"every": interval, "run_at_start": True}},
+                    title="24/7 MONITOR")
 
-    try:
-        while True:
-            ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            print(f"\n[{ts}] Checking...")
 
-            messages = monitor_downloader.search_new_messages(
-                service, settings.CHECK_INTERVAL_SECONDS * 2
-            )
+def scheduled_check_with_llm():
+    """Catch up on the last week, then check for new emails at the daemon's llm_batch times."""
+    from src.daemon import jobs
 
-            if messages:
-                new = monitor_downloader.process_messages(service, messages, processed)
-                monitor_downloader.save_processed_ids(processed)
+    definitions = {name: spec for name, spec in settings.DAEMON_JOBS.items() if name != "poll"}
+    jobs.run_daemon(process_and_archive_invoices, definitions, title="SCHEDULED LLM MONITOR")
 
-                if new > 0:
-                    print(f"[NEW] {new} email(s)")
-                    process_and_archive_invoices(excel_ids, invoice_dir=settings.INVOICE_DIR)
-            else:
-                print("No new invoices")
 
-            time.sleep(settings.CHECK_INTERVAL_SECONDS)
+def daemon():
+    """Run polling, the 12 AM / 7 AM LLM batches and reconciliation as one asyncio daemon."""
+    from src.daemon import jobs
+    jobs.run_daemon(process_and_archive_invoices)
 
-    except KeyboardInterrupt:
-        print("\n[STOP] Monitor stopped")
 
+def test_connection():
+    """Authenticate with Gmail (opens the OAuth flow if needed)."""
+    from src.auth.gmail_auth import get_gmail_service
+    get_gmail_service()
 
-def scheduled_check_with_llm():
-    """Check for new emails at midnight and 7 AM daily."""
-    print("\n" + "=" * 60)
-    print("SCHEDULED LLM MONITOR")
-    print("Running at 12:00 AM and 7:00 AM daily - Ctrl+C to stop")
-    print("=" * 60)
-
-    service = get_gmail_service()
-    processed = monitor_downloader.load_processed_ids()
-    excel_ids = sheets_writer.get_existing_thread_ids()
-
-    scheduled_times = [dt_time(0, 0), dt_time(7, 0)]
-
-    # --- Initial catch-up: process any invoices received since the last check ---
-    print("\n[INIT] Checking for unprocessed invoices since last run...")
-    messages = monitor_downloader.search_new_messages(service, 7 * 24 * 3600)  # look back 7 days
-
-    if messages:
-        new = monitor_downloader.process_messages(service, messages, processed)
-        monitor_downloader.save_processed_ids(processed)
-
-        if new > 0:
-            print(f"[INIT] {new} new email(s) found - Processing with LLM...")
-            added_count = process_and_archive_invoices(excel_ids, invoice_dir=settings.INVOICE_DIR)
-            print(f"[INIT] Catch-up complete: {added_count} invoices processed and added to sheet")
-        else:
-            print("[INIT] No unprocessed invoices found")
-    else:
-        print("[INIT] No new invoices found")
 
-    print("\n[INFO] Initial catch-up done. Now waiting for scheduled times (12 AM & 7 AM)...")
+def process(invoice_dir: str = None) -> int:
+    """Process invoices already downloaded to the invoice directory."""
+    from src.writers import sheets_writer
+
+    existing = sheets_writer.get_existing_thread_ids()
+    count = process_and_archive_invoices(existing, invoice_dir=invoice_dir or settings.INVOICE_DIR)
+    logger.info("[OK] %s invoices added", count)
+    return count
+
+
+def menu():
+    """Interactive menu (the default when no command is given)."""
+    from src.writers import sheets_writer
 
-    try:
-        while True:
-            now = datetime.now()
-            current_time = now.time()
-
-            should_run = False
-            for scheduled_time in scheduled_times:
-                time_diff = abs((current_time.hour * 60 + current_time.minute) -
-                                (scheduled_time.hour * 60 + scheduled_time.minute))
-                if time_diff < 1:
-                    should_run = True
-                    break
-
-            if should_run:
-                ts = now.strftime("%Y-%m-%d %H:%M:%S")
-                print(f"\n[{ts}] Scheduled check starting...")
-
-                messages = monitor_downloader.search_new_messages(service, 24 * 3600)
-
-                if messages:
-                    new = monitor_downloader.process_messages(service, messages, processed)
-                    monitor_downloader.save_processed_ids(processed)
-
-                    if new > 0:
-                        print(f"[NEW] {new} email(s) - Processing with LLM...")
-                        added_count = process_and_archive_invoices(excel_ids, invoice_dir=settings.INVOICE_DIR)
-                        print(f"[OK] {added_count} invoices processed and added to sheet")
-                    else:
-                        print("Emails downloaded but already processed")
-                else:
-                    print("No new invoices found")
-
-                time.sleep(120)
-            else:
-                next_run = None
-                for scheduled_time in scheduled_times:
-                    next_datetime = datetime.combine(now.date(), scheduled_time)
-                    if next_datetime <= now:
-                        next_datetime += timedelta(days=1)
-                    if next_run is None or next_datetime < next_run:
-                        next_run = next_datetime
-
-                print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] Waiting... Next check: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
-                time.sleep(60)
-
-    except KeyboardInterrupt:
-        print("\n[STOP] Scheduled monitor stopped")
-
-
-def main():
-    """Main application entry point."""
-    sheets_writer.init_sheet()
     print("""
 ============================================================
            INVOICE TRACKER (Google Sheets Edition)
@@ -174,32 +155,153 @@ def main():
   4. Process Existing Invoices
   5. FULL AUTO (24/7) [*]
   6. Scheduled Check (12 AM & 7 AM) with LLM
+  7. Daemon (poll + scheduled LLM + reconcile)
 ============================================================
     """)
 
-    choice = input("Choice (1-6): ").strip()
+    choice = input("Choice (1-7): ").strip()
+    if choice != "1":
+        sheets_writer.init_sheet()
 
     if choice == "1":
-        get_gmail_service()
+        test_connection()
     elif choice == "2":
-        bulk_downloader.download_invoices()
-        existing = sheets_writer.get_existing_thread_ids()
-        count = process_and_archive_invoices(existing, invoice_dir=settings.INVOICE_DIR)
-        print(f"\n[OK] {count} invoices added")
+        backfill()
     elif choice == "3":
         monitor()
     elif choice == "4":
-        existing = sheets_writer.get_existing_thread_ids()
-        count = process_and_archive_invoices(existing, invoice_dir=settings.INVOICE_DIR)
-        print(f"\n[OK] {count} invoices added")
+        process()
     elif choice == "5":
         backfill()
         monitor()
     elif choice == "6":
         scheduled_check_with_llm()
+    elif choice == "7":
+        daemon()
     else:
         print("[ERROR] Invalid choice")
 
 
+def _run_export(opts):
+    from src.writers import parquet_writer
+    parquet_writer.export(out_dir=opts.out, full=opts.full)
+
+
+def _run_report(opts):
+    from src.analytics import spend
+    spend.run_report(opts)
+
+
+def _run_search(opts):
+    from src.storage import search
+    search.run_search(opts)
+
+
+def _run_blobs(opts):
+    from src.storage import blob_store
+    blob_store.run_blobs(opts)
+
+
+def _run_backfill(opts):
+    backfill(download=not opts.no_download, retry_failed=opts.retry_failed)
+    if opts.monitor:
+        monitor(opts.interval)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command-line interface: one subcommand per operation."""
+    from src.analytics import cli as report_cli
+    from src.storage import blob_store, search
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Invoice Tracker")
+    parser.add_argument("--metrics", action="store_true",
+                        help=f"record stage timings and counters to {settings.METRICS_JSONL_FILE}")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help=f"serve Prometheus metrics on this port (default {settings.METRICS_PORT})")
+    parser.add_argument("--log-level", action="append", metavar="[LOGGER=]LEVEL",
+                        help="log level, or one subsystem's level, e.g. src.processors.llm_extractor=DEBUG "
+                             "(repeatable)")
+    parser.add_argument("--log-json", action="store_true", help="write console logs as JSON lines")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"profile each processing run, reports in {settings.PROFILE_DIR}")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, also report top allocation sites (slower)")
+    sub = parser.add_subparsers(dest="command", metavar="<command>")
+
+    p = sub.add_parser("test-connection", help="authenticate with Gmail")
+    p.set_defaults(func=lambda opts: test_connection())
+
+    p = sub.add_parser("backfill", help="download historical invoice emails and process them")
+    p.add_argument("--no-download", action="store_true", help="only process files already downloaded")
+    p.add_argument("--retry-failed", action="store_true",
+                   help=f"retry messages that failed {settings.JOB_MAX_ATTEMPTS} times")
+    p.add_argument("--monitor", action="store_true", help="keep monitoring afterwards (full auto)")
+    p.add_argument("--interval", type=int, help="monitor check interval in seconds")
+    p.set_defaults(func=_run_backfill)
+
+    p = sub.add_parser("monitor", help="poll Gmail and process new invoices until stopped")
+    p.add_argument("--interval", type=int, help=f"seconds between checks (default {settings.CHECK_INTERVAL_SECONDS})")
+    p.set_defaults(func=lambda opts: monitor(opts.interval))
+
+    p = sub.add_parser("scheduled", help="check at 12 AM and 7 AM daily with LLM processing")
+    p.set_defaults(func=lambda opts: scheduled_check_with_llm())
+
+    p = sub.add_parser("process", help="process invoices already downloaded")
+    p.add_argument("--invoice-dir", help=f"directory to process (default {settings.INVOICE_DIR})")
+    p.set_defaults(func=lambda opts: process(opts.invoice_dir))
+
+    p = sub.add_parser("daemon", help="poll + scheduled LLM batches + reconcile in one process")
+    p.set_defaults(func=lambda opts: daemon())
+
+    p = sub.add_parser("export", help="export invoices and line items to partitioned Parquet")
+    p.add_argument("--full", action="store_true", help="rewrite every partition")
+    p.add_argument("--out", default=settings.PARQUET_EXPORT_DIR, help="export directory")
+    p.set_defaults(func=_run_export)
+
+    p = sub.add_parser("report", help="spend reports (per vendor/month, top items, outliers)")
+    report_cli.add_arguments(p)
+    p.set_defaults(func=_run_report)
+
+    p = sub.add_parser("search", help="full-text search over processed invoices")
+    search.add_arguments(p)
+    p.set_defaults(func=_run_search)
+
+    p = sub.add_parser("blobs", help="attachment store space savings and garbage collection")
+    blob_store.add_arguments(p)
+    p.set_defaults(func=_run_blobs)
+
+    p = sub.add_parser("menu", help="interactive menu (default)")
+    p.set_defaults(func=lambda opts: menu())
+    return parser
+
+
+def _setup_logging(opts):
+    from src.utils import log
+
+    level, levels = None, dict(settings.LOG_LEVELS)
+    for spec in opts.log_level or []:
+        name, _, value = spec.rpartition("=")
+        if name:
+            levels[name] = value
+        else:
+            level = value
+    log.setup(level, console_format="json" if opts.log_json else None, levels=levels)
+
+
+def main(argv: list = None):
+    """Main application entry point."""
+    opts = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    _setup_logging(opts)
+    if opts.metrics or opts.metrics_port or settings.METRICS_ENABLED:
+        from src.utils import metrics
+        metrics.configure(True, opts.metrics_port)
+    if opts.profile or opts.profile_memory:
+        from src.utils import profiling
+        profiling.enable(True, memory=opts.profile_memory, label=opts.command or "menu")
+    if opts.command is None:
+        return menu()
+    return opts.func(opts)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,16 @@
+"""Arguments of the spend report command.
+
+Kept apart from spend.py so building the CLI parser (``python main.py
+--help``) does not import numpy and pandas.
+"""
+
+REPORTS = ["vendor-month", "monthly", "top-items", "outliers"]
+
+
+def add_arguments(parser):
+    """Add the report command's arguments to ``parser``."""
+    parser.add_argument("report", choices=REPORTS)
+    parser.add_argument("--top", type=int, default=10, help="rows for top-items")
+    parser.add_argument("--by", choices=["spend", "quantity"], default="spend", help="top-items ranking")
+    parser.add_argument("--threshold", type=float, default=3.5, help="robust z-score for outliers")
+    parser.add_argument("--csv", help="also write the report to this CSV file")
@@ -0,0 +1,218 @@
+"""Vectorized spend analytics over the local invoice store.
+
+Invoices and line items are loaded once into pandas DataFrames (vendor
+names as categoricals, amounts as float64, months as periods) and every
+report is a vectorized group-by over those columns. Frames and report
+results are cached until the store's data version changes, i.e. until
+an invoice is added or edited.
+
+Usage:
+    python -m src.analytics.spend vendor-month
+    python -m src.analytics.spend top-items --top 20
+    python -m src.analytics.spend outliers --threshold 3.5
+"""
+import argparse
+
+from src.analytics.cli import add_arguments
+from src.storage import invoice_store
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = None
+    pd = None
+
+INVOICE_COLUMNS = ["invoice_id", "vendor", "purchase_date", "created_at", "total", "other_expenses"]
+ITEM_COLUMNS = ["invoice_id", "item_name", "quantity", "price"]
+
+
+def _require_pandas():
+    if pd is None:
+        raise RuntimeError("Spend analytics needs numpy and pandas: pip install numpy pandas")
+
+
+def build_frames(invoice_rows: list, item_rows: list) -> tuple:
+    """Turn raw store rows into typed (invoices, items) DataFrames."""
+    _require_pandas()
+    invoices = pd.DataFrame.from_records(invoice_rows, columns=INVOICE_COLUMNS)
+    items = pd.DataFrame.from_records(item_rows, columns=ITEM_COLUMNS)
+    return prepare_frames(invoices, items)
+
+
+def prepare_frames(invoices, items) -> tuple:
+    """Normalize column types and derive month, vendor and amount columns.
+
+    ``invoices`` needs INVOICE_COLUMNS and ``items`` needs ITEM_COLUMNS.
+    """
+    _require_pandas()
+    invoices = invoices.copy()
+    day = pd.to_datetime(invoices["purchase_date"], format="%Y-%m-%d", errors="coerce")
+    fallback = pd.to_datetime(invoices["created_at"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    invoices["date"] = day.fillna(fallback)
+    invoices["month"] = invoices["date"].dt.to_period("M")
+    invoices["vendor"] = invoices["vendor"].fillna("").astype("category")
+    invoices["total"] = pd.to_numeric(invoices["total"], errors="coerce").astype("float64")
+    invoices["other_expenses"] = pd.to_numeric(invoices["other_expenses"], errors="coerce").astype("float64")
+    invoices = invoices.drop(columns=["purchase_date", "created_at"]).set_index("invoice_id", drop=False)
+
+    items = items.copy()
+    items["quantity"] = pd.to_numeric(items["quantity"], errors="coerce").fillna(1).astype("float64")
+    items["price"] = pd.to_numeric(items["price"], errors="coerce").astype("float64")
+    items["amount"] = items["quantity"].to_numpy() * items["price"].to_numpy()
+    items["item_name"] = items["item_name"].fillna("").astype("category")
+
+    position = invoices.index.get_indexer(items["invoice_id"])
+    known = position >= 0
+    items = items[known]
+    position = position[known]
+    items["vendor"] = pd.Categorical.from_codes(
+        invoices["vendor"].cat.codes.to_numpy()[position], invoices["vendor"].cat.categories)
+    items["month"] = invoices["month"].array[position]
+    return invoices.reset_index(drop=True), items.reset_index(drop=True)
+
+
+def spend_by_vendor_month(invoices):
+    """Invoice count and total spend per vendor per month."""
+    grouped = invoices.groupby(["vendor", "month"], observed=True)["total"]
+    out = grouped.agg(invoices="size", spend="sum").reset_index()
+    return out.sort_values(["month", "spend"], ascending=[True, False], ignore_index=True)
+
+
+def monthly_spend(invoices):
+    """Total spend and invoice count per month."""
+    out = invoices.groupby("month")["total"].agg(invoices="size", spend="sum").reset_index()
+    return out.sort_values("month", ignore_index=True)
+
+
+def top_items(items, n: int = 10, by: str = "spend"):
+    """Items with the highest total spend (or quantity) across all invoices."""
+    out = items.groupby("item_name", observed=True).agg(
+        quantity=("quantity", "sum"),
+        spend=("amount", "sum"),
+        orders=("invoice_id", "nunique"),
+        vendors=("vendor", "nunique"),
+    )
+    return out.nlargest(n, by).reset_index()
+
+
+def outlier_totals(invoices, threshold: float = 3.5, min_invoices: int = 5):
+    """Invoices whose total is far from their vendor's usual total.
+
+    Uses the robust z-score 0.6745 * (total - median) / MAD per vendor;
+    vendors with fewer than ``min_invoices`` priced invoices are skipped.
+    """
+    priced = invoices[invoices["total"].notna()]
+    by_vendor = priced.groupby("vendor", observed=True)["total"]
+    median = by_vendor.transform("median")
+    mad = (priced["total"] - median).abs().groupby(priced["vendor"], observed=True).transform("median")
+    count = by_vendor.transform("size")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = 0.6745 * (priced["total"] - median) / mad
+    flagged = (count >= min_invoices) & (mad > 0) & (z.abs() > threshold)
+
+    out = priced.loc[flagged, ["invoice_id", "vendor", "date", "total"]].copy()
+    out["vendor_median"] = median[flagged]
+    out["z_score"] = z[flagged].round(2)
+    return out.sort_values("z_score", key=abs, ascending=False, ignore_index=True)
+
+
+class SpendAnalytics:
+    """Cached reports over an InvoiceStore (or prebuilt frames).
+
+    Frames are reloaded, and every cached report dropped, the first time a
+    report is requested after the store's data version changes.
+    """
+
+    def __init__(self, store=None, frames: tuple = None):
+        _require_pandas()
+        self.store = store
+        self._frames = frames
+        self._version = None
+        self._cache = {}
+
+    @classmethod
+    def from_frames(cls, invoices, items):
+        """Analytics over in-memory frames (see prepare_frames) instead of a store."""
+        return cls(frames=prepare_frames(invoices, items))
+
+    def frames(self) -> tuple:
+        """Return (invoices, items), reloading them if the store changed."""
+        if self.store is None:
+            return self._frames
+
+        version = self.store.data_version()
+        if self._frames is None or version != self._version:
+            self._frames = build_frames(*self.store.bulk_rows())
+            self._version = version
+            self._cache.clear()
+        return self._frames
+
+    def _cached(self, key: tuple, compute):
+        invoices, items = self.frames()
+        if key not in self._cache:
+            self._cache[key] = compute(invoices, items)
+        return self._cache[key]
+
+    def spend_by_vendor_month(self):
+        return self._cached(("vendor_month",), lambda inv, _: spend_by_vendor_month(inv))
+
+    def monthly_spend(self):
+        return self._cached(("monthly",), lambda inv, _: monthly_spend(inv))
+
+    def top_items(self, n: int = 10, by: str = "spend"):
+        return self._cached(("top_items", n, by), lambda _, items: top_items(items, n, by))
+
+    def outlier_totals(self, threshold: float = 3.5, min_invoices: int = 5):
+        return self._cached(("outliers", threshold, min_invoices),
+                            lambda inv, _: outlier_totals(inv, threshold, min_invoices))
+
+
+_analytics = None
+
+
+def get_analytics() -> SpendAnalytics:
+    """Return process-wide analytics over the shared invoice store."""
+    global _analytics
+    store = invoice_store.get_store()
+    if _analytics is None or _analytics.store is not store:
+        _analytics = SpendAnalytics(store)
+    return _analytics
+
+
+def run_report(opts):
+    """Print a spend report for the local invoice store.
+
+    Args:
+        opts: Parsed arguments (see add_arguments) or a list of CLI arguments.
+    """
+    if isinstance(opts, list):
+        parser = argparse.ArgumentParser(prog="report", description=run_report.__doc__.splitlines()[0])
+        add_arguments(parser)
+        opts = parser.parse_args(opts)
+
+    analytics = get_analytics()
+    if opts.report == "vendor-month":
+        result = analytics.spend_by_vendor_month()
+    elif opts.report == "monthly":
+        result = analytics.monthly_spend()
+    elif opts.report == "top-items":
+        result = analytics.top_items(opts.top, opts.by)
+    else:
+        result = analytics.outlier_totals(opts.threshold)
+
+    if result.empty:
+        print("[REPORT] No data")
+    else:
+        with pd.option_context("display.max_rows", 200, "display.width", 160):
+            print(result.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    if opts.csv:
+        result.to_csv(opts.csv, index=False)
+        print(f"[REPORT] Written to {opts.csv}")
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    run_report(sys.argv[1:])
@@ -1,4 +1,5 @@
 """Gmail authentication module."""
+import logging
 import os
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -6,6 +7,9 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 
 from src.config import settings
+from src.utils.rate_limiter import limited
+
+logger = logging.getLogger(__name__)
 
 
 def get_gmail_service():
@@ -28,9 +32,9 @@ def get_gmail_service():
         with open(settings.TOKEN_FILE, 'w') as token:
             token.write(creds.to_json())
 
-    service = build('gmail', 'v1', credentials=creds)
+    service = limited(build('gmail', 'v1', credentials=creds), 'gmail')
     user = service.users().getProfile(userId='me').execute()
-    print(f"✅ Connected to Gmail: {user['emailAddress']}")
+    logger.info("✅ Connected to Gmail: %s", user['emailAddress'])
     return service
 
 
@@ -54,7 +58,7 @@ def get_sheets_service():
         with open(settings.TOKEN_FILE, 'w') as token:
             token.write(creds.to_json())
 
-    return build('sheets', 'v4', credentials=creds)
+    return limited(build('sheets', 'v4', credentials=creds), 'sheets')
 
 
 if __name__ == "__main__":
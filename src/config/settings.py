@@ -19,15 +19,126 @@ CREDENTIALS_FILE = 'credentials/credentials.json'
 TOKEN_FILE = 'credentials/token.json'
 INVOICE_DIR = 'data/invoices'
 OLD_INVOICE_DIR = 'data/old_invoices'
+# Archive layout: 'sharded' (<year>/<month>/<vendor>/<group>/) or 'flat' (one directory)
+ARCHIVE_LAYOUT = 'sharded'
+# Pack archived email .txt files into per-month zstd bundles (pip install zstandard)
+ARCHIVE_BUNDLE_TEXT = False
+ARCHIVE_BUNDLE_MAX_BYTES = 64 * 1024 * 1024
+ARCHIVE_ZSTD_LEVEL = 10
+# Background archiving: groups per batch (one directory fsync pass each), max wait to fill one, queue bound
+ARCHIVE_BATCH_SIZE = 32
+ARCHIVE_BATCH_SECONDS = 0.5
+ARCHIVE_QUEUE_SIZE = 64
+ARCHIVE_FSYNC = True
+# OCR fallback for PDF pages without a text layer (pip install pdf2image pytesseract; needs poppler + tesseract)
+OCR_ENABLED = True
+OCR_MIN_CHARS_PER_PAGE = 20
+# Render pages about this wide (8.5in at 300 DPI), within the DPI bounds; near-empty results retry at OCR_MAX_DPI
+OCR_TARGET_WIDTH_PX = 2550
+OCR_MIN_DPI = 150
+OCR_MAX_DPI = 400
+OCR_WORKERS = 2
+OCR_LANG = 'eng'
+# Time budget per OCR'd page, shared by its pdftoppm/tesseract calls; a page still running at twice this restarts the OCR pool
+OCR_TIMEOUT_SECONDS = 180
+OCR_CACHE_FILE = 'data/ocr_cache.db'
 PROCESSED_IDS_FILE = 'data/processed_ids.json'
+INVOICE_DB_FILE = 'data/invoices.db'
+# Content-addressed attachment store: one copy per distinct file, hardlinked into each group
+BLOB_STORE_ENABLED = True
+BLOB_DIR = 'data/blobs'
+BLOB_GC_GRACE_SECONDS = 3600
+# Backfill job queue: per-message progress, retried with doubling delays up to the cap
+JOB_QUEUE_FILE = 'data/jobs.db'
+JOB_RETRY_BASE_SECONDS = 60
+JOB_RETRY_MAX_SECONDS = 6 * 3600
+JOB_MAX_ATTEMPTS = 8
+# Rows per values.batchUpdate request when syncing the store to the sheet
+SHEETS_SYNC_BATCH_ROWS = 500
+# Partitioned Parquet export (python main.py export)
+PARQUET_EXPORT_DIR = 'data/export'
 
 GMAIL_SEARCH_QUERY = 'Invoice OR Receipt OR Bill'
+
+# Client-side quota for Google API calls: (units per second, burst) per API, shared by all threads
+API_RATE_LIMITS = {'gmail': (250, 250), 'sheets': (1.0, 60)}
+# Quota units per call (unlisted methods cost 1); Gmail publishes these per method
+API_QUOTA_UNITS = {
+    'gmail': {'messages.list': 5, 'messages.get': 5, 'messages.attachments.get': 5,
+              'history.list': 2, 'getProfile': 1},
+    'sheets': {},
+}
+# Retries on 429 / 5xx / rate-limit 403: full-jitter backoff doubling up to the cap, or Retry-After
+API_MAX_RETRIES = 6
+API_BACKOFF_BASE_SECONDS = 1.0
+API_BACKOFF_MAX_SECONDS = 64.0
 CHECK_INTERVAL_SECONDS = 60
 MONITOR_CHECK_INTERVAL = 20
 
+# Daemon jobs: "every" (seconds) or "cron" (minute hour day month weekday)
+DAEMON_JOBS = {
+    "reconcile": {"cron": "30 3 * * *", "run_at_start": True},
+    "poll": {"every": CHECK_INTERVAL_SECONDS},
+    "llm_batch": {"cron": "0 0,7 * * *"},
+}
+DAEMON_SHUTDOWN_TIMEOUT = 300
+
 OLLAMA_MODEL = "gemma2:2b"
 OLLAMA_URL = "http://localhost:11434/api/chat"
 OLLAMA_TIMEOUT = 300
+OLLAMA_CONNECT_TIMEOUT = 5
+OLLAMA_TAGS_URL = "http://localhost:11434/api/tags"
+OLLAMA_HEALTH_TIMEOUT = 3
+# Open the LLM circuit after this many consecutive transport failures
+LLM_BREAKER_FAILURES = 3
+LLM_BREAKER_RESET_SECONDS = 300
+LLM_RETRY_QUEUE_FILE = 'data/llm_retry_queue.json'
+# Pack up to this many short unknown-vendor emails into one LLM request (1 = off)
+LLM_BATCH_SIZE = 1
+LLM_BATCH_MAX_CHARS = 2000
+
+# Staged processing: worker threads per stage and bounded queue size between stages
+PIPELINE_ENABLED = True
+PIPELINE_WORKERS = {"extract": 4, "classify": 1, "parse": 2, "store": 1, "archive": 1}
+PIPELINE_QUEUE_SIZE = 8
+PIPELINE_REPORT_SECONDS = 10
+
+# Near-duplicate detection (same purchase arriving as confirmation, receipt, forward...)
+DUPLICATE_DETECTION_ENABLED = True
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32
+SHINGLE_SIZE = 3
+# Estimated Jaccard similarity above which two invoices' text counts as the same document
+DUPLICATE_TEXT_THRESHOLD = 0.8
+
+# Stage timers and event counters (python main.py --metrics ...); off = one flag check per call
+METRICS_ENABLED = False
+METRICS_HOST = '127.0.0.1'
+# Prometheus text endpoint at http://METRICS_HOST:METRICS_PORT/metrics while enabled (None = no endpoint)
+METRICS_PORT = 9464
+METRICS_JSONL_FILE = 'data/metrics.jsonl'
+
+# Logging (src/utils/log.py): console shows the message ('json' for journald), the file gets JSON lines
+LOG_LEVEL = 'INFO'
+LOG_CONSOLE_FORMAT = 'text'
+LOG_FILE = 'data/logs/invoice_tracker.jsonl'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# Records waiting for the writer thread; beyond this they are dropped instead of blocking
+LOG_QUEUE_SIZE = 10000
+# Per-subsystem verbosity, by logger name prefix, e.g. {'src.processors.llm_extractor': 'DEBUG'}
+LOG_LEVELS = {}
+
+# Profiling mode (python main.py --profile ...): one report per processing run
+PROFILE_DIR = 'data/profiles'
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_TOP = 30
+PROFILE_TRACEMALLOC_FRAMES = 1
+
+CLASSIFIER_ENABLED = True
+CLASSIFIER_THRESHOLD = 0.35
+QUARANTINE_DIR = 'data/quarantine'
+QUARANTINE_REPORT_FILE = 'data/quarantine/report.jsonl'
 
 KNOWN_VENDORS = {
     "homedepot.com": "home_depot",
@@ -36,13 +147,27 @@ KNOWN_VENDORS = {
     "mcmaster-carr.com": "mcmaster_carr",
 }
 
+# Known vendors' line items are read from the item table's columns (PDF word positions),
+# falling back to the vendor parser's regex when no table is found
+LINE_ITEM_TABLES_ENABLED = True
+# Words whose tops differ by at most this many PDF points are on the same table line
+LINE_ITEM_ROW_TOLERANCE = 2.0
+# PDFs whose table words read_pdf keeps in memory for the parser, so the PDF is parsed once
+LINE_ITEM_WORD_CACHE = 64
+
 INVOICE_SCHEMA = {
     "mail_thread_id": "string",
     "company_name": "string",
     "purchase_date": "YYYY-MM-DD",
     "mail_received_time": "string",
     "purchase_receiver": "string",
+    "order_number": "string",
     "total_price": "float",
-    "sum of other_expanses": "float",
+    "other_expenses": "float",
     "items": [{"item_name": "string", "quantity": "integer", "price": "float"}]
 }
+
+# Extracted invoices missing these fields are sent to repair instead of the sheet
+SCHEMA_REQUIRED_FIELDS = ["company_name", "total_price"]
+LLM_REPAIR_ATTEMPTS = 1
+REJECTED_FILE = 'data/rejected.jsonl'
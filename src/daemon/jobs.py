@@ -0,0 +1,160 @@
+"""Job definitions for the invoice daemon."""
+import asyncio
+import logging
+import threading
+import time
+
+from src.auth.gmail_auth import get_gmail_service
+from src.config import settings
+from src.daemon.runtime import Daemon, Job
+from src.downloaders import monitor_downloader
+from src.processors import invoice_processor
+from src.storage import invoice_store
+from src.utils import metrics
+from src.writers import sheet_sync, sheets_writer
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonState:
+    """Shared state for daemon jobs.
+
+    Gmail downloads from different jobs may overlap; processing runs are
+    serialized with ``process_lock`` because they share INVOICE_DIR.
+    """
+
+    def __init__(self, process_fn, poll_interval: int = None):
+        self.process_fn = process_fn
+        self.poll_interval = poll_interval or settings.CHECK_INTERVAL_SECONDS
+        self.process_lock = threading.Lock()
+        self.ids_lock = threading.Lock()
+        self._service = None
+        self.processed = monitor_downloader.load_processed_ids()
+        self.excel_ids = set()
+        self.last_poll = None
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = get_gmail_service()
+        return self._service
+
+    def download(self, window_seconds: int) -> int:
+        """Download new messages received within the window."""
+        messages = monitor_downloader.search_new_messages(self.service, window_seconds)
+        if not messages:
+            return 0
+        with self.ids_lock:
+            new = monitor_downloader.process_messages(self.service, messages, self.processed)
+            monitor_downloader.save_processed_ids(self.processed)
+        return new
+
+    def process(self) -> int:
+        with self.process_lock:
+            return self.process_fn(self.excel_ids, invoice_dir=settings.INVOICE_DIR)
+
+    def load_sheet_ids(self):
+        self.excel_ids.update(sheets_writer.get_existing_thread_ids())
+        logger.info("[INFO] %s existing entries in Google Sheets", len(self.excel_ids))
+
+    def flush(self):
+        """Persist state that would otherwise be lost on shutdown.
+
+        Invoices stored since the last sheet sync are synced too, unless a
+        processing run that outlived the shutdown timeout still holds the
+        store; it is picked up by the next run's sync instead.
+        """
+        with self.ids_lock:
+            monitor_downloader.save_processed_ids(self.processed)
+        if self.process_lock.acquire(blocking=False):
+            try:
+                sheet_sync.sync(invoice_store.get_store())
+            except Exception as e:
+                logger.warning("[DAEMON] Sheet sync on shutdown failed: %s", e)
+            finally:
+                self.process_lock.release()
+        else:
+            logger.warning("[DAEMON] Processing still running, sheet sync left for the next run")
+        metrics.flush()
+
+
+def poll(state: DaemonState):
+    """Download new invoice emails and process them."""
+    now = time.time()
+    window = state.poll_interval * 2
+    if state.last_poll is not None:
+        window = max(window, int(now - state.last_poll) + state.poll_interval)
+
+    new = state.download(window)
+    state.last_poll = now
+    if new > 0 or invoice_processor.retry_queue_ready():
+        logger.info("[NEW] %s email(s)", new)
+        state.process()
+    else:
+        logger.info("No new invoices")
+
+
+def llm_batch(state: DaemonState):
+    """Daily catch-up over the last 24 hours with LLM processing."""
+    new = state.download(24 * 3600)
+    count = state.process()
+    logger.info("[OK] %s email(s) downloaded, %s invoices added to sheet", new, count)
+
+
+def reconcile(state: DaemonState):
+    """Refresh sheet thread IDs, check for hand edits, re-download the last week and process leftovers."""
+    with state.process_lock:
+        state.load_sheet_ids()
+        sheet_sync.audit(invoice_store.get_store())
+    state.download(7 * 24 * 3600)
+    count = state.process()
+    logger.info("[OK] Reconciliation added %s invoices", count)
+
+
+JOB_FUNCTIONS = {
+    "poll": poll,
+    "llm_batch": llm_batch,
+    "reconcile": reconcile,
+}
+
+
+def build_jobs(state: DaemonState, definitions: dict = None) -> list:
+    """Create Job objects from DAEMON_JOBS-style definitions."""
+    definitions = definitions if definitions is not None else settings.DAEMON_JOBS
+    jobs = []
+    for name, spec in definitions.items():
+        func = JOB_FUNCTIONS[name]
+        jobs.append(Job(
+            name,
+            lambda f=func: f(state),
+            cron=spec.get("cron"),
+            every=spec.get("every"),
+            run_at_start=spec.get("run_at_start", False),
+        ))
+    return jobs
+
+
+def run_daemon(process_fn, definitions: dict = None, title: str = "INVOICE DAEMON"):
+    """Run the daemon until SIGINT/SIGTERM.
+
+    Args:
+        process_fn: Callable(skip_ids, invoice_dir=...) that processes,
+            writes and archives downloaded invoices and returns a count.
+        definitions: Jobs to run (default settings.DAEMON_JOBS). Without a
+            reconcile job, sheet thread IDs are loaded once at startup.
+        title: Banner logged at startup.
+    """
+    definitions = definitions if definitions is not None else settings.DAEMON_JOBS
+    logger.info("=" * 60)
+    logger.info("%s - Ctrl+C to stop", title)
+    for name, spec in definitions.items():
+        logger.info("  %s: %s", name, f"every {spec['every']}s" if spec.get("every") else f"cron {spec['cron']}")
+    logger.info("=" * 60)
+
+    poll_spec = definitions.get("poll") or {}
+    state = DaemonState(process_fn, poll_interval=poll_spec.get("every"))
+    if "reconcile" not in definitions:
+        state.load_sheet_ids()
+    daemon = Daemon(build_jobs(state, definitions), flush_hooks=[state.flush],
+                    shutdown_timeout=settings.DAEMON_SHUTDOWN_TIMEOUT)
+    asyncio.run(daemon.run())
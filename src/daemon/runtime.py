@@ -0,0 +1,196 @@
+"""Asyncio daemon that runs timer- and cron-driven jobs."""
+import asyncio
+import logging
+import signal
+import threading
+import time
+from datetime import datetime
+
+from src.daemon.cron import CronSchedule
+from src.utils import log
+
+logger = logging.getLogger(__name__)
+
+
+def _run_as_stage(name: str, func):
+    """Run ``func`` with its log records tagged with the job name."""
+    log.set_stage(name)
+    try:
+        return func()
+    finally:
+        log.set_stage(None)
+
+
+def _in_thread(name: str, func) -> asyncio.Future:
+    """Run ``func`` in a daemon thread and return a future for its result.
+
+    Unlike asyncio.to_thread, a job that hangs past the shutdown timeout
+    does not keep the process alive: nothing joins the thread at exit.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(method, value):
+        if not future.done():
+            method(value)
+
+    def target():
+        try:
+            result = _run_as_stage(name, func)
+        except BaseException as e:
+            outcome = (future.set_exception, e)
+        else:
+            outcome = (future.set_result, result)
+        try:
+            loop.call_soon_threadsafe(settle, *outcome)
+        except RuntimeError:
+            pass  # the loop is already closed: the daemon gave up on this job
+
+    threading.Thread(target=target, name=f"job-{name}", daemon=True).start()
+    return future
+
+
+class Job:
+    """A named unit of blocking work run on a schedule.
+
+    Exactly one of ``cron`` (five-field expression) or ``every`` (seconds)
+    must be given. ``func`` runs in a daemon thread so jobs overlap their
+    I/O; a job is never started again while its previous run is still going.
+    """
+
+    def __init__(self, name: str, func, cron: str = None, every: float = None,
+                 run_at_start: bool = False):
+        if (cron is None) == (every is None):
+            raise ValueError(f"job {name!r} needs exactly one of cron/every")
+        self.name = name
+        self.func = func
+        self.schedule = CronSchedule(cron) if cron else None
+        self.every = every
+        self.run_at_start = run_at_start
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_duration = None
+
+    def seconds_until_next(self, now: datetime = None) -> float:
+        """Seconds until the job is next due."""
+        if self.every is not None:
+            return float(self.every)
+        now = now or datetime.now()
+        return max((self.schedule.next_after(now) - now).total_seconds(), 0.0)
+
+
+class Daemon:
+    """Run jobs on their schedules until stopped, then flush and exit."""
+
+    def __init__(self, jobs: list, flush_hooks: list = None, shutdown_timeout: float = 300):
+        self.jobs = jobs
+        self.flush_hooks = flush_hooks or []
+        self.shutdown_timeout = shutdown_timeout
+        self._stop = None
+        self._force = None
+        self._tasks = set()
+
+    def stop(self):
+        """Request a graceful shutdown (safe to call from a signal handler).
+
+        A second request while shutting down stops waiting for running jobs.
+        """
+        if self._stop is None:
+            return
+        if self._stop.is_set():
+            logger.warning("[DAEMON] Stopping now without waiting for running jobs")
+            self._force.set()
+        self._stop.set()
+
+    async def _run_job(self, job: Job):
+        if job.running:
+            logger.info("[DAEMON] %s still running, skipping this tick", job.name)
+            return
+
+        job.running = True
+        try:
+            ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            logger.info("[%s] [DAEMON] %s starting", ts, job.name)
+            start = time.perf_counter()
+            await _in_thread(job.name, job.func)
+            job.last_duration = time.perf_counter() - start
+            job.runs += 1
+            logger.info("[DAEMON] %s finished in %.1fs", job.name, job.last_duration)
+        except Exception as e:
+            job.failures += 1
+            logger.warning("[DAEMON] %s failed: %s", job.name, e)
+        finally:
+            job.running = False
+
+    def _spawn(self, job: Job):
+        task = asyncio.create_task(self._run_job(job), name=job.name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _schedule(self, job: Job):
+        if job.run_at_start:
+            self._spawn(job)
+        while not self._stop.is_set():
+            delay = job.seconds_until_next()
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                self._spawn(job)
+
+    def _install_signal_handlers(self, loop):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+
+    async def run(self):
+        """Run until stop() or SIGINT/SIGTERM, then wait for in-flight jobs and flush."""
+        self._stop = asyncio.Event()
+        self._force = asyncio.Event()
+        self._install_signal_handlers(asyncio.get_running_loop())
+
+        for job in self.jobs:
+            nxt = "at start" if job.run_at_start else f"in {job.seconds_until_next():.0f}s"
+            every = job.schedule.expr if job.schedule else f"every {job.every}s"
+            logger.info("[DAEMON] %s: %s (next %s)", job.name, every, nxt)
+
+        schedulers = [asyncio.create_task(self._schedule(job)) for job in self.jobs]
+        await self._stop.wait()
+
+        logger.info("[DAEMON] Shutting down - waiting for running jobs (Ctrl+C again to stop now)...")
+        for s in schedulers:
+            s.cancel()
+        await asyncio.gather(*schedulers, return_exceptions=True)
+        await self._wait_for_jobs()
+
+        for hook in self.flush_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.warning("[DAEMON] Flush failed: %s", e)
+        logger.info("[DAEMON] Stopped")
+
+    async def _wait_for_jobs(self):
+        """Wait up to shutdown_timeout for running jobs, or until a forced stop."""
+        tasks = set(self._tasks)
+        if not tasks:
+            return
+        force = asyncio.create_task(self._force.wait())
+        deadline = asyncio.get_running_loop().time() + self.shutdown_timeout
+        pending = tasks
+        while pending and not force.done():
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            await asyncio.wait(pending | {force}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            pending = {t for t in pending if not t.done()}
+        force.cancel()
+        running = [t for t in tasks if not t.done()]
+        if running:
+            logger.warning("[DAEMON] %s job(s) still running, abandoning them: %s",
+                           len(running), ", ".join(t.get_name() for t in running))
+            for t in running:
+                t.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
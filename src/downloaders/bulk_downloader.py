@@ -1,75 +1,86 @@
 """Bulk email downloader for historical invoices."""
+import logging
 import os
-import base64
 
 from src.auth.gmail_auth import get_gmail_service
 from src.config import settings
-from src.utils.file_utils import safe_filename
+from src.utils import metrics
 
+logger = logging.getLogger(__name__)
+
+
+@metrics.timed("gmail_search")
+def list_messages(service, query: str) -> list:
+    """Return every message matching ``query``, following nextPageToken."""
+    messages = []
+    page_token = None
+    while True:
+        results = service.users().messages().list(
+            userId='me',
+            q=query,
+            pageToken=page_token
+        ).execute()
+        messages.extend(results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return messages
+
+
+@metrics.timed("gmail_backfill")
+def download_invoices(jobs=None) -> int:
+    """Search Gmail for historical invoice emails and save each one as an invoice group.
+
+    Messages are tracked in the job queue: only those not yet downloaded
+    (and not waiting out a retry delay) are fetched, so an interrupted
+    backfill picks up where it stopped. A message that fails to download
+    is retried with backoff on a later run.
+
+    Args:
+        jobs: JobQueue to record progress in. Defaults to one on JOB_QUEUE_FILE.
+
+    Returns:
+        Number of messages downloaded.
+    """
+    from src.downloaders.monitor_downloader import save_message
+    from src.storage.job_queue import JobQueue
 
-def download_invoices():
-    """Search Gmail for historical emails and save PDF attachments or email text."""
     service = get_gmail_service()
+    own_queue = jobs is None
+    jobs = jobs or JobQueue()
+
+    try:
+        messages = list_messages(service, settings.GMAIL_SEARCH_QUERY)
+        if not messages:
+            logger.info("No emails containing invoice keywords found.")
+            return 0
+
+        new = jobs.add(messages)
+        pending = jobs.due("listed")
+        logger.info("[QUEUE] %s message(s) listed, %s new, %s to download", len(messages), new, len(pending))
+
+        os.makedirs(settings.INVOICE_DIR, exist_ok=True)
+        try:
+            user_email = service.users().getProfile(userId='me').execute().get('emailAddress')
+        except Exception:
+            user_email = None
+
+        downloaded = 0
+        for msg_id in pending:
+            try:
+                msg_data = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
+                basename = save_message(service, msg_data, settings.INVOICE_DIR, user_email)
+            except Exception as e:
+                delay = jobs.fail(msg_id, str(e))
+                logger.warning("[QUEUE] Download of %s failed, retrying in %.0fs: %s", msg_id, delay, e)
+                continue
+            jobs.advance(msg_id, "downloaded", group=basename)
+            downloaded += 1
 
-    results = service.users().messages().list(
-        userId='me',
-        q=settings.GMAIL_SEARCH_QUERY
-    ).execute()
-
-    messages = results.get('messages', [])
-    if not messages:
-        print("No emails containing invoice keywords found.")
-        return
-
-    os.makedirs(settings.INVOICE_DIR, exist_ok=True)
-
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id']).execute()
-
-        headers = msg_data['payload'].get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "(No Subject)")
-        print(f"Checking email: {subject}")
-
-        parts = msg_data['payload'].get('parts', [])
-        pdf_found = False
-
-        for part in parts:
-            if part.get('filename') and part['filename'].endswith('.pdf'):
-                attach_id = part['body'].get('attachmentId')
-                if attach_id:
-                    attachment = service.users().messages().attachments().get(
-                        userId='me',
-                        messageId=msg['id'],
-                        id=attach_id
-                    ).execute()
-                    data = base64.urlsafe_b64decode(attachment['data'])
-                    filename = safe_filename(part['filename'])
-                    file_path = os.path.join(settings.INVOICE_DIR, filename)
-                    with open(file_path, 'wb') as f:
-                        f.write(data)
-                    print(f"  Saved PDF: {file_path}")
-                    pdf_found = True
-
-        if not pdf_found:
-            body = ""
-            if msg_data['payload'].get('body', {}).get('data'):
-                body = base64.urlsafe_b64decode(
-                    msg_data['payload']['body']['data']
-                ).decode('utf-8', errors='ignore')
-            else:
-                for part in parts:
-                    if part.get('mimeType') == 'text/plain' and part['body'].get('data'):
-                        body = base64.urlsafe_b64decode(
-                            part['body']['data']
-                        ).decode('utf-8', errors='ignore')
-                        break
-
-            if body:
-                filename = safe_filename(f"{msg['id']}.txt")
-                file_path = os.path.join(settings.INVOICE_DIR, filename)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(body)
-                print(f"   Saved email text: {file_path}")
+        metrics.count("gmail_messages_downloaded", downloaded)
+        return downloaded
+    finally:
+        if own_queue:
+            jobs.close()
 
 
 if __name__ == "__main__":
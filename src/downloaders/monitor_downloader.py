@@ -1,15 +1,22 @@
 """Real-time invoice email monitor."""
+import logging
 import os
 import base64
 import time
 import json
 import mimetypes
+import shutil
 from email.utils import parseaddr, getaddresses
 
 from src.auth.gmail_auth import get_gmail_service
 from src.config import settings
+from src.downloaders.bulk_downloader import list_messages
+from src.storage import blob_store
 from src.utils.file_utils import sanitize_filename
 from src.utils.date_utils import unix_timestamp
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
 
 
 def load_processed_ids() -> set:
@@ -30,20 +37,20 @@ def save_processed_ids(ids: set):
         f.write(json.dumps(list(ids), indent=2))
 
 
+@metrics.timed("gmail_search")
 def search_new_messages(service, window_seconds: int = 30) -> list:
     """Search for new invoice emails within a time window."""
     after_ts = unix_timestamp(window_seconds)
     query = f'({settings.GMAIL_SEARCH_QUERY}) after:{after_ts}'
-    print(f"Searching: {query}")
+    logger.debug("Searching: %s", query)
 
-    result = service.users().messages().list(userId='me', q=query).execute()
-    return result.get('messages', [])
+    return list_messages(service, query)
 
 
 def _save_bytes_to_file(data_bytes: bytes, filepath: str):
     with open(filepath, 'wb') as f:
         f.write(data_bytes)
-    print(f"Saved: {filepath}")
+    logger.debug("Saved: %s", filepath)
 
 
 def save_attachment(service, msg_id: str, part: dict, save_dir: str,
@@ -62,7 +69,7 @@ def save_attachment(service, msg_id: str, part: dict, save_dir: str,
             ).execute()
             data_b64 = attachment.get('data')
         except Exception as e:
-            print(f"Failed to fetch attachment {attach_id} for {msg_id}: {e}")
+            logger.warning("Failed to fetch attachment %s for %s: %s", attach_id, msg_id, e)
             return False
     else:
         data_b64 = part.get('body', {}).get('data')
@@ -76,7 +83,7 @@ def save_attachment(service, msg_id: str, part: dict, save_dir: str,
         try:
             data = base64.b64decode(data_b64)
         except Exception as e:
-            print(f"Failed to decode attachment data for {msg_id}: {e}")
+            logger.warning("Failed to decode attachment data for %s: %s", msg_id, e)
             return False
 
     if filename:
@@ -94,7 +101,11 @@ def save_attachment(service, msg_id: str, part: dict, save_dir: str,
         if ext:
             filepath = filepath + ext
 
-    _save_bytes_to_file(data, filepath)
+    if settings.BLOB_STORE_ENABLED:
+        blob_store.save(data, filepath)
+        logger.debug("Saved: %s", filepath)
+    else:
+        _save_bytes_to_file(data, filepath)
     return True
 
 
@@ -157,7 +168,7 @@ def save_email_text(msg_data: dict, msg_id: str, basename: str,
         else:
             f.write("[No readable body found]\n")
 
-    print(f"Email text saved: {filepath}")
+    logger.debug("Email text saved: %s", filepath)
 
 
 def _iter_parts(parts: list):
@@ -168,6 +179,59 @@ def _iter_parts(parts: list):
                 yield sub
 
 
+def save_message(service, msg_data: dict, save_dir: str, user_email: str = None) -> str:
+    """Save a message's text and attachments as one invoice group; returns the group basename.
+
+    Files are written to a staging directory and only moved into
+    ``save_dir`` once all of them are saved (the email text last), so a
+    concurrent scan never sees a group whose attachments are still
+    downloading.
+    """
+    msg_id = msg_data['id']
+    headers = msg_data.get('payload', {}).get('headers', [])
+    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "(No Subject)")
+    sender = next((h['value'] for h in headers if h['name'] == 'From'), "(Unknown Sender)")
+    date = next((h['value'] for h in headers if h['name'] == 'Date'), "(Unknown Date)")
+    message_id_header = next((h['value'] for h in headers if h['name'].lower() == 'message-id'), None)
+
+    unique_id = message_id_header if message_id_header else msg_id
+    internal_date_ms = msg_data.get('internalDate') or str(int(time.time() * 1000))
+
+    safe_unique_id = sanitize_filename(unique_id.strip('<>'))
+    basename = f"{safe_unique_id}_{internal_date_ms}"
+
+    logger.info("New email: %s | From: %s | basename: %s", subject, sender, basename)
+
+    staging = os.path.join(save_dir, ".partial", basename)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    save_email_text(msg_data, msg_id, basename, subject, sender, date, staging, user_email)
+
+    parts = msg_data.get('payload', {}).get('parts', [])
+    attach_count = 0
+    for i, part in enumerate(_iter_parts(parts)):
+        filename = part.get('filename', '')
+        mime_type = part.get('mimeType', '')
+        has_attach_id = bool(part.get('body', {}).get('attachmentId'))
+        has_inline_data = bool(part.get('body', {}).get('data'))
+
+        if mime_type in ('text/plain', 'text/html'):
+            continue
+
+        if filename or has_attach_id or has_inline_data:
+            saved = save_attachment(service, msg_id, part, staging, basename, attach_index=attach_count)
+            if saved:
+                attach_count += 1
+
+    text_name = f"{basename}.txt"
+    for name in sorted(os.listdir(staging), key=lambda n: n == text_name):
+        os.replace(os.path.join(staging, name), os.path.join(save_dir, name))
+    os.rmdir(staging)
+    return basename
+
+
+@metrics.timed("gmail_download")
 def process_messages(service, messages: list, processed_ids: set) -> int:
     """Process and download new messages."""
     os.makedirs(settings.INVOICE_DIR, exist_ok=True)
@@ -185,53 +249,28 @@ def process_messages(service, messages: list, processed_ids: set) -> int:
         msg_data = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
 
         headers = msg_data.get('payload', {}).get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "(No Subject)")
-        sender = next((h['value'] for h in headers if h['name'] == 'From'), "(Unknown Sender)")
-        date = next((h['value'] for h in headers if h['name'] == 'Date'), "(Unknown Date)")
         message_id_header = next((h['value'] for h in headers if h['name'].lower() == 'message-id'), None)
 
         unique_id = message_id_header if message_id_header else msg_id
 
         if unique_id in processed_ids:
-            print(f"⏭   Skipping already processed {unique_id}")
+            logger.debug("⏭   Skipping already processed %s", unique_id)
             continue
 
-        internal_date_ms = msg_data.get('internalDate') or str(int(time.time() * 1000))
-
-        safe_unique_id = sanitize_filename(unique_id.strip('<>'))
-        basename = f"{safe_unique_id}_{internal_date_ms}"
-
-        print(f"\n    New email: {subject} | From: {sender} | basename: {basename}")
-
-        save_email_text(msg_data, msg_id, basename, subject, sender, date, settings.INVOICE_DIR, user_email)
-
-        parts = msg_data.get('payload', {}).get('parts', [])
-        attach_count = 0
-        for i, part in enumerate(_iter_parts(parts)):
-            filename = part.get('filename', '')
-            mime_type = part.get('mimeType', '')
-            has_attach_id = bool(part.get('body', {}).get('attachmentId'))
-            has_inline_data = bool(part.get('body', {}).get('data'))
-
-            if mime_type in ('text/plain', 'text/html'):
-                continue
-
-            if filename or has_attach_id or has_inline_data:
-                saved = save_attachment(service, msg_id, part, settings.INVOICE_DIR, basename, attach_index=attach_count)
-                if saved:
-                    attach_count += 1
+        save_message(service, msg_data, settings.INVOICE_DIR, user_email)
 
         processed_ids.add(unique_id)
         new_count += 1
 
+    metrics.count("gmail_messages_downloaded", new_count)
     return new_count
 
 
 def monitor_invoices(service, check_interval: int = None):
     """Continuously monitor Gmail for new invoice emails."""
     check_interval = check_interval or settings.MONITOR_CHECK_INTERVAL
-    print("Gmail Invoice Monitor started")
-    print(f"Checking every {check_interval}s")
+    logger.info("Gmail Invoice Monitor started")
+    logger.info("Checking every %ss", check_interval)
 
     processed_ids = load_processed_ids()
 
@@ -242,15 +281,15 @@ def monitor_invoices(service, check_interval: int = None):
                 new_count = process_messages(service, messages, processed_ids)
                 save_processed_ids(processed_ids)
                 if new_count:
-                    print(f"{new_count} new invoice(s) processed")
+                    logger.info("%s new invoice(s) processed", new_count)
             else:
-                print(f"No new invoices")
+                logger.info("No new invoices")
 
-            print(f"Sleeping {check_interval}s...\n")
+            logger.info("Sleeping %ss...", check_interval)
             time.sleep(check_interval)
 
     except KeyboardInterrupt:
-        print("\nStopped by user")
+        logger.info("Stopped by user")
 
 
 if __name__ == "__main__":
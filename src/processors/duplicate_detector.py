@@ -0,0 +1,195 @@
+"""Near-duplicate invoice detection with MinHash signatures and an LSH index.
+
+The same purchase often arrives as an order confirmation, a shipping
+receipt and a forwarded copy, each in its own Gmail thread. Two checks
+catch these before the Sheets write:
+
+* Key match: same vendor, order number and total as a stored invoice.
+* Text match: the normalized email/PDF text is nearly identical. Word
+  shingles are summarized into a MinHash signature, whose bands are
+  stored as LSH buckets in the invoice store, so candidates are found
+  with a few indexed lookups instead of comparing against every invoice.
+
+Duplicates stay in the store, flagged with ``duplicate_of``, and are
+never synced to the sheet or counted in reports.
+"""
+import logging
+import random
+import re
+import struct
+import zlib
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+ORDER_NUMBER_RE = re.compile(
+    r'\b(?:order|po|purchase\s+order)\s*(?:#|no\.?|number|num\.?)?\s*[:#]?\s*((?=[A-Z-]*\d)[A-Z0-9][A-Z0-9-]{4,})',
+    re.I,
+)
+# Header lines that differ between the original email and a forwarded copy
+FORWARD_LINE_RE = re.compile(
+    r'^\s*(?:>+\s*)?(?:-+\s*forwarded message\s*-+|begin forwarded message:?|'
+    r'(?:from|to|cc|sent|date|subject)\s*:.*)$',
+    re.I | re.M,
+)
+_TOKEN_RE = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+
+_permutations = {}
+
+
+def _coefficients(num_perm: int) -> list:
+    """Fixed (a, b) pairs for the universal hashes h(x) = (a*x + b) mod p."""
+    if num_perm not in _permutations:
+        rng = random.Random(1)
+        _permutations[num_perm] = [
+            (rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)
+        ]
+    return _permutations[num_perm]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop forwarding headers and punctuation, collapse whitespace."""
+    text = FORWARD_LINE_RE.sub(" ", text or "")
+    return " ".join(_TOKEN_RE.findall(text.lower()))
+
+
+def shingles(text: str, size: int = None) -> set:
+    """CRC32 hashes of overlapping word n-grams of the normalized text."""
+    size = size or settings.SHINGLE_SIZE
+    words = normalize_text(text).split()
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash(shingle_set: set, num_perm: int = None) -> list:
+    """MinHash signature: per hash function, the minimum over all shingles."""
+    num_perm = num_perm or settings.MINHASH_PERMUTATIONS
+    if not shingle_set:
+        return [_MAX_HASH] * num_perm
+    return [
+        min(((a * x + b) % _MERSENNE) & _MAX_HASH for x in shingle_set)
+        for a, b in _coefficients(num_perm)
+    ]
+
+
+def similarity(sig_a: list, sig_b: list) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def lsh_buckets(signature: list, bands: int = None) -> list:
+    """Split a signature into bands and hash each band to a (band, bucket) key."""
+    bands = bands or settings.LSH_BANDS
+    rows = max(1, len(signature) // bands)
+    keys = []
+    for band in range(bands):
+        chunk = signature[band * rows:(band + 1) * rows]
+        if chunk:
+            keys.append((band, format(zlib.crc32(struct.pack(f"<{len(chunk)}I", *chunk)), "08x")))
+    return keys
+
+
+def pack(signature: list) -> bytes:
+    return struct.pack(f"<{len(signature)}I", *signature)
+
+
+def unpack(blob: bytes) -> list:
+    return list(struct.unpack(f"<{len(blob) // 4}I", blob))
+
+
+def order_number(result: dict) -> str:
+    """The invoice's order number, from the parser/LLM or found in its text."""
+    value = str(result.get("order_number", "") or "").strip()
+    if value:
+        return value.upper()
+    m = ORDER_NUMBER_RE.search(result.get("_content", "") or "")
+    return m.group(1).upper() if m else ""
+
+
+def annotate(result: dict) -> dict:
+    """Fill in order_number before the invoice is stored."""
+    result["order_number"] = order_number(result)
+    return result
+
+
+def _totals_agree(a, b) -> bool:
+    if a in ("", None) or b in ("", None):
+        return True
+    try:
+        return abs(float(a) - float(b)) < 0.005
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+
+def check(store, invoice_id: int, result: dict) -> dict:
+    """Index a newly stored invoice and flag it if it duplicates an earlier one.
+
+    Args:
+        store: InvoiceStore holding the invoice.
+        invoice_id: ID returned by store.save_invoice.
+        result: The extracted invoice; ``_content`` holds its text.
+
+    Returns:
+        {"original", "reason", "similarity"} if it was flagged, else None.
+    """
+    match = None
+    number = result.get("order_number") or order_number(result)
+    if number and result.get("company_name"):
+        earlier = store.find_by_order(result["company_name"], number, result.get("total_price"),
+                                      exclude=invoice_id)
+        if earlier:
+            match = {"original": earlier[0], "reason": f"order {number}", "similarity": 1.0}
+
+    content = result.get("_content", "")
+    if content:
+        signature = minhash(shingles(content))
+        buckets = lsh_buckets(signature)
+        if match is None:
+            best = None
+            for candidate, blob in store.lsh_candidates(buckets, exclude=invoice_id).items():
+                score = similarity(signature, unpack(blob))
+                if score < settings.DUPLICATE_TEXT_THRESHOLD:
+                    continue
+                other = store.get_invoice(candidate)
+                if other.get("_duplicate_of") is not None:
+                    candidate = other["_duplicate_of"]
+                if not _totals_agree(result.get("total_price"), other.get("total_price")):
+                    continue
+                if best is None or score > best[1]:
+                    best = (candidate, score)
+            if best:
+                match = {"original": best[0], "reason": f"text {best[1]:.2f}", "similarity": best[1]}
+        store.save_minhash(invoice_id, pack(signature), buckets)
+
+    if match:
+        store.mark_duplicate(invoice_id, match["original"], match["reason"])
+        logger.info("[DUPLICATE] Invoice #%s duplicates #%s (%s)", invoice_id, match['original'], match['reason'])
+    return match
+
+
+def print_report(store=None):
+    """List invoices flagged as duplicates."""
+    from src.storage import invoice_store
+    store = store or invoice_store.get_store()
+    flagged = store.duplicates()
+    if not flagged:
+        print("[DUPLICATE] No duplicates flagged")
+        return
+    for invoice_id, original, reason in flagged:
+        dup, orig = store.get_invoice(invoice_id), store.get_invoice(original)
+        print(f"#{invoice_id} {dup['company_name']} {dup['total_price']} ({dup['mail_thread_id']}) "
+              f"-> #{original} ({orig['mail_thread_id']}) [{reason}]")
+
+
+if __name__ == "__main__":
+    print_report()
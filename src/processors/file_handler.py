@@ -1,4 +1,5 @@
 """File handler for reading and processing invoice files."""
+import logging
 import os
 import re
 import pdfplumber
@@ -6,6 +7,11 @@ import shutil
 from collections import defaultdict
 
 from src.config import settings
+from src.processors import line_items, ocr
+from src.storage import blob_store
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
 
 
 def read_txt(filepath: str) -> str:
@@ -15,19 +21,51 @@ def read_txt(filepath: str) -> str:
 
 
 def read_pdf(filepath: str) -> str:
-    """Extract text from PDF file."""
-    content = ""
+    """Extract text from PDF file, OCR-ing pages that have no text layer."""
+    return extract_pdf_text(filepath)[0]
+
+
+@metrics.timed("read_pdf")
+def extract_pdf_text(filepath: str) -> tuple:
+    """read_pdf's text, and whether every page without a text layer was OCR'd.
+
+    Words of pages from a vendor item table on are kept for line_items,
+    which would otherwise parse the PDF a second time.
+    """
+    texts = []
+    scanned = []
+    words = []
     with pdfplumber.open(filepath) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                content += text + "\n"
-    return content
+        for i, page in enumerate(pdf.pages):
+            text = page.extract_text() or ""
+            texts.append(text)
+            if settings.LINE_ITEM_TABLES_ENABLED and (words or line_items.has_header(text)):
+                words.append(page.extract_words())
+            if settings.OCR_ENABLED and ocr.needs_ocr(text):
+                if ocr.available():
+                    scanned.append((i, ocr.page_hash(page, f"{filepath}:{i}"), ocr.dpi_for(page)))
+                else:
+                    ocr.warn_unavailable()
+    if words:
+        line_items.remember(filepath, words)
+
+    ocr_texts = ocr.ocr_pages(filepath, scanned)
+    for i, text in ocr_texts.items():
+        if len(text.strip()) > len(texts[i].strip()):
+            texts[i] = text
+    complete = all(i in ocr_texts for i, _, _ in scanned)
+    return "".join(text + "\n" for text in texts if text), complete
 
 
 def read_file(filepath: str) -> str:
-    """Read file content, automatically detecting file type."""
+    """Read file content, automatically detecting file type.
+
+    PDF text is cached by content in the blob store, so an attachment seen
+    in several groups is only extracted once.
+    """
     if filepath.lower().endswith(".pdf"):
+        if settings.BLOB_STORE_ENABLED:
+            return blob_store.cached_text(filepath, extract_pdf_text)
         return read_pdf(filepath)
     elif filepath.lower().endswith(".txt"):
         return read_txt(filepath)
@@ -98,20 +136,43 @@ def combine_content(file_paths: list) -> str:
     return content
 
 
-def move_processed_files(file_paths: list, target_dir: str):
-    """Move processed files to an archive directory."""
+def archive_target(fp: str, target_dir: str) -> tuple:
+    """Where ``fp`` goes in ``target_dir``: (path, True if an identical file is already there).
+
+    A different file with the same name gets ``<name>~<content hash><ext>``,
+    so the name depends only on the content and a rerun picks the same one.
+    """
+    filename = os.path.basename(fp)
+    target_path = os.path.join(target_dir, filename)
+    if not os.path.exists(target_path):
+        return target_path, False
+    if blob_store.same_content(fp, target_path):
+        return target_path, True
+
+    base, ext = os.path.splitext(filename)
+    target_path = os.path.join(target_dir, f"{base}~{blob_store.digest_file(fp)[:12]}{ext}")
+    return target_path, os.path.exists(target_path) and blob_store.same_content(fp, target_path)
+
+
+def move_processed_files(file_paths: list, target_dir: str) -> list:
+    """Move processed files to an archive directory.
+
+    Returns:
+        The archived paths of the files that were moved.
+    """
     os.makedirs(target_dir, exist_ok=True)
 
+    moved = []
     for fp in file_paths:
         try:
-            filename = os.path.basename(fp)
-            target_path = os.path.join(target_dir, filename)
-
-            # Handle potential filename collisions
-            if os.path.exists(target_path):
-                base, ext = os.path.splitext(filename)
-                target_path = os.path.join(target_dir, f"{base}_duplicate{ext}")
-
-            shutil.move(fp, target_path)
+            target_path, identical = archive_target(fp, target_dir)
+            if identical:
+                # The same file is already archived (e.g. both links of one blob): keep one
+                os.remove(fp)
+            else:
+                shutil.move(fp, target_path)
+            moved.append(target_path)
         except Exception as e:
-            print(f"[ERROR] Failed to move {fp}: {e}")
+            logger.error("[ERROR] Failed to move %s: %s", fp, e)
+
+    return moved
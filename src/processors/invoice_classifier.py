@@ -0,0 +1,113 @@
+"""Fast local pre-classifier that filters non-invoices before the LLM."""
+import json
+import logging
+import math
+import os
+import re
+from datetime import datetime
+
+from src.config import settings
+from src.processors import file_handler
+
+logger = logging.getLogger(__name__)
+
+# (name, pattern, weight) - each feature counts once per group.
+# Positive weights are purchase-invoice evidence, negative weights point at
+# newsletters, bill-pay reminders and shipping notices.
+FEATURES = [
+    ("invoice_word", re.compile(r'\b(invoice|receipt)\b', re.I), 1.5),
+    ("order_number", re.compile(r'\border\s*(#|number|no\.?|confirmation)', re.I), 1.0),
+    ("total_amount", re.compile(r'\b(sub\s*total|grand\s*total|total|amount paid)\b[:\s]*\$?\s*\d[\d,]*\.\d{2}', re.I), 2.0),
+    ("money", re.compile(r'\$\s?\d[\d,]*\.\d{2}'), 0.5),
+    ("line_items", re.compile(r'\b(qty|quantity|unit price|sku|part number|item)\b', re.I), 0.8),
+    ("tax_shipping", re.compile(r'\b(sales tax|tax|shipping|freight)\b', re.I), 0.4),
+    ("billing", re.compile(r'\b(bill to|ship to|sold to|payment method|paid with)\b', re.I), 0.8),
+    ("unsubscribe", re.compile(r'\bunsubscribe\b', re.I), -1.5),
+    ("newsletter", re.compile(r'\b(newsletter|webinar|view (it )?in (your )?browser)\b', re.I), -1.2),
+    ("bill_reminder", re.compile(r'\b(payment (is )?due|due date|reminder|autopay|statement is (now )?available)\b', re.I), -1.0),
+    ("shipping_notice", re.compile(r'\b(tracking number|has shipped|out for delivery|on its way)\b', re.I), -0.8),
+]
+BIAS = -1.0
+
+
+def matched_features(content: str, subject: str = "") -> list:
+    """Return names of the features present in a group's subject and content."""
+    text = f"{subject or ''}\n{content or ''}"
+    return [name for name, pattern, _ in FEATURES if pattern.search(text)]
+
+
+def score(content: str, subject: str = "") -> float:
+    """Score how likely a group is a purchase invoice (0.0 - 1.0)."""
+    text = f"{subject or ''}\n{content or ''}"
+    z = BIAS
+    for _, pattern, weight in FEATURES:
+        if pattern.search(text):
+            z += weight
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def is_invoice(content: str, subject: str = "", threshold: float = None) -> bool:
+    """Return True if the group scores at or above the classifier threshold."""
+    threshold = settings.CLASSIFIER_THRESHOLD if threshold is None else threshold
+    return score(content, subject) >= threshold
+
+
+def quarantine(file_paths: list, content: str, metadata: dict = None) -> str:
+    """Move a low-scoring group to the quarantine dir and log it for review."""
+    metadata = metadata or {}
+    subject = metadata.get("subject", "")
+    os.makedirs(settings.QUARANTINE_DIR, exist_ok=True)
+
+    entry = {
+        "quarantined_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "score": round(score(content, subject), 4),
+        "features": matched_features(content, subject),
+        "subject": subject,
+        "sender_email": metadata.get("sender_email", ""),
+        "thread_id": metadata.get("thread_id", ""),
+        "files": [os.path.basename(fp) for fp in file_paths],
+    }
+
+    file_handler.move_processed_files(file_paths, settings.QUARANTINE_DIR)
+
+    os.makedirs(os.path.dirname(settings.QUARANTINE_REPORT_FILE), exist_ok=True)
+    with open(settings.QUARANTINE_REPORT_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+
+    label = subject or ", ".join(entry["files"])
+    logger.info("[QUARANTINE] score=%.2f %s", entry['score'], label)
+    return settings.QUARANTINE_DIR
+
+
+def load_report() -> list:
+    """Load quarantine entries, highest scores (likely false negatives) first."""
+    if not os.path.exists(settings.QUARANTINE_REPORT_FILE):
+        return []
+
+    entries = []
+    with open(settings.QUARANTINE_REPORT_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return sorted(entries, key=lambda e: e.get("score", 0.0), reverse=True)
+
+
+def print_report():
+    """Print the quarantine review report."""
+    entries = load_report()
+    print(f"[QUARANTINE] {len(entries)} group(s) in {settings.QUARANTINE_DIR} "
+          f"(threshold {settings.CLASSIFIER_THRESHOLD})")
+    for e in entries:
+        print(f"  {e.get('score', 0):.2f}  {e.get('quarantined_at', '')}  "
+              f"{e.get('sender_email', '') or '-'}  {e.get('subject', '') or ', '.join(e.get('files', []))}")
+        if e.get("features"):
+            print(f"        features: {', '.join(e['features'])}")
+
+
+if __name__ == "__main__":
+    print_report()
@@ -1,8 +1,16 @@
 """Invoice processing orchestrator."""
+import json
+import logging
 import os
+import threading
+from datetime import datetime
 
 from src.config import settings
-from src.processors import file_handler, vendor_parser, llm_extractor
+from src.processors import file_handler, vendor_parser, llm_extractor, invoice_classifier, schema_validator
+
+logger = logging.getLogger(__name__)
+
+_retry_queue_lock = threading.Lock()
 
 
 def detect_vendor(sender_email: str) -> str:
@@ -17,81 +25,277 @@ def detect_vendor(sender_email: str) -> str:
     return None
 
 
-def route(sender_email: str, content: str) -> dict:
-    """Route invoice content to appropriate parser."""
+def route(sender_email: str, content: str, file_paths: list = None) -> dict:
+    """Route invoice content to appropriate parser.
+
+    ``file_paths`` lets vendor parsers read item tables from PDF attachments.
+    """
     vendor = detect_vendor(sender_email)
 
     if vendor:
-        print(f"[MODEL A] {vendor}")
-        raw = vendor_parser.parse(content, vendor)
-        return vendor_parser.normalize_to_schema(raw)
+        logger.debug("[MODEL A] %s", vendor)
+        pdf_paths = [f for f in file_paths or [] if f.lower().endswith(".pdf")]
+        raw = vendor_parser.parse(content, vendor, pdf_paths)
+        result, errors = schema_validator.validate(vendor_parser.normalize_to_schema(raw))
+        if not errors:
+            return result
+        logger.info("[MODEL A] Invalid parse (%s), falling back to LLM", '; '.join(errors))
+        return llm_extractor.extract(content)
     else:
-        print(f"[MODEL B] LLM")
+        logger.debug("[MODEL B] LLM")
         return llm_extractor.extract(content)
 
 
-def process_group(file_paths: list) -> dict:
-    """Process a group of files belonging to the same invoice."""
+def load_group(file_paths: list) -> dict:
+    """Read a group's files and resolve its email context.
+
+    Returns:
+        Dict with file_paths, content, sender_email, thread_id,
+        received_time and subject, or None if the group has no content.
+    """
     txt_file = next((f for f in file_paths if f.lower().endswith(".txt")), None)
     content = file_handler.combine_content(file_paths)
 
     if not content.strip():
-        print("[WARN] No content")
+        logger.warning("[WARN] No content (no text layer or OCR text): %s",
+                       ", ".join(os.path.basename(f) for f in file_paths))
         return None
 
     if txt_file:
         metadata = file_handler.parse_email_headers(txt_file)
-        sender_email = metadata["sender_email"]
-        thread_id = metadata["thread_id"]
-        received_time = metadata["received_time"]
     else:
-        print("[WARN] No email context, using content-based detection")
-        sender_email = ""
-        thread_id = ""
-        received_time = ""
+        logger.warning("[WARN] No email context, using content-based detection")
+        metadata = {"sender_email": "", "thread_id": "", "received_time": "", "subject": ""}
 
         for fp in file_paths:
             fname = os.path.basename(fp).lower()
             if "mcmaster" in fname:
-                sender_email = "order@mcmaster.com"
+                metadata["sender_email"] = "order@mcmaster.com"
             elif "homedepot" in fname or "home depot" in fname:
-                sender_email = "orders@homedepot.com"
+                metadata["sender_email"] = "orders@homedepot.com"
 
-    result = route(sender_email, content)
+    return {
+        "file_paths": file_paths,
+        "content": content,
+        "sender_email": metadata.get("sender_email", ""),
+        "thread_id": metadata.get("thread_id", ""),
+        "received_time": metadata.get("received_time", ""),
+        "subject": metadata.get("subject", ""),
+    }
 
+
+def passes_classifier(ctx: dict) -> bool:
+    """Quarantine unknown-vendor groups that don't look like purchase invoices."""
+    if not settings.CLASSIFIER_ENABLED or detect_vendor(ctx["sender_email"]):
+        return True
+
+    if invoice_classifier.is_invoice(ctx["content"], ctx["subject"]):
+        return True
+
+    invoice_classifier.quarantine(ctx["file_paths"], ctx["content"], ctx)
+    return False
+
+
+def finalize_result(result: dict, ctx: dict) -> dict:
+    """Fill in email-derived fields the parser or LLM cannot know."""
     if result:
-        result["mail_thread_id"] = thread_id or result.get("mail_thread_id", "")
-        result["mail_received_time"] = received_time or result.get("mail_received_time", "")
+        sender_email = ctx["sender_email"]
+        result["mail_thread_id"] = ctx["thread_id"] or result.get("mail_thread_id", "")
+        result["mail_received_time"] = ctx["received_time"] or result.get("mail_received_time", "")
         if not result.get("company_name") and sender_email and "@" in sender_email:
             result["company_name"] = sender_email.split("@")[1].split(".")[0].title()
+        result["_content"] = ctx["content"]
+
+    return result
+
+
+def process_group(file_paths: list) -> dict:
+    """Process a group of files belonging to the same invoice.
+
+    Raises:
+        llm_extractor.LLMUnavailableError: The group needs the LLM and it is down.
+    """
+    ctx = load_group(file_paths)
+    if not ctx or not passes_classifier(ctx):
+        return None
+
+    return finalize_result(route(ctx["sender_email"], ctx["content"], ctx["file_paths"]), ctx)
+
+
+def load_retry_queue() -> dict:
+    """Load groups parked while the LLM was unavailable, keyed by group base."""
+    if os.path.exists(settings.LLM_RETRY_QUEUE_FILE):
+        with open(settings.LLM_RETRY_QUEUE_FILE, 'r', encoding='utf-8') as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return {}
+    return {}
+
+
+def save_retry_queue(queue: dict):
+    """Persist the LLM retry queue."""
+    os.makedirs(os.path.dirname(settings.LLM_RETRY_QUEUE_FILE), exist_ok=True)
+    with open(settings.LLM_RETRY_QUEUE_FILE, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(queue, indent=2))
+
+
+def park_group(base: str, paths: list, reason: str = ""):
+    """Park a group in the on-disk retry queue until the LLM is back."""
+    with _retry_queue_lock:
+        queue = load_retry_queue()
+        queue[base] = {
+            "file_paths": paths,
+            "parked_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "reason": reason,
+        }
+        save_retry_queue(queue)
+    logger.info("[PARKED] %s - LLM unavailable (%s)", base, reason)
+
+
+def retry_queue_ready() -> bool:
+    """Return True if groups are parked and the LLM answers a health probe again."""
+    return bool(load_retry_queue()) and llm_extractor.is_healthy()
 
+
+def held_parked_groups(grouped: dict) -> set:
+    """Decide which parked groups to hold back this run.
+
+    If the LLM is healthy again the queue is drained (its groups are
+    processed with everything else); otherwise parked groups are skipped
+    so the run doesn't keep fast-failing on them.
+    """
+    queue = load_retry_queue()
+    if not queue:
+        return set()
+
+    queue = {base: entry for base, entry in queue.items() if base in grouped}
+    if queue and not llm_extractor.is_healthy():
+        save_retry_queue(queue)
+        logger.info("[PARKED] %s group(s) waiting for the LLM", len(queue))
+        return set(queue)
+
+    if queue:
+        logger.info("[LLM] Available again, draining %s parked group(s)", len(queue))
+    save_retry_queue({})
+    return set()
+
+
+def accept_result(result: dict, paths: list, skip_ids: set, group: str = "") -> dict:
+    """Return the result ready to yield, or None if its thread was already processed."""
+    tid = result.get("mail_thread_id", "")
+    if tid and tid in skip_ids:
+        logger.info("[SKIP] Already processed: %s", tid)
+        return None
+    logger.info("[OK] %s - $%s", result.get('company_name', 'Unknown'), result.get('total_price', 'N/A'))
+
+    # Attach original file paths to result so caller can move them if desired
+    result['_file_paths'] = paths
+    result['_group'] = group
     return result
 
 
-def process_all(skip_ids: set = None, invoice_dir: str = None):
+def flush_llm_batch(pending: list, skip_ids: set):
+    """Run buffered Model B groups through one batched LLM request.
+
+    Jobs are labelled by their position in the batch, not by thread ID:
+    two groups of one thread (or two without one) must not share a label.
+    """
+    logger.debug("[MODEL B] LLM batch of %s", len(pending))
+    jobs = [{"id": str(i), "email_body": ctx["content"]} for i, ctx in enumerate(pending)]
+    try:
+        extracted = llm_extractor.extract_batch(jobs)
+    except llm_extractor.LLMUnavailableError as e:
+        for ctx in pending:
+            park_group(ctx["group"], ctx["file_paths"], str(e))
+        return
+
+    for job, ctx in zip(jobs, pending):
+        result = finalize_result(extracted.get(job["id"]), ctx)
+        if result:
+            result = accept_result(result, ctx["file_paths"], skip_ids, ctx["group"])
+            if result:
+                yield result
+
+
+def batchable(ctx: dict) -> bool:
+    """True if a group should wait for a batched LLM request (short, unknown vendor)."""
+    return not detect_vendor(ctx["sender_email"]) and len(ctx["content"]) <= settings.LLM_BATCH_MAX_CHARS
+
+
+def _process_all_batched(grouped: dict, skip_ids: set, batch_size: int):
+    """Process groups, packing short unknown-vendor groups into LLM batches."""
+    pending = []
+
+    for base, paths in grouped.items():
+        logger.info("Processing: %s", base)
+        ctx = load_group(paths)
+        if not ctx or not passes_classifier(ctx):
+            continue
+
+        tid = ctx["thread_id"]
+        if tid and tid in skip_ids:
+            logger.info("[SKIP] Already processed: %s", tid)
+            continue
+
+        if not batchable(ctx):
+            try:
+                result = finalize_result(route(ctx["sender_email"], ctx["content"], ctx["file_paths"]), ctx)
+            except llm_extractor.LLMUnavailableError as e:
+                park_group(base, paths, str(e))
+                continue
+            if result:
+                result = accept_result(result, paths, skip_ids, base)
+                if result:
+                    yield result
+            continue
+
+        ctx["group"] = base
+        pending.append(ctx)
+        if len(pending) >= batch_size:
+            yield from flush_llm_batch(pending, skip_ids)
+            pending = []
+
+    if pending:
+        yield from flush_llm_batch(pending, skip_ids)
+
+
+def process_all(skip_ids: set = None, invoice_dir: str = None, hold: set = None, seen: list = None):
     """Process all invoice files in a directory.
 
     Yields results one at a time so callers can save each invoice
-    immediately before the next one is processed.
+    immediately before the next one is processed. Groups that need the LLM
+    while it is unavailable are parked in LLM_RETRY_QUEUE_FILE and picked
+    up again once a health probe succeeds.
 
     Args:
         skip_ids: Thread IDs to skip.
         invoice_dir: Directory containing invoice files. Defaults to settings.INVOICE_DIR.
+        hold: Group keys to leave alone this run.
+        seen: If given, the group keys attempted are appended to it.
     """
     skip_ids = skip_ids or set()
     grouped = file_handler.get_invoice_files(invoice_dir=invoice_dir)
 
+    held = held_parked_groups(grouped) | (hold or set())
+    if held:
+        grouped = {base: paths for base, paths in grouped.items() if base not in held}
+    if seen is not None:
+        seen.extend(grouped)
+
+    if settings.LLM_BATCH_SIZE > 1:
+        yield from _process_all_batched(grouped, skip_ids, settings.LLM_BATCH_SIZE)
+        return
+
     for base, paths in grouped.items():
-        print(f"\nProcessing: {base}")
-        result = process_group(paths)
+        logger.info("Processing: %s", base)
+        try:
+            result = process_group(paths)
+        except llm_extractor.LLMUnavailableError as e:
+            park_group(base, paths, str(e))
+            continue
 
         if result:
-            tid = result.get("mail_thread_id", "")
-            if tid and tid in skip_ids:
-                print(f"[SKIP] Already processed: {tid}")
-                continue
-            print(f"[OK] {result.get('company_name', 'Unknown')} - ${result.get('total_price', 'N/A')}")
-
-            # Attach original file paths to result so caller can move them if desired
-            result['_file_paths'] = paths
-            yield result
+            result = accept_result(result, paths, skip_ids, base)
+            if result:
+                yield result
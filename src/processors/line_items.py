@@ -0,0 +1,258 @@
+"""Table-aware line-item extraction for vendor invoices.
+
+Vendor parsers used to find items with one regex over flattened text,
+which loses the column structure: a description that wraps onto a
+second line is cut off, and formats the regex doesn't know (Home Depot)
+yield nothing. Here the item table is read by position instead:
+
+* Words come from pdfplumber (``extract_words``) for PDF attachments, or
+  from a layout pass over plain text (character offsets) for email
+  bodies whose columns are aligned with spaces.
+* On each page the vendor's header row ("Line Product Description ...")
+  is found once and gives the column spans; every word below it is
+  assigned to the column it overlaps.
+* A line with a key, an integer quantity and a price starts an item; a
+  line with words only in the wrap column continues the previous item's
+  description; anything else (totals, page footer) ends the table until
+  the next header. Pages without a repeated header reuse the previous
+  page's columns.
+
+Parsing a PDF's characters is most of pdfplumber's cost, so read_pdf
+keeps the words of pages from a vendor table header on (``remember``)
+and the table pass reuses them instead of opening the PDF again.
+
+Items are yielded as soon as they are complete, page by page, in the
+same shape the regex parsers produce (item_name, quantity, price).
+"""
+import logging
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+import pdfplumber
+
+from src.config import settings
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Column layout of each vendor's item table. ``name`` columns are joined
+# into item_name; continuation lines are appended to the ``wrap`` column.
+TABLES = {
+    "mcmaster_carr": {
+        "header": ["Line", "Product", "Description", "Ordered", "Unit", "Shipped", "Price", "Total"],
+        "key": "Line",
+        "name": ["Product", "Description"],
+        "wrap": "Description",
+        "quantity": "Ordered",
+        "price": "Price",
+    },
+    "home_depot": {
+        "header": ["SKU", "Description", "Qty", "Unit Price", "Amount"],
+        "key": "SKU",
+        "name": ["Description"],
+        "wrap": "Description",
+        "quantity": "Qty",
+        "price": "Unit Price",
+    },
+}
+
+# Each table's header as it appears in flattened text, to spot pages worth reading by position
+_HEADERS = [re.compile(r'\b' + r'\s+'.join(map(re.escape, " ".join(t["header"]).split())) + r'\b', re.I)
+            for t in TABLES.values()]
+_MONEY = re.compile(r'^\$?([\d,]+\.\d{2})$')
+_QUANTITY = re.compile(r'^\d[\d,]*$')
+
+
+def _lines(words: list, tolerance: float) -> list:
+    """Group words into lines by their top coordinate, each sorted left to right."""
+    lines, current, top = [], [], None
+    for word in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if current and word["top"] - top > tolerance:
+            lines.append(sorted(current, key=lambda w: w["x0"]))
+            current = []
+        if not current:
+            top = word["top"]
+        current.append(word)
+    if current:
+        lines.append(sorted(current, key=lambda w: w["x0"]))
+    return lines
+
+
+def find_columns(line: list, header: list, min_gap: float = 0) -> list:
+    """Column spans [(x0, x1), ...] if ``line`` is the table header, else None.
+
+    Each header label may be several words ("Unit Price"); labels must
+    appear in order, and consecutive labels at least ``min_gap`` apart.
+    """
+    texts = [w["text"].lower() for w in line]
+    spans, pos = [], 0
+    for label in header:
+        tokens = label.lower().split()
+        while pos < len(texts) and texts[pos:pos + len(tokens)] != tokens:
+            pos += 1
+        if pos >= len(texts):
+            return None
+        first, last = line[pos], line[pos + len(tokens) - 1]
+        if spans and first["x0"] - spans[-1][1] < min_gap:
+            return None
+        spans.append((first["x0"], last["x1"]))
+        pos += len(tokens)
+    return spans
+
+
+def _column(word: dict, spans: list, starts: list) -> int:
+    """Index of the column a word belongs to, or -1 if it is left of the table.
+
+    The header label it overlaps most wins; a word under no label (the
+    rest of a description) belongs to the last column starting before it.
+    """
+    best, best_overlap = -1, 0
+    for i, (x0, x1) in enumerate(spans):
+        overlap = min(x1, word["x1"]) - max(x0, word["x0"])
+        if overlap > best_overlap:
+            best, best_overlap = i, overlap
+    if best >= 0:
+        return best
+    return bisect_right(starts, word["x0"]) - 1
+
+
+def _cells(line: list, header: list, spans: list) -> dict:
+    starts = [x0 for x0, _ in spans]
+    cells = {}
+    for word in line:
+        i = _column(word, spans, starts)
+        if i >= 0:
+            cells.setdefault(header[i], []).append(word["text"])
+    return {label: " ".join(words) for label, words in cells.items()}
+
+
+def _row(cells: dict, table: dict) -> dict:
+    """An item from a table line's cells, or None if the line is not an item row."""
+    key = cells.get(table["key"], "")
+    quantity = cells.get(table["quantity"], "")
+    price = _MONEY.match(cells.get(table["price"], ""))
+    if not key or " " in key or not _QUANTITY.match(quantity) or not price:
+        return None
+    return {
+        "item_name": " ".join(cells[c] for c in table["name"] if cells.get(c)),
+        "quantity": int(quantity.replace(",", "")),
+        "price": float(price.group(1).replace(",", "")),
+    }
+
+
+def iter_items(pages, vendor: str, tolerance: float = None, min_gap: float = 0):
+    """Stream line items from positioned words.
+
+    Args:
+        pages: Iterable of pages, each a list of words (dicts with text,
+            x0, x1 and top, as pdfplumber's ``extract_words`` returns).
+        vendor: Key into TABLES.
+        tolerance: Max difference in ``top`` between words on one line.
+        min_gap: Minimum space between header labels (see find_columns).
+
+    Yields:
+        Item dicts (item_name, quantity, price), in table order.
+    """
+    table = TABLES[vendor]
+    header = table["header"]
+    tolerance = settings.LINE_ITEM_ROW_TOLERANCE if tolerance is None else tolerance
+    spans, item, in_table = None, None, False
+
+    for words in pages:
+        in_table = False
+        for line in _lines(words, tolerance):
+            columns = find_columns(line, header, min_gap)
+            if columns:
+                if item:
+                    yield item
+                spans, item, in_table = columns, None, False
+                continue
+            if spans is None:
+                continue
+
+            cells = _cells(line, header, spans)
+            row = _row(cells, table)
+            if row:
+                if item:
+                    yield item
+                item, in_table = row, True
+            elif in_table and item and cells and set(cells) == {table["wrap"]}:
+                item["item_name"] = f"{item['item_name']} {cells[table['wrap']]}"
+            elif in_table:
+                # Totals or page footer: the table ends here until the next header
+                if item:
+                    yield item
+                item, in_table = None, False
+    if item:
+        yield item
+
+
+_words = OrderedDict()
+_words_lock = threading.Lock()
+
+
+def has_header(text: str) -> bool:
+    """True if a page's text contains a known vendor table header."""
+    return any(h.search(text) for h in _HEADERS)
+
+
+def remember(path: str, pages: list):
+    """Keep the words read_pdf extracted from ``path`` for the next table pass."""
+    with _words_lock:
+        _words[path] = pages
+        _words.move_to_end(path)
+        while len(_words) > settings.LINE_ITEM_WORD_CACHE:
+            _words.popitem(last=False)
+
+
+def pdf_words(path: str):
+    """Yield each page's words from a PDF, once: remembered words are used and dropped."""
+    with _words_lock:
+        pages = _words.pop(path, None)
+    if pages is not None:
+        metrics.count("line_item_word_hits")
+        yield from pages
+        return
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            yield page.extract_words()
+
+
+def text_words(text: str) -> list:
+    """Words of plain text as a single page, positioned by character offset and line number."""
+    return [{"text": m.group(0), "x0": m.start(), "x1": m.end(), "top": n}
+            for n, line in enumerate(text.splitlines())
+            for m in re.finditer(r'\S+', line)]
+
+
+def pdf_items(path: str, vendor: str) -> list:
+    return list(iter_items(pdf_words(path), vendor))
+
+
+def text_items(text: str, vendor: str) -> list:
+    # Columns aligned with spaces have at least two between header labels;
+    # flattened PDF text has one and its positions mean nothing.
+    return list(iter_items([text_words(text)], vendor, tolerance=0, min_gap=2))
+
+
+@metrics.timed("line_items")
+def extract(vendor: str, text: str = "", pdf_paths: list = None) -> list:
+    """Line items of a vendor invoice from its table, or None if no table was found.
+
+    PDF attachments are read by word position; failing that, ``text`` is
+    tried as a space-aligned layout.
+    """
+    if vendor not in TABLES:
+        return None
+    for path in pdf_paths or []:
+        try:
+            items = pdf_items(path, vendor)
+        except Exception as e:
+            logger.warning("[LINE ITEMS] Could not read table from %s: %s", path, e)
+            continue
+        if items:
+            return items
+    items = text_items(text or "", vendor)
+    return items or None
@@ -1,8 +1,20 @@
 """LLM-based invoice data extraction."""
 import json
+import logging
 import requests
 
 from src.config import settings
+from src.processors import schema_validator
+from src.utils import metrics
+from src.utils.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS)
+
+
+class LLMUnavailableError(RuntimeError):
+    """Ollama is down, timing out, or the circuit breaker is open."""
 
 
 def _strip_schema_placeholders(value):
@@ -37,28 +49,215 @@ def build_prompt(email_body: str, attachment_texts: list = None) -> str:
     return "\n".join(parts)
 
 
-def extract(email_body: str, attachment_texts: list = None) -> dict:
-    """Extract invoice data from structured email content using LLM."""
-    if not email_body and not attachment_texts:
-        return None
-
-    prompt = build_prompt(email_body, attachment_texts)
+def _chat(messages: list, fmt=None):
+    """Send a chat to Ollama and return the decoded JSON reply.
 
+    Args:
+        messages: Chat messages.
+        fmt: JSON Schema constraining the reply. Defaults to one invoice.
+    """
     payload = {
         "model": settings.OLLAMA_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "format": "json",
+        "messages": messages,
+        "format": fmt if fmt is not None else schema_validator.json_schema(),
         "stream": False,
         "options": {"temperature": 0.1}
     }
 
-    print("[LLM] Sending to Ollama...")
+    if not breaker.allow_request():
+        metrics.count("llm_circuit_open")
+        raise LLMUnavailableError("circuit open, Ollama marked unavailable")
 
+    metrics.count("llm_requests")
     try:
-        r = requests.post(settings.OLLAMA_URL, json=payload, timeout=settings.OLLAMA_TIMEOUT)
+        r = requests.post(settings.OLLAMA_URL, json=payload,
+                          timeout=(settings.OLLAMA_CONNECT_TIMEOUT, settings.OLLAMA_TIMEOUT))
         r.raise_for_status()
-        raw = json.loads(r.json()['message']['content'])
-        return _strip_schema_placeholders(raw)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        metrics.count("llm_failures")
+        breaker.record_failure()
+        raise LLMUnavailableError(str(e)) from e
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code >= 500:
+            metrics.count("llm_failures")
+            breaker.record_failure()
+            raise LLMUnavailableError(str(e)) from e
+        breaker.record_success()
+        raise
+    except requests.RequestException as e:
+        # Broken stream, bad reply encoding...: Ollama did not answer usably
+        metrics.count("llm_failures")
+        breaker.record_failure()
+        raise LLMUnavailableError(str(e)) from e
+    except Exception:
+        # Never leave a half-open trial in flight, or the circuit can't close again
+        breaker.record_failure()
+        raise
+
+    breaker.record_success()
+    return json.loads(r.json()['message']['content'])
+
+
+def is_healthy() -> bool:
+    """Probe Ollama with a cheap /api/tags call and close the circuit if the model is up."""
+    try:
+        r = requests.get(settings.OLLAMA_TAGS_URL, timeout=settings.OLLAMA_HEALTH_TIMEOUT)
+        r.raise_for_status()
+        models = {m.get("name", "") for m in r.json().get("models", [])}
+    except Exception as e:
+        logger.warning("[LLM] Health check failed: %s", e)
+        return False
+
+    if settings.OLLAMA_MODEL not in models and f"{settings.OLLAMA_MODEL}:latest" not in models:
+        logger.info("[LLM] Ollama is up but %s is not installed", settings.OLLAMA_MODEL)
+        return False
+
+    breaker.reset()
+    return True
+
+
+def build_repair_prompt(errors: list) -> str:
+    """Ask the model to fix the listed validation errors in its last answer."""
+    lines = ["Your JSON did not validate against the schema:"]
+    lines.extend(f"- {e}" for e in errors)
+    lines.append("Return the corrected JSON only. Numbers must be plain JSON numbers "
+                 "(no $ or commas), quantities integers, dates YYYY-MM-DD.")
+    return "\n".join(lines)
+
+
+@metrics.timed("llm_extract")
+def extract(email_body: str, attachment_texts: list = None) -> dict:
+    """Extract invoice data from structured email content using LLM.
+
+    Output is validated against INVOICE_SCHEMA; invalid answers get up to
+    LLM_REPAIR_ATTEMPTS repair rounds before being rejected.
+
+    Raises:
+        LLMUnavailableError: Ollama is unreachable or the circuit is open,
+            so the caller can park the invoice instead of dropping it.
+    """
+    if not email_body and not attachment_texts:
+        return None
+
+    prompt = build_prompt(email_body, attachment_texts)
+    messages = [{"role": "user", "content": prompt}]
+
+    logger.debug("[LLM] Sending to Ollama...")
+
+    try:
+        for attempt in range(settings.LLM_REPAIR_ATTEMPTS + 1):
+            raw = _strip_schema_placeholders(_chat(messages))
+            result, errors = schema_validator.validate(raw)
+            if not errors:
+                return result
+
+            if attempt < settings.LLM_REPAIR_ATTEMPTS:
+                logger.info("[LLM] Invalid output, repairing (%s)", '; '.join(errors))
+                messages = messages + [
+                    {"role": "assistant", "content": json.dumps(raw)},
+                    {"role": "user", "content": build_repair_prompt(errors)},
+                ]
+
+        schema_validator.record_rejection(raw, errors, source="llm")
+        return None
+    except LLMUnavailableError:
+        raise
     except Exception as e:
-        print(f"[LLM] Error: {e}")
+        logger.warning("[LLM] Error: %s", e)
         return None
+
+
+def build_batch_prompt(jobs: list) -> str:
+    """Build one prompt that packs several short invoices into delimited sections.
+
+    Args:
+        jobs: Dicts with an "id" unique within the batch and "email_body".
+    """
+    parts = [
+        f"Extract invoice data from each of the {len(jobs)} emails below.",
+        "Each email starts with a line '=== INVOICE <id> ===' and ends with '=== END <id> ==='.",
+        'Return ONLY valid JSON of the form {"invoices": [...]} with exactly one object per email, '
+        "in the same order, each matching this schema:",
+        json.dumps(settings.INVOICE_SCHEMA, indent=2),
+        "Set mail_thread_id in every object to the <id> of the email it was extracted from.",
+        "",
+    ]
+
+    for job in jobs:
+        body = job.get("email_body") or ""
+        parts.append(f"=== INVOICE {job['id']} ===")
+        parts.append(body.strip() if body.strip() else "[No email body]")
+        parts.append(f"=== END {job['id']} ===")
+        parts.append("")
+
+    return "\n".join(parts)
+
+
+def _batch_objects(raw) -> list:
+    """Pull the per-invoice object list out of a batch reply."""
+    if isinstance(raw, list):
+        return raw
+    if isinstance(raw, dict):
+        for value in raw.values():
+            if isinstance(value, list):
+                return value
+    return []
+
+
+@metrics.timed("llm_extract_batch")
+def extract_batch(jobs: list) -> dict:
+    """Extract several short invoices with a single LLM request.
+
+    Objects are matched back to their job by the id the model echoes in
+    mail_thread_id, which is then cleared: the id is only a label within
+    the batch. Jobs whose object is missing, duplicated, unrecognised or
+    fails validation are retried singly.
+
+    Args:
+        jobs: Dicts with an "id" unique within the batch (e.g. its
+            position) and "email_body".
+
+    Returns:
+        Dict mapping each job id to its extracted data (or None).
+
+    Raises:
+        LLMUnavailableError: Ollama is unreachable or the circuit is open.
+    """
+    jobs = [j for j in jobs if j.get("email_body")]
+    if not jobs:
+        return {}
+    if len(jobs) == 1:
+        job = jobs[0]
+        return {str(job["id"]): extract(job["email_body"])}
+
+    logger.info("[LLM] Sending batch of %s to Ollama...", len(jobs))
+
+    results = {}
+    try:
+        prompt = build_batch_prompt(jobs)
+        objects = _batch_objects(_chat([{"role": "user", "content": prompt}],
+                                       schema_validator.batch_json_schema()))
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        logger.warning("[LLM] Batch error: %s", e)
+        objects = []
+
+    wanted = {str(j["id"]) for j in jobs}
+    for obj in objects:
+        if not isinstance(obj, dict):
+            continue
+        tid = str(obj.get("mail_thread_id", "")).strip()
+        if tid in wanted and tid not in results:
+            result, errors = schema_validator.validate(_strip_schema_placeholders(obj))
+            if not errors:
+                result["mail_thread_id"] = ""
+                results[tid] = result
+
+    retry = [j for j in jobs if str(j["id"]) not in results]
+    if retry:
+        logger.info("[LLM] %s batch item(s) unmatched or invalid, retrying singly", len(retry))
+    for job in retry:
+        results[str(job["id"])] = extract(job["email_body"])
+
+    return results
@@ -0,0 +1,300 @@
+"""OCR fallback for scanned (image-only) PDF pages.
+
+``read_pdf`` sends pages whose text layer has fewer than
+OCR_MIN_CHARS_PER_PAGE characters here. Each page is rasterized with
+pdf2image (poppler) and read with Tesseract (pytesseract) in a process
+pool of OCR_WORKERS, so several pages and PDFs are OCR'd in parallel
+without holding the GIL.
+
+The DPI adapts to the page: it is chosen so the page renders about
+OCR_TARGET_WIDTH_PX wide (clamped to OCR_MIN_DPI..OCR_MAX_DPI), and a
+page that yields almost nothing is retried once at OCR_MAX_DPI.
+
+Results are cached in OCR_CACHE_FILE by a hash of the page's content
+and image streams, so a page seen again (a reprocessed group, the same
+scan attached to another email) is never OCR'd twice.
+
+Each page gets OCR_TIMEOUT_SECONDS in total, shared by its poppler and
+tesseract calls (and the high-DPI retry), so a hung page cannot hold a
+pool worker for good. Only a page that is still running well past that
+budget - time spent queued behind other pages does not count - makes
+the pool be replaced; the stuck worker finishes or times out on its own
+while later pages get fresh workers.
+
+Both libraries are optional; without them (or without the tesseract
+binary) scanned pages stay empty, as before, with a one-time warning.
+"""
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from src.config import settings
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pytesseract
+    from pdf2image import convert_from_path
+except ImportError:
+    pytesseract = None
+    convert_from_path = None
+
+_available = None
+_warned = False
+_pool = None
+_pool_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_pages (
+    page_hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    dpi INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+def available() -> bool:
+    """True if pdf2image, pytesseract and the tesseract binary are all present."""
+    global _available
+    if _available is None:
+        _available = False
+        if pytesseract is not None:
+            try:
+                pytesseract.get_tesseract_version()
+                _available = True
+            except Exception:
+                pass
+    return _available
+
+
+def warn_unavailable():
+    global _warned
+    if not _warned:
+        _warned = True
+        logger.warning("[OCR] Scanned PDF pages found but OCR is unavailable: "
+                       "pip install pdf2image pytesseract, and install poppler and tesseract")
+
+
+def needs_ocr(text: str) -> bool:
+    return len((text or "").strip()) < settings.OCR_MIN_CHARS_PER_PAGE
+
+
+def dpi_for(page) -> int:
+    """Render DPI that makes the page about OCR_TARGET_WIDTH_PX wide."""
+    try:
+        width_inches = float(page.width) / 72
+    except (TypeError, ValueError, AttributeError):
+        return settings.OCR_MIN_DPI
+    if width_inches <= 0:
+        return settings.OCR_MIN_DPI
+    dpi = int(settings.OCR_TARGET_WIDTH_PX / width_inches)
+    return max(settings.OCR_MIN_DPI, min(settings.OCR_MAX_DPI, dpi))
+
+
+def page_hash(page, fallback: str) -> str:
+    """Hash of a pdfplumber page's content and image streams (``fallback`` if unreadable)."""
+    from pdfminer.pdftypes import resolve1
+
+    h = hashlib.sha256()
+    try:
+        contents = page.page_obj.contents or []
+        for stream in contents:
+            h.update(resolve1(stream).get_rawdata() or b"")
+        for image in page.images:
+            h.update(image["stream"].get_rawdata() or b"")
+        h.update(f"{float(page.width):.1f}x{float(page.height):.1f}".encode())
+    except Exception:
+        return hashlib.sha256(fallback.encode("utf-8")).hexdigest()
+    return h.hexdigest()
+
+
+class OcrCache:
+    """SQLite cache of OCR text keyed by page hash."""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.OCR_CACHE_FILE
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def get_many(self, hashes: list) -> dict:
+        hashes = list(hashes)
+        out = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT page_hash, text FROM ocr_pages WHERE page_hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                out.update(rows)
+        return out
+
+    def put(self, digest: str, text: str, dpi: int):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ocr_pages (page_hash, text, dpi, created_at) VALUES (?, ?, ?, ?)",
+                (digest, text, dpi, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> OcrCache:
+    """Return the process-wide cache for settings.OCR_CACHE_FILE."""
+    global _cache
+    with _cache_lock:
+        if _cache is None or _cache.path != settings.OCR_CACHE_FILE:
+            _cache = OcrCache(settings.OCR_CACHE_FILE)
+        return _cache
+
+
+def _ocr_page(path: str, page_number: int, dpi: int, lang: str, min_chars: int, max_dpi: int,
+              timeout: float = None) -> tuple:
+    """Rasterize and OCR one page (1-based) in a pool worker; returns (text, dpi used).
+
+    ``timeout`` is the page's whole budget: each pdftoppm and tesseract
+    call gets what is left of it, and the high-DPI retry is skipped once
+    it is spent. A call that runs out of time raises.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+
+    def remaining():
+        return max(deadline - time.monotonic(), 0.001) if deadline else None
+
+    while True:
+        images = convert_from_path(path, dpi=dpi, first_page=page_number, last_page=page_number,
+                                   grayscale=True, timeout=remaining())
+        text = pytesseract.image_to_string(images[0], lang=lang, timeout=remaining() or 0) if images else ""
+        if len(text.strip()) >= min_chars or dpi >= max_dpi:
+            return text, dpi
+        if deadline and time.monotonic() >= deadline:
+            return text, dpi
+        # Small print on a large page: one more try at full resolution
+        dpi = max_dpi
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the pipeline's threads may hold locks at fork time
+            _pool = ProcessPoolExecutor(max_workers=settings.OCR_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _recycle_pool(pool: ProcessPoolExecutor):
+    """Stop handing work to ``pool`` (it has a stuck worker); the next _get_pool starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return  # another caller already replaced it
+        _pool = None
+    # Queued pages still run; the stuck worker exits once its tesseract/pdftoppm call times out
+    pool.shutdown(wait=False)
+    metrics.count("ocr_pool_recycles")
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown)
+
+
+def _as_finished(pool: ProcessPoolExecutor, futures: list, budget: float):
+    """Yield (index, digest, future) as pages finish; pages overrunning their budget are dropped.
+
+    A page's clock starts when the pool marks it running, not when it was
+    submitted, so pages queued behind other callers' work are not timed
+    out. A process pool marks a call running once it is handed to the
+    workers' queue, which holds one call beyond the busy workers, so a
+    page is overdue only after twice its budget.
+    """
+    by_future = {future: (index, digest) for index, digest, future in futures}
+    started = {}
+    pending = set(by_future)
+    while pending:
+        done, pending = wait(pending, timeout=min(1.0, budget / 4), return_when=FIRST_COMPLETED)
+        for future in done:
+            yield (*by_future[future], future)
+        now = time.monotonic()
+        for future in list(pending):
+            if future.running():
+                started.setdefault(future, now)
+            if future in started and now - started[future] > 2 * budget:
+                logger.warning("[OCR] Page %s is still running after %ss, restarting the OCR pool",
+                               by_future[future][0] + 1, round(now - started[future]))
+                _recycle_pool(pool)
+                pending.discard(future)
+
+
+def ocr_pages(path: str, pages: list) -> dict:
+    """OCR the given pages of a PDF, using cached text where the page was seen before.
+
+    Args:
+        path: PDF file.
+        pages: (page index, page hash, dpi) for each page to OCR.
+
+    Returns:
+        Page index -> OCR text, for the pages that could be read; failed
+        or timed-out pages are missing and not cached, so they are
+        retried the next time the PDF is read.
+    """
+    if not pages:
+        return {}
+    if not available():
+        warn_unavailable()
+        return {}
+
+    cache = get_cache()
+    cached = cache.get_many(digest for _, digest, _ in pages)
+    out = {index: cached[digest] for index, digest, _ in pages if digest in cached}
+    hits = len(out)
+    metrics.count("ocr_cache_hits", hits)
+
+    todo = [(index, digest, dpi) for index, digest, dpi in pages if digest not in cached]
+    if not todo:
+        return out
+
+    pool = _get_pool()
+    futures = [
+        (index, digest, pool.submit(_ocr_page, path, index + 1, dpi, settings.OCR_LANG,
+                                    settings.OCR_MIN_CHARS_PER_PAGE, settings.OCR_MAX_DPI,
+                                    settings.OCR_TIMEOUT_SECONDS))
+        for index, digest, dpi in todo
+    ]
+    for index, digest, future in _as_finished(pool, futures, settings.OCR_TIMEOUT_SECONDS):
+        try:
+            text, dpi = future.result(timeout=0)
+        except Exception as e:
+            logger.warning("[OCR] Page %s of %s failed: %s", index + 1, os.path.basename(path), e)
+            continue
+        cache.put(digest, text, dpi)
+        out[index] = text
+        metrics.count("ocr_pages")
+    logger.info("[OCR] %s: %s page(s) OCR'd, %s from cache", os.path.basename(path), len(out) - hits, hits)
+    return out
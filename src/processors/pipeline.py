@@ -0,0 +1,455 @@
+"""Staged, multi-threaded invoice processing pipeline.
+
+scan -> extract -> classify -> parse -> store -> archive (background, + search index), then one Sheets sync
+
+Each stage has its own worker pool and reads from a bounded queue, so
+PDF extraction, LLM calls and Sheets writes overlap while a full queue
+blocks the stage feeding it (back-pressure keeps memory bounded).
+Invoices are committed to the local store before their files are
+archived; pushing them to Google Sheets happens once at the end, as a
+single differential sync.
+"""
+import logging
+import queue
+import threading
+import time
+
+from src.config import settings
+from src.processors import duplicate_detector, file_handler, llm_extractor
+from src.processors import invoice_processor as ip
+from src.storage import archive, invoice_store, job_queue
+from src.utils import log
+from src.writers import sheet_sync
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    """One pipeline stage: a function applied to each item by N worker threads.
+
+    ``func(item)`` returns the item to pass downstream, None to drop it,
+    or a list of items (possibly empty) to pass several at once. If given,
+    ``flush()`` is called once after the last input and returns a list of
+    items still held back (e.g. a half-full batch).
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, flush=None):
+        self.name = name
+        self.func = func
+        self.flush = flush
+        self.workers = max(1, workers)
+        self.inbox = None
+        self.outbox = None
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def _work(self, downstream_workers: int):
+        log.set_stage(self.name)
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                break
+
+            start = time.perf_counter()
+            try:
+                out = self.func(item)
+            except Exception as e:
+                out = None
+                with self._lock:
+                    self.errors += 1
+                logger.warning("[PIPELINE] %s error: %s", self.name, e)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self.processed += 1
+                self.busy_seconds += elapsed
+                if out is None or out == []:
+                    self.dropped += 1
+
+            self._emit(out)
+
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.flush is not None:
+            try:
+                self._emit(self.flush())
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.warning("[PIPELINE] %s flush error: %s", self.name, e)
+        if last and self.outbox is not None:
+            for _ in range(downstream_workers):
+                self.outbox.put(_DONE)
+
+    def _emit(self, out):
+        if out is None or self.outbox is None:
+            return
+        for item in (out if isinstance(out, list) else [out]):
+            self.outbox.put(item)
+
+    def start(self, downstream_workers: int) -> list:
+        self._running = self.workers
+        threads = [
+            threading.Thread(target=self._work, args=(downstream_workers,),
+                             name=f"{self.name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        return threads
+
+
+class Pipeline:
+    """Chain of stages connected by bounded queues."""
+
+    def __init__(self, stages: list, queue_size: int = 16, report_seconds: float = 10):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.report_seconds = report_seconds
+        self.started_at = None
+        self.scanned = 0
+        self._stop_report = threading.Event()
+
+    def metrics(self) -> list:
+        """Snapshot per-stage throughput and queue depth."""
+        elapsed = max(time.perf_counter() - (self.started_at or time.perf_counter()), 1e-9)
+        snapshot = [{
+            "stage": "scan",
+            "workers": 1,
+            "processed": self.scanned,
+            "dropped": 0,
+            "errors": 0,
+            "per_second": round(self.scanned / elapsed, 2),
+            "busy_seconds": 0.0,
+            "queue_depth": 0,
+        }]
+        for stage in self.stages:
+            with stage._lock:
+                snapshot.append({
+                    "stage": stage.name,
+                    "workers": stage.workers,
+                    "processed": stage.processed,
+                    "dropped": stage.dropped,
+                    "errors": stage.errors,
+                    "per_second": round(stage.processed / elapsed, 2),
+                    "busy_seconds": round(stage.busy_seconds, 3),
+                    "queue_depth": stage.inbox.qsize() if stage.inbox is not None else 0,
+                })
+        return snapshot
+
+    def format_metrics(self) -> str:
+        return " | ".join(
+            f"{m['stage']} {m['processed']} ({m['per_second']}/s) q={m['queue_depth']}"
+            for m in self.metrics()
+        )
+
+    def _report_loop(self):
+        while not self._stop_report.wait(self.report_seconds):
+            logger.info("[PIPELINE] %s", self.format_metrics())
+
+    def run(self, source) -> list:
+        """Feed every item from ``source`` through the stages and wait for completion.
+
+        Returns:
+            Final per-stage metrics.
+        """
+        for stage in self.stages:
+            stage.inbox = queue.Queue(maxsize=self.queue_size)
+        for upstream, downstream in zip(self.stages, self.stages[1:]):
+            upstream.outbox = downstream.inbox
+
+        self.started_at = time.perf_counter()
+        threads = []
+        for i, stage in enumerate(self.stages):
+            nxt = self.stages[i + 1].workers if i + 1 < len(self.stages) else 0
+            threads.extend(stage.start(nxt))
+
+        reporter = None
+        if self.report_seconds:
+            reporter = threading.Thread(target=self._report_loop, name="pipeline-report", daemon=True)
+            reporter.start()
+
+        first = self.stages[0]
+        try:
+            for item in source:
+                first.inbox.put(item)
+                self.scanned += 1
+        finally:
+            for _ in range(first.workers):
+                first.inbox.put(_DONE)
+            for t in threads:
+                t.join()
+            self._stop_report.set()
+            if reporter:
+                reporter.join()
+
+        logger.info("[PIPELINE] done: %s", self.format_metrics())
+        return self.metrics()
+
+
+def _extract_stage(item: dict):
+    logger.info("Processing: %s", item['base'])
+    ctx = ip.load_group(item["paths"])
+    if ctx:
+        ctx["group"] = item["base"]
+    return ctx
+
+
+def _classify_stage(skip_ids: set):
+    def stage(ctx: dict):
+        if not ip.passes_classifier(ctx):
+            return None
+        tid = ctx["thread_id"]
+        if tid and tid in skip_ids:
+            logger.info("[SKIP] Already processed: %s", tid)
+            return None
+        return ctx
+    return stage
+
+
+class LlmBatch:
+    """Collects short unknown-vendor groups from the parse workers into LLM_BATCH_SIZE batches.
+
+    A group joining a batch is not passed on until its batch is sent;
+    the last, partial batch is sent when the input ends (``flush``).
+    Batched groups record their own progress in the job queue.
+    """
+
+    def __init__(self, skip_ids: set, size: int, jobs=None, failed: set = None):
+        self.skip_ids = skip_ids
+        self.size = size
+        self.jobs = jobs
+        self.failed = failed
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, ctx: dict) -> list:
+        """Queue a group; returns the results of its batch if this filled it, else []."""
+        with self._lock:
+            self._pending.append(ctx)
+            if len(self._pending) < self.size:
+                return []
+            batch, self._pending = self._pending, []
+        return self._send(batch)
+
+    def flush(self) -> list:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        return self._send(batch) if batch else []
+
+    def _send(self, batch: list) -> list:
+        try:
+            results = list(ip.flush_llm_batch(batch, self.skip_ids))
+        except Exception as e:
+            logger.warning("[PIPELINE] LLM batch of %s failed: %s", len(batch), e)
+            if self.jobs is not None:
+                for ctx in batch:
+                    if self.failed is not None:
+                        self.failed.add(ctx["group"])
+                    self.jobs.fail_group(ctx["group"], f"{type(e).__name__}: {e}")
+            return []
+        if self.jobs is not None:
+            for result in results:
+                self.jobs.advance_group(result["_group"], "parsed")
+        return results
+
+
+def _parse_stage(skip_ids: set, batch: LlmBatch = None):
+    def stage(ctx: dict):
+        if batch is not None and ip.batchable(ctx):
+            return batch.add(ctx)
+        try:
+            result = ip.finalize_result(ip.route(ctx["sender_email"], ctx["content"], ctx["file_paths"]), ctx)
+        except llm_extractor.LLMUnavailableError as e:
+            ip.park_group(ctx["group"], ctx["file_paths"], str(e))
+            return None
+        if not result:
+            return None
+        return ip.accept_result(result, ctx["file_paths"], skip_ids, ctx["group"])
+    return stage
+
+
+def store_result(store, result: dict) -> tuple:
+    """Save an extracted invoice and flag it if it duplicates a stored one.
+
+    Returns:
+        (invoice_id, created) as from InvoiceStore.save_invoice.
+    """
+    if settings.DUPLICATE_DETECTION_ENABLED:
+        duplicate_detector.annotate(result)
+    invoice_id, created = store.save_invoice(result, result.get("_group", ""))
+    if created and settings.DUPLICATE_DETECTION_ENABLED:
+        duplicate_detector.check(store, invoice_id, result)
+    return invoice_id, created
+
+
+def _store_stage(store, skip_ids: set, written: list):
+    def stage(result: dict):
+        invoice_id, created = store_result(store, result)
+        tid = result.get("mail_thread_id", "")
+        if tid:
+            skip_ids.add(tid)
+        if created:
+            written.append(result)
+            logger.info("[OK] Stored invoice #%s: %s", invoice_id, result.get('company_name', '?'))
+        else:
+            logger.info("[SKIP] Already stored as #%s", invoice_id)
+        result["_invoice_id"] = invoice_id
+        result["_created"] = created
+        return result
+    return stage
+
+
+def _archived(store, result: dict, invoice_id: int, created: bool, jobs=None, failed: set = None):
+    """Completion callback for a group's archiving: index its text and record its progress."""
+    group = result.get("_group", "")
+
+    def done(archived: list, error: Exception):
+        if error is not None:
+            logger.warning("[ARCHIVE] %s failed: %s", group, error)
+            if jobs is not None:
+                if failed is not None:
+                    failed.add(group)
+                jobs.fail_group(group, f"{type(error).__name__}: {error}")
+            return
+        if created:
+            store.index_text(invoice_id, result.get("_content", ""), archived)
+        if jobs is not None:
+            jobs.advance_group(group, "archived")
+    return done
+
+
+def archive_result(store, result: dict, invoice_id: int, created: bool, worker=None, jobs=None,
+                   failed: set = None):
+    """Move a stored invoice's files to the archive and index their text for search.
+
+    With an ArchiveWorker this only queues the group and returns; indexing
+    and the job queue's ``archived`` step follow once its batch is on disk.
+    """
+    file_paths = result.get("_file_paths", [])
+    done = _archived(store, result, invoice_id, created, jobs, failed)
+    if not file_paths:
+        done([], None)
+        return
+    logger.info("[MOVE] Archiving %s file(s) to %s...", len(file_paths), settings.OLD_INVOICE_DIR)
+    if worker is not None:
+        worker.submit(result.get("_group", ""), file_paths, result, done)
+    else:
+        done(archive.get_archive().archive_group(result.get("_group", ""), file_paths, result), None)
+
+
+def _archive_stage(store, worker=None, jobs=None, failed: set = None):
+    def stage(result: dict):
+        archive_result(store, result, result["_invoice_id"], result["_created"], worker, jobs, failed)
+        return result
+    return stage
+
+
+def _group_of(item: dict) -> str:
+    return item.get("base") or item.get("group") or item.get("_group", "")
+
+
+def _tracked(func, jobs, failed: set, state: str = None, dropped_state: str = None):
+    """Wrap a stage function to record each group's progress in the job queue."""
+    def stage(item: dict):
+        group = _group_of(item)
+        try:
+            out = func(item)
+        except Exception as e:
+            failed.add(group)
+            jobs.fail_group(group, f"{type(e).__name__}: {e}")
+            raise
+        if isinstance(out, list):
+            # Batched groups (LlmBatch) record their own progress
+            return out
+        if out is not None and state:
+            jobs.advance_group(group, state)
+        elif out is None and dropped_state:
+            jobs.advance_group(group, dropped_state)
+        return out
+    return stage
+
+
+def build_pipeline(skip_ids: set, written: list, store=None, jobs=None, failed: set = None,
+                   worker=None) -> Pipeline:
+    """Assemble the standard invoice pipeline (recording progress in ``jobs`` if given).
+
+    With an ArchiveWorker the archive stage hands groups to it instead of
+    moving files itself. With LLM_BATCH_SIZE > 1 the parse stage packs
+    short unknown-vendor groups into batched LLM requests.
+    """
+    store = store or invoice_store.get_store()
+    workers = settings.PIPELINE_WORKERS
+    failed = set() if failed is None else failed
+    batch = LlmBatch(skip_ids, settings.LLM_BATCH_SIZE, jobs, failed) if settings.LLM_BATCH_SIZE > 1 else None
+    stages = [
+        ("extract", _extract_stage, "extracted", None),
+        ("classify", _classify_stage(skip_ids), None, job_queue.SKIPPED),
+        ("parse", _parse_stage(skip_ids, batch), "parsed", None),
+        ("store", _store_stage(store, skip_ids, written), "written", None),
+        # archive_result records the archived step once the files are on disk
+        ("archive", _archive_stage(store, worker, jobs, failed), None, None),
+    ]
+    if jobs is not None:
+        stages = [(name, _tracked(func, jobs, failed, state, dropped), state, dropped)
+                  for name, func, state, dropped in stages]
+    flushes = {"parse": batch.flush} if batch is not None else {}
+    stages = [Stage(name, func, workers.get(name, 1), flushes.get(name)) for name, func, _, _ in stages]
+    return Pipeline(stages, settings.PIPELINE_QUEUE_SIZE, settings.PIPELINE_REPORT_SECONDS)
+
+
+def scan(invoice_dir: str = None, store=None, jobs=None, seen: list = None):
+    """Scan stage: yield invoice groups, holding back parked, retrying and already-stored ones."""
+    grouped = file_handler.get_invoice_files(invoice_dir=invoice_dir)
+    held = ip.held_parked_groups(grouped)
+    if jobs is not None:
+        held |= jobs.held_groups()
+    for base, paths in grouped.items():
+        if base in held:
+            continue
+        if store is not None and store.is_group_processed(base):
+            logger.info("[SKIP] Already stored, archiving: %s", base)
+            archive.get_archive().archive_group(base, paths, store.group_invoice(base))
+            if jobs is not None:
+                jobs.advance_group(base, "archived")
+            continue
+        if seen is not None:
+            seen.append(base)
+        yield {"base": base, "paths": paths}
+
+
+def retry_unfinished(jobs, groups: list, failed: set = frozenset()):
+    """Schedule a retry (with backoff) for groups attempted this run that didn't reach the archive."""
+    for group in jobs.unfinished_groups(groups):
+        if group not in failed:
+            jobs.fail_group(group, "processing did not complete")
+
+
+def run(skip_ids: set, invoice_dir: str = None, store=None, jobs=None) -> int:
+    """Process, store and archive every invoice group, then sync the sheet.
+
+    Args:
+        skip_ids: Thread IDs already processed; updated in place.
+        invoice_dir: Directory to scan. Defaults to settings.INVOICE_DIR.
+        store: InvoiceStore to write to. Defaults to the shared store.
+        jobs: JobQueue recording per-group progress (backfill), or None.
+
+    Returns:
+        Number of new invoices stored.
+    """
+    store = store or invoice_store.get_store()
+    skip_ids.update(store.thread_ids())
+    written, seen, failed = [], [], set()
+    with archive.ArchiveWorker() as worker:
+        build_pipeline(skip_ids, written, store, jobs, failed, worker).run(scan(invoice_dir, store, jobs, seen))
+    if jobs is not None:
+        retry_unfinished(jobs, seen, failed)
+    sheet_sync.sync(store)
+    return len(written)
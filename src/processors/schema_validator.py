@@ -0,0 +1,298 @@
+"""Strict validation and type coercion for extracted invoice data.
+
+INVOICE_SCHEMA in settings is written as an example document ("float",
+"YYYY-MM-DD", ...). This module derives a real JSON Schema from it (for
+Ollama's constrained ``format``) and compiles it once into a list of
+per-field coercers, so validating an invoice is a single pass over a dict.
+"""
+import json
+import logging
+import os
+import re
+from datetime import datetime
+
+from src.config import settings
+from src.utils.date_utils import normalize_date
+
+logger = logging.getLogger(__name__)
+
+# Legacy / misspelled keys mapped onto their canonical schema key
+KEY_ALIASES = {
+    "sum of other_expanses": "other_expenses",
+    "sum of other_expenses": "other_expenses",
+    "other_expanses": "other_expenses",
+}
+
+NUMBER_WORDS = {
+    "zero": 0, "a": 1, "an": 1, "one": 1, "single": 1, "two": 2, "three": 3,
+    "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+TENS_WORDS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70,
+    "eighty": 80, "ninety": 90,
+}
+# Words that multiply what comes before them ("two dozen", "three hundred")
+MULTIPLIER_WORDS = {"pair": 2, "dozen": 12, "hundred": 100, "thousand": 1000}
+
+EXTRA_DATE_FORMATS = ["%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y", "%Y/%m/%d"]
+
+_AMOUNT_RE = re.compile(r'^\(?-?\d+(\.\d+)?\)?$')
+# "1,234.50" or "1, 234.50": one number with thousands separators, not a list to sum
+_THOUSANDS_RE = re.compile(r'^\(?-?\$?\d{1,3}(,\s*\d{3})+(\.\d+)?\)?$')
+_ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class Invalid(ValueError):
+    """Raised by a coercer when a value cannot be made to fit its type."""
+
+
+def _to_json_type(spec):
+    """Translate one INVOICE_SCHEMA example value into a JSON Schema node."""
+    if isinstance(spec, list):
+        return {"type": "array", "items": _to_json_type(spec[0]) if spec else {}}
+    if isinstance(spec, dict):
+        return {
+            "type": "object",
+            "properties": {k: _to_json_type(v) for k, v in spec.items()},
+            "required": list(spec.keys()),
+        }
+    if spec == "float":
+        return {"type": "number"}
+    if spec == "integer":
+        return {"type": "integer"}
+    if spec == "YYYY-MM-DD":
+        return {"type": "string", "format": "date"}
+    return {"type": "string"}
+
+
+def json_schema(schema: dict = None) -> dict:
+    """Build a JSON Schema for one invoice from the example-style INVOICE_SCHEMA."""
+    return _to_json_type(schema if schema is not None else settings.INVOICE_SCHEMA)
+
+
+def batch_json_schema(schema: dict = None) -> dict:
+    """JSON Schema for a batch reply: {"invoices": [invoice, ...]}."""
+    return {
+        "type": "object",
+        "properties": {"invoices": {"type": "array", "items": json_schema(schema)}},
+        "required": ["invoices"],
+    }
+
+
+def _parse_amount(text: str) -> float:
+    s = text.strip().replace("$", "").replace("USD", "").replace(" ", "").replace(",", "")
+    if not _AMOUNT_RE.match(s):
+        raise Invalid(f"not a number: {text!r}")
+    negative = s.startswith("(") and s.endswith(")")
+    value = float(s.strip("()"))
+    return -value if negative else value
+
+
+def to_float(value):
+    """Coerce "$1,234.50", "(5.00)" or "10.00, 5.00" (a list of amounts, summed) to a float.
+
+    Digits grouped in threes after a comma ("1, 234.50") are one number,
+    never a list.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        if not value.strip():
+            return ""
+        if _THOUSANDS_RE.match(value.strip()):
+            return _parse_amount(value)
+        parts = re.split(r',\s+|\s*\+\s*', value.strip())
+        if len(parts) > 1:
+            return round(sum(_parse_amount(p) for p in parts), 2)
+        return _parse_amount(value)
+    raise Invalid(f"not a number: {value!r}")
+
+
+def to_int(value):
+    """Coerce "3", 3.0, "three" or "a dozen" to an int."""
+    if value is None:
+        return ""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        raise Invalid(f"not an integer: {value!r}")
+    if isinstance(value, str):
+        s = value.strip().lower()
+        if not s:
+            return ""
+        if re.match(r'^-?\d+(\.0+)?$', s.replace(",", "")):
+            return int(float(s.replace(",", "")))
+        words = [w for w in re.split(r'[\s-]+', s) if w not in ("x", "qty", "pcs", "each", "ea")]
+        if words:
+            return _number_words(words, value)
+    raise Invalid(f"not an integer: {value!r}")
+
+
+def _number_words(words: list, value) -> int:
+    """Add up "twenty one", "one hundred and five" or "two dozen"; Invalid if it isn't a number."""
+    total, current, last = 0, 0, None
+    for w in words:
+        if w == "and" and last is not None:
+            continue
+        if w in NUMBER_WORDS:
+            n = NUMBER_WORDS[w]
+            # "three four" or "twenty twelve" are not numbers
+            if last == "unit" or (last == "tens" and not 1 <= n <= 9):
+                raise Invalid(f"not an integer: {value!r}")
+            current, last = current + n, "unit"
+        elif w in TENS_WORDS:
+            if last in ("unit", "tens"):
+                raise Invalid(f"not an integer: {value!r}")
+            current, last = current + TENS_WORDS[w], "tens"
+        elif w in MULTIPLIER_WORDS:
+            m = MULTIPLIER_WORDS[w]
+            if m >= 1000:
+                total, current = total + (current or 1) * m, 0
+            else:
+                current = (current or 1) * m
+            last = "multiplier"
+        else:
+            raise Invalid(f"not an integer: {value!r}")
+    if last is None:
+        raise Invalid(f"not an integer: {value!r}")
+    return total + current
+
+
+def to_date(value):
+    """Coerce a date string to YYYY-MM-DD."""
+    if value is None:
+        return ""
+    s = str(value).strip()
+    if not s:
+        return ""
+    iso = normalize_date(s)
+    if _ISO_DATE_RE.match(iso):
+        return iso
+    for fmt in EXTRA_DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise Invalid(f"not a date: {value!r}")
+
+
+def to_string(value):
+    """Coerce a scalar to a stripped string."""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        raise Invalid(f"not a string: {value!r}")
+    return str(value).strip()
+
+
+def _coercer_for(spec):
+    if spec == "float":
+        return to_float
+    if spec == "integer":
+        return to_int
+    if spec == "YYYY-MM-DD":
+        return to_date
+    return to_string
+
+
+def compile_validator(schema: dict = None, required: tuple = None):
+    """Compile INVOICE_SCHEMA into a fast validate(data) -> (clean, errors) function."""
+    schema = schema if schema is not None else settings.INVOICE_SCHEMA
+    required = tuple(required if required is not None else settings.SCHEMA_REQUIRED_FIELDS)
+
+    fields = []
+    item_fields = []
+    for key, spec in schema.items():
+        if isinstance(spec, list):
+            item_spec = spec[0] if spec else {}
+            item_fields = [(k, _coercer_for(v)) for k, v in item_spec.items()]
+            fields.append((key, None))
+        else:
+            fields.append((key, _coercer_for(spec)))
+
+    def validate(data: dict):
+        if not isinstance(data, dict):
+            return None, ["not a JSON object"]
+
+        source = dict(data)
+        for alias, canonical in KEY_ALIASES.items():
+            if alias in source:
+                value = source.pop(alias)
+                if canonical not in source or source[canonical] in ("", None):
+                    source[canonical] = value
+
+        clean = {}
+        errors = []
+        for key, coerce in fields:
+            value = source.pop(key, None)
+            if coerce is None:
+                items = []
+                if value not in (None, "") and not isinstance(value, list):
+                    errors.append(f"{key}: not a list")
+                    value = []
+                for i, item in enumerate(value or []):
+                    if not isinstance(item, dict):
+                        errors.append(f"{key}[{i}]: not an object")
+                        continue
+                    clean_item = {}
+                    for item_key, item_coerce in item_fields:
+                        try:
+                            clean_item[item_key] = item_coerce(item.get(item_key))
+                        except Invalid as e:
+                            errors.append(f"{key}[{i}].{item_key}: {e}")
+                            clean_item[item_key] = item.get(item_key)
+                    items.append(clean_item)
+                clean[key] = items
+                continue
+
+            try:
+                clean[key] = coerce(value)
+            except Invalid as e:
+                errors.append(f"{key}: {e}")
+                clean[key] = value
+
+        for key in required:
+            if clean.get(key) == "":
+                errors.append(f"{key}: missing")
+
+        # Keep private (_file_paths, ...) and extra keys untouched
+        clean.update(source)
+        return clean, errors
+
+    return validate
+
+
+_validator = None
+
+
+def validate(data: dict):
+    """Validate and coerce an invoice dict against INVOICE_SCHEMA.
+
+    Returns:
+        (clean, errors) - clean is the coerced dict, errors a list of
+        human-readable problems (empty when the invoice is valid).
+    """
+    global _validator
+    if _validator is None:
+        _validator = compile_validator()
+    return _validator(data)
+
+
+def record_rejection(data, errors: list, source: str = ""):
+    """Append an invoice that failed validation to the rejected log for review."""
+    entry = {
+        "rejected_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source": source,
+        "errors": errors,
+        "data": data,
+    }
+    os.makedirs(os.path.dirname(settings.REJECTED_FILE) or ".", exist_ok=True)
+    with open(settings.REJECTED_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, default=str) + "\n")
+    logger.warning("[SCHEMA] Rejected (%s): %s", source, '; '.join(errors))
@@ -1,9 +1,14 @@
 """Vendor-specific invoice parsing."""
+import logging
 import re
 
 from src.config import settings
+from src.processors import line_items
+from src.utils import metrics
 from src.utils.date_utils import normalize_date
 
+logger = logging.getLogger(__name__)
+
 VENDOR_PARSERS = {}
 
 
@@ -79,7 +84,7 @@ def parse_mcmaster_carr(text: str) -> dict:
     for match in re.finditer(item_pattern, text, re.MULTILINE):
         item_name = f"{match.group(2)} {match.group(3).strip()}"
         quantity = int(match.group(4))
-        price = float(match.group(6).replace(',', ''))
+        price = float(match.group(5).replace(',', ''))
         data["items"].append({
             "item_name": item_name,
             "quantity": quantity,
@@ -89,11 +94,21 @@ def parse_mcmaster_carr(text: str) -> dict:
     return data
 
 
-def parse(text: str, vendor_key: str = None) -> dict:
-    """Parse invoice text using vendor-specific parser."""
+@metrics.timed("vendor_parse")
+def parse(text: str, vendor_key: str = None, pdf_paths: list = None) -> dict:
+    """Parse invoice text using vendor-specific parser.
+
+    Line items come from the item table when one is found (see
+    line_items), else from the parser's own regex.
+    """
     if vendor_key and vendor_key in VENDOR_PARSERS:
-        print(f"[VENDOR PARSER] {vendor_key}")
-        return VENDOR_PARSERS[vendor_key](text)
+        logger.debug("[VENDOR PARSER] %s", vendor_key)
+        raw = VENDOR_PARSERS[vendor_key](text)
+        if settings.LINE_ITEM_TABLES_ENABLED:
+            items = line_items.extract(vendor_key, text, pdf_paths)
+            if items:
+                raw["items"] = items
+        return raw
     return None
 
 
@@ -108,6 +123,7 @@ def normalize_to_schema(raw: dict) -> dict:
         "purchase_date": normalize_date(raw.get("dates", [""])[0]) if raw.get("dates") else "",
         "mail_received_time": "",
         "purchase_receiver": raw.get("customer_info", {}).get("name", raw.get("ordered_by", "")),
+        "order_number": raw.get("order_number", [""])[0] if raw.get("order_number") else "",
         "total_price": raw.get("total_amount", [""])[0] if raw.get("total_amount") else "",
         "sum of other_expanses": ", ".join(raw.get("shipping", [])) if raw.get("shipping") else "",
         "items": raw.get("items", [])
@@ -0,0 +1,462 @@
+"""Sharded archive for processed invoice files (OLD_INVOICE_DIR).
+
+With ARCHIVE_LAYOUT = 'sharded' each group gets its own directory:
+
+    <root>/<year>/<month>/<vendor>/<group>/<files>
+
+so no directory grows past one vendor-month. Year and month come from
+the purchase date (else the email's timestamp in the group name), the
+vendor from the stored company name. 'flat' keeps the old single
+directory.
+
+With ARCHIVE_BUNDLE_TEXT the email .txt files are packed into per-month
+zstd bundles, ``<root>/<year>/<month>/text-0001.zst``, one compressed
+frame per file, so any one file is read back with a seek and a single
+frame decompression. ``<root>/index.db`` records where each bundled file
+and each group directory is.
+
+Archiving a group is all-or-nothing: its files are moved into
+``<root>/.staging/<group>/`` and the directory is renamed into its shard
+in one step, then the directories involved are fsynced (once per batch
+when ``ArchiveWorker`` archives in the background). A crash before the rename leaves the group in staging, and
+``recover()`` (run when the archive is opened) moves it back to the
+directory it came from (noted in ``<group>.origin``), to be archived
+again on the next run.
+"""
+import contextlib
+import logging
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from src.config import settings
+from src.processors import file_handler
+from src.utils import log, metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_FILE = "index.db"
+STAGING_DIR = ".staging"
+_ORIGIN_EXT = ".origin"
+_BUNDLE_RE = re.compile(r"text-(\d+)\.zst$")
+_GROUP_TS_RE = re.compile(r"_(\d{13})$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bundled (
+    group_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    bundle TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (group_key, name)
+);
+CREATE INDEX IF NOT EXISTS idx_bundled_bundle ON bundled(bundle, name);
+CREATE TABLE IF NOT EXISTS groups (
+    group_key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    archived_at TEXT NOT NULL
+);
+"""
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("ARCHIVE_BUNDLE_TEXT needs zstandard: pip install zstandard")
+
+
+def vendor_slug(name: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", (name or "").lower()).strip("-")
+    return slug[:40].rstrip("-") or "unknown"
+
+
+def shard_for(group: str, result: dict = None) -> str:
+    """Relative shard directory ``<year>/<month>/<vendor>`` for a group."""
+    result = result or {}
+    day = None
+    try:
+        day = datetime.strptime(str(result.get("purchase_date") or "")[:10], "%Y-%m-%d")
+    except ValueError:
+        match = _GROUP_TS_RE.search(group)
+        if match:
+            day = datetime.fromtimestamp(int(match.group(1)) / 1000)
+    day = day or datetime.now()
+    return os.path.join(f"{day.year:04d}", f"{day.month:02d}", vendor_slug(result.get("company_name")))
+
+
+def _move(src: str, dst: str):
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # Different filesystem: no atomic rename, fall back to copy + delete
+        shutil.move(src, dst)
+
+
+def fsync_dir(path: str):
+    """Flush a directory's entries (renames into and out of it) to disk."""
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Not supported for directories on this platform (Windows)
+        pass
+    finally:
+        os.close(fd)
+
+
+class Archive:
+    """Sharded archive rooted at ``root``, with its bundle index."""
+
+    def __init__(self, root: str = None, layout: str = None, bundle_text: bool = None):
+        self.root = root or settings.OLD_INVOICE_DIR
+        self.layout = layout or settings.ARCHIVE_LAYOUT
+        self.bundle_text = settings.ARCHIVE_BUNDLE_TEXT if bundle_text is None else bundle_text
+        if self.bundle_text:
+            _require_zstandard()
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.conn = sqlite3.connect(os.path.join(self.root, INDEX_FILE), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.recover()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # -- writing -------------------------------------------------------------
+
+    def _touched(self, *dirs):
+        """Record directories whose entries changed; synced now, or at the end of batch()."""
+        if not settings.ARCHIVE_FSYNC:
+            return
+        pending = getattr(self._local, "dirty", None)
+        if pending is None:
+            for d in dict.fromkeys(dirs):
+                fsync_dir(d)
+        else:
+            pending.update(dirs)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Defer directory fsyncs inside the block to one pass over every directory touched."""
+        if getattr(self._local, "dirty", None) is not None:
+            yield
+            return
+        self._local.dirty = set()
+        try:
+            yield
+        finally:
+            dirty, self._local.dirty = self._local.dirty, None
+            for d in sorted(dirty, key=len, reverse=True):
+                fsync_dir(d)
+
+    def _archive_flat(self, paths: list) -> list:
+        archived = []
+        for p in paths:
+            target, identical = file_handler.archive_target(p, self.root)
+            if identical:
+                os.remove(p)
+            else:
+                _move(p, target)
+            archived.append(target)
+        self._touched(self.root, *{os.path.dirname(os.path.abspath(p)) for p in paths})
+        return archived
+
+    def archive_group(self, group: str, paths: list, result: dict = None) -> list:
+        """Move a group's files into the archive.
+
+        Args:
+            group: Group basename.
+            paths: The group's files (in the invoice directory).
+            result: Stored invoice (company_name, purchase_date) for the shard.
+
+        Returns:
+            Archived locations: file paths, and ``<bundle>#<name>`` for
+            bundled text files.
+        """
+        if not paths:
+            return []
+        if self.layout != "sharded" or not group:
+            return self._archive_flat(paths)
+
+        with self._lock:
+            staging = os.path.join(self.root, STAGING_DIR, group)
+            os.makedirs(staging, exist_ok=True)
+            with open(staging + _ORIGIN_EXT, "w", encoding="utf-8") as f:
+                f.write(os.path.dirname(os.path.abspath(paths[0])))
+
+            texts = [p for p in paths if self.bundle_text and p.lower().endswith(".txt")]
+            shard = shard_for(group, result)
+            try:
+                for p in paths:
+                    if p not in texts:
+                        _move(p, os.path.join(staging, os.path.basename(p)))
+                entries = [self._append_text(shard, group, p) for p in texts]
+            except Exception:
+                self._restore(group)
+                raise
+
+            dest = os.path.join(self.root, shard, group)
+            if os.path.isdir(dest):
+                # Archived before (a retry of a crashed run): merge into it
+                for name in sorted(os.listdir(staging)):
+                    staged = os.path.join(staging, name)
+                    target, identical = file_handler.archive_target(staged, dest)
+                    if identical:
+                        os.remove(staged)
+                    else:
+                        os.replace(staged, target)
+                os.rmdir(staging)
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.rename(staging, dest)
+            os.remove(staging + _ORIGIN_EXT)
+            self._touched(dest, os.path.dirname(dest), os.path.dirname(staging),
+                          *{os.path.dirname(os.path.abspath(p)) for p in paths})
+
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO groups (group_key, path, archived_at) VALUES (?, ?, ?)",
+                                  (group, os.path.relpath(dest, self.root), now))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO bundled (group_key, name, bundle, offset, length, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", entries)
+            for p in texts:
+                os.remove(p)
+
+        archived = [os.path.join(dest, n) for n in sorted(os.listdir(dest))]
+        archived += [f"{os.path.join(self.root, e[2])}#{e[1]}" for e in entries]
+        return archived
+
+    def _bundle_for(self, shard: str) -> str:
+        """Current bundle (relative path) for the shard's month, starting a new one when full."""
+        month_dir = os.path.dirname(shard)
+        directory = os.path.join(self.root, month_dir)
+        os.makedirs(directory, exist_ok=True)
+        numbers = [int(m.group(1)) for m in map(_BUNDLE_RE.match, os.listdir(directory)) if m]
+        number = max(numbers, default=1)
+        path = os.path.join(directory, f"text-{number:04d}.zst")
+        if os.path.exists(path) and os.path.getsize(path) >= settings.ARCHIVE_BUNDLE_MAX_BYTES:
+            path = os.path.join(directory, f"text-{number + 1:04d}.zst")
+        return os.path.relpath(path, self.root)
+
+    def _append_text(self, shard: str, group: str, path: str) -> tuple:
+        with open(path, "rb") as f:
+            data = f.read()
+        frame = zstandard.ZstdCompressor(level=settings.ARCHIVE_ZSTD_LEVEL).compress(data)
+        bundle = self._bundle_for(shard)
+        with open(os.path.join(self.root, bundle), "ab") as f:
+            offset = f.tell()
+            f.write(frame)
+            f.flush()
+            os.fsync(f.fileno())
+        return (group, os.path.basename(path), bundle, offset, len(frame), len(data))
+
+    def _restore(self, group: str) -> str:
+        """Move a staged group back to the directory it came from; returns that directory."""
+        staging = os.path.join(self.root, STAGING_DIR, group)
+        origin = settings.INVOICE_DIR
+        if os.path.exists(staging + _ORIGIN_EXT):
+            with open(staging + _ORIGIN_EXT, encoding="utf-8") as f:
+                origin = f.read().strip() or origin
+        os.makedirs(origin, exist_ok=True)
+        for name in os.listdir(staging):
+            target = os.path.join(origin, name)
+            if os.path.exists(target):
+                os.remove(os.path.join(staging, name))
+            else:
+                _move(os.path.join(staging, name), target)
+        os.rmdir(staging)
+        if os.path.exists(staging + _ORIGIN_EXT):
+            os.remove(staging + _ORIGIN_EXT)
+        return origin
+
+    def recover(self) -> int:
+        """Move groups left in staging by a crash back to where they came from; returns how many."""
+        staging_root = os.path.join(self.root, STAGING_DIR)
+        if not os.path.isdir(staging_root):
+            return 0
+        recovered = 0
+        for name in sorted(os.listdir(staging_root)):
+            path = os.path.join(staging_root, name)
+            if os.path.isdir(path):
+                origin = self._restore(name)
+                recovered += 1
+                logger.warning("[ARCHIVE] Recovered half-archived group %s back to %s", name, origin)
+            elif name.endswith(_ORIGIN_EXT) and os.path.exists(path) and not os.path.isdir(path[:-len(_ORIGIN_EXT)]):
+                os.remove(path)
+        return recovered
+
+    # -- reading -------------------------------------------------------------
+
+    def locate(self, group: str) -> str:
+        """Directory holding an archived group's files, or None."""
+        with self._lock:
+            row = self.conn.execute("SELECT path FROM groups WHERE group_key = ?", (group,)).fetchone()
+        return os.path.join(self.root, row["path"]) if row else None
+
+    def groups(self) -> dict:
+        """Every archived group -> its archived locations (sharded, bundled and flat files)."""
+        out = {}
+        for base, paths in file_handler.get_invoice_files(invoice_dir=self.root).items():
+            out.setdefault(base, []).extend(sorted(paths))
+        with self._lock:
+            rows = self.conn.execute("SELECT group_key, path FROM groups").fetchall()
+            bundled = self.conn.execute("SELECT group_key, name, bundle FROM bundled ORDER BY rowid").fetchall()
+        for row in rows:
+            directory = os.path.join(self.root, row["path"])
+            if os.path.isdir(directory):
+                out.setdefault(row["group_key"], []).extend(
+                    os.path.join(directory, n) for n in sorted(os.listdir(directory)))
+        for row in bundled:
+            out.setdefault(row["group_key"], []).append(f"{os.path.join(self.root, row['bundle'])}#{row['name']}")
+        return out
+
+    def read_bundled(self, ref: str) -> str:
+        """Text of a ``<bundle>#<name>`` location."""
+        _require_zstandard()
+        bundle_path, name = ref.rsplit("#", 1)
+        bundle = os.path.relpath(bundle_path, self.root)
+        with self._lock:
+            row = self.conn.execute("SELECT offset, length, size FROM bundled WHERE bundle = ? AND name = ?",
+                                    (bundle, name)).fetchone()
+        if row is None:
+            raise FileNotFoundError(ref)
+        with open(bundle_path, "rb") as f:
+            f.seek(row["offset"])
+            frame = f.read(row["length"])
+        data = zstandard.ZstdDecompressor().decompress(frame, max_output_size=row["size"])
+        return data.decode("utf-8", errors="replace")
+
+    def read(self, location: str) -> str:
+        if "#" in location and _BUNDLE_RE.search(location.rsplit("#", 1)[0]):
+            return self.read_bundled(location)
+        return file_handler.read_file(location)
+
+    def group_content(self, locations: list) -> str:
+        """combine_content() for archived locations, bundled text included."""
+        content = ""
+        for location in locations:
+            text = self.read(location)
+            if text:
+                content += f"\n--- {os.path.basename(location.rsplit('#', 1)[-1])} ---\n{text}\n"
+        return content
+
+
+_STOP = object()
+
+
+class ArchiveWorker:
+    """Archives groups on a background thread so processing never waits on the disk.
+
+    Submitted groups are archived in batches of up to ARCHIVE_BATCH_SIZE
+    (or whatever arrived within ARCHIVE_BATCH_SECONDS), with one fsync per
+    directory touched by the batch. ``done(archived, error)`` is called
+    for each group once its batch is on disk.
+    """
+
+    def __init__(self, archive: Archive = None, batch_size: int = None, batch_seconds: float = None):
+        self.archive = archive or get_archive()
+        self.batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+        self.batch_seconds = settings.ARCHIVE_BATCH_SECONDS if batch_seconds is None else batch_seconds
+        self.archived = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=settings.ARCHIVE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="archive-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, group: str, paths: list, result: dict = None, done=None):
+        """Queue a group for archiving (blocks only while the queue is full)."""
+        self._queue.put((group, paths, result, done))
+
+    def close(self):
+        """Archive everything submitted so far and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _next_batch(self) -> tuple:
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.batch_seconds
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        log.set_stage("archive")
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                self._archive(batch)
+
+    @metrics.timed("archive_batch")
+    def _archive(self, batch: list):
+        outcomes = []
+        try:
+            with self.archive.batch():
+                for group, paths, result, done in batch:
+                    try:
+                        outcomes.append((done, self.archive.archive_group(group, paths, result), None))
+                    except Exception as e:
+                        outcomes.append((done, None, e))
+        except Exception as e:
+            # The batch's fsync failed: nothing in it is known to be on disk
+            outcomes = [(done, None, e) for _, _, _, done in batch]
+
+        for done, archived, error in outcomes:
+            if error is None:
+                self.archived += 1
+            else:
+                self.failed += 1
+            if done is not None:
+                try:
+                    done(archived, error)
+                except Exception as e:
+                    logger.warning("[ARCHIVE] Callback failed: %s", e)
+        metrics.count("archive_batches")
+        metrics.count("archived_groups", sum(1 for _, _, error in outcomes if error is None))
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> Archive:
+    """Return the process-wide archive for settings.OLD_INVOICE_DIR."""
+    global _archive
+    with _archive_lock:
+        if _archive is None or _archive.root != settings.OLD_INVOICE_DIR:
+            _archive = Archive(settings.OLD_INVOICE_DIR)
+        return _archive
@@ -0,0 +1,245 @@
+"""Content-addressed store for attachment bytes and their extracted text.
+
+Attachments are written once to BLOB_DIR as ``<sha256[:2]>/<sha256><ext>``
+and hardlinked into each message group that carries them, so a vendor's
+standard terms PDF or an invoice re-attached down a reply chain takes
+disk space once however many groups (in INVOICE_DIR or the archive)
+reference it. Where hardlinks aren't supported the group gets a copy.
+
+Text extracted from a file is cached next to its blob as
+``<sha256>.text``, keyed by content, so identical PDFs are extracted once.
+
+A blob's link count is its reference count: ``gc()`` removes blobs no
+group links to any more (and cached text whose blob is gone), after
+BLOB_GC_GRACE_SECONDS so a blob written a moment before being linked is
+never collected.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from src.config import settings
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_TEXT_EXT = ".text"
+_CHUNK = 1024 * 1024
+
+
+def _root(root: str = None) -> str:
+    return root or settings.BLOB_DIR
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def blob_path(digest: str, ext: str = "", root: str = None) -> str:
+    return os.path.join(_root(root), digest[:2], digest + ext.lower())
+
+
+def _write_atomic(path: str, data: bytes):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def put(data: bytes, ext: str = "", root: str = None) -> str:
+    """Store ``data`` (once) and return its blob path."""
+    path = blob_path(digest_bytes(data), ext, root)
+    if os.path.exists(path):
+        metrics.count("blob_dedup_hits")
+        metrics.count("blob_dedup_bytes", len(data))
+        os.utime(path)
+    else:
+        _write_atomic(path, data)
+    return path
+
+
+def link(blob: str, target: str):
+    """Make ``target`` refer to ``blob``: a hardlink, or a copy where links aren't possible."""
+    try:
+        os.link(blob, target)
+    except OSError:
+        shutil.copyfile(blob, target)
+
+
+def save(data: bytes, target: str, root: str = None) -> str:
+    """Write attachment bytes to ``target`` through the store; returns the blob path."""
+    blob = put(data, os.path.splitext(target)[1], root)
+    link(blob, target)
+    return blob
+
+
+def same_content(a: str, b: str) -> bool:
+    """True if the two files are the same blob or hold identical bytes."""
+    try:
+        if os.path.samefile(a, b):
+            return True
+        return os.path.getsize(a) == os.path.getsize(b) and digest_file(a) == digest_file(b)
+    except OSError:
+        return False
+
+
+def cached_text(path: str, extract, root: str = None) -> str:
+    """Text of ``path``, extracted once per distinct file content.
+
+    ``extract(path)`` returns (text, complete); incomplete text (a page
+    whose OCR failed or timed out) is returned but not cached, so the
+    next read tries again.
+    """
+    try:
+        digest = digest_file(path)
+    except OSError:
+        return extract(path)[0]
+
+    text_path = blob_path(digest, _TEXT_EXT, root)
+    try:
+        with open(text_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        metrics.count("blob_text_hits")
+        return text
+    except FileNotFoundError:
+        pass
+
+    text, complete = extract(path)
+    if not complete or not (text or "").strip():
+        # OCR failed, or nothing extracted (a scan without OCR available): try again next time
+        return text
+    try:
+        _write_atomic(text_path, (text or "").encode("utf-8"))
+    except OSError as e:
+        logger.warning("[BLOB] Could not cache text for %s: %s", path, e)
+    return text
+
+
+def _iter_blobs(root: str):
+    if not os.path.isdir(root):
+        return
+    for shard in sorted(os.listdir(root)):
+        shard_dir = os.path.join(root, shard)
+        if len(shard) != 2 or not os.path.isdir(shard_dir):
+            continue
+        for name in sorted(os.listdir(shard_dir)):
+            if not name.startswith(".tmp-"):
+                yield os.path.join(shard_dir, name)
+
+
+def usage(root: str = None) -> dict:
+    """Space accounting for the store.
+
+    Returns:
+        Dict with blob counts, ``stored_bytes`` (on disk once),
+        ``referenced_bytes`` (what every linking group would take as
+        separate copies) and ``saved_bytes`` (the difference).
+    """
+    out = {"blobs": 0, "unreferenced": 0, "references": 0, "texts": 0,
+           "stored_bytes": 0, "referenced_bytes": 0, "saved_bytes": 0, "text_bytes": 0}
+    for path in _iter_blobs(_root(root)):
+        st = os.stat(path)
+        if path.endswith(_TEXT_EXT):
+            out["texts"] += 1
+            out["text_bytes"] += st.st_size
+            continue
+        refs = st.st_nlink - 1
+        out["blobs"] += 1
+        out["references"] += refs
+        out["stored_bytes"] += st.st_size
+        out["referenced_bytes"] += st.st_size * refs
+        if refs <= 0:
+            out["unreferenced"] += 1
+    out["saved_bytes"] = max(out["referenced_bytes"] - out["stored_bytes"], 0)
+    return out
+
+
+def gc(root: str = None, grace_seconds: float = None, now: float = None, dry_run: bool = False) -> dict:
+    """Delete blobs no group links to, and cached text whose blob is gone.
+
+    Args:
+        root: Store directory (default BLOB_DIR).
+        grace_seconds: Keep anything modified more recently than this
+            (default BLOB_GC_GRACE_SECONDS).
+        now: Current time, for tests.
+        dry_run: Only report what would be deleted.
+
+    Returns:
+        {'blobs': n, 'texts': n, 'bytes': n} removed.
+    """
+    grace = settings.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    cutoff = (time.time() if now is None else now) - grace
+    # Blobs before texts, so the text of a blob collected now goes in the same pass
+    paths = sorted(_iter_blobs(_root(root)), key=lambda p: p.endswith(_TEXT_EXT))
+    digests = {os.path.basename(p).split(".", 1)[0] for p in paths if not p.endswith(_TEXT_EXT)}
+
+    removed = {"blobs": 0, "texts": 0, "bytes": 0}
+    for path in paths:
+        st = os.stat(path)
+        if st.st_mtime > cutoff:
+            continue
+        if path.endswith(_TEXT_EXT):
+            digest = os.path.basename(path)[:-len(_TEXT_EXT)]
+            if digest in digests:
+                continue
+            kind = "texts"
+        elif st.st_nlink <= 1:
+            digests.discard(os.path.basename(path).split(".", 1)[0])
+            kind = "blobs"
+        else:
+            continue
+        if not dry_run:
+            os.remove(path)
+        removed[kind] += 1
+        removed["bytes"] += st.st_size
+    return removed
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def format_usage(stats: dict) -> str:
+    return (f"{stats['blobs']} blob(s), {stats['references']} reference(s), "
+            f"{stats['unreferenced']} unreferenced; stored {_fmt_bytes(stats['stored_bytes'])}, "
+            f"saved {_fmt_bytes(stats['saved_bytes'])}; {stats['texts']} cached text(s) "
+            f"({_fmt_bytes(stats['text_bytes'])})")
+
+
+def add_arguments(parser):
+    """Add the blobs command's arguments to ``parser``."""
+    parser.add_argument("--gc", action="store_true", help="delete blobs no invoice group references")
+    parser.add_argument("--dry-run", action="store_true", help="with --gc, only report what would be deleted")
+
+
+def run_blobs(opts) -> dict:
+    """Print the store's space savings, optionally collecting garbage first."""
+    if opts.gc:
+        removed = gc(dry_run=opts.dry_run)
+        verb = "Would remove" if opts.dry_run else "Removed"
+        print(f"{verb} {removed['blobs']} blob(s) and {removed['texts']} cached text(s), "
+              f"{_fmt_bytes(removed['bytes'])}")
+    stats = usage()
+    print(format_usage(stats))
+    return stats
@@ -0,0 +1,689 @@
+"""Local SQLite invoice warehouse - the system of record for extracted invoices.
+
+Google Sheets is a view that is synced from here, so dedupe, lookups and
+reporting never need a network round trip.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from src.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    mail_thread_id TEXT NOT NULL DEFAULT '',
+    company_name TEXT NOT NULL DEFAULT '',
+    purchase_date TEXT NOT NULL DEFAULT '',
+    mail_received_time TEXT NOT NULL DEFAULT '',
+    purchase_receiver TEXT NOT NULL DEFAULT '',
+    order_number TEXT NOT NULL DEFAULT '',
+    total_price REAL,
+    other_expenses REAL,
+    content_hash TEXT NOT NULL,
+    group_key TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    sheet_synced INTEGER NOT NULL DEFAULT 0,
+    sheet_row INTEGER,
+    sheet_hash TEXT,
+    sheet_pending_hash TEXT,
+    sheet_conflict INTEGER NOT NULL DEFAULT 0,
+    duplicate_of INTEGER REFERENCES invoices(id),
+    duplicate_reason TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_thread
+    ON invoices(mail_thread_id) WHERE mail_thread_id != '';
+CREATE INDEX IF NOT EXISTS idx_invoices_vendor ON invoices(company_name);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(purchase_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_hash ON invoices(content_hash);
+CREATE INDEX IF NOT EXISTS idx_invoices_order ON invoices(order_number) WHERE order_number != '';
+CREATE INDEX IF NOT EXISTS idx_invoices_unsynced ON invoices(sheet_synced) WHERE sheet_synced = 0;
+
+CREATE TABLE IF NOT EXISTS line_items (
+    id INTEGER PRIMARY KEY,
+    invoice_id INTEGER NOT NULL REFERENCES invoices(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    item_name TEXT NOT NULL DEFAULT '',
+    quantity INTEGER,
+    price REAL
+);
+CREATE INDEX IF NOT EXISTS idx_line_items_invoice ON line_items(invoice_id);
+
+CREATE TABLE IF NOT EXISTS invoice_minhash (
+    invoice_id INTEGER PRIMARY KEY REFERENCES invoices(id) ON DELETE CASCADE,
+    signature BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    invoice_id INTEGER NOT NULL REFERENCES invoices(id) ON DELETE CASCADE,
+    PRIMARY KEY (band, bucket, invoice_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS processed_groups (
+    group_key TEXT PRIMARY KEY,
+    invoice_id INTEGER REFERENCES invoices(id) ON DELETE SET NULL,
+    processed_at TEXT NOT NULL
+);
+"""
+
+# Columns added after the first release; created on older databases by _migrate()
+ADDED_COLUMNS = {
+    "order_number": "TEXT NOT NULL DEFAULT ''",
+    "duplicate_of": "INTEGER REFERENCES invoices(id)",
+    "duplicate_reason": "TEXT NOT NULL DEFAULT ''",
+    "sheet_row": "INTEGER",
+    "sheet_hash": "TEXT",
+    "sheet_pending_hash": "TEXT",
+    "sheet_conflict": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Full-text index over invoice text and line items; rowid = invoices.id
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5(
+    vendor, items, content, files UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+# bm25 weights for (vendor, items, content, files)
+SEARCH_WEIGHTS = (4.0, 8.0, 1.0, 0.0)
+
+INVOICE_FIELDS = [
+    "mail_thread_id", "company_name", "purchase_date", "mail_received_time",
+    "purchase_receiver", "order_number", "total_price", "other_expenses",
+]
+
+
+def _number(value):
+    """Store "" / None as NULL, everything else as a float."""
+    if value in ("", None):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _integer(value):
+    if value in ("", None):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def content_hash(data: dict) -> str:
+    """Stable hash of an invoice's business content (ignores thread ID and timestamps)."""
+    items = [
+        [str(i.get("item_name", "")), _integer(i.get("quantity")), _number(i.get("price"))]
+        for i in data.get("items", []) if isinstance(i, dict)
+    ]
+    key = [
+        str(data.get("company_name", "")).strip().lower(),
+        str(data.get("purchase_date", "")),
+        _number(data.get("total_price")),
+        _number(data.get("other_expenses", data.get("sum of other_expanses"))),
+        items,
+    ]
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class InvoiceStore:
+    """SQLite (WAL mode) store with normalized invoices and line_items tables.
+
+    One connection is shared by all threads and guarded by a lock, which
+    is plenty for the pipeline's single writer.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.INVOICE_DB_FILE
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(SEARCH_SCHEMA)
+            self.has_search = True
+        except sqlite3.OperationalError:
+            self.has_search = False
+
+    def _migrate(self):
+        """Add columns missing from databases created by older versions."""
+        existing = {r[1] for r in self.conn.execute("PRAGMA table_info(invoices)")}
+        if not existing:
+            return
+        with self.conn:
+            for name, decl in ADDED_COLUMNS.items():
+                if name not in existing:
+                    self.conn.execute(f"ALTER TABLE invoices ADD COLUMN {name} {decl}")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def save_invoice(self, data: dict, group_key: str = "") -> tuple:
+        """Insert an invoice and its line items and mark its group processed.
+
+        Everything happens in one transaction. Invoices whose thread ID is
+        already stored (or, without a thread ID, whose content hash is) are
+        not inserted again.
+
+        Returns:
+            (invoice_id, created) - created is False for duplicates.
+        """
+        tid = str(data.get("mail_thread_id", "") or "")
+        digest = content_hash(data)
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        with self._lock, self.conn:
+            row = None
+            if tid:
+                row = self.conn.execute(
+                    "SELECT id FROM invoices WHERE mail_thread_id = ?", (tid,)
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT id FROM invoices WHERE content_hash = ? AND mail_thread_id = ''", (digest,)
+                ).fetchone()
+
+            if row is not None:
+                invoice_id, created = row["id"], False
+            else:
+                cur = self.conn.execute(
+                    """INSERT INTO invoices (mail_thread_id, company_name, purchase_date,
+                           mail_received_time, purchase_receiver, order_number, total_price,
+                           other_expenses, content_hash, group_key, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        tid,
+                        str(data.get("company_name", "") or ""),
+                        str(data.get("purchase_date", "") or ""),
+                        str(data.get("mail_received_time", "") or ""),
+                        str(data.get("purchase_receiver", "") or ""),
+                        str(data.get("order_number", "") or ""),
+                        _number(data.get("total_price")),
+                        _number(data.get("other_expenses", data.get("sum of other_expanses"))),
+                        digest,
+                        group_key or "",
+                        now,
+                        now,
+                    ),
+                )
+                invoice_id, created = cur.lastrowid, True
+                self._insert_items(invoice_id, data)
+
+            if group_key:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO processed_groups (group_key, invoice_id, processed_at) "
+                    "VALUES (?, ?, ?)",
+                    (group_key, invoice_id, now),
+                )
+
+        return invoice_id, created
+
+    def _insert_items(self, invoice_id: int, data: dict):
+        self.conn.executemany(
+            "INSERT INTO line_items (invoice_id, position, item_name, quantity, price) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (invoice_id, pos, str(item.get("item_name", "") or ""),
+                 _integer(item.get("quantity")), _number(item.get("price")))
+                for pos, item in enumerate(data.get("items", []))
+                if isinstance(item, dict)
+            ],
+        )
+
+    def update_invoice(self, invoice_id: int, data: dict) -> bool:
+        """Replace a stored invoice's fields and line items (e.g. a correction).
+
+        The invoice is flagged for the next Sheets sync, which rewrites its
+        existing row in place. Returns False if the invoice doesn't exist.
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                """UPDATE invoices SET company_name = ?, purchase_date = ?, mail_received_time = ?,
+                       purchase_receiver = ?, order_number = ?, total_price = ?, other_expenses = ?,
+                       content_hash = ?, updated_at = ?, sheet_synced = 0
+                   WHERE id = ?""",
+                (
+                    str(data.get("company_name", "") or ""),
+                    str(data.get("purchase_date", "") or ""),
+                    str(data.get("mail_received_time", "") or ""),
+                    str(data.get("purchase_receiver", "") or ""),
+                    str(data.get("order_number", "") or ""),
+                    _number(data.get("total_price")),
+                    _number(data.get("other_expenses", data.get("sum of other_expanses"))),
+                    content_hash(data),
+                    now,
+                    invoice_id,
+                ),
+            )
+            if cur.rowcount == 0:
+                return False
+            self.conn.execute("DELETE FROM line_items WHERE invoice_id = ?", (invoice_id,))
+            self._insert_items(invoice_id, data)
+        return True
+
+    def has_thread(self, thread_id: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM invoices WHERE mail_thread_id = ?", (thread_id,)
+            ).fetchone() is not None
+
+    def thread_ids(self) -> set:
+        """All stored thread IDs."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT mail_thread_id FROM invoices WHERE mail_thread_id != ''"
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def is_group_processed(self, group_key: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM processed_groups WHERE group_key = ?", (group_key,)
+            ).fetchone() is not None
+
+    def group_invoice(self, group_key: str) -> dict:
+        """Vendor and purchase date of the invoice stored from ``group_key`` ({} if none)."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT i.company_name, i.purchase_date FROM processed_groups g "
+                "JOIN invoices i ON i.id = g.invoice_id WHERE g.group_key = ?", (group_key,)
+            ).fetchone()
+        return dict(row) if row else {}
+
+    def find_by_hash(self, digest: str) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM invoices WHERE content_hash = ?", (digest,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def get_invoice(self, invoice_id: int) -> dict:
+        """Load an invoice with its items in the extractor's dict format."""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
+            if row is None:
+                return None
+            items = self.conn.execute(
+                "SELECT item_name, quantity, price FROM line_items WHERE invoice_id = ? ORDER BY position",
+                (invoice_id,),
+            ).fetchall()
+
+        data = {k: row[k] for k in INVOICE_FIELDS}
+        for k in ("total_price", "other_expenses"):
+            if data[k] is None:
+                data[k] = ""
+        data["items"] = [
+            {
+                "item_name": i["item_name"],
+                "quantity": "" if i["quantity"] is None else i["quantity"],
+                "price": "" if i["price"] is None else i["price"],
+            }
+            for i in items
+        ]
+        data["_invoice_id"] = row["id"]
+        data["_created_at"] = row["created_at"]
+        data["_sheet_row"] = row["sheet_row"]
+        data["_sheet_hash"] = row["sheet_hash"]
+        data["_duplicate_of"] = row["duplicate_of"]
+        return data
+
+    def unsynced_ids(self) -> list:
+        """IDs of invoices not yet pushed to Google Sheets, oldest first.
+
+        Invoices whose sheet row was edited by hand are left out until the
+        conflict is cleared, and duplicates of another invoice are never synced.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM invoices WHERE sheet_synced = 0 AND sheet_conflict = 0 "
+                "AND duplicate_of IS NULL ORDER BY id"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def mark_synced(self, invoice_ids: list):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE invoices SET sheet_synced = 1 WHERE id = ?", [(i,) for i in invoice_ids]
+            )
+
+    def get_state(self, key: str, default=None):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, key: str, value):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value))
+            )
+
+    def thread_id_map(self) -> dict:
+        """Map thread ID -> invoice ID for every stored invoice with a thread ID."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT mail_thread_id, id FROM invoices WHERE mail_thread_id != ''"
+            ).fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def sheet_rows(self) -> dict:
+        """Map invoice ID -> (sheet_row, sheet_hash) for invoices placed in the sheet."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, sheet_row, sheet_hash FROM invoices WHERE sheet_row IS NOT NULL"
+            ).fetchall()
+        return {r[0]: (r[1], r[2]) for r in rows}
+
+    def set_sheet_rows(self, placements: list, next_row: int):
+        """Record where invoices already sit in the sheet.
+
+        Args:
+            placements: (invoice_id, sheet_row, sheet_hash) tuples.
+            next_row: First free sheet row.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE invoices SET sheet_row = ?, sheet_hash = ? WHERE id = ?",
+                [(row, digest, invoice_id) for invoice_id, row, digest in placements],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('next_row', ?)", (str(next_row),)
+            )
+
+    def set_sheet_hashes(self, hashes: list):
+        """Mark invoices synced with the given (invoice_id, sheet_hash) pairs."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE invoices SET sheet_hash = ?, sheet_synced = 1 WHERE id = ?",
+                [(digest, invoice_id) for invoice_id, digest in hashes],
+            )
+
+    def plan_sheet_writes(self, writes: list, next_row: int):
+        """Journal row writes before they are sent, so an interrupted sync can resume.
+
+        Args:
+            writes: (invoice_id, sheet_row, row_hash) tuples about to be written.
+            next_row: First free sheet row after the inserts.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE invoices SET sheet_row = ?, sheet_pending_hash = ? WHERE id = ?",
+                [(row, digest, invoice_id) for invoice_id, row, digest in writes],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('next_row', ?)", (str(next_row),)
+            )
+
+    def pending_sheet_writes(self) -> list:
+        """(invoice_id, sheet_row, pending_hash) for writes that were never confirmed."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, sheet_row, sheet_pending_hash FROM invoices "
+                "WHERE sheet_pending_hash IS NOT NULL ORDER BY id"
+            ).fetchall()
+        return [(r[0], r[1], r[2]) for r in rows]
+
+    def confirm_sheet_writes(self, invoice_ids: list):
+        """Mark journaled writes as landed in the sheet."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE invoices SET sheet_hash = sheet_pending_hash, sheet_pending_hash = NULL, "
+                "sheet_synced = 1 WHERE id = ? AND sheet_pending_hash IS NOT NULL",
+                [(i,) for i in invoice_ids],
+            )
+
+    def cancel_sheet_writes(self, invoice_ids: list):
+        """Drop journaled writes that did not land; they are retried on the next sync."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE invoices SET sheet_pending_hash = NULL, sheet_synced = 0 WHERE id = ?",
+                [(i,) for i in invoice_ids],
+            )
+
+    def mark_sheet_conflict(self, invoice_ids: list):
+        """Flag invoices whose sheet row was edited by hand; sync leaves them alone."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE invoices SET sheet_conflict = 1 WHERE id = ?", [(i,) for i in invoice_ids]
+            )
+
+    def conflict_ids(self) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM invoices WHERE sheet_conflict = 1 ORDER BY id"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def clear_sheet_conflict(self, invoice_id: int):
+        """Let the next sync overwrite a hand-edited row with the stored invoice."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE invoices SET sheet_conflict = 0, sheet_hash = NULL, sheet_synced = 0 WHERE id = ?",
+                (invoice_id,),
+            )
+
+    def changed_since(self, timestamp: str = None) -> list:
+        """IDs of invoices created or updated at or after ``timestamp`` (all if None)."""
+        with self._lock:
+            if timestamp is None:
+                rows = self.conn.execute("SELECT id FROM invoices ORDER BY id").fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT id FROM invoices WHERE updated_at >= ? ORDER BY id", (timestamp,)
+                ).fetchall()
+        return [r[0] for r in rows]
+
+    def fetch_rows(self, invoice_ids: list) -> tuple:
+        """Raw invoice and line-item rows for many invoices at once.
+
+        Returns:
+            (invoices, line_items) - lists of dicts; line items carry invoice_id
+            and position and are ordered by invoice then position.
+        """
+        invoices, items = [], []
+        ids = list(invoice_ids)
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                invoices.extend(dict(r) for r in self.conn.execute(
+                    f"SELECT * FROM invoices WHERE id IN ({marks}) ORDER BY id", chunk))
+                items.extend(dict(r) for r in self.conn.execute(
+                    f"SELECT invoice_id, position, item_name, quantity, price FROM line_items "
+                    f"WHERE invoice_id IN ({marks}) ORDER BY invoice_id, position", chunk))
+        return invoices, items
+
+    def save_minhash(self, invoice_id: int, signature: bytes, buckets: list):
+        """Store an invoice's MinHash signature and its LSH (band, bucket) keys."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO invoice_minhash (invoice_id, signature) VALUES (?, ?)",
+                (invoice_id, signature),
+            )
+            self.conn.execute("DELETE FROM lsh_buckets WHERE invoice_id = ?", (invoice_id,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (band, bucket, invoice_id) VALUES (?, ?, ?)",
+                [(band, bucket, invoice_id) for band, bucket in buckets],
+            )
+
+    def lsh_candidates(self, buckets: list, exclude: int = None) -> dict:
+        """Map invoice ID -> signature for invoices sharing any (band, bucket) key."""
+        found = set()
+        with self._lock:
+            for band, bucket in buckets:
+                found.update(r[0] for r in self.conn.execute(
+                    "SELECT invoice_id FROM lsh_buckets WHERE band = ? AND bucket = ?", (band, bucket)))
+            found.discard(exclude)
+            out = {}
+            for invoice_id in sorted(found):
+                row = self.conn.execute(
+                    "SELECT signature FROM invoice_minhash WHERE invoice_id = ?", (invoice_id,)
+                ).fetchone()
+                if row is not None:
+                    out[invoice_id] = row[0]
+        return out
+
+    def find_by_order(self, company_name: str, order_number: str, total_price, exclude: int = None) -> list:
+        """IDs of invoices with the same vendor, order number and total."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM invoices WHERE order_number = ? AND lower(company_name) = lower(?) "
+                "AND total_price IS ? AND id != ? ORDER BY id",
+                (order_number, company_name, _number(total_price), exclude if exclude is not None else -1),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def mark_duplicate(self, invoice_id: int, original_id: int, reason: str):
+        """Flag an invoice as a duplicate of an earlier one; it is kept but never synced."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE invoices SET duplicate_of = ?, duplicate_reason = ?, updated_at = ? WHERE id = ?",
+                (original_id, reason, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), invoice_id),
+            )
+
+    def duplicates(self) -> list:
+        """(invoice_id, duplicate_of, reason) for every flagged duplicate."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, duplicate_of, duplicate_reason FROM invoices "
+                "WHERE duplicate_of IS NOT NULL ORDER BY id"
+            ).fetchall()
+        return [(r[0], r[1], r[2]) for r in rows]
+
+    def index_text(self, invoice_id: int, content: str, files: list = None):
+        """Add or replace an invoice in the full-text index.
+
+        Vendor and line items come from the stored invoice; ``content`` is the
+        already-extracted email/PDF text and ``files`` where it is archived.
+        """
+        if not self.has_search:
+            return
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT company_name FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
+            if row is None:
+                return
+            items = self.conn.execute(
+                "SELECT item_name FROM line_items WHERE invoice_id = ? ORDER BY position", (invoice_id,)
+            ).fetchall()
+            self.conn.execute("DELETE FROM invoice_search WHERE rowid = ?", (invoice_id,))
+            self.conn.execute(
+                "INSERT INTO invoice_search (rowid, vendor, items, content, files) VALUES (?, ?, ?, ?, ?)",
+                (invoice_id, row[0], "\n".join(r[0] for r in items), content or "",
+                 "\n".join(files or [])),
+            )
+
+    def group_keys(self, invoice_ids: list) -> dict:
+        """Map invoice ID -> the file group it was extracted from."""
+        ids = list(invoice_ids)
+        out = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                out.update(self.conn.execute(
+                    f"SELECT id, group_key FROM invoices WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return out
+
+    def unindexed_ids(self) -> list:
+        """IDs of non-duplicate invoices missing from the full-text index."""
+        if not self.has_search:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM invoices WHERE duplicate_of IS NULL "
+                "AND id NOT IN (SELECT rowid FROM invoice_search) ORDER BY id"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Ranked full-text search (FTS5 MATCH syntax) over indexed invoices.
+
+        Returns:
+            Dicts with invoice_id, mail_thread_id, company_name, purchase_date,
+            total_price, files, snippet and score (lower bm25 = better).
+        """
+        if not self.has_search:
+            raise RuntimeError("SQLite was built without FTS5; full-text search is unavailable")
+        weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+        with self._lock:
+            rows = self.conn.execute(
+                f"""SELECT i.id, i.mail_thread_id, i.company_name, i.purchase_date, i.total_price,
+                           s.files, snippet(invoice_search, -1, '[', ']', '...', 12) AS snippet,
+                           bm25(invoice_search, {weights}) AS score
+                    FROM invoice_search s JOIN invoices i ON i.id = s.rowid
+                    WHERE invoice_search MATCH ? AND i.duplicate_of IS NULL
+                    ORDER BY score LIMIT ?""",
+                (query, limit),
+            ).fetchall()
+        return [
+            {
+                "invoice_id": r[0], "mail_thread_id": r[1], "company_name": r[2],
+                "purchase_date": r[3], "total_price": r[4],
+                "files": r[5].split("\n") if r[5] else [], "snippet": r[6], "score": r[7],
+            }
+            for r in rows
+        ]
+
+    def data_version(self) -> tuple:
+        """Cheap fingerprint that changes whenever an invoice is added or edited."""
+        with self._lock:
+            return tuple(self.conn.execute(
+                "SELECT COUNT(*), MAX(id), MAX(updated_at) FROM invoices"
+            ).fetchone())
+
+    def bulk_rows(self) -> tuple:
+        """Every non-duplicate invoice and line item as plain tuples, for loading into column arrays.
+
+        Returns:
+            (invoices, line_items) where invoices are (id, company_name,
+            purchase_date, created_at, total_price, other_expenses) and line
+            items are (invoice_id, item_name, quantity, price).
+        """
+        with self._lock:
+            invoices = self.conn.execute(
+                "SELECT id, company_name, purchase_date, created_at, total_price, other_expenses "
+                "FROM invoices WHERE duplicate_of IS NULL ORDER BY id"
+            ).fetchall()
+            items = self.conn.execute(
+                "SELECT li.invoice_id, li.item_name, li.quantity, li.price FROM line_items li "
+                "JOIN invoices i ON i.id = li.invoice_id WHERE i.duplicate_of IS NULL "
+                "ORDER BY li.invoice_id, li.position"
+            ).fetchall()
+        return [tuple(r) for r in invoices], [tuple(r) for r in items]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> InvoiceStore:
+    """Return the process-wide store for settings.INVOICE_DB_FILE."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != settings.INVOICE_DB_FILE:
+            _store = InvoiceStore(settings.INVOICE_DB_FILE)
+        return _store
@@ -0,0 +1,194 @@
+"""Durable per-message work queue for backfills.
+
+Every Gmail message a backfill lists gets a row recording the last step
+it completed:
+
+    listed -> downloaded -> extracted -> parsed -> written -> archived
+
+(or ``skipped`` when processing decided it is not a new invoice).
+Transitions only move forward, so replaying a step after a crash is a
+no-op, and a restarted backfill downloads only messages still at
+``listed`` and processes only groups that haven't been archived.
+
+A failed step leaves the state unchanged and schedules a retry with
+exponential backoff; messages that fail JOB_MAX_ATTEMPTS times in a row
+are left alone until ``retry_exhausted()`` (``backfill --retry-failed``).
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from src.config import settings
+
+STATES = ("listed", "downloaded", "extracted", "parsed", "written", "archived")
+SKIPPED = "skipped"
+_RANK = {state: i for i, state in enumerate(STATES)}
+_RANK[SKIPPED] = len(STATES)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    msg_id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL DEFAULT '',
+    group_key TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(rank, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_group ON jobs(group_key) WHERE group_key != '';
+"""
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number ``attempts`` (1-based): doubling from JOB_RETRY_BASE_SECONDS, capped."""
+    return min(settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), settings.JOB_RETRY_MAX_SECONDS)
+
+
+class JobQueue:
+    """SQLite-backed message states, shared by the downloader and the pipeline threads."""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.JOB_QUEUE_FILE
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def add(self, messages: list) -> int:
+        """Record listed messages ({'id', 'threadId'} as from messages.list); returns how many are new."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (msg_id, thread_id, state, rank, created_at, updated_at) "
+                "VALUES (?, ?, 'listed', 0, ?, ?)",
+                [(m["id"], m.get("threadId", ""), now, now) for m in messages],
+            )
+            return self.conn.total_changes - before
+
+    def advance(self, msg_id: str, state: str, group: str = None) -> bool:
+        """Move a message forward to ``state``, clearing its failures.
+
+        Returns False (and changes nothing) if it is already at or past ``state``.
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                "UPDATE jobs SET state = ?, rank = ?, group_key = COALESCE(?, group_key), attempts = 0, "
+                "next_attempt_at = 0, last_error = '', updated_at = ? WHERE msg_id = ? AND rank < ?",
+                (state, _RANK[state], group, now, msg_id, _RANK[state]),
+            )
+            return cur.rowcount > 0
+
+    def advance_group(self, group: str, state: str) -> bool:
+        """advance() the message whose files form invoice group ``group``."""
+        msg_id = self.message_for_group(group)
+        return msg_id is not None and self.advance(msg_id, state)
+
+    def fail(self, msg_id: str, error: str) -> float:
+        """Record a failed attempt at the message's next step; returns the retry delay in seconds."""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT attempts FROM jobs WHERE msg_id = ?", (msg_id,)).fetchone()
+            if row is None:
+                return 0.0
+            attempts = row["attempts"] + 1
+            delay = backoff_seconds(attempts)
+            self.conn.execute(
+                "UPDATE jobs SET attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                "WHERE msg_id = ?",
+                (attempts, time.time() + delay, str(error)[:500],
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"), msg_id),
+            )
+            return delay
+
+    def fail_group(self, group: str, error: str) -> float:
+        msg_id = self.message_for_group(group)
+        return 0.0 if msg_id is None else self.fail(msg_id, error)
+
+    def message_for_group(self, group: str) -> str:
+        with self._lock:
+            row = self.conn.execute("SELECT msg_id FROM jobs WHERE group_key = ?", (group,)).fetchone()
+        return row["msg_id"] if row else None
+
+    def state(self, msg_id: str) -> str:
+        with self._lock:
+            row = self.conn.execute("SELECT state FROM jobs WHERE msg_id = ?", (msg_id,)).fetchone()
+        return row["state"] if row else None
+
+    def due(self, state: str, now: float = None) -> list:
+        """Message IDs at ``state`` whose retry time has come and that haven't exhausted their attempts."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT msg_id FROM jobs WHERE rank = ? AND next_attempt_at <= ? AND attempts < ? "
+                "ORDER BY created_at, msg_id",
+                (_RANK[state], now, settings.JOB_MAX_ATTEMPTS),
+            ).fetchall()
+        return [r["msg_id"] for r in rows]
+
+    def held_groups(self, now: float = None) -> set:
+        """Downloaded-but-unfinished groups waiting out a retry delay (or out of attempts)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT group_key FROM jobs WHERE group_key != '' AND rank BETWEEN ? AND ? "
+                "AND (next_attempt_at > ? OR attempts >= ?)",
+                (_RANK["downloaded"], _RANK["written"], now, settings.JOB_MAX_ATTEMPTS),
+            ).fetchall()
+        return {r["group_key"] for r in rows}
+
+    def unfinished_groups(self, groups) -> list:
+        """Those of ``groups`` whose message has not reached ``archived`` (or ``skipped``)."""
+        groups = list(groups)
+        if not groups:
+            return []
+        out = []
+        with self._lock:
+            for i in range(0, len(groups), 500):
+                chunk = groups[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT group_key FROM jobs WHERE rank < ? AND group_key IN ({','.join('?' * len(chunk))})",
+                    [_RANK["archived"], *chunk],
+                ).fetchall()
+                out.extend(r["group_key"] for r in rows)
+        return out
+
+    def retry_exhausted(self) -> int:
+        """Give messages that ran out of attempts a fresh set; returns how many."""
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                "UPDATE jobs SET attempts = 0, next_attempt_at = 0 WHERE attempts >= ? AND rank < ?",
+                (settings.JOB_MAX_ATTEMPTS, _RANK["archived"]),
+            )
+            return cur.rowcount
+
+    def counts(self) -> dict:
+        """Messages per state, plus 'failing' (waiting to retry) and 'exhausted'."""
+        with self._lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+            failing = self.conn.execute(
+                "SELECT SUM(attempts > 0 AND attempts < ?), SUM(attempts >= ?) FROM jobs WHERE rank < ?",
+                (settings.JOB_MAX_ATTEMPTS, settings.JOB_MAX_ATTEMPTS, _RANK["archived"]),
+            ).fetchone()
+        out = {state: 0 for state in (*STATES, SKIPPED)}
+        out.update({r["state"]: r["n"] for r in rows})
+        out["failing"] = failing[0] or 0
+        out["exhausted"] = failing[1] or 0
+        return out
+
+    def format_counts(self) -> str:
+        return ", ".join(f"{state} {n}" for state, n in self.counts().items() if n)
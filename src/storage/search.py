@@ -0,0 +1,111 @@
+"""Full-text search over processed invoices.
+
+The FTS5 index in the invoice store is filled as invoices are archived,
+from text that was already extracted, so searching never re-reads PDFs.
+
+Usage:
+    python main.py search socket head screws 8-32
+    python main.py search --raw 'vendor:mcmaster AND items:bearing'
+    python main.py search --reindex
+"""
+import argparse
+import logging
+import re
+import sqlite3
+import time
+
+from src.storage import invoice_store
+
+logger = logging.getLogger(__name__)
+
+_TERM_RE = re.compile(r'"[^"]+"|\S+')
+
+
+def build_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word (or "quoted phrase") must match."""
+    terms = []
+    for term in _TERM_RE.findall(text):
+        term = term.strip('"').replace('"', '')
+        if term:
+            terms.append(f'"{term}"')
+    return " ".join(terms)
+
+
+def reindex_archive(store=None, archive_dir: str = None) -> int:
+    """Index stored invoices missing from the search index.
+
+    Text is read once from the invoice's archived files (matched by group
+    key); invoices without archived files are indexed by vendor and items.
+
+    Returns:
+        Number of invoices indexed.
+    """
+    from src.storage import archive
+
+    store = store or invoice_store.get_store()
+    missing = store.unindexed_ids()
+    if not missing:
+        return 0
+
+    old = archive.Archive(archive_dir) if archive_dir else archive.get_archive()
+    groups = old.groups()
+    keys = store.group_keys(missing)
+
+    for invoice_id in missing:
+        files = groups.get(keys.get(invoice_id, ""), [])
+        content = old.group_content(files) if files else ""
+        store.index_text(invoice_id, content, files)
+
+    logger.info("[SEARCH] Indexed %s invoice(s)", len(missing))
+    return len(missing)
+
+
+def search(text: str, limit: int = 20, raw: bool = False, store=None) -> list:
+    """Ranked hits for ``text`` (see InvoiceStore.search for the fields)."""
+    store = store or invoice_store.get_store()
+    query = text if raw else build_query(text)
+    if not query:
+        return []
+    return store.search(query, limit)
+
+
+def add_arguments(parser):
+    """Add the search command's arguments to ``parser``."""
+    parser.add_argument("query", nargs="*", help="words or \"quoted phrases\" that must all appear")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--raw", action="store_true", help="pass the query to FTS5 unchanged")
+    parser.add_argument("--reindex", action="store_true", help="index stored invoices missing from the index")
+
+
+def run_search(opts) -> list:
+    """Search processed invoices by vendor, line items and email/PDF text.
+
+    Args:
+        opts: Parsed arguments (see add_arguments) or a list of CLI arguments.
+    """
+    if isinstance(opts, list):
+        parser = argparse.ArgumentParser(prog="search", description=run_search.__doc__.splitlines()[0])
+        add_arguments(parser)
+        opts = parser.parse_args(opts)
+
+    if opts.reindex:
+        reindex_archive()
+    if not opts.query:
+        return []
+
+    start = time.perf_counter()
+    try:
+        hits = search(" ".join(opts.query), opts.limit, opts.raw)
+    except sqlite3.OperationalError as e:
+        # Only reachable with --raw: built queries are always valid FTS5
+        print(f"[SEARCH] Invalid query: {e}")
+        return []
+    elapsed = (time.perf_counter() - start) * 1000
+
+    for hit in hits:
+        total = "" if hit["total_price"] is None else f"${hit['total_price']:,.2f}"
+        print(f"{hit['purchase_date'] or '----------'}  {hit['company_name'][:24]:<24} {total:>10}  "
+              f"{hit['mail_thread_id']}")
+        print(f"    {' '.join(hit['snippet'].split())}")
+    print(f"[SEARCH] {len(hits)} hit(s) in {elapsed:.1f} ms")
+    return hits
@@ -0,0 +1,160 @@
+"""Logging setup: per-module loggers behind one non-blocking queue.
+
+Modules log through ``logging.getLogger(__name__)``. ``setup()`` routes
+every record through a bounded in-memory queue to a listener thread that
+does the actual I/O, so a hot loop only pays for an enqueue:
+
+* console (stderr): the plain message, or one JSON object per line with
+  LOG_CONSOLE_FORMAT = 'json' (for journald and other collectors)
+* LOG_FILE: JSON lines, rotated at LOG_MAX_BYTES keeping LOG_BACKUP_COUNT files
+
+JSON records carry the timestamp, level, logger name, thread and the
+pipeline stage or daemon job that emitted them. Verbosity is set per
+subsystem with LOG_LEVELS (logger name prefix -> level).
+
+If the queue is full (the disk or terminal can't keep up) records are
+dropped and counted rather than blocking the caller.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+from src.config import settings
+
+_context = threading.local()
+_listener = None
+_handler = None
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "stage"}
+
+
+def set_stage(name: str = None):
+    """Tag records logged from the current thread with ``name`` (None clears it)."""
+    _context.stage = name
+
+
+def current_stage() -> str:
+    return getattr(_context, "stage", None)
+
+
+class StageFilter(logging.Filter):
+    """Stamps the emitting thread's stage on the record before it is queued."""
+
+    def filter(self, record):
+        if not hasattr(record, "stage"):
+            record.stage = current_stage()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; ``extra={...}`` fields are included as keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "thread_id": record.thread,
+            "stage": getattr(record, "stage", None),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records that don't fit are counted and dropped."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _level(name) -> int:
+    return name if isinstance(name, int) else logging.getLevelName(str(name).upper())
+
+
+def setup(level: str = None, log_file: str = None, console_format: str = None, levels: dict = None):
+    """Install the queue handler on the root logger and start the writer thread.
+
+    Safe to call more than once; later calls replace the earlier setup.
+
+    Args:
+        level: Root level (default LOG_LEVEL).
+        log_file: JSON-lines log file, '' for none (default LOG_FILE).
+        console_format: 'text' or 'json' (default LOG_CONSOLE_FORMAT).
+        levels: Logger name prefix -> level overrides (default LOG_LEVELS).
+
+    Returns:
+        The DroppingQueueHandler attached to the root logger.
+    """
+    global _listener, _handler
+    shutdown()
+
+    console = logging.StreamHandler(sys.stderr)
+    fmt = console_format or settings.LOG_CONSOLE_FORMAT
+    console.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter("%(message)s"))
+    handlers = [console]
+
+    log_file = settings.LOG_FILE if log_file is None else log_file
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        rotating = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8")
+        rotating.setFormatter(JsonFormatter())
+        handlers.append(rotating)
+
+    _handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    _handler.addFilter(StageFilter())
+    _listener = logging.handlers.QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for h in [h for h in root.handlers if isinstance(h, DroppingQueueHandler)]:
+        root.removeHandler(h)
+    root.addHandler(_handler)
+    root.setLevel(_level(level or settings.LOG_LEVEL))
+    for name, lvl in (settings.LOG_LEVELS if levels is None else levels).items():
+        logging.getLogger(name).setLevel(_level(lvl))
+
+    _listener.start()
+    return _handler
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread."""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
+    if _handler is not None:
+        if _handler.dropped:
+            sys.stderr.write(f"[LOG] {_handler.dropped} record(s) dropped (queue full)\n")
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+atexit.register(shutdown)
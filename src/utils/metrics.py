@@ -0,0 +1,228 @@
+"""Lightweight timing and counter instrumentation.
+
+Functions decorated with ``timed`` record their duration in a
+per-stage histogram, and ``count`` bumps named event counters. While
+metrics are disabled (the default) both are a single flag check, so the
+decorators can stay on hot paths.
+
+The registry is exported two ways:
+
+* Prometheus text format on ``http://<host>:METRICS_PORT/metrics``
+* One JSON snapshot per ``flush()`` appended to METRICS_JSONL_FILE
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "invoice_tracker"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_enabled = False
+
+
+class Histogram:
+    """Cumulative duration histogram with fixed bucket bounds (seconds)."""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        i = 0
+        while i < len(self.buckets) and seconds > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Registry:
+    """Thread-safe store of stage timers and event counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            hist = self.timers.get(stage)
+            if hist is None:
+                hist = self.timers[stage] = Histogram()
+            hist.observe(seconds)
+
+    def inc(self, event: str, amount: float = 1):
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> dict:
+        """Plain-dict view: per-stage count/sum/max/p50/p99 and counter values."""
+        with self._lock:
+            return {
+                "timers": {
+                    stage: {
+                        "count": h.count,
+                        "sum_seconds": round(h.sum, 6),
+                        "max_seconds": round(h.max, 6),
+                        "p50_seconds": h.quantile(0.5),
+                        "p99_seconds": h.quantile(0.99),
+                    }
+                    for stage, h in sorted(self.timers.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Time spent per call of each instrumented stage.",
+            f"# TYPE {PREFIX}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, h in sorted(self.timers.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+            lines.append(f"# HELP {PREFIX}_events_total Counted events.")
+            lines.append(f"# TYPE {PREFIX}_events_total counter")
+            for event, value in sorted(self.counters.items()):
+                lines.append(f'{PREFIX}_events_total{{event="{event}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def timed(stage: str):
+    """Decorator: record each call's duration under ``stage`` while metrics are enabled."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count(event: str, amount: float = 1):
+    """Add ``amount`` to the ``event`` counter while metrics are enabled."""
+    if _enabled:
+        registry.inc(event, amount)
+
+
+def flush(path: str = None) -> dict:
+    """Append a timestamped snapshot of the registry to the JSON-lines file.
+
+    Returns:
+        The snapshot written, or None when metrics are disabled.
+    """
+    if not _enabled:
+        return None
+    path = path or settings.METRICS_JSONL_FILE
+    snapshot = {"ts": datetime.now().isoformat(timespec="seconds"), "pid": os.getpid()}
+    snapshot.update(registry.snapshot())
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot) + "\n")
+    return snapshot
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_http_server(port: int = None, host: str = None):
+    """Serve /metrics in a daemon thread. Returns the server (port 0 picks a free port)."""
+    global _server
+    if _server is not None:
+        return _server
+    port = settings.METRICS_PORT if port is None else port
+    _server = ThreadingHTTPServer((host or settings.METRICS_HOST, port), _MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("[METRICS] Serving http://%s:%s/metrics", _server.server_address[0], _server.server_address[1])
+    return _server
+
+
+def stop_http_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+
+
+def configure(enable_metrics: bool = None, port: int = None):
+    """Enable metrics from settings (or the arguments) and start the endpoint if a port is set."""
+    on = settings.METRICS_ENABLED if enable_metrics is None else enable_metrics
+    enable(on)
+    port = settings.METRICS_PORT if port is None else port
+    if on and port:
+        start_http_server(port)
@@ -0,0 +1,212 @@
+"""Profiling mode for processing runs (python main.py --profile ...).
+
+Each profiled run writes three files to PROFILE_DIR, named
+``<timestamp>-<label>-n<corpus size>``:
+
+* ``.txt``    top functions by cumulative and own time, plus the top
+              allocation sites with --profile-memory (tracemalloc)
+* ``.prof``   raw cProfile stats (pstats, snakeviz, ...)
+* ``.folded`` wall-clock stack samples of every thread in collapsed
+              format, for flamegraph.pl / speedscope / inferno
+
+cProfile is installed in every thread started during the run, so the
+pipeline's worker threads are included; the sampler sees threads that
+are blocked (on a queue, the LLM, the disk) as well as running ones.
+"""
+import contextlib
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+_enabled = False
+_memory = False
+_label = "run"
+
+_THREAD_SUFFIX_RE = re.compile(r"-\d+$")
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True, memory: bool = False, label: str = "run"):
+    """Profile every processing run from now on; ``memory`` adds tracemalloc."""
+    global _enabled, _memory, _label
+    _enabled, _memory, _label = on, memory, label
+
+
+class StackSampler:
+    """Samples the stacks of all threads every ``interval`` seconds into folded-stack counts."""
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._root = os.getcwd()
+
+    def _frame_name(self, frame) -> str:
+        code = frame.f_code
+        path = code.co_filename
+        if path.startswith(self._root):
+            path = os.path.relpath(path, self._root)
+        return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+    def _sample(self):
+        names = {t.ident: _THREAD_SUFFIX_RE.sub("", t.name) for t in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, "thread"))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class Profiler:
+    """cProfile on the calling thread and every thread it starts, plus the stack sampler."""
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.main = cProfile.Profile()
+        self.threads = []
+        self.sampler = StackSampler()
+        self.snapshot = None
+        self.peak_bytes = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._start = 0.0
+
+    def _thread_hook(self, *args):
+        # Runs as the first profile event of each new thread; enable() replaces it
+        prof = cProfile.Profile()
+        with self._lock:
+            self.threads.append(prof)
+        prof.enable()
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+        self.sampler.start()
+        threading.setprofile(self._thread_hook)
+        self._start = time.perf_counter()
+        self.main.enable()
+
+    def stop(self):
+        self.main.disable()
+        self.seconds = time.perf_counter() - self._start
+        threading.setprofile(None)
+        self.sampler.stop()
+        if self.memory:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.main)
+        for prof in self.threads:
+            stats.add(prof)
+        return stats
+
+    def report(self, label: str, corpus_size: int, top: int = None) -> str:
+        top = top or settings.PROFILE_TOP
+        per_invoice = f"{self.seconds / corpus_size * 1000:.1f} ms/invoice" if corpus_size else "-"
+        out = io.StringIO()
+        out.write(f"Profile: {label}, {corpus_size} invoice group(s), {self.seconds:.2f}s wall ({per_invoice})\n")
+        out.write(f"Threads profiled: {1 + len(self.threads)}, stack samples: {self.sampler.samples}\n")
+
+        stats = self.stats()
+        stats.stream = out
+        for key, title in (("cumulative", "cumulative time"), ("tottime", "own time")):
+            out.write(f"\n=== Top {top} functions by {title} ===\n")
+            stats.sort_stats(key).print_stats(top)
+
+        if self.snapshot is not None:
+            out.write(f"\n=== Top {top} allocation sites (peak traced {self.peak_bytes / 1024 / 1024:.1f} MiB) ===\n")
+            snapshot = self.snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ])
+            for stat in snapshot.statistics("lineno")[:top]:
+                frame = stat.traceback[0]
+                out.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}\n")
+        return out.getvalue()
+
+    def write(self, label: str, corpus_size: int, out_dir: str = None) -> dict:
+        """Write the .txt report, .prof stats and .folded stacks; returns their paths."""
+        out_dir = out_dir or settings.PROFILE_DIR
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(out_dir, f"{stamp}-{label}-n{corpus_size}")
+        paths = {"report": base + ".txt", "stats": base + ".prof", "stacks": base + ".folded"}
+
+        with open(paths["report"], "w", encoding="utf-8") as f:
+            f.write(self.report(label, corpus_size))
+        self.stats().dump_stats(paths["stats"])
+        with open(paths["stacks"], "w", encoding="utf-8") as f:
+            f.write(self.sampler.folded())
+        return paths
+
+
+@contextlib.contextmanager
+def profile_run(label: str, corpus_size: int, out_dir: str = None, memory: bool = None):
+    """Profile the body of the ``with`` block and write its report files.
+
+    Args:
+        label: Run name used in the file names (e.g. the CLI command).
+        corpus_size: Invoice groups in the run, used in the file names.
+        out_dir: Report directory (default PROFILE_DIR).
+        memory: Trace allocations (default: as set by enable()).
+    """
+    profiler = Profiler(memory=_memory if memory is None else memory)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        paths = profiler.write(label, corpus_size, out_dir)
+        logger.info("[PROFILE] %.2fs over %s group(s) -> %s", profiler.seconds, corpus_size, paths["report"])
+
+
+def maybe_profile(corpus_size) -> contextlib.AbstractContextManager:
+    """profile_run() with the enabled label when profiling is on, else a no-op.
+
+    ``corpus_size`` is a callable so counting the corpus costs nothing
+    when profiling is off.
+    """
+    if not _enabled:
+        return contextlib.nullcontext()
+    return profile_run(_label, corpus_size())
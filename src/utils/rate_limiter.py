@@ -0,0 +1,206 @@
+"""Client-side rate limiting and retries for Google API calls.
+
+Every ``execute()`` on a wrapped service first takes the call's quota
+units (API_QUOTA_UNITS, e.g. Gmail messages.get = 5) from a token
+bucket shared by all threads of the process, refilled at the API's
+per-user quota (API_RATE_LIMITS). Calls failing with 429, 5xx or a 403
+rate-limit reason are retried with exponential backoff and full jitter;
+a Retry-After header sets the delay instead and pauses the whole bucket,
+so other threads back off too rather than piling into the same limit.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from src.config import settings
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded", b"RATE_LIMIT_EXCEEDED")
+
+
+class TokenBucket:
+    """Thread-safe token bucket holding up to ``capacity`` units, refilled at ``rate`` units/second."""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self, units: float = 1) -> float:
+        """Block until ``units`` are available and take them; returns the seconds waited."""
+        units = min(units, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                # The epsilon keeps float rounding from leaving a wait too short to advance the clock
+                if now >= self._paused_until and self._tokens >= units - 1e-9:
+                    self._tokens = max(self._tokens - units, 0.0)
+                    return waited
+                wait = max(self._paused_until - now, (units - self._tokens) / self.rate)
+            self._sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        """Hold every caller for ``seconds`` and restart from an empty bucket (server asked us to slow down)."""
+        with self._lock:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = max(now, self._paused_until)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(api: str) -> TokenBucket:
+    """The process-wide bucket for ``api`` ('gmail', 'sheets'), from API_RATE_LIMITS."""
+    with _buckets_lock:
+        if api not in _buckets:
+            rate, burst = settings.API_RATE_LIMITS[api]
+            _buckets[api] = TokenBucket(rate, burst)
+        return _buckets[api]
+
+
+def quota_units(api: str, method: str) -> float:
+    """Units charged for ``method`` (e.g. 'users.messages.get'), matched on its longest known suffix."""
+    costs = settings.API_QUOTA_UNITS.get(api, {})
+    parts = method.split(".")
+    for i in range(len(parts)):
+        key = ".".join(parts[i:])
+        if key in costs:
+            return costs[key]
+    return 1
+
+
+def _retry_after(value) -> float:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def classify_error(exc: Exception) -> tuple:
+    """(retryable, retry_after_seconds) for an exception raised by execute()."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True, None
+    resp = getattr(exc, "resp", None)
+    status = getattr(resp, "status", None) or getattr(exc, "status_code", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False, None
+
+    retry_after = None
+    if resp is not None and hasattr(resp, "get"):
+        retry_after = _retry_after(resp.get("retry-after") or resp.get("Retry-After"))
+
+    content = getattr(exc, "content", b"") or b""
+    if isinstance(content, str):
+        content = content.encode("utf-8", "ignore")
+    if status == 429 or 500 <= status < 600:
+        return True, retry_after
+    if status == 403 and any(reason in content for reason in _RATE_LIMIT_REASONS):
+        return True, retry_after
+    return False, None
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (0-based)."""
+    ceiling = min(settings.API_BACKOFF_MAX_SECONDS, settings.API_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def execute(api: str, method: str, func, sleep=time.sleep):
+    """Run ``func`` (a request's execute) under the API's rate limit, retrying transient failures.
+
+    Raises:
+        The last error once API_MAX_RETRIES retries are used up, or any
+        non-retryable error immediately.
+    """
+    bucket = bucket_for(api)
+    units = quota_units(api, method)
+    for attempt in range(settings.API_MAX_RETRIES + 1):
+        waited = bucket.acquire(units)
+        if waited:
+            metrics.count(f"{api}_throttled_seconds", waited)
+        try:
+            return func()
+        except Exception as e:
+            retryable, retry_after = classify_error(e)
+            if not retryable or attempt == settings.API_MAX_RETRIES:
+                raise
+            if retry_after is not None:
+                bucket.pause(retry_after)
+                delay = retry_after
+            else:
+                delay = backoff_seconds(attempt)
+            metrics.count(f"{api}_retries")
+            logger.warning("[RATE] %s %s failed (%s), retry %s/%s in %.1fs",
+                           api, method, e, attempt + 1, settings.API_MAX_RETRIES, delay)
+            sleep(delay)
+
+
+class _LimitedRequest:
+    def __init__(self, request, api: str, method: str):
+        self._request = request
+        self._api = api
+        self._method = method
+
+    def execute(self, *args, **kwargs):
+        return execute(self._api, self._method, lambda: self._request.execute(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+
+class LimitedService:
+    """Wraps a googleapiclient service so every request's execute() goes through ``execute``."""
+
+    def __init__(self, target, api: str, path: tuple = ()):
+        self._target = target
+        self._api = api
+        self._path = path
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        path = self._path + (name,)
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _LimitedRequest(result, self._api, ".".join(path))
+            return LimitedService(result, self._api, path)
+        return call
+
+
+def limited(service, api: str):
+    """Return ``service`` with rate limiting and retries on every call."""
+    return LimitedService(service, api)
@@ -0,0 +1,251 @@
+"""Columnar export of stored invoices and line items to partitioned Parquet.
+
+Layout (Hive-style, readable by pandas, pyarrow, DuckDB or Spark):
+
+    <dir>/invoices/year=2024/month=01/part-0.parquet
+    <dir>/line_items/year=2024/month=01/part-0.parquet
+    <dir>/_manifest.json
+
+Invoices are partitioned by the year and month of their purchase date
+(store creation date when the purchase date is missing). Exports are
+incremental: only partitions holding invoices created or updated since
+the last export are rewritten.
+"""
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from email.utils import parsedate_to_datetime
+
+from src.config import settings
+from src.storage import invoice_store
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+MANIFEST_FILE = "_manifest.json"
+TABLES = ("invoices", "line_items")
+CENTS = Decimal("0.01")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+
+def _to_date(value):
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _to_timestamp(value):
+    """Parse store timestamps and RFC 2822 email dates (converted to UTC)."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        pass
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def _to_money(value):
+    if value is None:
+        return None
+    try:
+        amount = Decimal(str(value)).quantize(CENTS)
+    except InvalidOperation:
+        return None
+    return amount if amount.adjusted() < 10 else None
+
+
+def partition_of(row: dict) -> str:
+    """Return the "YYYY-MM" partition for a raw invoice row."""
+    day = _to_date(row.get("purchase_date", "")) or _to_date(row["created_at"])
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def invoice_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("invoice_id", pa.int64()),
+        ("mail_thread_id", pa.string()),
+        ("company_name", pa.dictionary(pa.int32(), pa.string())),
+        ("purchase_date", pa.date32()),
+        ("mail_received_time", pa.timestamp("s")),
+        ("purchase_receiver", pa.string()),
+        ("order_number", pa.string()),
+        ("total_price", pa.decimal128(12, 2)),
+        ("other_expenses", pa.decimal128(12, 2)),
+        ("item_count", pa.int32()),
+        ("duplicate_of", pa.int64()),
+        ("created_at", pa.timestamp("s")),
+        ("updated_at", pa.timestamp("s")),
+    ])
+
+
+def line_item_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("invoice_id", pa.int64()),
+        ("position", pa.int32()),
+        ("company_name", pa.dictionary(pa.int32(), pa.string())),
+        ("purchase_date", pa.date32()),
+        ("item_name", pa.string()),
+        ("quantity", pa.int32()),
+        ("price", pa.decimal128(12, 2)),
+    ])
+
+
+def _table(columns: dict, schema):
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def build_tables(invoices: list, items: list) -> tuple:
+    """Convert raw store rows into typed (invoices, line_items) Arrow tables."""
+    by_id = {row["id"]: row for row in invoices}
+    item_counts = {}
+    for item in items:
+        item_counts[item["invoice_id"]] = item_counts.get(item["invoice_id"], 0) + 1
+
+    invoice_table = _table({
+        "invoice_id": [r["id"] for r in invoices],
+        "mail_thread_id": [r["mail_thread_id"] for r in invoices],
+        "company_name": [r["company_name"] for r in invoices],
+        "purchase_date": [_to_date(r["purchase_date"]) for r in invoices],
+        "mail_received_time": [_to_timestamp(r["mail_received_time"]) for r in invoices],
+        "purchase_receiver": [r["purchase_receiver"] for r in invoices],
+        "order_number": [r["order_number"] for r in invoices],
+        "total_price": [_to_money(r["total_price"]) for r in invoices],
+        "other_expenses": [_to_money(r["other_expenses"]) for r in invoices],
+        "item_count": [item_counts.get(r["id"], 0) for r in invoices],
+        "duplicate_of": [r["duplicate_of"] for r in invoices],
+        "created_at": [_to_timestamp(r["created_at"]) for r in invoices],
+        "updated_at": [_to_timestamp(r["updated_at"]) for r in invoices],
+    }, invoice_schema())
+
+    item_table = _table({
+        "invoice_id": [i["invoice_id"] for i in items],
+        "position": [i["position"] for i in items],
+        "company_name": [by_id[i["invoice_id"]]["company_name"] for i in items],
+        "purchase_date": [_to_date(by_id[i["invoice_id"]]["purchase_date"]) for i in items],
+        "item_name": [i["item_name"] for i in items],
+        "quantity": [i["quantity"] for i in items],
+        "price": [_to_money(i["price"]) for i in items],
+    }, line_item_schema())
+
+    return invoice_table, item_table
+
+
+def _partition_path(out_dir: str, table: str, key: str) -> str:
+    year, month = key.split("-")
+    return os.path.join(out_dir, table, f"year={year}", f"month={month}", "part-0.parquet")
+
+
+def _write_atomic(table, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def load_manifest(out_dir: str) -> dict:
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"exported_at": None, "partitions": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(out_dir: str, manifest: dict):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def export(store=None, out_dir: str = None, full: bool = False) -> list:
+    """Write changed partitions of the invoice store to Parquet.
+
+    Args:
+        store: InvoiceStore to read. Defaults to the shared store.
+        out_dir: Export directory. Defaults to settings.PARQUET_EXPORT_DIR.
+        full: Discard the previous export and rewrite every partition.
+
+    Returns:
+        Sorted list of "YYYY-MM" partitions written.
+    """
+    _require_pyarrow()
+    store = store or invoice_store.get_store()
+    out_dir = out_dir or settings.PARQUET_EXPORT_DIR
+    os.makedirs(out_dir, exist_ok=True)
+
+    if full:
+        for table in TABLES:
+            shutil.rmtree(os.path.join(out_dir, table), ignore_errors=True)
+        manifest = {"exported_at": None, "partitions": {}}
+    else:
+        manifest = load_manifest(out_dir)
+
+    started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    changed = store.changed_since(manifest["exported_at"])
+    if not changed:
+        logger.info("[EXPORT] Nothing changed since %s", manifest['exported_at'])
+        return []
+
+    members = {key: set(ids) for key, ids in manifest["partitions"].items()}
+    owner = {i: key for key, ids in members.items() for i in ids}
+    touched = set()
+    changed_rows, _ = store.fetch_rows(changed)
+    for row in changed_rows:
+        key = partition_of(row)
+        previous = owner.get(row["id"])
+        if previous and previous != key:
+            members[previous].discard(row["id"])
+            touched.add(previous)
+        members.setdefault(key, set()).add(row["id"])
+        touched.add(key)
+
+    for key in sorted(touched):
+        ids = sorted(members[key])
+        if not ids:
+            for table in TABLES:
+                path = _partition_path(out_dir, table, key)
+                if os.path.exists(path):
+                    os.remove(path)
+            del members[key]
+            continue
+        invoice_table, item_table = build_tables(*store.fetch_rows(ids))
+        _write_atomic(invoice_table, _partition_path(out_dir, "invoices", key))
+        _write_atomic(item_table, _partition_path(out_dir, "line_items", key))
+
+    _save_manifest(out_dir, {
+        "exported_at": started,
+        "partitions": {key: sorted(ids) for key, ids in sorted(members.items())},
+    })
+    logger.info("[EXPORT] %s changed invoice(s) -> %s partition(s) in %s", len(changed), len(touched), out_dir)
+    return sorted(touched)
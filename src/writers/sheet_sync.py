@@ -0,0 +1,241 @@
+"""Differential Google Sheets sync driven by the local invoice store.
+
+The store remembers which sheet row each invoice occupies and a hash of
+what was last written there, so a sync only reads and writes the rows
+that were inserted or changed. Rows are written with one
+values.batchUpdate call, and planned writes are journaled in the store
+before the call so an interrupted sync is confirmed or retried by the
+next one. A row whose sheet content no longer matches what was last
+written was edited by hand and is left alone.
+"""
+import hashlib
+import json
+import logging
+
+from src.auth.gmail_auth import get_sheets_service
+from src.config import settings
+from src.utils import metrics
+from src.writers.sheets_writer import format_row
+
+logger = logging.getLogger(__name__)
+
+# Columns covered by the row hash (processed_at is excluded)
+HASH_COLUMNS = 10
+LAST_COLUMN = "K"
+
+
+def _cell(value) -> str:
+    """Normalize a cell so written values and values read back hash the same."""
+    if value is None:
+        return ""
+    text = str(value).strip()
+    try:
+        return repr(float(text))
+    except ValueError:
+        return text
+
+
+def row_hash(values: list) -> str:
+    """Hash the data columns of a sheet row."""
+    cells = [_cell(v) for v in list(values)[:HASH_COLUMNS]]
+    cells += [""] * (HASH_COLUMNS - len(cells))
+    return hashlib.sha256(json.dumps(cells).encode("utf-8")).hexdigest()
+
+
+def _row_range(row: int) -> str:
+    return f"{settings.SHEET_NAME}!A{row}:{LAST_COLUMN}{row}"
+
+
+def _read_rows(service, rows: list) -> dict:
+    """Fetch specific rows with one batchGet. Returns {row: values}."""
+    if not rows:
+        return {}
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=settings.SPREADSHEET_ID,
+        ranges=[_row_range(r) for r in rows],
+        valueRenderOption='UNFORMATTED_VALUE'
+    ).execute()
+
+    out = {}
+    for row, value_range in zip(rows, result.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        out[row] = values[0] if values else []
+    return out
+
+
+def _read_all(service) -> list:
+    result = service.spreadsheets().values().get(
+        spreadsheetId=settings.SPREADSHEET_ID,
+        range=f"{settings.SHEET_NAME}!A:{LAST_COLUMN}",
+        valueRenderOption='UNFORMATTED_VALUE'
+    ).execute()
+    return result.get("values", [])
+
+
+def bootstrap(store, service) -> int:
+    """Find the sheet rows of stored invoices (one full read, first sync only).
+
+    Returns:
+        Number of invoices matched to an existing row.
+    """
+    values = _read_all(service)
+    by_thread = store.thread_id_map()
+    placements = []
+    for row, cells in enumerate(values[1:], start=2):
+        tid = str(cells[0]) if cells else ""
+        if tid in by_thread:
+            placements.append((by_thread.pop(tid), row, row_hash(cells)))
+
+    store.set_sheet_rows(placements, next_row=max(len(values) + 1, 2))
+    logger.info("[SYNC] Matched %s stored invoice(s) to existing sheet rows", len(placements))
+    return len(placements)
+
+
+def _first_free_row(service, next_row: int) -> int:
+    """Skip past rows appended to the sheet by something other than this sync."""
+    result = service.spreadsheets().values().get(
+        spreadsheetId=settings.SPREADSHEET_ID,
+        range=f"{settings.SHEET_NAME}!A{next_row}:A"
+    ).execute()
+    return next_row + len(result.get("values", []))
+
+
+def _resume(store, service, stats: dict):
+    """Confirm or cancel writes journaled by a sync that didn't finish."""
+    pending = store.pending_sheet_writes()
+    if not pending:
+        return
+    current = _read_rows(service, [row for _, row, _ in pending])
+    landed = [i for i, row, digest in pending if row_hash(current.get(row, [])) == digest]
+    missing = [i for i, _, _ in pending if i not in set(landed)]
+    store.confirm_sheet_writes(landed)
+    store.cancel_sheet_writes(missing)
+    stats["resumed"] += len(landed)
+    logger.info("[SYNC] Resumed interrupted sync: %s confirmed, %s to retry", len(landed), len(missing))
+
+
+def audit(store) -> list:
+    """Compare every placed row with what was last written and flag hand edits.
+
+    This reads the whole sheet, so it is meant for the nightly reconcile
+    rather than every sync.
+
+    Returns:
+        IDs of invoices newly flagged as edited in the sheet.
+    """
+    if settings.SPREADSHEET_ID == 'YOUR_SPREADSHEET_ID_HERE':
+        return []
+
+    try:
+        values = _read_all(get_sheets_service())
+    except Exception as e:
+        logger.warning("[WARN] Could not audit sheet: %s", e)
+        return []
+
+    known = set(store.conflict_ids())
+    edited = []
+    for invoice_id, (row, digest) in store.sheet_rows().items():
+        if digest is None or invoice_id in known:
+            continue
+        cells = values[row - 1] if row - 1 < len(values) else []
+        if row_hash(cells) != digest:
+            edited.append(invoice_id)
+            logger.warning("[CONFLICT] Sheet row %s was edited by hand (invoice #%s)", row, invoice_id)
+
+    store.mark_sheet_conflict(edited)
+    return edited
+
+
+@metrics.timed("sheets_sync")
+def sync(store) -> dict:
+    """Push inserted and changed invoices from the store to Google Sheets.
+
+    Returns:
+        Counts of inserted, updated, unchanged, conflicting, resumed and
+        failed rows.
+    """
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "conflicts": 0, "resumed": 0, "failed": 0}
+    if settings.SPREADSHEET_ID == 'YOUR_SPREADSHEET_ID_HERE':
+        logger.error("[ERROR] SPREADSHEET_ID not set")
+        return stats
+
+    try:
+        service = get_sheets_service()
+        if store.get_state("next_row") is None:
+            bootstrap(store, service)
+        _resume(store, service, stats)
+    except Exception as e:
+        logger.error("[ERROR] GSheets sync: %s", e)
+        return stats
+
+    dirty = store.unsynced_ids()
+    if not dirty:
+        return stats
+
+    inserts, updates, current_hashes = [], [], []
+    for invoice_id in dirty:
+        data = store.get_invoice(invoice_id)
+        values = format_row(data, processed_at=data["_created_at"])
+        digest = row_hash(values)
+        if data["_sheet_row"] is None:
+            inserts.append((invoice_id, digest, values))
+        elif digest == data["_sheet_hash"]:
+            current_hashes.append((invoice_id, digest))
+        else:
+            updates.append((invoice_id, data["_sheet_row"], data["_sheet_hash"], digest, values))
+
+    try:
+        on_sheet = _read_rows(service, [u[1] for u in updates])
+        next_row = int(store.get_state("next_row", 2))
+        if inserts:
+            next_row = _first_free_row(service, next_row)
+    except Exception as e:
+        logger.error("[ERROR] GSheets sync: %s", e)
+        return stats
+
+    writes, conflicts = [], []
+    for invoice_id, row, last_hash, digest, values in updates:
+        sheet_digest = row_hash(on_sheet.get(row, []))
+        if last_hash is None or sheet_digest == last_hash:
+            writes.append((invoice_id, row, digest, values))
+            stats["updated"] += 1
+        elif sheet_digest == digest:
+            current_hashes.append((invoice_id, digest))
+        else:
+            conflicts.append(invoice_id)
+            logger.warning("[CONFLICT] Sheet row %s was edited by hand; not overwriting (invoice #%s)",
+                           row, invoice_id)
+
+    for invoice_id, digest, values in inserts:
+        writes.append((invoice_id, next_row, digest, values))
+        next_row += 1
+        stats["inserted"] += 1
+
+    store.set_sheet_hashes(current_hashes)
+    store.mark_sheet_conflict(conflicts)
+    stats["unchanged"] = len(current_hashes)
+    stats["conflicts"] = len(conflicts)
+
+    if writes:
+        store.plan_sheet_writes([(i, row, digest) for i, row, digest, _ in writes], next_row)
+        for start in range(0, len(writes), settings.SHEETS_SYNC_BATCH_ROWS):
+            chunk = writes[start:start + settings.SHEETS_SYNC_BATCH_ROWS]
+            body = {
+                'valueInputOption': 'RAW',
+                'data': [{'range': _row_range(row), 'values': [values]} for _, row, _, values in chunk]
+            }
+            try:
+                service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=settings.SPREADSHEET_ID, body=body
+                ).execute()
+            except Exception as e:
+                stats["failed"] = len(writes) - start
+                logger.error("[ERROR] GSheets sync: %s (%s row(s) left for the next sync)", e, stats['failed'])
+                break
+            store.confirm_sheet_writes([i for i, _, _, _ in chunk])
+
+    for key in ("inserted", "updated", "conflicts", "failed"):
+        metrics.count(f"sheets_rows_{key}", stats[key])
+    logger.info("[SYNC] %s inserted, %s updated, %s unchanged, %s conflict(s)",
+                stats['inserted'], stats['updated'], stats['unchanged'], stats['conflicts'])
+    return stats
@@ -1,14 +1,18 @@
 """Google Sheets writer for invoice data."""
+import logging
 from datetime import datetime
 
 from src.auth.gmail_auth import get_sheets_service
 from src.config import settings
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
 
 
 def init_sheet() -> bool:
     """Initialize Google Sheets with headers."""
     if settings.SPREADSHEET_ID == 'YOUR_SPREADSHEET_ID_HERE':
-        print("[ERROR] Please set SPREADSHEET_ID in src/config/settings.py")
+        logger.error("[ERROR] Please set SPREADSHEET_ID in src/config/settings.py")
         return False
 
     try:
@@ -23,10 +27,10 @@ def init_sheet() -> bool:
             body=body
         ).execute()
 
-        print("[OK] Headers updated")
+        logger.info("[OK] Headers updated")
         return True
     except Exception as e:
-        print(f"[ERROR] Failed to initialize sheet: {e}")
+        logger.error("[ERROR] Failed to initialize sheet: %s", e)
         return False
 
 
@@ -45,42 +49,54 @@ def get_existing_thread_ids() -> set:
         values = result.get('values', [])
         return {str(row[0]) for row in values[1:] if row}
     except Exception as e:
-        print(f"[WARN] Could not fetch existing thread IDs: {e}")
+        logger.warning("[WARN] Could not fetch existing thread IDs: %s", e)
         return set()
 
 
-def write_invoice_data(data: dict) -> bool:
-    """Write invoice data to Google Sheets."""
+def format_row(data: dict, processed_at: str = None) -> list:
+    """Build the sheet row (SHEET_HEADERS order) for an invoice dict."""
+    items = data.get("items", [])
+    item_names = ", ".join([str(i.get('item_name', '')) for i in items if isinstance(i, dict)])
+    item_quantities = ", ".join([str(i.get('quantity', '')) for i in items if isinstance(i, dict)])
+    item_prices = ", ".join([str(i.get('price', '')) for i in items if isinstance(i, dict)])
+
+    return [
+        data.get("mail_thread_id", ""),
+        data.get("company_name", ""),
+        data.get("purchase_date", ""),
+        data.get("mail_received_time", ""),
+        data.get("purchase_receiver", ""),
+        data.get("total_price", ""),
+        item_names,
+        item_quantities,
+        item_prices,
+        data.get("other_expenses", data.get("sum of other_expanses", "")),
+        processed_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ]
+
+
+@metrics.timed("sheets_write")
+def write_invoice_data(data: dict, existing_ids: set = None) -> bool:
+    """Write invoice data to Google Sheets.
+
+    Args:
+        data: Invoice dict.
+        existing_ids: Thread IDs already in the sheet. Fetched from the
+            sheet when omitted (one full-column read per call).
+    """
     if settings.SPREADSHEET_ID == 'YOUR_SPREADSHEET_ID_HERE':
-        print("[ERROR] SPREADSHEET_ID not set")
+        logger.error("[ERROR] SPREADSHEET_ID not set")
         return False
 
     try:
         tid = str(data.get("mail_thread_id", ""))
-        existing = get_existing_thread_ids()
+        existing = existing_ids if existing_ids is not None else get_existing_thread_ids()
 
         if tid and tid in existing:
-            print(f"[SKIP] Duplicate: {tid}")
+            logger.info("[SKIP] Duplicate: %s", tid)
             return False
 
-        items = data.get("items", [])
-        item_names = ", ".join([str(i.get('item_name', '')) for i in items if isinstance(i, dict)])
-        item_quantities = ", ".join([str(i.get('quantity', '')) for i in items if isinstance(i, dict)])
-        item_prices = ", ".join([str(i.get('price', '')) for i in items if isinstance(i, dict)])
-
-        values = [[
-            data.get("mail_thread_id", ""),
-            data.get("company_name", ""),
-            data.get("purchase_date", ""),
-            data.get("mail_received_time", ""),
-            data.get("purchase_receiver", ""),
-            data.get("total_price", ""),
-            item_names,
-            item_quantities,
-            item_prices,
-            data.get("sum of other_expanses", data.get("other_expenses", "")),
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ]]
+        values = [format_row(data)]
 
         service = get_sheets_service()
         body = {'values': values}
@@ -91,9 +107,9 @@ def write_invoice_data(data: dict) -> bool:
             body=body
         ).execute()
 
-        print(f"[OK] Saved to Google Sheets: {data.get('company_name', '?')}")
+        logger.info("[OK] Saved to Google Sheets: %s", data.get('company_name', '?'))
         return True
 
     except Exception as e:
-        print(f"[ERROR] GSheets: {e}")
+        logger.error("[ERROR] GSheets: %s", e)
         return False
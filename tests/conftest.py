@@ -8,6 +8,29 @@ import shutil
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+@pytest.fixture(autouse=True)
+def isolated_data_files(tmp_path, monkeypatch):
+    """Keep review logs written during tests out of the real data/ directory."""
+    from src.config import settings
+    monkeypatch.setattr(settings, 'REJECTED_FILE', str(tmp_path / 'rejected.jsonl'))
+    monkeypatch.setattr(settings, 'QUARANTINE_DIR', str(tmp_path / 'quarantine'))
+    monkeypatch.setattr(settings, 'QUARANTINE_REPORT_FILE', str(tmp_path / 'quarantine' / 'report.jsonl'))
+    monkeypatch.setattr(settings, 'LLM_RETRY_QUEUE_FILE', str(tmp_path / 'llm_retry_queue.json'))
+    monkeypatch.setattr(settings, 'INVOICE_DB_FILE', str(tmp_path / 'invoices.db'))
+    monkeypatch.setattr(settings, 'JOB_QUEUE_FILE', str(tmp_path / 'jobs.db'))
+    monkeypatch.setattr(settings, 'BLOB_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.setattr(settings, 'OLD_INVOICE_DIR', str(tmp_path / 'old_invoices'))
+    monkeypatch.setattr(settings, 'OCR_CACHE_FILE', str(tmp_path / 'ocr_cache.db'))
+    monkeypatch.setattr(settings, 'LOG_FILE', str(tmp_path / 'logs' / 'invoice_tracker.jsonl'))
+
+    from src.processors import llm_extractor
+    llm_extractor.breaker.reset()
+
+    yield
+    from src.utils import log
+    log.shutdown()
+
+
 @pytest.fixture
 def temp_dir():
     temp = tempfile.mkdtemp()
@@ -0,0 +1,202 @@
+"""Tests for src/storage/archive.py"""
+import os
+from unittest.mock import patch
+
+import pytest
+
+from src.storage import archive
+from src.storage.archive import Archive, shard_for, vendor_slug
+
+
+def _group(directory, base="msg@vendor.com_1705329000000", pdf=True):
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, f"{base}.txt")]
+    with open(paths[0], "w", encoding="utf-8") as f:
+        f.write("Subject: Invoice\nTotal: $5.00\n")
+    if pdf:
+        paths.append(os.path.join(directory, f"{base}_invoice.pdf"))
+        with open(paths[1], "wb") as f:
+            f.write(b"%PDF-1.4 fake")
+    return base, paths
+
+
+class TestShardFor:
+    def test_purchase_date_and_vendor(self):
+        result = {"purchase_date": "2024-03-09", "company_name": "McMaster-Carr"}
+        assert shard_for("g_1705329000000", result) == os.path.join("2024", "03", "mcmaster-carr")
+
+    def test_falls_back_to_group_timestamp(self):
+        # 1705329000000 ms = 2024-01-15
+        assert shard_for("g_1705329000000", {"purchase_date": "", "company_name": ""}) == \
+            os.path.join("2024", "01", "unknown")
+
+    def test_vendor_slug(self):
+        assert vendor_slug("The Home Depot, Inc.") == "the-home-depot-inc"
+        assert vendor_slug(None) == "unknown"
+
+
+class TestArchiveGroup:
+    def test_group_moves_into_its_shard(self, tmp_path):
+        base, paths = _group(str(tmp_path / "invoices"))
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=False)
+
+        archived = old.archive_group(base, paths, {"purchase_date": "2024-02-01", "company_name": "Acme"})
+
+        dest = os.path.join(str(tmp_path / "old"), "2024", "02", "acme", base)
+        assert sorted(archived) == sorted(os.path.join(dest, os.path.basename(p)) for p in paths)
+        assert not any(os.path.exists(p) for p in paths)
+        assert old.locate(base) == dest
+        assert old.groups()[base] == sorted(archived)
+        assert os.listdir(os.path.join(str(tmp_path / "old"), archive.STAGING_DIR)) == []
+
+    def test_flat_layout_keeps_single_directory(self, tmp_path):
+        base, paths = _group(str(tmp_path / "invoices"))
+        old = Archive(str(tmp_path / "old"), layout="flat", bundle_text=False)
+        archived = old.archive_group(base, paths)
+        assert all(os.path.dirname(p) == str(tmp_path / "old") for p in archived)
+        assert set(old.groups()[base]) == set(archived)
+
+    def test_failed_move_leaves_group_in_place(self, tmp_path):
+        base, paths = _group(str(tmp_path / "invoices"))
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=False)
+        real_move = archive._move
+        calls = []
+
+        def failing_move(src, dst):
+            calls.append(src)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            real_move(src, dst)
+
+        with patch("src.storage.archive._move", side_effect=failing_move):
+            with pytest.raises(OSError):
+                old.archive_group(base, paths)
+
+        assert all(os.path.exists(p) for p in paths)
+        assert old.locate(base) is None
+
+    def test_recover_restores_staged_group(self, tmp_path):
+        invoices = str(tmp_path / "invoices")
+        base, paths = _group(invoices)
+        root = str(tmp_path / "old")
+        staging = os.path.join(root, archive.STAGING_DIR, base)
+        os.makedirs(staging)
+        with open(staging + ".origin", "w", encoding="utf-8") as f:
+            f.write(invoices)
+        os.replace(paths[1], os.path.join(staging, os.path.basename(paths[1])))
+
+        Archive(root, layout="sharded", bundle_text=False)
+
+        assert all(os.path.exists(p) for p in paths)
+        assert os.listdir(os.path.join(root, archive.STAGING_DIR)) == []
+
+
+class TestBundles:
+    @pytest.fixture(autouse=True)
+    def _zstd(self):
+        pytest.importorskip("zstandard")
+
+    def test_text_is_bundled_and_readable(self, tmp_path):
+        base, paths = _group(str(tmp_path / "invoices"), pdf=False)
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=True)
+
+        archived = old.archive_group(base, paths, {"purchase_date": "2024-02-01", "company_name": "Acme"})
+
+        refs = [a for a in archived if "#" in a]
+        assert len(refs) == 1
+        assert refs[0].endswith(f"text-0001.zst#{base}.txt")
+        assert old.read(refs[0]) == "Subject: Invoice\nTotal: $5.00\n"
+        assert not os.path.exists(paths[0])
+        assert "Total: $5.00" in old.group_content(old.groups()[base])
+
+    def test_random_access_across_groups(self, tmp_path):
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=True)
+        refs = {}
+        for i in range(5):
+            base, paths = _group(str(tmp_path / "invoices"), base=f"m{i}_170532900000{i}", pdf=False)
+            with open(paths[0], "w", encoding="utf-8") as f:
+                f.write(f"email {i}")
+            refs[i] = old.archive_group(base, paths, {"purchase_date": "2024-01-02"})[0]
+        assert len({r.split("#")[0] for r in refs.values()}) == 1
+        assert old.read(refs[3]) == "email 3"
+        assert old.read(refs[0]) == "email 0"
+
+    def test_bundle_rolls_over_when_full(self, tmp_path, monkeypatch):
+        from src.config import settings
+        monkeypatch.setattr(settings, "ARCHIVE_BUNDLE_MAX_BYTES", 1)
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=True)
+        bundles = set()
+        for i in range(2):
+            base, paths = _group(str(tmp_path / "invoices"), base=f"m{i}_170532900000{i}", pdf=False)
+            bundles.add(old.archive_group(base, paths, {"purchase_date": "2024-01-02"})[0].split("#")[0])
+        assert len(bundles) == 2
+
+
+class TestGetArchive:
+    def test_follows_settings(self, tmp_path, monkeypatch):
+        from src.config import settings
+        monkeypatch.setattr(settings, "OLD_INVOICE_DIR", str(tmp_path / "a"))
+        first = archive.get_archive()
+        assert archive.get_archive() is first
+        monkeypatch.setattr(settings, "OLD_INVOICE_DIR", str(tmp_path / "b"))
+        assert archive.get_archive().root == str(tmp_path / "b")
+
+
+class TestCollisionNames:
+    def test_clashing_names_get_content_hash_suffix(self, tmp_path):
+        from src.processors import file_handler
+        target = tmp_path / "old"
+        target.mkdir()
+        (target / "g_1705329000000_invoice.pdf").write_bytes(b"first")
+        names = []
+        for content in (b"second", b"third"):
+            src = tmp_path / "g_1705329000000_invoice.pdf"
+            src.write_bytes(content)
+            names.append(os.path.basename(file_handler.move_processed_files([str(src)], str(target))[0]))
+
+        assert names[0] != names[1]
+        assert all(n.startswith("g_1705329000000_invoice~") and n.endswith(".pdf") for n in names)
+        # Same content again: same name, nothing new written
+        src = tmp_path / "g_1705329000000_invoice.pdf"
+        src.write_bytes(b"second")
+        assert os.path.basename(file_handler.move_processed_files([str(src)], str(target))[0]) == names[0]
+        assert len(os.listdir(target)) == 3
+        assert list(file_handler.get_invoice_files(str(target))) == ["g_1705329000000"]
+
+
+class TestArchiveWorker:
+    def test_archives_in_background_and_reports_each_group(self, tmp_path):
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=False)
+        done = {}
+        with archive.ArchiveWorker(old, batch_size=4, batch_seconds=0.05) as worker:
+            for i in range(6):
+                base, paths = _group(str(tmp_path / "invoices"), base=f"m{i}_170532900000{i}")
+                worker.submit(base, paths, {"purchase_date": "2024-01-02"},
+                              lambda archived, error, base=base: done.setdefault(base, (archived, error)))
+
+        assert worker.archived == 6
+        assert len(done) == 6
+        assert all(error is None and len(archived) == 2 for archived, error in done.values())
+        assert os.listdir(str(tmp_path / "invoices")) == []
+
+    def test_failure_is_reported_not_raised(self, tmp_path):
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=False)
+        results = []
+        with archive.ArchiveWorker(old, batch_seconds=0) as worker:
+            worker.submit("missing_1705329000000", [str(tmp_path / "missing.txt")], None,
+                          lambda archived, error: results.append(error))
+        assert worker.failed == 1
+        assert isinstance(results[0], OSError)
+
+    def test_batch_fsyncs_each_directory_once(self, tmp_path):
+        old = Archive(str(tmp_path / "old"), layout="sharded", bundle_text=False)
+        groups = [_group(str(tmp_path / "invoices"), base=f"m{i}_170532900000{i}") for i in range(3)]
+        with patch("src.storage.archive.fsync_dir") as mock_fsync:
+            with old.batch():
+                for base, paths in groups:
+                    old.archive_group(base, paths, {"purchase_date": "2024-01-02", "company_name": "Acme"})
+                assert mock_fsync.call_count == 0
+        synced = [c.args[0] for c in mock_fsync.call_args_list]
+        assert len(synced) == len(set(synced))
+        assert str(tmp_path / "invoices") in synced
+        assert os.path.join(str(tmp_path / "old"), "2024", "01", "acme") in synced
@@ -0,0 +1,137 @@
+"""Tests for src/storage/blob_store.py"""
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from src.config import settings
+from src.processors import file_handler
+from src.storage import blob_store
+
+
+def _write(path, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class TestSave:
+    def test_identical_attachments_share_one_blob(self, tmp_path):
+        a, b = str(tmp_path / "a_terms.pdf"), str(tmp_path / "b_terms.pdf")
+        blob_a = blob_store.save(b"%PDF terms", a)
+        blob_b = blob_store.save(b"%PDF terms", b)
+
+        assert blob_a == blob_b
+        assert blob_a.startswith(settings.BLOB_DIR)
+        assert blob_a.endswith(".pdf")
+        assert os.path.samefile(a, b)
+        assert os.stat(blob_a).st_nlink == 3
+
+    def test_different_content_different_blobs(self, tmp_path):
+        blob_a = blob_store.save(b"one", str(tmp_path / "a.pdf"))
+        blob_b = blob_store.save(b"two", str(tmp_path / "b.pdf"))
+        assert blob_a != blob_b
+
+    def test_falls_back_to_copy_without_hardlinks(self, tmp_path):
+        target = str(tmp_path / "a.pdf")
+        with patch("src.storage.blob_store.os.link", side_effect=OSError("cross-device")):
+            blob = blob_store.save(b"data", target)
+        assert not os.path.samefile(blob, target)
+        with open(target, "rb") as f:
+            assert f.read() == b"data"
+
+
+class TestCachedText:
+    def test_extracts_each_content_once(self, tmp_path):
+        a, b = str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")
+        _write(a, b"same")
+        _write(b, b"same")
+        extract = Mock(return_value=("Invoice total 5.00", True))
+
+        assert blob_store.cached_text(a, extract) == "Invoice total 5.00"
+        assert blob_store.cached_text(b, extract) == "Invoice total 5.00"
+        extract.assert_called_once_with(a)
+
+    def test_missing_file_is_extracted_directly(self):
+        extract = Mock(return_value=("x", True))
+        assert blob_store.cached_text("missing.pdf", extract) == "x"
+        extract.assert_called_once_with("missing.pdf")
+
+    def test_incomplete_text_is_not_cached(self, tmp_path):
+        a = str(tmp_path / "a.pdf")
+        _write(a, b"scan")
+        extract = Mock(side_effect=[("Page one only", False), ("Page one\nPage two", True)])
+
+        assert blob_store.cached_text(a, extract) == "Page one only"
+        assert blob_store.cached_text(a, extract) == "Page one\nPage two"
+        assert blob_store.cached_text(a, extract) == "Page one\nPage two"
+        assert extract.call_count == 2
+
+    @patch("src.processors.file_handler.extract_pdf_text", return_value=("pdf text", True))
+    def test_read_file_uses_cache(self, mock_read_pdf, tmp_path):
+        a, b = str(tmp_path / "x_1.pdf"), str(tmp_path / "y_2.pdf")
+        _write(a, b"%PDF")
+        _write(b, b"%PDF")
+        assert file_handler.read_file(a) == "pdf text"
+        assert file_handler.read_file(b) == "pdf text"
+        assert mock_read_pdf.call_count == 1
+
+
+class TestUsageAndGc:
+    def test_usage_reports_savings(self, tmp_path):
+        for name in ("a.pdf", "b.pdf", "c.pdf"):
+            blob_store.save(b"x" * 100, str(tmp_path / name))
+        blob_store.save(b"y" * 10, str(tmp_path / "d.pdf"))
+
+        stats = blob_store.usage()
+        assert stats["blobs"] == 2
+        assert stats["references"] == 4
+        assert stats["stored_bytes"] == 110
+        assert stats["referenced_bytes"] == 310
+        assert stats["saved_bytes"] == 200
+        assert "saved 200 B" in blob_store.format_usage(stats)
+
+    def test_gc_removes_only_unreferenced_blobs_and_their_text(self, tmp_path):
+        kept, dropped = str(tmp_path / "kept.pdf"), str(tmp_path / "dropped.pdf")
+        kept_blob = blob_store.save(b"kept", kept)
+        dropped_blob = blob_store.save(b"dropped", dropped)
+        blob_store.cached_text(dropped, lambda p: ("text", True))
+        os.remove(dropped)
+
+        removed = blob_store.gc(grace_seconds=0, now=time.time() + 1)
+
+        assert removed["blobs"] == 1
+        assert removed["texts"] == 1
+        assert os.path.exists(kept_blob)
+        assert not os.path.exists(dropped_blob)
+
+    def test_gc_grace_period_protects_new_blobs(self, tmp_path):
+        blob = blob_store.put(b"just written")
+        assert blob_store.gc(grace_seconds=3600)["blobs"] == 0
+        assert os.path.exists(blob)
+
+    def test_dry_run_deletes_nothing(self, tmp_path):
+        blob = blob_store.put(b"orphan")
+        removed = blob_store.gc(grace_seconds=0, now=time.time() + 1, dry_run=True)
+        assert removed["blobs"] == 1
+        assert os.path.exists(blob)
+
+    def test_run_blobs_prints_report(self, tmp_path, capsys):
+        blob_store.save(b"x", str(tmp_path / "a.pdf"))
+        stats = blob_store.run_blobs(SimpleNamespace(gc=True, dry_run=False))
+        assert stats["blobs"] == 1
+        assert "1 blob(s)" in capsys.readouterr().out
+
+
+class TestArchiveDedup:
+    def test_same_content_collision_is_not_duplicated(self, tmp_path):
+        archive = tmp_path / "old"
+        archive.mkdir()
+        src = str(tmp_path / "g_1_terms.pdf")
+        blob_store.save(b"terms", src)
+        blob_store.save(b"terms", str(archive / "g_1_terms.pdf"))
+
+        moved = file_handler.move_processed_files([src], str(archive))
+
+        assert moved == [str(archive / "g_1_terms.pdf")]
+        assert sorted(os.listdir(archive)) == ["g_1_terms.pdf"]
+        assert not os.path.exists(src)
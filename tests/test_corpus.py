@@ -0,0 +1,85 @@
+"""Tests for benchmarks/corpus.py"""
+import json
+import os
+
+from benchmarks.corpus import invoice, load_truth, render_pdf, score, write_corpus, write_group
+from src.processors import file_handler, invoice_processor
+
+
+def _extracted(truth):
+    """A perfect extraction of a truth record, in stored-invoice shape."""
+    return {
+        'mail_thread_id': truth['thread_id'], 'company_name': truth['company_name'],
+        'purchase_date': truth['purchase_date'], 'order_number': truth['order_number'],
+        'total_price': truth['total_price'],
+        'items': [{'quantity': i['quantity'], 'price': i['price']} for i in truth['items']],
+    }
+
+
+class TestGenerator:
+    def test_deterministic_per_seed_and_index(self):
+        assert invoice(5, seed=1) == invoice(5, seed=1)
+        assert invoice(5, seed=1)['truth'] != invoice(5, seed=2)['truth']
+
+    def test_pdf_is_deterministic_and_readable(self, temp_dir):
+        pages = [[[(40, "Order # ABC-123")], [(40, "Total"), (300, "12.50")]], [[(40, "Page (2)")]]]
+        assert render_pdf(pages) == render_pdf(pages)
+
+        path = os.path.join(temp_dir, "x.pdf")
+        with open(path, "wb") as f:
+            f.write(render_pdf(pages))
+        text = file_handler.read_pdf(path)
+        assert "Order # ABC-123" in text and "Total 12.50" in text and "Page (2)" in text
+
+    def test_long_orders_span_pages(self):
+        inv = invoice(0, seed=4, llm_share=0.0, pdf_share=1.0, long_share=1.0, rows_per_page=10)
+        assert inv['truth']['pages'] > 1
+        assert len(inv['truth']['items']) >= 10
+
+
+class TestWriteCorpus:
+    def test_layout_matches_downloader(self, temp_dir):
+        summary = write_corpus(temp_dir, 12, seed=3)
+        assert summary['invoices'] == 12
+
+        groups = file_handler.get_invoice_files(os.path.join(temp_dir, "invoices"))
+        truth = load_truth(temp_dir)
+        assert len(groups) == 12
+
+        for base, paths in groups.items():
+            txt = next(p for p in paths if p.endswith(".txt"))
+            headers = file_handler.parse_email_headers(txt)
+            record = truth[headers['thread_id']]
+            assert record['base'] == base
+            assert len(paths) == (2 if record['pages'] else 1)
+            with open(os.path.join(temp_dir, "truth", f"{base}.json")) as f:
+                assert json.load(f) == record
+
+    def test_known_vendor_groups_parse(self, temp_dir):
+        inv = next(inv for inv in (invoice(i, seed=0, llm_share=0.0, pdf_share=1.0, long_share=0.0)
+                                   for i in range(20))
+                   if inv['truth']['layout'] == 'mcmaster_carr')
+        paths = write_group(inv, temp_dir)
+
+        result = invoice_processor.process_group(paths)
+        assert result['company_name'] == 'McMaster-Carr'
+        assert result['order_number'] == inv['truth']['order_number']
+        assert abs(result['total_price'] - inv['truth']['total_price']) < 0.005
+
+
+class TestScore:
+    def test_perfect_extraction(self):
+        truth = {t['thread_id']: t for t in (invoice(i, seed=2)['truth'] for i in range(5))}
+        report = score(truth, [_extracted(t) for t in truth.values()])
+        assert report['matched'] == 5
+        assert set(report['accuracy'].values()) == {1.0}
+
+    def test_matches_by_order_number_and_counts_misses(self):
+        truth = {t['thread_id']: t for t in (invoice(i, seed=2)['truth'] for i in range(4))}
+        first, second = list(truth.values())[:2]
+        wrong_total = dict(_extracted(first), mail_thread_id='', total_price=first['total_price'] + 1)
+
+        report = score(truth, [wrong_total, _extracted(second)])
+        assert report['matched'] == 2
+        assert report['accuracy']['found'] == 0.5
+        assert report['accuracy']['total_price'] == 0.25
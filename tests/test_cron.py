@@ -0,0 +1,40 @@
+"""Tests for src/daemon/cron.py"""
+import pytest
+from datetime import datetime
+from src.daemon.cron import CronSchedule
+
+
+class TestCronSchedule:
+    def test_midnight_and_seven(self):
+        cron = CronSchedule("0 0,7 * * *")
+        assert cron.next_after(datetime(2024, 1, 15, 3, 12)) == datetime(2024, 1, 15, 7, 0)
+        assert cron.next_after(datetime(2024, 1, 15, 7, 0)) == datetime(2024, 1, 16, 0, 0)
+
+    def test_step_minutes(self):
+        cron = CronSchedule("*/15 * * * *")
+        assert cron.next_after(datetime(2024, 1, 15, 10, 1)) == datetime(2024, 1, 15, 10, 15)
+
+    def test_range_hours(self):
+        cron = CronSchedule("0 9-17 * * *")
+        assert cron.next_after(datetime(2024, 1, 15, 17, 30)) == datetime(2024, 1, 16, 9, 0)
+
+    def test_weekday_sunday_as_zero_and_seven(self):
+        # 2024-01-21 is a Sunday
+        assert CronSchedule("0 8 * * 0").next_after(datetime(2024, 1, 16)) == datetime(2024, 1, 21, 8, 0)
+        assert CronSchedule("0 8 * * 7").next_after(datetime(2024, 1, 16)) == datetime(2024, 1, 21, 8, 0)
+
+    def test_month_rollover(self):
+        cron = CronSchedule("0 0 1 * *")
+        assert cron.next_after(datetime(2024, 12, 15)) == datetime(2025, 1, 1, 0, 0)
+
+    def test_invalid_field_count(self):
+        with pytest.raises(ValueError):
+            CronSchedule("0 0 * *")
+
+    def test_out_of_range(self):
+        with pytest.raises(ValueError):
+            CronSchedule("61 * * * *")
+
+    def test_never_fires(self):
+        with pytest.raises(ValueError):
+            CronSchedule("0 0 31 2 *").next_after(datetime(2024, 1, 1))
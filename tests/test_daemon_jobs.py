@@ -0,0 +1,54 @@
+"""Tests for src/daemon/jobs.py"""
+from unittest.mock import patch
+
+from src.daemon import jobs
+
+
+def _state(**kwargs):
+    with patch.object(jobs.monitor_downloader, "load_processed_ids", return_value=set()):
+        return jobs.DaemonState(lambda skip_ids, invoice_dir=None: 0, **kwargs)
+
+
+class TestPoll:
+    def test_window_follows_poll_interval(self):
+        state = _state(poll_interval=30)
+        with patch.object(state, "download", return_value=0) as mock_download, \
+                patch.object(jobs.invoice_processor, "retry_queue_ready", return_value=False):
+            jobs.poll(state)
+        mock_download.assert_called_once_with(60)
+
+
+class TestFlush:
+    @patch.object(jobs.metrics, "flush")
+    @patch.object(jobs.invoice_store, "get_store")
+    @patch.object(jobs.sheet_sync, "sync")
+    @patch.object(jobs.monitor_downloader, "save_processed_ids")
+    def test_saves_ids_and_syncs_sheet(self, mock_save, mock_sync, mock_store, mock_metrics):
+        state = _state()
+        state.flush()
+        mock_save.assert_called_once_with(state.processed)
+        mock_sync.assert_called_once_with(mock_store.return_value)
+        mock_metrics.assert_called_once()
+
+    @patch.object(jobs.metrics, "flush")
+    @patch.object(jobs.sheet_sync, "sync")
+    @patch.object(jobs.monitor_downloader, "save_processed_ids")
+    def test_skips_sync_while_processing_runs(self, mock_save, mock_sync, mock_metrics):
+        state = _state()
+        with state.process_lock:
+            state.flush()
+        mock_save.assert_called_once()
+        mock_sync.assert_not_called()
+
+
+class TestRunDaemon:
+    @patch.object(jobs.asyncio, "run")
+    @patch.object(jobs, "Daemon")
+    @patch.object(jobs.sheets_writer, "get_existing_thread_ids", return_value={"t1"})
+    @patch.object(jobs.monitor_downloader, "load_processed_ids", return_value=set())
+    def test_without_reconcile_loads_sheet_ids(self, mock_load, mock_ids, mock_daemon, mock_run):
+        jobs.run_daemon(lambda skip_ids, invoice_dir=None: 0, {"poll": {"every": 15}})
+        mock_ids.assert_called_once()
+        built = mock_daemon.call_args.args[0]
+        assert [(j.name, j.every) for j in built] == [("poll", 15)]
+        mock_run.assert_called_once_with(mock_daemon.return_value.run.return_value)
@@ -0,0 +1,112 @@
+"""Tests for src/daemon/runtime.py"""
+import asyncio
+import threading
+import time
+import pytest
+from src.daemon.runtime import Job, Daemon
+
+
+def _run_for(daemon, seconds):
+    async def go():
+        task = asyncio.create_task(daemon.run())
+        await asyncio.sleep(seconds)
+        daemon.stop()
+        await task
+    asyncio.run(go())
+
+
+class TestJob:
+    def test_requires_one_schedule(self):
+        with pytest.raises(ValueError):
+            Job("x", lambda: None)
+        with pytest.raises(ValueError):
+            Job("x", lambda: None, cron="* * * * *", every=5)
+
+    def test_every_interval(self):
+        assert Job("x", lambda: None, every=30).seconds_until_next() == 30.0
+
+
+class TestDaemon:
+    def test_interval_job_runs_repeatedly(self):
+        calls = []
+        job = Job("tick", lambda: calls.append(1), every=0.05, run_at_start=True)
+        _run_for(Daemon([job]), 0.3)
+        assert len(calls) >= 3
+
+    def test_job_does_not_overlap_itself(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.15)
+            with lock:
+                active.pop()
+
+        job = Job("slow", slow, every=0.02, run_at_start=True)
+        _run_for(Daemon([job], shutdown_timeout=1), 0.3)
+        assert max(peak) == 1
+
+    def test_jobs_overlap_each_other(self):
+        started = threading.Event()
+        overlapped = []
+
+        def first():
+            started.set()
+            time.sleep(0.2)
+
+        def second():
+            overlapped.append(started.is_set())
+
+        jobs = [Job("a", first, every=10, run_at_start=True), Job("b", second, every=0.05)]
+        _run_for(Daemon(jobs, shutdown_timeout=1), 0.15)
+        assert overlapped and overlapped[0] is True
+
+    def test_shutdown_waits_for_running_job_and_flushes(self):
+        order = []
+
+        def work():
+            time.sleep(0.1)
+            order.append("job")
+
+        daemon = Daemon([Job("w", work, every=10, run_at_start=True)],
+                        flush_hooks=[lambda: order.append("flush")], shutdown_timeout=2)
+        _run_for(daemon, 0.02)
+        assert order == ["job", "flush"]
+
+    def test_failing_job_is_counted(self):
+        def boom():
+            raise RuntimeError("down")
+
+        job = Job("boom", boom, every=10, run_at_start=True)
+        _run_for(Daemon([job]), 0.05)
+        assert job.failures == 1
+
+    def test_hung_job_is_abandoned_after_timeout(self):
+        release = threading.Event()
+        flushed = []
+        daemon = Daemon([Job("hung", release.wait, every=10, run_at_start=True)],
+                        flush_hooks=[lambda: flushed.append(1)], shutdown_timeout=0.1)
+        start = time.perf_counter()
+        _run_for(daemon, 0.02)  # asyncio.run returns: nothing joins the job's thread
+        assert time.perf_counter() - start < 1
+        assert flushed == [1]
+        release.set()
+
+    def test_second_stop_skips_the_wait(self):
+        release = threading.Event()
+        daemon = Daemon([Job("hung", release.wait, every=10, run_at_start=True)], shutdown_timeout=30)
+
+        async def go():
+            task = asyncio.create_task(daemon.run())
+            await asyncio.sleep(0.02)
+            daemon.stop()
+            await asyncio.sleep(0.02)
+            daemon.stop()
+            await asyncio.wait_for(task, timeout=1)
+
+        asyncio.run(go())
+        release.set()
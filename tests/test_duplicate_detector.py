@@ -0,0 +1,118 @@
+"""Tests for src/processors/duplicate_detector.py"""
+import pytest
+from src.storage.invoice_store import InvoiceStore
+from src.processors import duplicate_detector as dd
+
+RECEIPT = """Thank you for your order from Home Depot.
+Order # WD12345678
+Item: 1/2 in. x 10 ft. PVC pipe  Qty 4  $3.98
+Item: PVC cement 8 oz  Qty 1  $7.49
+Subtotal $23.41  Tax $1.64  Total $25.05
+Ship to Rutgers Solar Car, 96 Frelinghuysen Rd, Piscataway NJ
+Questions about your order? Visit homedepot.com/orders or call 1-800-466-3337.
+"""
+
+FORWARDED = """---------- Forwarded message ---------
+From: Home Depot <orders@homedepot.com>
+Date: Mon, Jan 15, 2024 at 10:30 AM
+Subject: Your order confirmation
+To: team@example.com
+
+""" + RECEIPT
+
+
+@pytest.fixture
+def store():
+    s = InvoiceStore(":memory:")
+    yield s
+    s.close()
+
+
+def _store(store, tid, content, vendor='Home Depot', total=25.05, order=''):
+    result = {'mail_thread_id': tid, 'company_name': vendor, 'total_price': total,
+              'order_number': order, '_content': content}
+    dd.annotate(result)
+    invoice_id, _ = store.save_invoice(result)
+    return invoice_id, dd.check(store, invoice_id, result)
+
+
+class TestMinHash:
+    def test_identical_text_has_similarity_one(self):
+        sig = dd.minhash(dd.shingles(RECEIPT))
+        assert dd.similarity(sig, dd.minhash(dd.shingles(RECEIPT))) == 1.0
+
+    def test_forward_headers_ignored(self):
+        a = dd.minhash(dd.shingles(RECEIPT))
+        b = dd.minhash(dd.shingles(FORWARDED))
+        assert dd.similarity(a, b) == 1.0
+
+    def test_unrelated_text_dissimilar(self):
+        other = "McMaster-Carr packing list. Socket head screw 8-32 x 1/2 in, pack of 100. Total 12.31"
+        a = dd.minhash(dd.shingles(RECEIPT))
+        b = dd.minhash(dd.shingles(other))
+        assert dd.similarity(a, b) < 0.2
+
+    def test_estimate_tracks_jaccard(self):
+        words = [f"w{i}" for i in range(200)]
+        a = set(words[:150])
+        b = set(words[50:])
+        sa = dd.minhash({hash(w) & 0xffffffff for w in a})
+        sb = dd.minhash({hash(w) & 0xffffffff for w in b})
+        assert abs(dd.similarity(sa, sb) - 100 / 200) < 0.15
+
+    def test_signature_round_trip(self):
+        sig = dd.minhash(dd.shingles(RECEIPT))
+        assert dd.unpack(dd.pack(sig)) == sig
+
+    def test_lsh_buckets_count(self):
+        sig = dd.minhash(dd.shingles(RECEIPT), num_perm=128)
+        assert len(dd.lsh_buckets(sig, bands=32)) == 32
+
+
+class TestOrderNumber:
+    def test_from_result(self):
+        assert dd.order_number({'order_number': 'wd123'}) == 'WD123'
+
+    def test_from_content(self):
+        assert dd.order_number({'_content': RECEIPT}) == 'WD12345678'
+
+    def test_missing(self):
+        assert dd.order_number({'_content': 'no numbers here'}) == ''
+
+
+class TestCheck:
+    def test_forwarded_copy_flagged(self, store):
+        original, _ = _store(store, 't1', RECEIPT)
+        copy, match = _store(store, 't2', FORWARDED)
+        assert match['original'] == original
+        assert store.duplicates()[0][:2] == (copy, original)
+        assert store.unsynced_ids() == [original]
+
+    def test_same_order_number_different_text_flagged(self, store):
+        original, _ = _store(store, 't1', "Order confirmation. Order # WD12345678. Total 25.05")
+        _, match = _store(store, 't2', "Your package shipped! Tracking 1Z999. Order # WD12345678. Total 25.05")
+        assert match['original'] == original
+        assert match['reason'] == 'order WD12345678'
+
+    def test_same_template_different_total_not_flagged(self, store):
+        _store(store, 't1', RECEIPT)
+        _, match = _store(store, 't2', RECEIPT.replace("25.05", "99.10"), total=99.10, order='WD99999999')
+        assert match is None
+
+    def test_unrelated_invoice_not_flagged(self, store):
+        _store(store, 't1', RECEIPT)
+        _, match = _store(store, 't2', "McMaster-Carr receipt for bearings and shafts, total 310.00",
+                          vendor='McMaster-Carr', total=310.0)
+        assert match is None
+
+    def test_duplicate_of_duplicate_points_at_original(self, store):
+        original, _ = _store(store, 't1', RECEIPT, order='X1')
+        _store(store, 't2', FORWARDED, order='X2')
+        _, match = _store(store, 't3', FORWARDED, order='X3')
+        assert match['original'] == original
+
+    def test_duplicates_excluded_from_analytics_rows(self, store):
+        _store(store, 't1', RECEIPT)
+        _store(store, 't2', FORWARDED)
+        invoices, _ = store.bulk_rows()
+        assert len(invoices) == 1
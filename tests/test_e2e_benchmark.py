@@ -0,0 +1,81 @@
+"""Smoke tests for benchmarks/e2e_benchmark.py and its fakes"""
+import json
+from argparse import Namespace
+
+import requests
+
+from benchmarks.corpus import invoice
+from benchmarks.e2e_benchmark import percentile, run_scenario
+from benchmarks.fakes import FakeGmail, FakeSheets, OllamaStub, truth_answer
+
+
+def _opts(**overrides):
+    opts = dict(invoices=8, seed=1, llm_share=0.5, pdf_share=0.5, long_share=0.0, ollama_latency_ms=0, gmail_latency_ms=0,
+                sheets_latency_ms=0, cycles=2, verbose=False)
+    opts.update(overrides)
+    return Namespace(**opts)
+
+
+class TestFakes:
+    def test_gmail_list_pages_and_filters_by_after(self):
+        gmail = FakeGmail(page_size=2)
+        for i in range(3):
+            gmail.add_message(f"m{i}", "Receipt", "a@b.com", "body", internal_ms=(i + 1) * 1000_000)
+
+        first = gmail.users().messages().list(userId='me', q='x').execute()
+        assert len(first['messages']) == 2 and first['nextPageToken'] == '2'
+        recent = gmail.users().messages().list(userId='me', q='x after:2000').execute()
+        assert [m['id'] for m in recent['messages']] == ['m2', 'm1']
+
+    def test_gmail_attachments_and_history(self):
+        gmail = FakeGmail()
+        gmail.add_message("m1", "Receipt", "a@b.com", "body", attachments=[("a.pdf", "application/pdf", b"%PDF")])
+        part = gmail.users().messages().get(userId='me', id='m1').execute()['payload']['parts'][1]
+        data = gmail.users().messages().attachments().get(
+            userId='me', messageId='m1', id=part['body']['attachmentId']).execute()['data']
+        assert data == "JVBERg=="
+        history = gmail.users().history().list(userId='me', startHistoryId='1000').execute()
+        assert history['history'][0]['messagesAdded'][0]['message']['id'] == 'm1'
+
+    def test_sheets_ranges(self):
+        sheets = FakeSheets()
+        values = sheets.spreadsheets().values()
+        values.update(spreadsheetId='s', range='Sheet1!A1:K1', body={'values': [['h1', 'h2']]}).execute()
+        values.append(spreadsheetId='s', range='Sheet1!A:L', body={'values': [['t1', 'A']]}).execute()
+        values.batchUpdate(spreadsheetId='s', body={'data': [{'range': 'Sheet1!A3:K3', 'values': [['t2', 'B']]}]}).execute()
+
+        assert values.get(spreadsheetId='s', range='Sheet1!A:A').execute()['values'] == [['h1'], ['t1'], ['t2']]
+        assert values.get(spreadsheetId='s', range='Sheet1!A3:A').execute()['values'] == [['t2']]
+        assert sheets.calls['values.update'] == 1
+
+    def test_ollama_stub_answers_by_order_number(self):
+        truth = invoice(3, seed=1, llm_share=1.0)['truth']
+        prompt = f"Extract...\n=== EMAIL BODY ===\nOrder # {truth['order_number']}\n"
+        with OllamaStub(answers={truth['order_number']: truth_answer(truth)}) as stub:
+            known = requests.post(f"{stub.url}/api/chat", json={"messages": [{"role": "user", "content": prompt}]})
+            unknown = requests.post(f"{stub.url}/api/chat", json={"messages": [{"role": "user", "content": "hi"}]})
+            tags = requests.get(f"{stub.url}/api/tags")
+
+        assert json.loads(known.json()['message']['content'])['total_price'] == truth['total_price']
+        assert json.loads(unknown.json()['message']['content']) == {}
+        assert tags.json()['models'][0]['name'] == stub.model
+        assert stub.requests == 2
+
+
+class TestScenarios:
+    def test_pipeline_stores_every_invoice(self):
+        result = run_scenario("pipeline", _opts())
+        assert result['invoices'] == 8
+        assert result['sheet_rows'] == 8
+        assert result['stages']['parse']['calls'] == 8
+        assert result['accuracy']['found'] == 1.0
+
+    def test_monitor_cycles(self):
+        result = run_scenario("monitor", _opts())
+        assert result['invoices'] == 8
+        assert result['stages']['download']['calls'] == 2
+
+    def test_percentile_nearest_rank(self):
+        assert percentile([1, 2, 3, 4], 50) == 2
+        assert percentile(list(range(1, 101)), 99) == 99
+        assert percentile([], 50) == 0.0
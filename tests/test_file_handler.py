@@ -78,9 +78,9 @@ class TestReadFile:
             f.write("Text content")
         assert read_file(filepath) == "Text content"
 
-    @patch('src.processors.file_handler.read_pdf')
+    @patch('src.processors.file_handler.extract_pdf_text')
     def test_read_file_pdf(self, mock_read_pdf, temp_dir):
-        mock_read_pdf.return_value = "PDF content"
+        mock_read_pdf.return_value = ("PDF content", True)
         filepath = os.path.join(temp_dir, "test.pdf")
         read_file(filepath)
         mock_read_pdf.assert_called_once()
@@ -0,0 +1,69 @@
+"""Tests for src/processors/invoice_classifier.py"""
+import os
+import pytest
+from unittest.mock import patch
+from src.processors.invoice_classifier import (
+    score, is_invoice, matched_features, quarantine, load_report
+)
+
+
+class TestScore:
+    def test_score_real_invoice_is_high(self, sample_email_text):
+        assert score(sample_email_text, "Your Order Confirmation") > 0.9
+
+    def test_score_newsletter_is_low(self):
+        text = "Our spring newsletter is here! View in browser. Unsubscribe at any time."
+        assert score(text, "Spring Newsletter") < 0.2
+
+    def test_score_bill_reminder_is_low(self):
+        text = "Reminder: your payment is due on 02/01. Autopay is not enabled."
+        assert score(text, "Your bill is ready") < 0.35
+
+    def test_score_empty_content(self):
+        assert 0.0 < score("", "") < 0.5
+
+    def test_score_uses_subject(self):
+        assert score("Thanks!", "Receipt for your purchase") > score("Thanks!", "")
+
+    def test_matched_features_lists_names(self):
+        features = matched_features("Unsubscribe here", "Invoice")
+        assert "invoice_word" in features
+        assert "unsubscribe" in features
+
+
+class TestIsInvoice:
+    def test_is_invoice_default_threshold(self, sample_email_text):
+        assert is_invoice(sample_email_text) is True
+
+    def test_is_invoice_custom_threshold(self):
+        assert is_invoice("Invoice content", threshold=0.99) is False
+
+    @patch('src.processors.invoice_classifier.settings')
+    def test_is_invoice_reads_settings_threshold(self, mock_settings):
+        mock_settings.CLASSIFIER_THRESHOLD = 0.0
+        assert is_invoice("newsletter unsubscribe") is True
+
+
+class TestQuarantine:
+    def test_quarantine_moves_files_and_writes_report(self, temp_dir):
+        src = os.path.join(temp_dir, "msg_1700000000000.txt")
+        with open(src, 'w', encoding='utf-8') as f:
+            f.write("newsletter")
+        qdir = os.path.join(temp_dir, "quarantine")
+
+        with patch('src.processors.invoice_classifier.settings') as mock_settings:
+            mock_settings.QUARANTINE_DIR = qdir
+            mock_settings.QUARANTINE_REPORT_FILE = os.path.join(qdir, "report.jsonl")
+            quarantine([src], "newsletter unsubscribe", {"subject": "News", "thread_id": "t1"})
+            report = load_report()
+
+        assert not os.path.exists(src)
+        assert os.path.exists(os.path.join(qdir, "msg_1700000000000.txt"))
+        assert len(report) == 1
+        assert report[0]["thread_id"] == "t1"
+        assert "unsubscribe" in report[0]["features"]
+
+    @patch('src.processors.invoice_classifier.settings')
+    def test_load_report_missing_file(self, mock_settings, temp_dir):
+        mock_settings.QUARANTINE_REPORT_FILE = os.path.join(temp_dir, "missing.jsonl")
+        assert load_report() == []
@@ -1,7 +1,10 @@
 """Tests for src/processors/invoice_processor.py"""
 import pytest
 from unittest.mock import patch, Mock
-from src.processors.invoice_processor import detect_vendor, route, process_group, process_all
+from src.processors.invoice_processor import (
+    detect_vendor, route, process_group, process_all, load_retry_queue, park_group
+)
+from src.processors.llm_extractor import LLMUnavailableError
 
 
 class TestDetectVendor:
@@ -31,8 +34,9 @@ class TestDetectVendor:
 
 
 class TestRoute:
+    @patch('src.processors.invoice_processor.llm_extractor')
     @patch('src.processors.invoice_processor.vendor_parser')
-    def test_route_to_vendor_parser(self, mock_vendor):
+    def test_route_to_vendor_parser(self, mock_vendor, mock_llm):
         mock_vendor.parse.return_value = {'organizations': ['Test']}
         mock_vendor.normalize_to_schema.return_value = {'company_name': 'Test'}
 
@@ -40,6 +44,32 @@ class TestRoute:
         mock_vendor.parse.assert_called_once()
         mock_vendor.normalize_to_schema.assert_called_once()
 
+    @patch('src.processors.invoice_processor.llm_extractor')
+    @patch('src.processors.invoice_processor.vendor_parser')
+    def test_route_validates_vendor_output(self, mock_vendor, mock_llm):
+        mock_vendor.normalize_to_schema.return_value = {
+            'company_name': 'The Home Depot', 'total_price': '$84.11', 'sum of other_expanses': '5.00, 2.50'
+        }
+        result = route("orders@homedepot.com", "Invoice content")
+        assert result['total_price'] == 84.11
+        assert result['other_expenses'] == 7.5
+        mock_llm.extract.assert_not_called()
+
+    @patch('src.processors.invoice_processor.llm_extractor')
+    @patch('src.processors.invoice_processor.vendor_parser')
+    def test_route_invalid_vendor_output_falls_back_to_llm(self, mock_vendor, mock_llm):
+        mock_vendor.normalize_to_schema.return_value = {'company_name': 'The Home Depot', 'total_price': ''}
+        mock_llm.extract.return_value = {'company_name': 'The Home Depot', 'total_price': 10.0}
+        assert route("orders@homedepot.com", "Invoice content")['total_price'] == 10.0
+        mock_llm.extract.assert_called_once_with("Invoice content")
+
+    @patch('src.processors.invoice_processor.llm_extractor')
+    @patch('src.processors.invoice_processor.vendor_parser')
+    def test_route_passes_pdf_attachments_to_vendor_parser(self, mock_vendor, mock_llm):
+        mock_vendor.normalize_to_schema.return_value = {'company_name': 'The Home Depot', 'total_price': '5.00'}
+        route("orders@homedepot.com", "Invoice content", ["g_1.txt", "g_1_receipt.PDF"])
+        mock_vendor.parse.assert_called_once_with("Invoice content", "home_depot", ["g_1_receipt.PDF"])
+
     @patch('src.processors.invoice_processor.llm_extractor')
     def test_route_to_llm_for_unknown(self, mock_llm):
         mock_llm.extract.return_value = {'company_name': 'Unknown Corp'}
@@ -84,6 +114,39 @@ class TestProcessGroup:
         process_group(['/path/to/mcmaster_invoice.pdf'])
         mock_route.assert_called()
 
+    @patch('src.processors.invoice_processor.invoice_classifier')
+    @patch('src.processors.invoice_processor.file_handler')
+    @patch('src.processors.invoice_processor.route')
+    def test_process_group_quarantines_non_invoice(self, mock_route, mock_file_handler, mock_classifier):
+        mock_file_handler.combine_content.return_value = "Newsletter - unsubscribe"
+        mock_file_handler.parse_email_headers.return_value = {
+            'sender_email': 'news@random.com',
+            'thread_id': 'thread_9',
+            'received_time': '',
+            'subject': 'Spring newsletter'
+        }
+        mock_classifier.is_invoice.return_value = False
+
+        assert process_group(['/path/to/email.txt']) is None
+        mock_classifier.quarantine.assert_called_once()
+        mock_route.assert_not_called()
+
+    @patch('src.processors.invoice_processor.invoice_classifier')
+    @patch('src.processors.invoice_processor.file_handler')
+    @patch('src.processors.invoice_processor.route')
+    def test_process_group_known_vendor_skips_classifier(self, mock_route, mock_file_handler, mock_classifier):
+        mock_file_handler.combine_content.return_value = "Order content"
+        mock_file_handler.parse_email_headers.return_value = {
+            'sender_email': 'orders@homedepot.com',
+            'thread_id': 'thread_1',
+            'received_time': '',
+            'subject': 'Your order'
+        }
+        mock_route.return_value = {'company_name': 'The Home Depot'}
+
+        process_group(['/path/to/email.txt'])
+        mock_classifier.is_invoice.assert_not_called()
+
 
 class TestProcessAll:
     @patch('src.processors.invoice_processor.file_handler')
@@ -138,3 +201,102 @@ class TestProcessAll:
         mock_file_handler.get_invoice_files.return_value = {}
         list(process_all(invoice_dir='data/old_invoices'))
         mock_file_handler.get_invoice_files.assert_called_with(invoice_dir='data/old_invoices')
+
+    @patch('src.processors.invoice_processor.llm_extractor')
+    @patch('src.processors.invoice_processor.load_group')
+    @patch('src.processors.invoice_processor.file_handler')
+    @patch('src.processors.invoice_processor.settings')
+    def test_process_all_batches_short_llm_groups(self, mock_settings, mock_file_handler,
+                                                  mock_load_group, mock_llm):
+        mock_settings.LLM_BATCH_SIZE = 2
+        mock_settings.LLM_BATCH_MAX_CHARS = 1000
+        mock_settings.CLASSIFIER_ENABLED = False
+        mock_settings.KNOWN_VENDORS = {}
+        mock_file_handler.get_invoice_files.return_value = {
+            'base1': ['/path/file1.txt'],
+            'base2': ['/path/file2.txt'],
+            'base3': ['/path/file3.txt'],
+        }
+        mock_load_group.side_effect = [
+            {'file_paths': ['/path/file%d.txt' % i], 'content': 'Receipt %d' % i,
+             'sender_email': 'a@shop.com', 'thread_id': 't%d' % i, 'received_time': '', 'subject': ''}
+            for i in (1, 2, 3)
+        ]
+        mock_llm.extract_batch.return_value = {'0': {'company_name': 'A'}, '1': {'company_name': 'C'}}
+
+        result = list(process_all(skip_ids={'t2'}))
+        assert [r['mail_thread_id'] for r in result] == ['t1', 't3']
+        mock_llm.extract_batch.assert_called_once()
+        assert [j['id'] for j in mock_llm.extract_batch.call_args[0][0]] == ['0', '1']
+        assert result[0]['_file_paths'] == ['/path/file1.txt']
+
+    @patch('src.processors.invoice_processor.llm_extractor')
+    @patch('src.processors.invoice_processor.load_group')
+    @patch('src.processors.invoice_processor.file_handler')
+    @patch('src.processors.invoice_processor.settings')
+    def test_batch_groups_sharing_a_thread_keep_their_own_answers(self, mock_settings, mock_file_handler,
+                                                                  mock_load_group, mock_llm):
+        mock_settings.LLM_BATCH_SIZE = 2
+        mock_settings.LLM_BATCH_MAX_CHARS = 1000
+        mock_settings.CLASSIFIER_ENABLED = False
+        mock_settings.KNOWN_VENDORS = {}
+        mock_file_handler.get_invoice_files.return_value = {'base1': ['/p/1.txt'], 'base2': ['/p/2.txt']}
+        mock_load_group.side_effect = [
+            {'file_paths': ['/p/%d.txt' % i], 'content': 'Receipt %d' % i,
+             'sender_email': 'a@shop.com', 'thread_id': thread, 'received_time': '', 'subject': ''}
+            for i, thread in ((1, ''), (2, ''))
+        ]
+        mock_llm.extract_batch.return_value = {'0': {'company_name': 'A'}, '1': {'company_name': 'B'}}
+
+        result = list(process_all())
+
+        assert [r['company_name'] for r in result] == ['A', 'B']
+        assert [r['mail_thread_id'] for r in result] == ['', '']
+        assert [r['_group'] for r in result] == ['base1', 'base2']
+
+
+class TestRetryQueue:
+    @patch('src.processors.invoice_processor.file_handler')
+    @patch('src.processors.invoice_processor.process_group')
+    def test_process_all_parks_group_when_llm_down(self, mock_process_group, mock_file_handler):
+        mock_file_handler.get_invoice_files.return_value = {
+            'base1': ['/path/file1.txt'],
+            'base2': ['/path/file2.txt']
+        }
+        mock_process_group.side_effect = [
+            LLMUnavailableError("refused"),
+            {'mail_thread_id': 't2', 'company_name': 'B'}
+        ]
+        result = list(process_all())
+        assert [r['mail_thread_id'] for r in result] == ['t2']
+        assert load_retry_queue()['base1']['file_paths'] == ['/path/file1.txt']
+
+    @patch('src.processors.invoice_processor.llm_extractor')
+    @patch('src.processors.invoice_processor.file_handler')
+    @patch('src.processors.invoice_processor.process_group')
+    def test_process_all_holds_parked_groups_while_unhealthy(self, mock_process_group,
+                                                             mock_file_handler, mock_llm):
+        park_group('base1', ['/path/file1.txt'], 'refused')
+        mock_llm.is_healthy.return_value = False
+        mock_file_handler.get_invoice_files.return_value = {
+            'base1': ['/path/file1.txt'],
+            'base2': ['/path/file2.txt']
+        }
+        mock_process_group.return_value = {'mail_thread_id': 't2', 'company_name': 'B'}
+
+        list(process_all())
+        mock_process_group.assert_called_once_with(['/path/file2.txt'])
+        assert 'base1' in load_retry_queue()
+
+    @patch('src.processors.invoice_processor.llm_extractor')
+    @patch('src.processors.invoice_processor.file_handler')
+    @patch('src.processors.invoice_processor.process_group')
+    def test_process_all_drains_queue_when_healthy(self, mock_process_group,
+                                                   mock_file_handler, mock_llm):
+        park_group('base1', ['/path/file1.txt'], 'refused')
+        mock_llm.is_healthy.return_value = True
+        mock_file_handler.get_invoice_files.return_value = {'base1': ['/path/file1.txt']}
+        mock_process_group.return_value = {'mail_thread_id': 't1', 'company_name': 'A'}
+
+        assert len(list(process_all())) == 1
+        assert load_retry_queue() == {}
@@ -0,0 +1,113 @@
+"""Tests for src/storage/invoice_store.py"""
+import os
+import sqlite3
+import pytest
+from src.config import settings
+from src.storage.invoice_store import InvoiceStore, content_hash, get_store
+
+
+@pytest.fixture
+def store():
+    s = InvoiceStore(":memory:")
+    yield s
+    s.close()
+
+
+class TestInvoiceStore:
+    def test_save_and_get_round_trip(self, store, sample_invoice_data):
+        invoice_id, created = store.save_invoice(sample_invoice_data, "grp_1700000000000")
+        assert created is True
+
+        data = store.get_invoice(invoice_id)
+        assert data['mail_thread_id'] == 'thread_123'
+        assert data['total_price'] == 150.0
+        assert data['other_expenses'] == 10.0
+        assert [i['item_name'] for i in data['items']] == ['Widget A', 'Widget B']
+        assert data['items'][0]['quantity'] == 2
+
+    def test_duplicate_thread_not_inserted(self, store, sample_invoice_data):
+        first, _ = store.save_invoice(sample_invoice_data)
+        second, created = store.save_invoice(dict(sample_invoice_data, total_price="1.00"))
+        assert created is False
+        assert second == first
+        assert store.count() == 1
+
+    def test_duplicate_content_without_thread(self, store):
+        data = {'company_name': 'A', 'total_price': 5.0}
+        store.save_invoice(data)
+        _, created = store.save_invoice(dict(data))
+        assert created is False
+
+    def test_same_content_different_threads_kept(self, store):
+        store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A', 'total_price': 5.0})
+        _, created = store.save_invoice({'mail_thread_id': 't2', 'company_name': 'A', 'total_price': 5.0})
+        assert created is True
+
+    def test_group_marked_processed_with_invoice(self, store, sample_invoice_data):
+        store.save_invoice(sample_invoice_data, "grp_1")
+        assert store.is_group_processed("grp_1")
+        assert not store.is_group_processed("grp_2")
+
+    def test_thread_ids(self, store):
+        store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A'})
+        store.save_invoice({'company_name': 'B'})
+        assert store.thread_ids() == {'t1'}
+        assert store.has_thread('t1')
+
+    def test_unsynced_and_mark_synced(self, store):
+        a, _ = store.save_invoice({'mail_thread_id': 't1'})
+        b, _ = store.save_invoice({'mail_thread_id': 't2'})
+        assert store.unsynced_ids() == [a, b]
+        store.mark_synced([a])
+        assert store.unsynced_ids() == [b]
+
+    def test_missing_numbers_stored_as_null(self, store):
+        invoice_id, _ = store.save_invoice({'mail_thread_id': 't1', 'total_price': ''})
+        assert store.get_invoice(invoice_id)['total_price'] == ''
+
+    def test_update_invoice_replaces_items_and_flags_sync(self, store, sample_invoice_data):
+        invoice_id, _ = store.save_invoice(sample_invoice_data)
+        store.mark_synced([invoice_id])
+
+        corrected = dict(sample_invoice_data, items=[{'item_name': 'Widget C', 'quantity': 1, 'price': 9}])
+        assert store.update_invoice(invoice_id, corrected) is True
+        assert [i['item_name'] for i in store.get_invoice(invoice_id)['items']] == ['Widget C']
+        assert store.unsynced_ids() == [invoice_id]
+        assert store.update_invoice(999, corrected) is False
+
+    def test_migrates_database_without_sheet_columns(self, temp_dir):
+        path = os.path.join(temp_dir, "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""CREATE TABLE invoices (id INTEGER PRIMARY KEY, mail_thread_id TEXT NOT NULL DEFAULT '',
+            company_name TEXT NOT NULL DEFAULT '', purchase_date TEXT NOT NULL DEFAULT '',
+            mail_received_time TEXT NOT NULL DEFAULT '', purchase_receiver TEXT NOT NULL DEFAULT '',
+            total_price REAL, other_expenses REAL, content_hash TEXT NOT NULL,
+            group_key TEXT NOT NULL DEFAULT '', created_at TEXT NOT NULL, updated_at TEXT NOT NULL,
+            sheet_synced INTEGER NOT NULL DEFAULT 0)""")
+        conn.commit()
+        conn.close()
+
+        s = InvoiceStore(path)
+        invoice_id, _ = s.save_invoice({'mail_thread_id': 't1'})
+        assert s.get_invoice(invoice_id)['_sheet_row'] is None
+        s.close()
+
+    def test_wal_mode_on_disk(self, temp_dir):
+        s = InvoiceStore(os.path.join(temp_dir, "inv.db"))
+        assert s.conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        s.close()
+
+    def test_get_store_uses_settings_path(self):
+        assert get_store().path == settings.INVOICE_DB_FILE
+
+
+class TestContentHash:
+    def test_ignores_thread_and_received_time(self):
+        a = {'mail_thread_id': 't1', 'mail_received_time': 'x', 'company_name': 'A', 'total_price': 5}
+        b = {'mail_thread_id': 't2', 'mail_received_time': 'y', 'company_name': 'a ', 'total_price': '5.0'}
+        assert content_hash(a) == content_hash(b)
+
+    def test_changes_with_items(self):
+        a = {'company_name': 'A', 'items': [{'item_name': 'x', 'quantity': 1, 'price': 2}]}
+        b = {'company_name': 'A', 'items': [{'item_name': 'x', 'quantity': 2, 'price': 2}]}
+        assert content_hash(a) != content_hash(b)
@@ -0,0 +1,123 @@
+"""Tests for src/storage/job_queue.py"""
+import os
+import time
+
+import pytest
+
+from src.config import settings
+from src.storage.job_queue import JobQueue, backoff_seconds
+
+
+@pytest.fixture
+def jobs():
+    queue = JobQueue(":memory:")
+    queue.add([{'id': 'm1', 'threadId': 't1'}, {'id': 'm2', 'threadId': 't2'}])
+    yield queue
+    queue.close()
+
+
+class TestTransitions:
+    def test_add_is_idempotent(self, jobs):
+        assert jobs.add([{'id': 'm1'}, {'id': 'm3'}]) == 1
+        assert jobs.counts()['listed'] == 3
+
+    def test_advance_only_moves_forward(self, jobs):
+        assert jobs.advance('m1', 'downloaded', group='g1')
+        assert jobs.advance('m1', 'parsed')
+        assert not jobs.advance('m1', 'parsed')
+        assert not jobs.advance('m1', 'extracted')
+        assert jobs.state('m1') == 'parsed'
+        assert jobs.message_for_group('g1') == 'm1'
+
+    def test_advance_group(self, jobs):
+        jobs.advance('m1', 'downloaded', group='g1')
+        assert jobs.advance_group('g1', 'archived')
+        assert not jobs.advance_group('unknown', 'archived')
+        assert jobs.state('m1') == 'archived'
+
+    def test_persists_across_reopen(self, temp_dir):
+        path = os.path.join(temp_dir, 'jobs.db')
+        queue = JobQueue(path)
+        queue.add([{'id': 'm1'}])
+        queue.advance('m1', 'downloaded', group='g1')
+        queue.close()
+
+        queue = JobQueue(path)
+        assert queue.state('m1') == 'downloaded'
+        assert queue.due('listed') == []
+        queue.close()
+
+
+class TestRetries:
+    def test_backoff_doubles_and_caps(self, monkeypatch):
+        monkeypatch.setattr(settings, 'JOB_RETRY_BASE_SECONDS', 10)
+        monkeypatch.setattr(settings, 'JOB_RETRY_MAX_SECONDS', 50)
+        assert [backoff_seconds(n) for n in (1, 2, 3, 4)] == [10, 20, 40, 50]
+
+    def test_failed_message_waits_out_its_delay(self, jobs):
+        delay = jobs.fail('m1', 'token expired')
+        assert delay == settings.JOB_RETRY_BASE_SECONDS
+        assert jobs.due('listed') == ['m2']
+        assert jobs.due('listed', now=time.time() + delay + 1) == ['m1', 'm2']
+        assert jobs.counts()['failing'] == 1
+
+    def test_progress_clears_failures(self, jobs):
+        jobs.fail('m1', 'boom')
+        jobs.advance('m1', 'downloaded', group='g1')
+        assert jobs.held_groups() == set()
+        assert jobs.counts()['failing'] == 0
+
+    def test_exhausted_until_reset(self, jobs, monkeypatch):
+        monkeypatch.setattr(settings, 'JOB_MAX_ATTEMPTS', 2)
+        jobs.advance('m1', 'downloaded', group='g1')
+        jobs.fail('m1', 'a')
+        jobs.fail('m1', 'b')
+        later = time.time() + 10 ** 6
+        assert jobs.due('downloaded', now=later) == []
+        assert jobs.held_groups(now=later) == {'g1'}
+        assert jobs.counts()['exhausted'] == 1
+
+        assert jobs.retry_exhausted() == 1
+        assert jobs.due('downloaded') == ['m1']
+
+    def test_unfinished_groups(self, jobs):
+        jobs.advance('m1', 'downloaded', group='g1')
+        jobs.advance('m2', 'downloaded', group='g2')
+        jobs.advance('m2', 'archived')
+        assert jobs.unfinished_groups(['g1', 'g2', 'other']) == ['g1']
+
+
+class TestResumableDownload:
+    def test_second_run_downloads_only_what_is_left(self, temp_dir, monkeypatch):
+        from benchmarks.fakes import FakeGmail
+        from src.downloaders import bulk_downloader
+
+        class FlakyGmail(FakeGmail):
+            failing = {'m1'}
+
+            def _get(self, userId, id, **kwargs):
+                if id in self.failing:
+                    raise ConnectionError('reset by peer')
+                return super()._get(userId, id, **kwargs)
+
+        monkeypatch.setattr(settings, 'INVOICE_DIR', temp_dir)
+        gmail = FlakyGmail()
+        for i in range(3):
+            gmail.add_message(f'm{i}', f'Invoice {i}', 'shop@example.com', f'Total $1{i}.00',
+                              internal_ms=1700000000000 + i)
+        monkeypatch.setattr(bulk_downloader, 'get_gmail_service', lambda: gmail)
+
+        jobs = JobQueue(":memory:")
+        assert bulk_downloader.download_invoices(jobs) == 2
+        assert jobs.state('m1') == 'listed'
+        assert sorted(f for f in os.listdir(temp_dir) if f.endswith('.txt')) == [
+            'm0@bench.local_1700000000000.txt', 'm2@bench.local_1700000000002.txt']
+        assert not os.listdir(os.path.join(temp_dir, '.partial'))
+
+        gmail.failing = set()
+        gmail.calls.clear()
+        monkeypatch.setattr(settings, 'JOB_RETRY_BASE_SECONDS', 0)
+        jobs.fail('m1', 'reset delay')
+        assert bulk_downloader.download_invoices(jobs) == 1
+        assert gmail.calls['messages.get'] == 1
+        assert jobs.counts()['downloaded'] == 3
@@ -0,0 +1,140 @@
+"""Tests for src/processors/line_items.py"""
+from unittest.mock import patch
+
+from benchmarks import corpus
+from benchmarks.line_items_benchmark import load_cases, run
+from src.processors import file_handler, line_items
+from src.processors.vendor_parser import parse
+
+HD_HEADER = line_items.TABLES["home_depot"]["header"]
+
+
+def _words(top, *cells):
+    """pdfplumber-style words for (x, text) cells on one line, 5pt per character."""
+    words = []
+    for x, text in cells:
+        for token in text.split():
+            words.append({"text": token, "x0": x, "x1": x + 5 * len(token), "top": top})
+            x += 5 * (len(token) + 1)
+    return words
+
+
+def _mcmaster_page(top, rows, header=True):
+    columns = [40, 62, 130, 340, 382, 418, 458, 520]
+    words = _words(top, *zip(columns, line_items.TABLES["mcmaster_carr"]["header"])) if header else []
+    for row in rows:
+        top += 14
+        if isinstance(row, str):
+            words += _words(top, (130, row))
+        else:
+            words += _words(top, *zip(columns, row))
+    return words
+
+
+def _pdf(tmp_path, inv):
+    path = str(tmp_path / "order.pdf")
+    with open(path, "wb") as f:
+        f.write(inv["attachments"][0][2])
+    return path
+
+
+def _truth_items(inv):
+    return [{"item_name": i["item_name"], "quantity": i["quantity"], "price": i["price"]}
+            for i in inv["truth"]["items"]]
+
+
+class TestFindColumns:
+    def test_multi_word_label(self):
+        line = _words(0, (40, "SKU"), (120, "Description"), (380, "Qty"), (430, "Unit Price"), (510, "Amount"))
+        spans = line_items.find_columns(line, HD_HEADER)
+        assert [x0 for x0, _ in spans] == [40, 120, 380, 430, 510]
+        assert spans[3] == (430, 430 + 5 * len("Unit Price"))
+
+    def test_other_lines_are_not_headers(self):
+        assert line_items.find_columns(_words(0, (40, "SKU 123 Description")), HD_HEADER) is None
+
+    def test_min_gap_rejects_flattened_text(self):
+        words = line_items.text_words("SKU Description Qty Unit Price Amount")
+        assert line_items.find_columns(words, HD_HEADER) is not None
+        assert line_items.find_columns(words, HD_HEADER, min_gap=2) is None
+
+
+class TestIterItems:
+    def test_wrapped_description_and_footer(self):
+        page = _mcmaster_page(100, [
+            ["1", "91251A540", "Steel Hex Nut,", "10", "Each", "10", "1.25", "12.50"],
+            "1/4\"-20 Thread Size",
+            ["2", "92196A830", "Brass Rivet", "1,000", "Box", "1,000", "2,100.00", "2,100,000.00"],
+        ])
+        page += _words(160, (340, "Merchandise"), (520, "2,100,012.50"))
+        page += _words(174, (430, "Page 1 of 1"))
+
+        items = list(line_items.iter_items([page], "mcmaster_carr"))
+
+        assert items == [
+            {"item_name": "91251A540 Steel Hex Nut, 1/4\"-20 Thread Size", "quantity": 10, "price": 1.25},
+            {"item_name": "92196A830 Brass Rivet", "quantity": 1000, "price": 2100.0},
+        ]
+
+    def test_page_without_header_reuses_columns(self):
+        first = _mcmaster_page(100, [["1", "91251A540", "Hex Nut", "1", "Each", "1", "1.00", "1.00"]])
+        second = _words(50, (40, "McMaster-Carr")) + _mcmaster_page(
+            60, [["2", "92196A830", "Rivet", "4", "Each", "4", "0.50", "2.00"]], header=False)
+        items = list(line_items.iter_items([first, second], "mcmaster_carr"))
+        assert [i["item_name"] for i in items] == ["91251A540 Hex Nut", "92196A830 Rivet"]
+
+    def test_no_header_no_items(self):
+        words = _words(0, (40, "1"), (62, "91251A540"), (340, "10"), (458, "1.25"))
+        assert list(line_items.iter_items([words], "mcmaster_carr")) == []
+
+
+class TestSources:
+    def test_multi_page_pdf_matches_truth(self, tmp_path):
+        inv = next(i for i in corpus.generate(40, seed=3, llm_share=0, pdf_share=1, long_share=1)
+                   if i["truth"]["layout"] == "home_depot")
+        assert inv["truth"]["pages"] > 1
+        assert line_items.pdf_items(_pdf(tmp_path, inv), "home_depot") == _truth_items(inv)
+
+    def test_aligned_email_body(self):
+        inv = next(i for i in corpus.generate(40, seed=3, llm_share=0, pdf_share=0)
+                   if i["truth"]["layout"] == "mcmaster_carr" and i["truth"]["wrapped_items"])
+        assert line_items.text_items(inv["body"], "mcmaster_carr") == _truth_items(inv)
+
+    def test_read_pdf_words_are_reused(self, tmp_path):
+        inv = next(i for i in corpus.generate(40, seed=3, llm_share=0, pdf_share=1)
+                   if i["truth"]["layout"] == "mcmaster_carr")
+        path = _pdf(tmp_path, inv)
+        text = file_handler.read_pdf(path)
+        with patch("src.processors.line_items.pdfplumber.open") as mock_open:
+            assert line_items.extract("mcmaster_carr", text, [path]) == _truth_items(inv)
+        mock_open.assert_not_called()
+
+    def test_unknown_vendor_or_no_table(self):
+        assert line_items.extract("generic", "anything") is None
+        assert line_items.extract("home_depot", "Total: $5.00") is None
+
+
+class TestVendorParse:
+    def test_home_depot_items_from_table(self):
+        inv = next(i for i in corpus.generate(40, seed=3, llm_share=0, pdf_share=0)
+                   if i["truth"]["layout"] == "home_depot")
+        assert parse(inv["body"], "home_depot")["items"] == _truth_items(inv)
+
+    def test_regex_fallback_without_table(self, sample_mcmaster_text):
+        items = parse(sample_mcmaster_text, "mcmaster_carr")["items"]
+        assert items[0] == {"item_name": "91251A540 Hex Nut Pack", "quantity": 10, "price": 2.5}
+
+    def test_disabled_uses_regex_only(self, monkeypatch):
+        from src.config import settings
+        monkeypatch.setattr(settings, "LINE_ITEM_TABLES_ENABLED", False)
+        inv = next(i for i in corpus.generate(40, seed=3, llm_share=0, pdf_share=0)
+                   if i["truth"]["layout"] == "home_depot")
+        assert "items" not in parse(inv["body"], "home_depot")
+
+
+class TestBenchmark:
+    def test_table_beats_regex(self, tmp_path):
+        report = run(load_cases(6, 1, pdf_share=0.5, long_share=0.5, workdir=str(tmp_path)))
+        assert report["invoices"] == 6
+        assert report["table"]["all"]["exact_invoices"] == 1.0
+        assert report["table"]["all"]["item_recall"] >= report["regex"]["all"]["item_recall"]
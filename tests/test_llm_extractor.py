@@ -1,7 +1,11 @@
 """Tests for src/processors/llm_extractor.py"""
 import pytest
+import requests
 from unittest.mock import patch, Mock
-from src.processors.llm_extractor import extract
+from src.config import settings
+from src.processors.llm_extractor import (
+    extract, extract_batch, build_batch_prompt, is_healthy, breaker, LLMUnavailableError
+)
 
 
 class TestLLMExtractor:
@@ -35,7 +39,7 @@ class TestLLMExtractor:
         result = extract("Invoice text here")
         assert result is not None
         assert result['company_name'] == 'Test Corp'
-        assert result['total_price'] == '150.00'
+        assert result['total_price'] == 150.0
 
     @patch('src.processors.llm_extractor.requests.post')
     def test_extract_handles_api_error(self, mock_post):
@@ -67,7 +71,7 @@ class TestLLMExtractor:
         assert 'total_price' in prompt
 
     @patch('src.processors.llm_extractor.requests.post')
-    def test_extract_uses_json_format(self, mock_post):
+    def test_extract_uses_json_schema_format(self, mock_post):
         mock_response = Mock()
         mock_response.json.return_value = {'message': {'content': '{}'}}
         mock_response.raise_for_status = Mock()
@@ -77,4 +81,175 @@ class TestLLMExtractor:
 
         call_args = mock_post.call_args
         payload = call_args.kwargs.get('json') or call_args[1].get('json')
-        assert payload.get('format') == 'json'
+        fmt = payload.get('format')
+        assert fmt['type'] == 'object'
+        assert fmt['properties']['total_price'] == {'type': 'number'}
+        assert fmt['properties']['items']['items']['properties']['quantity'] == {'type': 'integer'}
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_extract_coerces_malformed_types(self, mock_post):
+        mock_response = Mock()
+        mock_response.json.return_value = {'message': {'content': (
+            '{"company_name": "Acme", "total_price": "$1,204.50", "sum of other_expanses": "$5.00",'
+            ' "items": [{"item_name": "Bolt", "quantity": "two", "price": "$3.25"}]}'
+        )}}
+        mock_response.raise_for_status = Mock()
+        mock_post.return_value = mock_response
+
+        result = extract("Invoice text")
+        assert result['total_price'] == 1204.5
+        assert result['other_expenses'] == 5.0
+        assert result['items'][0]['quantity'] == 2
+        assert 'sum of other_expanses' not in result
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_extract_repairs_then_rejects(self, mock_post):
+        mock_response = Mock()
+        mock_response.json.return_value = {'message': {'content': '{"company_name": "Acme", "total_price": "N/A"}'}}
+        mock_response.raise_for_status = Mock()
+        mock_post.return_value = mock_response
+
+        assert extract("Invoice text") is None
+        assert mock_post.call_count == 2
+        repair_messages = mock_post.call_args.kwargs['json']['messages']
+        assert repair_messages[1]['role'] == 'assistant'
+        assert 'total_price' in repair_messages[2]['content']
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_extract_repair_succeeds(self, mock_post):
+        bad, good = Mock(), Mock()
+        bad.json.return_value = {'message': {'content': '{"company_name": "Acme"}'}}
+        good.json.return_value = {'message': {'content': '{"company_name": "Acme", "total_price": 12}'}}
+        mock_post.side_effect = [bad, good]
+
+        result = extract("Invoice text")
+        assert result['total_price'] == 12.0
+
+
+class TestExtractBatch:
+    @staticmethod
+    def _reply(content):
+        mock_response = Mock()
+        mock_response.json.return_value = {'message': {'content': content}}
+        mock_response.raise_for_status = Mock()
+        return mock_response
+
+    def test_extract_batch_empty(self):
+        assert extract_batch([]) == {}
+
+    def test_build_batch_prompt_delimits_each_invoice(self):
+        prompt = build_batch_prompt([
+            {'id': 't1', 'email_body': 'Receipt one'},
+            {'id': 't2', 'email_body': 'Receipt two'},
+        ])
+        assert '=== INVOICE t1 ===' in prompt
+        assert '=== END t2 ===' in prompt
+        assert 'Receipt one' in prompt
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_extract_batch_single_request(self, mock_post):
+        mock_post.return_value = self._reply(
+            '{"invoices": [{"mail_thread_id": "t1", "company_name": "A", "total_price": 1},'
+            ' {"mail_thread_id": "t2", "company_name": "B", "total_price": 2}]}'
+        )
+        result = extract_batch([
+            {'id': 't1', 'email_body': 'Receipt A'},
+            {'id': 't2', 'email_body': 'Receipt B'},
+        ])
+        assert mock_post.call_count == 1
+        assert result['t1']['company_name'] == 'A'
+        assert result['t2']['company_name'] == 'B'
+        # The batch label is not a thread ID
+        assert result['t1']['mail_thread_id'] == ''
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_extract_batch_retries_unmatched_singly(self, mock_post):
+        mock_post.side_effect = [
+            self._reply('[{"mail_thread_id": "t1", "company_name": "A", "total_price": 1},'
+                        ' {"mail_thread_id": "bogus", "company_name": "X", "total_price": 9}]'),
+            self._reply('{"company_name": "B", "total_price": 2}'),
+        ]
+        result = extract_batch([
+            {'id': 't1', 'email_body': 'Receipt A'},
+            {'id': 't2', 'email_body': 'Receipt B'},
+        ])
+        assert mock_post.call_count == 2
+        assert result['t2']['company_name'] == 'B'
+        single_prompt = mock_post.call_args.kwargs['json']['messages'][0]['content']
+        assert 'Receipt B' in single_prompt
+        assert 'Receipt A' not in single_prompt
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_extract_batch_falls_back_on_error(self, mock_post):
+        mock_post.side_effect = [
+            Exception("timeout"),
+            self._reply('{"company_name": "A", "total_price": 1}'),
+            self._reply('{"company_name": "B", "total_price": 2}'),
+        ]
+        result = extract_batch([
+            {'id': 't1', 'email_body': 'Receipt A'},
+            {'id': 't2', 'email_body': 'Receipt B'},
+        ])
+        assert mock_post.call_count == 3
+        assert result['t1']['company_name'] == 'A'
+
+
+class TestCircuitBreaking:
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_connection_error_raises_unavailable(self, mock_post):
+        mock_post.side_effect = requests.ConnectionError("refused")
+        with pytest.raises(LLMUnavailableError):
+            extract("Invoice text")
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_open_circuit_fails_fast(self, mock_post):
+        mock_post.side_effect = requests.Timeout("slow")
+        for _ in range(settings.LLM_BREAKER_FAILURES):
+            with pytest.raises(LLMUnavailableError):
+                extract("Invoice text")
+        mock_post.reset_mock()
+
+        with pytest.raises(LLMUnavailableError):
+            extract("Invoice text")
+        mock_post.assert_not_called()
+
+    @patch('src.processors.llm_extractor.requests.post')
+    def test_other_request_errors_end_the_half_open_trial(self, mock_post):
+        from src.utils.circuit_breaker import CircuitBreaker, OPEN
+        now = [0.0]
+        trial_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        trial_breaker.record_failure()
+        now[0] = 11
+
+        with patch('src.processors.llm_extractor.breaker', trial_breaker):
+            mock_post.side_effect = requests.exceptions.ChunkedEncodingError("connection broken")
+            with pytest.raises(LLMUnavailableError):
+                extract("Invoice text")
+            assert trial_breaker.state == OPEN
+
+            # After the next timeout a new trial is allowed and can close the circuit
+            now[0] = 22
+            mock_post.side_effect = None
+            mock_post.return_value.json.return_value = {
+                'message': {'content': '{"company_name": "A", "total_price": 1}'}}
+            assert extract("Invoice text")['company_name'] == 'A'
+            assert trial_breaker.allow_request() is True
+
+    @patch('src.processors.llm_extractor.requests.get')
+    def test_is_healthy_closes_circuit(self, mock_get):
+        for _ in range(settings.LLM_BREAKER_FAILURES):
+            breaker.record_failure()
+        mock_get.return_value.json.return_value = {'models': [{'name': settings.OLLAMA_MODEL}]}
+
+        assert is_healthy() is True
+        assert breaker.allow_request() is True
+
+    @patch('src.processors.llm_extractor.requests.get')
+    def test_is_healthy_requires_model(self, mock_get):
+        mock_get.return_value.json.return_value = {'models': [{'name': 'other:1b'}]}
+        assert is_healthy() is False
+
+    @patch('src.processors.llm_extractor.requests.get')
+    def test_is_healthy_handles_connection_error(self, mock_get):
+        mock_get.side_effect = requests.ConnectionError("refused")
+        assert is_healthy() is False
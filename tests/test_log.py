@@ -0,0 +1,96 @@
+"""Tests for src/utils/log.py"""
+import json
+import logging
+import queue
+import threading
+
+import pytest
+
+from src.utils import log
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.jsonl"
+    log.setup("INFO", log_file=str(path), levels={})
+    yield path
+    log.shutdown()
+    logging.getLogger("test.noisy").setLevel(logging.NOTSET)
+
+
+def _records(path):
+    log.shutdown()
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestJsonFile:
+    def test_fields(self, log_file):
+        logging.getLogger("test.module").warning("hello %s", "world", extra={"invoice_id": 7})
+        [rec] = _records(log_file)
+        assert rec["msg"] == "hello world"
+        assert rec["level"] == "WARNING"
+        assert rec["logger"] == "test.module"
+        assert rec["thread"] == "MainThread"
+        assert rec["thread_id"] == threading.get_ident()
+        assert rec["stage"] is None
+        assert rec["invoice_id"] == 7
+
+    def test_stage_of_emitting_thread(self, log_file):
+        def work():
+            log.set_stage("extract")
+            logging.getLogger("test.module").info("in stage")
+
+        t = threading.Thread(target=work, name="extract-0")
+        t.start()
+        t.join()
+        logging.getLogger("test.module").info("main")
+        recs = _records(log_file)
+        assert [(r["msg"], r["thread"], r["stage"]) for r in recs] == [
+            ("in stage", "extract-0", "extract"), ("main", "MainThread", None)]
+
+    def test_exception_text_kept(self, log_file):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("test.module").exception("failed")
+        [rec] = _records(log_file)
+        assert "ValueError: boom" in rec["msg"]
+
+
+class TestLevels:
+    def test_per_subsystem_level(self, tmp_path):
+        path = tmp_path / "app.jsonl"
+        log.setup("WARNING", log_file=str(path), levels={"test.noisy": "DEBUG"})
+        logging.getLogger("test.quiet").info("hidden")
+        logging.getLogger("test.noisy.child").debug("shown")
+        assert [r["msg"] for r in _records(path)] == ["shown"]
+        logging.getLogger("test.noisy").setLevel(logging.NOTSET)
+
+
+class TestQueue:
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = log.DroppingQueueHandler(queue.Queue(1))
+        record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+        handler.handle(record)
+        handler.handle(record)
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 1
+
+    def test_setup_twice_keeps_one_handler(self, tmp_path):
+        log.setup(log_file="")
+        log.setup(log_file="")
+        root = logging.getLogger()
+        assert sum(isinstance(h, log.DroppingQueueHandler) for h in root.handlers) == 1
+        log.shutdown()
+        assert not any(isinstance(h, log.DroppingQueueHandler) for h in root.handlers)
+
+    def test_rotation_is_bounded(self, tmp_path, monkeypatch):
+        from src.config import settings
+        monkeypatch.setattr(settings, "LOG_MAX_BYTES", 500)
+        monkeypatch.setattr(settings, "LOG_BACKUP_COUNT", 2)
+        path = tmp_path / "app.jsonl"
+        log.setup(log_file=str(path))
+        for i in range(100):
+            logging.getLogger("test.module").info("line %d", i)
+        log.shutdown()
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["app.jsonl", "app.jsonl.1", "app.jsonl.2"]
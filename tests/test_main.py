@@ -0,0 +1,167 @@
+"""Tests for main.py (command-line interface)"""
+import os
+import subprocess
+import sys
+import time
+import pytest
+from unittest.mock import patch
+
+import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pdfplumber', 'googleapiclient', 'google_auth_oauthlib', 'requests', 'pandas', 'pyarrow']
+
+
+class TestParser:
+    @patch('main.backfill')
+    @patch('main.monitor')
+    def test_backfill_flags(self, mock_monitor, mock_backfill):
+        main.main(['backfill', '--no-download', '--monitor', '--interval', '30'])
+        mock_backfill.assert_called_once_with(download=False, retry_failed=False)
+        mock_monitor.assert_called_once_with(30)
+
+    @patch('main.backfill')
+    def test_backfill_retry_failed(self, mock_backfill):
+        main.main(['backfill', '--retry-failed'])
+        mock_backfill.assert_called_once_with(download=True, retry_failed=True)
+
+    @patch('main.monitor')
+    def test_monitor_default_interval(self, mock_monitor):
+        main.main(['monitor'])
+        mock_monitor.assert_called_once_with(None)
+
+    @patch('main.process')
+    def test_process_invoice_dir(self, mock_process):
+        main.main(['process', '--invoice-dir', '/tmp/x'])
+        mock_process.assert_called_once_with('/tmp/x')
+
+    @patch('main.scheduled_check_with_llm')
+    def test_scheduled(self, mock_scheduled):
+        main.main(['scheduled'])
+        mock_scheduled.assert_called_once()
+
+    @patch('main.test_connection')
+    def test_test_connection_does_not_touch_sheet(self, mock_test):
+        with patch('src.writers.sheets_writer.init_sheet') as mock_init:
+            main.main(['test-connection'])
+        mock_test.assert_called_once()
+        mock_init.assert_not_called()
+
+    @patch('main.menu')
+    def test_no_command_shows_menu(self, mock_menu):
+        main.main([])
+        mock_menu.assert_called_once()
+
+    @patch('main.process')
+    def test_metrics_flag_enables_metrics(self, mock_process):
+        with patch('src.utils.metrics.configure') as mock_configure:
+            main.main(['--metrics', '--metrics-port', '9999', 'process'])
+        mock_configure.assert_called_once_with(True, 9999)
+        mock_process.assert_called_once()
+
+    @patch('main.process')
+    def test_log_level_flags(self, mock_process):
+        with patch('src.utils.log.setup') as mock_setup:
+            main.main(['--log-level', 'DEBUG', '--log-level', 'src.writers=WARNING', '--log-json', 'process'])
+        args, kwargs = mock_setup.call_args
+        assert args == ('DEBUG',)
+        assert kwargs['console_format'] == 'json'
+        assert kwargs['levels']['src.writers'] == 'WARNING'
+
+    @patch('main.process')
+    def test_profile_flag_enables_profiling(self, mock_process):
+        with patch('src.utils.profiling.enable') as mock_enable:
+            main.main(['--profile-memory', 'process'])
+        mock_enable.assert_called_once_with(True, memory=True, label='process')
+
+    def test_unknown_command_exits(self):
+        with pytest.raises(SystemExit):
+            main.main(['nope'])
+
+    @patch('src.storage.search.run_search')
+    def test_search_passes_query(self, mock_search):
+        main.main(['search', 'socket', 'head', '--limit', '5'])
+        opts = mock_search.call_args[0][0]
+        assert opts.query == ['socket', 'head']
+        assert opts.limit == 5
+
+    @patch('main._run_report')
+    def test_report_uses_spend_arguments(self, mock_report):
+        main.main(['report', 'top-items', '--top', '5', '--by', 'quantity'])
+        opts = mock_report.call_args[0][0]
+        assert (opts.report, opts.top, opts.by, opts.threshold) == ('top-items', 5, 'quantity', 3.5)
+
+
+class TestMenu:
+    @patch('main.test_connection')
+    @patch('builtins.input', return_value='1')
+    def test_menu_option_1_skips_init_sheet(self, mock_input, mock_test):
+        with patch('src.writers.sheets_writer.init_sheet') as mock_init:
+            main.menu()
+        mock_test.assert_called_once()
+        mock_init.assert_not_called()
+
+    @patch('main.process')
+    @patch('builtins.input', return_value='4')
+    def test_menu_option_4_inits_sheet(self, mock_input, mock_process):
+        with patch('src.writers.sheets_writer.init_sheet') as mock_init:
+            main.menu()
+        mock_init.assert_called_once()
+        mock_process.assert_called_once()
+
+
+class TestBackfill:
+    @patch('main.process_and_archive_invoices', return_value=0)
+    @patch('src.writers.sheets_writer.get_existing_thread_ids', return_value=set())
+    @patch('src.writers.sheets_writer.init_sheet')
+    @patch('src.storage.job_queue.JobQueue')
+    def test_retry_failed_resets_exhausted_jobs(self, mock_queue, mock_init, mock_ids, mock_process):
+        mock_queue.return_value.retry_exhausted.return_value = 3
+        main.backfill(download=False, retry_failed=True)
+        mock_queue.return_value.retry_exhausted.assert_called_once()
+
+    @patch('main.process_and_archive_invoices', return_value=0)
+    @patch('src.writers.sheets_writer.get_existing_thread_ids', return_value=set())
+    @patch('src.writers.sheets_writer.init_sheet')
+    @patch('src.storage.job_queue.JobQueue')
+    def test_exhausted_jobs_kept_by_default(self, mock_queue, mock_init, mock_ids, mock_process):
+        main.backfill(download=False)
+        mock_queue.return_value.retry_exhausted.assert_not_called()
+
+
+class TestSchedulers:
+    @patch('src.daemon.jobs.run_daemon')
+    def test_monitor_runs_poll_job(self, mock_run):
+        main.monitor(45)
+        definitions = mock_run.call_args.args[1]
+        assert definitions == {"poll": {"every": 45, "run_at_start": True}}
+
+    @patch('src.daemon.jobs.run_daemon')
+    def test_scheduled_runs_daemon_without_poll(self, mock_run):
+        main.scheduled_check_with_llm()
+        definitions = mock_run.call_args.args[1]
+        assert set(definitions) == {"reconcile", "llm_batch"}
+
+
+class TestStartup:
+    def _run(self, code):
+        return subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    def test_import_and_parser_skip_heavy_modules(self):
+        result = self._run(
+            "import sys, main; main.build_parser(); "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        )
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == ''
+
+    def test_help_starts_fast(self):
+        # Best of three to keep the measurement stable on a loaded machine
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, 'main.py', '--help'], cwd=ROOT,
+                                    capture_output=True, text=True, timeout=60)
+            timings.append(time.perf_counter() - start)
+            assert result.returncode == 0, result.stderr
+        assert min(timings) < 1.0
@@ -0,0 +1,85 @@
+"""Tests for src/utils/metrics.py"""
+import json
+import urllib.request
+
+import pytest
+
+from src.utils import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    metrics.registry.reset()
+    yield
+    metrics.enable(False)
+    metrics.stop_http_server()
+    metrics.registry.reset()
+
+
+@metrics.timed("work")
+def _work(x):
+    return x * 2
+
+
+class TestDisabled:
+    def test_records_nothing(self, temp_dir):
+        metrics.count("events")
+        assert _work(2) == 4
+        assert metrics.registry.snapshot() == {"timers": {}, "counters": {}}
+        assert metrics.flush(f"{temp_dir}/m.jsonl") is None
+
+
+class TestEnabled:
+    def test_timer_and_counter(self):
+        metrics.enable()
+        _work(1)
+        _work(2)
+        metrics.count("events", 3)
+        snap = metrics.registry.snapshot()
+        assert snap["timers"]["work"]["count"] == 2
+        assert snap["counters"] == {"events": 3}
+
+    def test_timer_records_failures(self):
+        @metrics.timed("boom")
+        def boom():
+            raise ValueError("x")
+
+        metrics.enable()
+        with pytest.raises(ValueError):
+            boom()
+        assert metrics.registry.snapshot()["timers"]["boom"]["count"] == 1
+
+    def test_flush_appends_jsonl(self, temp_dir):
+        metrics.enable()
+        _work(1)
+        path = f"{temp_dir}/sub/metrics.jsonl"
+        metrics.flush(path)
+        metrics.flush(path)
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == 2
+        assert lines[1]["timers"]["work"]["count"] == 1
+
+    def test_prometheus_endpoint(self):
+        metrics.enable()
+        metrics.registry.observe("read_pdf", 0.02)
+        metrics.registry.observe("read_pdf", 0.7)
+        metrics.count("llm_requests")
+        server = metrics.start_http_server(port=0, host="127.0.0.1")
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        text = urllib.request.urlopen(url).read().decode()
+
+        assert 'invoice_tracker_stage_seconds_bucket{stage="read_pdf",le="0.025"} 1' in text
+        assert 'invoice_tracker_stage_seconds_bucket{stage="read_pdf",le="+Inf"} 2' in text
+        assert 'invoice_tracker_stage_seconds_count{stage="read_pdf"} 2' in text
+        assert 'invoice_tracker_events_total{event="llm_requests"} 1' in text
+
+
+class TestHistogram:
+    def test_quantiles_use_bucket_bounds(self):
+        hist = metrics.Histogram((0.1, 1.0))
+        for v in (0.05, 0.05, 0.5, 3.0):
+            hist.observe(v)
+        assert hist.quantile(0.5) == 0.1
+        assert hist.quantile(0.75) == 1.0
+        assert hist.quantile(0.99) == 3.0
@@ -0,0 +1,175 @@
+"""Tests for src/processors/ocr.py"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from src.processors import ocr
+from src.config import settings
+from src.processors.file_handler import extract_pdf_text, read_pdf
+
+
+@pytest.fixture
+def ocr_on():
+    """OCR 'installed', with a thread pool standing in for the process pool."""
+    pool = ThreadPoolExecutor(max_workers=2)
+    with patch.object(ocr, "available", return_value=True), \
+            patch.object(ocr, "_get_pool", return_value=pool):
+        yield
+    pool.shutdown()
+
+
+def _pdf(*pages):
+    pdf = MagicMock()
+    pdf.pages = list(pages)
+    pdf.__enter__ = Mock(return_value=pdf)
+    pdf.__exit__ = Mock(return_value=False)
+    return pdf
+
+
+def _page(text, width=612, height=792):
+    page = Mock(width=width, height=height)
+    page.extract_text.return_value = text
+    return page
+
+
+class TestDpi:
+    def test_letter_page_renders_at_300_dpi(self):
+        assert ocr.dpi_for(SimpleNamespace(width=612)) == 300
+
+    def test_narrow_receipt_gets_max_dpi(self):
+        assert ocr.dpi_for(SimpleNamespace(width=226)) == 400
+
+    def test_large_page_gets_lower_dpi(self):
+        assert ocr.dpi_for(SimpleNamespace(width=842 * 2)) == 150
+
+    def test_needs_ocr(self):
+        assert ocr.needs_ocr("")
+        assert ocr.needs_ocr("  \n p. 1 ")
+        assert not ocr.needs_ocr("Invoice #123 Total due $45.00")
+
+
+class TestOcrPages:
+    def test_results_are_cached_by_page_hash(self, ocr_on):
+        with patch.object(ocr, "_ocr_page", return_value=("Scanned total 5.00", 300)) as mock_ocr:
+            assert ocr.ocr_pages("a.pdf", [(0, "h1", 300), (1, "h2", 300)]) == {
+                0: "Scanned total 5.00", 1: "Scanned total 5.00"}
+            # The same pages in another file: no OCR at all
+            assert ocr.ocr_pages("b.pdf", [(3, "h2", 300)]) == {3: "Scanned total 5.00"}
+        assert mock_ocr.call_count == 2
+        assert {c.args[1] for c in mock_ocr.call_args_list} == {1, 2}
+
+    def test_failed_page_is_skipped_and_not_cached(self, ocr_on):
+        with patch.object(ocr, "_ocr_page", side_effect=RuntimeError("tesseract crashed")):
+            assert ocr.ocr_pages("a.pdf", [(0, "h1", 300)]) == {}
+        assert ocr.get_cache().get_many(["h1"]) == {}
+
+    def test_timed_out_page_recycles_pool(self, ocr_on, monkeypatch):
+        monkeypatch.setattr(settings, "OCR_TIMEOUT_SECONDS", 0.05)
+        release = threading.Event()
+        with patch.object(ocr, "_ocr_page", side_effect=lambda *a: release.wait()), \
+                patch.object(ocr, "_recycle_pool") as mock_recycle:
+            assert ocr.ocr_pages("a.pdf", [(0, "h1", 300)]) == {}
+        release.set()
+        mock_recycle.assert_called_once()
+        assert ocr.get_cache().get_many(["h1"]) == {}
+
+    def test_queued_pages_are_not_timed_out(self, monkeypatch):
+        """More pages than workers across concurrent callers: waiting in the queue is not running."""
+        monkeypatch.setattr(settings, "OCR_TIMEOUT_SECONDS", 0.5)
+        pool = ThreadPoolExecutor(max_workers=2)
+        results = []
+
+        def call(n):
+            results.append(ocr.ocr_pages(f"{n}.pdf", [(0, f"q{n}a", 300), (1, f"q{n}b", 300)]))
+
+        with patch.object(ocr, "available", return_value=True), patch.object(ocr, "_get_pool", return_value=pool), \
+                patch.object(ocr, "_ocr_page", side_effect=lambda *a: (time.sleep(0.3), ("Scanned text", 300))[1]), \
+                patch.object(ocr, "_recycle_pool") as mock_recycle:
+            callers = [threading.Thread(target=call, args=(n,)) for n in range(4)]
+            for t in callers:
+                t.start()
+            for t in callers:
+                t.join()
+        pool.shutdown()
+        assert sorted(len(r) for r in results) == [2, 2, 2, 2]
+        mock_recycle.assert_not_called()
+
+    def test_recycle_replaces_the_pool(self):
+        old = Mock()
+        with patch.object(ocr, "_pool", old):
+            ocr._recycle_pool(old)
+            assert ocr._pool is None
+        old.shutdown.assert_called_once_with(wait=False)
+
+    def test_unavailable_returns_nothing(self):
+        with patch.object(ocr, "available", return_value=False):
+            assert ocr.ocr_pages("a.pdf", [(0, "h1", 300)]) == {}
+
+
+class TestAdaptiveDpi:
+    def test_retries_near_empty_page_at_max_dpi(self):
+        convert = Mock(return_value=["image"])
+        tesseract = Mock()
+        tesseract.image_to_string.side_effect = ["", "Small print invoice text"]
+        with patch.object(ocr, "convert_from_path", convert), patch.object(ocr, "pytesseract", tesseract):
+            assert ocr._ocr_page("a.pdf", 1, 200, "eng", 10, 400) == ("Small print invoice text", 400)
+        assert [c.kwargs["dpi"] for c in convert.call_args_list] == [200, 400]
+
+    def test_external_calls_get_the_timeout(self):
+        convert = Mock(return_value=["image"])
+        tesseract = Mock()
+        tesseract.image_to_string.return_value = "Invoice text"
+        with patch.object(ocr, "convert_from_path", convert), patch.object(ocr, "pytesseract", tesseract):
+            ocr._ocr_page("a.pdf", 1, 300, "eng", 5, 400, timeout=60)
+        assert 59 < convert.call_args.kwargs["timeout"] <= 60
+        assert 59 < tesseract.image_to_string.call_args.kwargs["timeout"] <= 60
+
+    def test_retry_shares_the_page_budget(self):
+        clock = iter([0, 10, 40, 70]).__next__  # start, convert, tesseract, budget check
+        convert = Mock(return_value=["image"])
+        tesseract = Mock()
+        tesseract.image_to_string.return_value = ""
+        with patch.object(ocr, "convert_from_path", convert), patch.object(ocr, "pytesseract", tesseract), \
+                patch.object(ocr.time, "monotonic", side_effect=lambda: clock()):
+            assert ocr._ocr_page("a.pdf", 1, 200, "eng", 10, 400, timeout=60) == ("", 200)
+        assert convert.call_args.kwargs["timeout"] == 50
+        assert tesseract.image_to_string.call_args.kwargs["timeout"] == 20
+
+
+class TestReadPdfFallback:
+    @patch('src.processors.file_handler.pdfplumber.open')
+    def test_only_empty_pages_are_ocrd(self, mock_pdf_open, ocr_on):
+        mock_pdf_open.return_value = _pdf(_page("Page one has a real text layer"), _page(None))
+        with patch.object(ocr, "ocr_pages", return_value={1: "Scanned page two"}) as mock_ocr:
+            content = read_pdf("scan.pdf")
+
+        assert "Page one has a real text layer" in content
+        assert "Scanned page two" in content
+        pages = mock_ocr.call_args.args[1]
+        assert [(index, dpi) for index, _, dpi in pages] == [(1, 300)]
+
+    @patch('src.processors.file_handler.pdfplumber.open')
+    def test_failed_ocr_marks_text_incomplete(self, mock_pdf_open, ocr_on):
+        mock_pdf_open.return_value = _pdf(_page("Page one has a real text layer"), _page(None))
+        with patch.object(ocr, "ocr_pages", return_value={}):
+            text, complete = extract_pdf_text("scan.pdf")
+        assert "Page one" in text
+        assert complete is False
+
+    @patch('src.processors.file_handler.pdfplumber.open')
+    def test_text_pdf_sends_no_pages_to_ocr(self, mock_pdf_open, ocr_on):
+        mock_pdf_open.return_value = _pdf(_page("Invoice #1 with plenty of text"))
+        with patch.object(ocr, "ocr_pages", return_value={}) as mock_ocr:
+            read_pdf("text.pdf")
+        mock_ocr.assert_called_once_with("text.pdf", [])
+
+    @patch('src.processors.file_handler.pdfplumber.open')
+    def test_warns_once_when_unavailable(self, mock_pdf_open, caplog):
+        mock_pdf_open.return_value = _pdf(_page(None), _page(None))
+        with patch.object(ocr, "available", return_value=False), patch.object(ocr, "_warned", False):
+            assert read_pdf("scan.pdf") == ""
+        assert sum("OCR is unavailable" in r.message for r in caplog.records) == 1
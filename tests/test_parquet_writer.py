@@ -0,0 +1,100 @@
+"""Tests for src/writers/parquet_writer.py"""
+import os
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from src.storage.invoice_store import InvoiceStore
+from src.writers.parquet_writer import export, partition_of, load_manifest, _to_timestamp
+
+
+@pytest.fixture
+def store():
+    s = InvoiceStore(":memory:")
+    yield s
+    s.close()
+
+
+def _invoice(tid, vendor, day, total, items=()):
+    return {
+        'mail_thread_id': tid, 'company_name': vendor, 'purchase_date': day,
+        'mail_received_time': 'Mon, 15 Jan 2024 10:30:00 -0500', 'total_price': total,
+        'items': [{'item_name': n, 'quantity': q, 'price': p} for n, q, p in items],
+    }
+
+
+def _read(out, table, key):
+    year, month = key.split("-")
+    return pq.read_table(os.path.join(out, table, f"year={year}", f"month={month}", "part-0.parquet"))
+
+
+class TestExport:
+    def test_writes_typed_partitions(self, store, temp_dir):
+        store.save_invoice(_invoice('t1', 'Home Depot', '2024-01-15', '12.50',
+                                    [('Bolt', 4, 1.25), ('Nut', 10, 0.75)]))
+        store.save_invoice(_invoice('t2', 'McMaster-Carr', '2024-02-03', 99.999))
+
+        assert export(store, temp_dir) == ['2024-01', '2024-02']
+
+        invoices = _read(temp_dir, "invoices", "2024-01")
+        assert pa.types.is_dictionary(invoices.schema.field("company_name").type)
+        assert invoices.schema.field("total_price").type == pa.decimal128(12, 2)
+        row = invoices.to_pylist()[0]
+        assert row['purchase_date'] == date(2024, 1, 15)
+        assert row['total_price'] == Decimal("12.50")
+        assert row['mail_received_time'] == datetime(2024, 1, 15, 15, 30)
+        assert row['item_count'] == 2
+
+        items = _read(temp_dir, "line_items", "2024-01").to_pylist()
+        assert [(i['item_name'], i['quantity'], i['price']) for i in items] == [
+            ('Bolt', 4, Decimal("1.25")), ('Nut', 10, Decimal("0.75"))]
+        assert items[0]['company_name'] == 'Home Depot'
+
+        assert _read(temp_dir, "invoices", "2024-02").to_pylist()[0]['total_price'] == Decimal("100.00")
+
+    def test_dataset_reads_back_with_partition_columns(self, store, temp_dir):
+        store.save_invoice(_invoice('t1', 'A', '2024-01-15', 1))
+        store.save_invoice(_invoice('t2', 'B', '2023-12-01', 2))
+        export(store, temp_dir)
+
+        table = pq.read_table(os.path.join(temp_dir, "invoices"))
+        assert sorted(table.column("year").to_pylist()) == [2023, 2024]
+
+    def test_incremental_rewrites_only_changed_partitions(self, store, temp_dir):
+        store.save_invoice(_invoice('t1', 'A', '2024-01-15', 1))
+        store.save_invoice(_invoice('t2', 'B', '2024-02-15', 2))
+        export(store, temp_dir)
+        store.conn.execute("UPDATE invoices SET updated_at = '2000-01-01 00:00:00'")
+
+        store.save_invoice(_invoice('t3', 'C', '2024-02-20', 3))
+        assert export(store, temp_dir) == ['2024-02']
+        assert _read(temp_dir, "invoices", "2024-02").num_rows == 2
+
+        store.conn.execute("UPDATE invoices SET updated_at = '2000-01-01 00:00:00'")
+        assert export(store, temp_dir) == []
+
+    def test_moved_invoice_leaves_old_partition(self, store, temp_dir):
+        invoice_id, _ = store.save_invoice(_invoice('t1', 'A', '2024-01-15', 1))
+        export(store, temp_dir)
+
+        store.update_invoice(invoice_id, _invoice('t1', 'A', '2024-03-01', 1))
+        assert export(store, temp_dir) == ['2024-01', '2024-03']
+        assert not os.path.exists(os.path.join(temp_dir, "invoices", "year=2024", "month=01", "part-0.parquet"))
+        assert load_manifest(temp_dir)['partitions'] == {'2024-03': [invoice_id]}
+
+    def test_full_export_rewrites_everything(self, store, temp_dir):
+        store.save_invoice(_invoice('t1', 'A', '2024-01-15', 1))
+        export(store, temp_dir)
+        store.conn.execute("UPDATE invoices SET updated_at = '2000-01-01 00:00:00'")
+        assert export(store, temp_dir, full=True) == ['2024-01']
+
+
+class TestHelpers:
+    def test_partition_falls_back_to_created_at(self):
+        assert partition_of({'purchase_date': '', 'created_at': '2024-05-02 10:00:00'}) == '2024-05'
+
+    def test_unparseable_timestamp_is_null(self):
+        assert _to_timestamp('(Unknown Date)') is None
@@ -0,0 +1,205 @@
+"""Tests for src/processors/pipeline.py"""
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from src.processors.pipeline import Stage, Pipeline, run
+from src.storage.invoice_store import InvoiceStore
+
+
+class TestPipeline:
+    def test_items_flow_through_all_stages(self):
+        seen = []
+        lock = threading.Lock()
+
+        def collect(x):
+            with lock:
+                seen.append(x)
+            return x
+
+        stages = [
+            Stage("double", lambda x: x * 2, workers=3),
+            Stage("inc", lambda x: x + 1, workers=2),
+            Stage("collect", collect),
+        ]
+        Pipeline(stages, queue_size=2, report_seconds=0).run(range(20))
+        assert sorted(seen) == [x * 2 + 1 for x in range(20)]
+
+    def test_none_drops_item(self):
+        stages = [Stage("even", lambda x: x if x % 2 == 0 else None), Stage("sink", lambda x: x)]
+        metrics = Pipeline(stages, report_seconds=0).run(range(10))
+        by_name = {m["stage"]: m for m in metrics}
+        assert by_name["even"]["dropped"] == 5
+        assert by_name["sink"]["processed"] == 5
+        assert by_name["scan"]["processed"] == 10
+
+    def test_errors_are_counted_not_raised(self):
+        def boom(x):
+            raise ValueError("bad")
+        metrics = Pipeline([Stage("boom", boom)], report_seconds=0).run(range(3))
+        assert metrics[1]["errors"] == 3
+
+    def test_queue_is_bounded(self):
+        depths = []
+        pipeline = Pipeline([Stage("slow", lambda x: time.sleep(0.005) or x)], queue_size=2, report_seconds=0)
+
+        def source():
+            for i in range(10):
+                depths.append(pipeline.stages[0].inbox.qsize())
+                yield i
+
+        pipeline.run(source())
+        assert max(depths) <= 2
+
+
+class TestRun:
+    @patch('src.storage.archive.get_archive')
+    @patch('src.processors.pipeline.file_handler')
+    @patch('src.processors.pipeline.sheet_sync')
+    @patch('src.processors.pipeline.ip')
+    def test_run_writes_and_archives(self, mock_ip, mock_sync, mock_file_handler, mock_get_archive):
+        archive_group = mock_get_archive.return_value.archive_group
+        mock_file_handler.get_invoice_files.return_value = {'b1': ['/p/b1.txt'], 'b2': ['/p/b2.txt']}
+        mock_ip.held_parked_groups.return_value = set()
+        mock_ip.load_group.side_effect = lambda paths: {
+            'file_paths': paths, 'content': 'x', 'sender_email': '', 'thread_id': paths[0], 'received_time': '',
+            'subject': ''
+        }
+        mock_ip.passes_classifier.return_value = True
+        mock_ip.finalize_result.side_effect = lambda result, ctx: {'mail_thread_id': ctx['thread_id']}
+        mock_ip.accept_result.side_effect = lambda result, paths, skip, group: dict(
+            result, _file_paths=paths, _group=group)
+
+        archive_group.side_effect = lambda group, paths, result: [p.replace('/p/', '/old/') for p in paths]
+
+        store = InvoiceStore(":memory:")
+        skip_ids = set()
+        assert run(skip_ids, store=store) == 2
+        assert skip_ids == {'/p/b1.txt', '/p/b2.txt'}
+        assert archive_group.call_count == 2
+        mock_sync.sync.assert_called_once_with(store)
+        assert len(store.unsynced_ids()) == 2
+        assert store.is_group_processed('b1')
+        assert store.unindexed_ids() == []
+
+    @patch('src.storage.archive.get_archive')
+    @patch('src.processors.pipeline.file_handler')
+    @patch('src.processors.pipeline.sheet_sync')
+    @patch('src.processors.pipeline.ip')
+    def test_run_archives_already_stored_groups(self, mock_ip, mock_sync, mock_file_handler, mock_get_archive):
+        archive_group = mock_get_archive.return_value.archive_group
+        store = InvoiceStore(":memory:")
+        store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A'}, 'b1')
+        mock_file_handler.get_invoice_files.return_value = {'b1': ['/p/b1.txt']}
+        mock_ip.held_parked_groups.return_value = set()
+
+        assert run(set(), store=store) == 0
+        mock_ip.load_group.assert_not_called()
+        archive_group.assert_called_once_with('b1', ['/p/b1.txt'], {'company_name': 'A', 'purchase_date': ''})
+
+    @patch('src.processors.pipeline.file_handler')
+    @patch('src.processors.pipeline.sheet_sync')
+    @patch('src.processors.pipeline.ip')
+    def test_run_skips_known_threads(self, mock_ip, mock_sync, mock_file_handler):
+        mock_file_handler.get_invoice_files.return_value = {'b1': ['/p/b1.txt']}
+        mock_ip.held_parked_groups.return_value = set()
+        mock_ip.load_group.return_value = {
+            'file_paths': ['/p/b1.txt'], 'content': 'x', 'sender_email': '', 'thread_id': 't1',
+            'received_time': '', 'subject': ''
+        }
+        mock_ip.passes_classifier.return_value = True
+
+        assert run({'t1'}, store=InvoiceStore(":memory:")) == 0
+        mock_ip.route.assert_not_called()
+
+    @patch('src.storage.archive.get_archive')
+    @patch('src.processors.pipeline.file_handler')
+    @patch('src.processors.pipeline.sheet_sync')
+    @patch('src.processors.pipeline.ip')
+    def test_run_records_progress_in_job_queue(self, mock_ip, mock_sync, mock_file_handler, mock_get_archive):
+        archive_group = mock_get_archive.return_value.archive_group
+        from src.storage.job_queue import JobQueue
+        jobs = JobQueue(":memory:")
+        jobs.add([{'id': 'm1'}, {'id': 'm2'}, {'id': 'm3'}])
+        for msg_id, group in (('m1', 'b1'), ('m2', 'b2'), ('m3', 'b3')):
+            jobs.advance(msg_id, 'downloaded', group=group)
+
+        mock_file_handler.get_invoice_files.return_value = {g: [f'/p/{g}.txt'] for g in ('b1', 'b2', 'b3')}
+        mock_ip.held_parked_groups.return_value = set()
+        mock_ip.load_group.side_effect = lambda paths: {
+            'file_paths': paths, 'content': 'x', 'sender_email': '', 'thread_id': paths[0], 'received_time': '',
+            'subject': ''
+        }
+        mock_ip.passes_classifier.side_effect = lambda ctx: ctx['group'] != 'b3'
+        mock_ip.finalize_result.side_effect = lambda result, ctx: (
+            None if ctx['group'] == 'b2' else {'mail_thread_id': ctx['thread_id']})
+        mock_ip.accept_result.side_effect = lambda result, paths, skip, group: dict(
+            result, _file_paths=paths, _group=group)
+        archive_group.side_effect = lambda group, paths, result: paths
+
+        assert run(set(), store=InvoiceStore(":memory:"), jobs=jobs) == 1
+        assert jobs.state('m1') == 'archived'
+        assert jobs.state('m2') == 'extracted'
+        assert jobs.state('m3') == 'skipped'
+        # The unfinished group waits out its retry delay on the next run
+        assert jobs.held_groups() == {'b2'}
+
+    @patch('src.storage.archive.get_archive')
+    @patch('src.processors.pipeline.file_handler')
+    @patch('src.processors.pipeline.sheet_sync')
+    @patch('src.processors.pipeline.ip')
+    def test_run_batches_llm_groups_when_batch_size_set(self, mock_ip, mock_sync, mock_file_handler,
+                                                        mock_get_archive, monkeypatch):
+        from src.config import settings
+        from src.storage.job_queue import JobQueue
+        monkeypatch.setattr(settings, "LLM_BATCH_SIZE", 2)
+        monkeypatch.setattr(settings, "PIPELINE_WORKERS", {"parse": 2})
+        mock_get_archive.return_value.archive_group.side_effect = lambda group, paths, result: paths
+        jobs = JobQueue(":memory:")
+        jobs.add([{'id': f'm{i}'} for i in range(3)])
+        for i in range(3):
+            jobs.advance(f'm{i}', 'downloaded', group=f'b{i}')
+
+        mock_file_handler.get_invoice_files.return_value = {f'b{i}': [f'/p/b{i}.txt'] for i in range(3)}
+        mock_ip.held_parked_groups.return_value = set()
+        mock_ip.load_group.side_effect = lambda paths: {
+            'file_paths': paths, 'content': 'short receipt', 'sender_email': 'a@shop.com',
+            'thread_id': paths[0], 'received_time': '', 'subject': ''
+        }
+        mock_ip.passes_classifier.return_value = True
+        mock_ip.batchable.return_value = True
+        batches = []
+
+        def flush(pending, skip_ids):
+            batches.append(len(pending))
+            for ctx in pending:
+                yield {'mail_thread_id': ctx['thread_id'], '_file_paths': ctx['file_paths'], '_group': ctx['group']}
+        mock_ip.flush_llm_batch.side_effect = flush
+
+        assert run(set(), store=InvoiceStore(":memory:"), jobs=jobs) == 3
+        assert sorted(batches) == [1, 2]
+        mock_ip.route.assert_not_called()
+        assert all(jobs.state(f'm{i}') == 'archived' for i in range(3))
+
+
+class TestStageBatching:
+    def test_list_outputs_and_flush(self):
+        held, seen = [], []
+
+        def hold(x):
+            held.append(x)
+            if len(held) == 3:
+                out = held[:]
+                held.clear()
+                return out
+            return []
+
+        def drain():
+            out = held[:]
+            held.clear()
+            return out
+
+        stages = [Stage("batch", hold, flush=drain), Stage("sink", lambda x: seen.append(x) or x)]
+        metrics = Pipeline(stages, report_seconds=0).run(range(7))
+        assert sorted(seen) == list(range(7))
+        assert {m["stage"]: m for m in metrics}["sink"]["processed"] == 7
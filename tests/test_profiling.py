@@ -0,0 +1,84 @@
+"""Tests for src/utils/profiling.py"""
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from src.utils import profiling
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    yield
+    profiling.enable(False)
+
+
+def _busy_regex(n):
+    pattern = re.compile(r"(\d+)\s+x\s+(\w+)")
+    return [pattern.findall("12 x bolt 3 x nut " * 50) for _ in range(n)]
+
+
+def _worker():
+    _busy_regex(200)
+    time.sleep(0.03)
+
+
+def _run():
+    t = threading.Thread(target=_worker, name="parse-0")
+    t.start()
+    _busy_regex(100)
+    t.join()
+
+
+class TestProfileRun:
+    def test_writes_report_stats_and_stacks(self, temp_dir):
+        with profiling.profile_run("process", 42, out_dir=temp_dir) as prof:
+            _run()
+
+        files = sorted(os.listdir(temp_dir))
+        assert len(files) == 3
+        assert all(re.match(r"\d{8}-\d{6}-process-n42\.(txt|prof|folded)$", f) for f in files)
+
+        report = open(os.path.join(temp_dir, files[2]), encoding="utf-8").read()
+        assert "process, 42 invoice group(s)" in report
+        assert "Threads profiled: 2" in report
+        assert "_busy_regex" in report
+        assert "allocation sites" not in report
+        assert prof.seconds > 0
+
+    def test_folded_stacks_cover_worker_threads(self, temp_dir):
+        with profiling.profile_run("process", 1, out_dir=temp_dir) as prof:
+            _run()
+        folded = prof.sampler.folded()
+        lines = folded.splitlines()
+        assert lines
+        assert all(re.match(r"^\S.*;.* \d+$", line) for line in lines)
+        # Worker thread names are folded without their index
+        assert any(line.startswith("parse;") for line in lines)
+
+    def test_memory_report(self, temp_dir):
+        with profiling.profile_run("backfill", 3, out_dir=temp_dir, memory=True) as prof:
+            data = [bytearray(1024) for _ in range(1000)]
+        report = prof.report("backfill", 3)
+        assert "allocation sites" in report
+        assert "test_profiling.py" in report
+        assert prof.peak_bytes >= 1024 * 1000
+        del data
+
+
+class TestMaybeProfile:
+    def test_disabled_skips_corpus_count(self):
+        def count():
+            raise AssertionError("counted while disabled")
+        with profiling.maybe_profile(count):
+            pass
+
+    def test_enabled_uses_label(self, temp_dir, monkeypatch):
+        from src.config import settings
+        monkeypatch.setattr(settings, "PROFILE_DIR", temp_dir)
+        profiling.enable(label="monitor")
+        with profiling.maybe_profile(lambda: 5):
+            _busy_regex(10)
+        assert any("-monitor-n5." in f for f in os.listdir(temp_dir))
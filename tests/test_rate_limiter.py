@@ -0,0 +1,187 @@
+"""Tests for src/utils/rate_limiter.py"""
+import pytest
+from unittest.mock import patch
+
+from src.config import settings
+from src.utils import rate_limiter
+from src.utils.rate_limiter import TokenBucket, classify_error, quota_units
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Response(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class HttpError(Exception):
+    """Shaped like googleapiclient.errors.HttpError."""
+
+    def __init__(self, status, content=b"", headers=None):
+        super().__init__(f"HTTP {status}")
+        self.resp = Response(status, headers)
+        self.content = content
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def bucket(clock):
+    bucket = TokenBucket(rate=10, capacity=20, clock=clock, sleep=clock.sleep)
+    with patch.dict(rate_limiter._buckets, {'test': bucket}):
+        yield bucket
+
+
+class TestTokenBucket:
+    def test_burst_then_refill_rate(self, bucket, clock):
+        assert bucket.acquire(20) == 0
+        assert bucket.acquire(5) == pytest.approx(0.5)
+        assert clock.now == pytest.approx(100.5)
+
+    def test_sustained_rate(self, bucket, clock):
+        for _ in range(60):
+            bucket.acquire(5)
+        # 20 units of burst, the remaining 280 at 10 units/s
+        assert clock.now - 100 == pytest.approx(28.0)
+
+    def test_pause_holds_and_empties(self, bucket, clock):
+        bucket.pause(3)
+        assert bucket.acquire(1) == pytest.approx(3.1)
+
+
+class TestQuota:
+    def test_longest_suffix_wins(self):
+        assert quota_units('gmail', 'users.messages.get') == 5
+        assert quota_units('gmail', 'users.messages.attachments.get') == 5
+        assert quota_units('gmail', 'users.history.list') == 2
+        assert quota_units('gmail', 'users.getProfile') == 1
+        assert quota_units('sheets', 'spreadsheets.values.append') == 1
+
+
+class TestClassify:
+    def test_retryable_statuses(self):
+        assert classify_error(HttpError(429)) == (True, None)
+        assert classify_error(HttpError(503)) == (True, None)
+        assert classify_error(HttpError(403, b'{"reason": "userRateLimitExceeded"}')) == (True, None)
+        assert classify_error(ConnectionError()) == (True, None)
+
+    def test_permanent_errors(self):
+        assert classify_error(HttpError(403, b'{"reason": "forbidden"}')) == (False, None)
+        assert classify_error(HttpError(404)) == (False, None)
+        assert classify_error(ValueError()) == (False, None)
+
+    def test_retry_after_header(self):
+        assert classify_error(HttpError(429, headers={'retry-after': '7'})) == (True, 7.0)
+        retryable, delay = classify_error(HttpError(503, headers={'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+        assert retryable and delay == 0.0
+
+
+class TestExecute:
+    def test_retries_then_succeeds(self, bucket, clock):
+        calls = []
+
+        def flaky():
+            calls.append(clock.now)
+            if len(calls) < 3:
+                raise HttpError(429)
+            return 'ok'
+
+        with patch.object(rate_limiter, 'backoff_seconds', return_value=2.0):
+            assert rate_limiter.execute('test', 'x.get', flaky, sleep=clock.sleep) == 'ok'
+        assert calls == [100.0, 102.0, 104.0]
+
+    def test_retry_after_pauses_the_bucket(self, bucket, clock):
+        calls = []
+
+        def limited():
+            calls.append(clock.now)
+            if len(calls) == 1:
+                raise HttpError(429, headers={'retry-after': '5'})
+            return 'ok'
+
+        assert rate_limiter.execute('test', 'x.get', limited, sleep=clock.sleep) == 'ok'
+        # Other callers are held until the Retry-After delay has passed as well
+        assert bucket.acquire(1) > 0
+        assert clock.now >= 105
+
+    def test_non_retryable_raises_immediately(self, bucket, clock):
+        calls = []
+
+        def missing():
+            calls.append(1)
+            raise HttpError(404)
+
+        with pytest.raises(HttpError):
+            rate_limiter.execute('test', 'x.get', missing, sleep=clock.sleep)
+        assert calls == [1]
+
+    def test_gives_up_after_max_retries(self, bucket, clock, monkeypatch):
+        monkeypatch.setattr(settings, 'API_MAX_RETRIES', 2)
+        calls = []
+
+        def down():
+            calls.append(1)
+            raise HttpError(500)
+
+        with pytest.raises(HttpError):
+            rate_limiter.execute('test', 'x.get', down, sleep=clock.sleep)
+        assert len(calls) == 3
+
+    def test_backoff_is_jittered_and_capped(self, monkeypatch):
+        monkeypatch.setattr(settings, 'API_BACKOFF_BASE_SECONDS', 1.0)
+        monkeypatch.setattr(settings, 'API_BACKOFF_MAX_SECONDS', 8.0)
+        samples = [rate_limiter.backoff_seconds(10) for _ in range(200)]
+        assert all(0 <= s <= 8.0 for s in samples)
+        assert len(set(samples)) > 1
+
+
+class TestLimitedService:
+    def test_wraps_every_execute(self, clock, monkeypatch):
+        from benchmarks.fakes import FakeGmail
+        gmail = FakeGmail()
+        gmail.add_message('m1', 'Invoice', 'a@b.c', 'body')
+        bucket = TokenBucket(rate=250, capacity=250, clock=clock, sleep=clock.sleep)
+        monkeypatch.setitem(rate_limiter._buckets, 'gmail', bucket)
+
+        service = rate_limiter.limited(gmail, 'gmail')
+        listed = service.users().messages().list(userId='me', q='').execute()
+        msg = service.users().messages().get(userId='me', id=listed['messages'][0]['id']).execute()
+        profile = service.users().getProfile(userId='me').execute()
+
+        assert msg['id'] == 'm1'
+        assert profile['emailAddress'] == gmail.email
+        assert bucket._tokens == pytest.approx(250 - 5 - 5 - 1)
+
+    def test_server_quota_is_never_exceeded(self, clock, monkeypatch):
+        """A client limited to the server's rate never sees a 429."""
+        rate, burst = 50, 50
+        server = TokenBucket(rate, burst, clock=clock, sleep=clock.sleep)
+        monkeypatch.setitem(rate_limiter._buckets, 'gmail', TokenBucket(rate, burst, clock=clock, sleep=clock.sleep))
+        rejected = []
+
+        def server_call():
+            server._refill(clock.now)
+            if server._tokens < 5 - 1e-9:
+                rejected.append(clock.now)
+                raise HttpError(429)
+            server._tokens = max(server._tokens - 5, 0.0)
+            return 'ok'
+
+        for _ in range(100):
+            rate_limiter.execute('gmail', 'users.messages.get', server_call, sleep=clock.sleep)
+        assert rejected == []
+        # 500 units at 50/s after a 50-unit burst: within a few percent of the quota
+        assert clock.now - 100 == pytest.approx(9.0)
@@ -0,0 +1,132 @@
+"""Tests for src/processors/schema_validator.py"""
+import json
+import os
+import pytest
+from src.config import settings
+from src.processors.schema_validator import (
+    validate, compile_validator, json_schema, batch_json_schema, record_rejection,
+    to_float, to_int, to_date, Invalid
+)
+
+
+class TestJsonSchema:
+    def test_json_schema_types(self):
+        schema = json_schema()
+        assert schema['type'] == 'object'
+        assert schema['properties']['total_price'] == {'type': 'number'}
+        assert schema['properties']['purchase_date']['format'] == 'date'
+        assert 'company_name' in schema['required']
+
+    def test_json_schema_items_array(self):
+        items = json_schema()['properties']['items']
+        assert items['type'] == 'array'
+        assert items['items']['properties']['quantity'] == {'type': 'integer'}
+
+    def test_batch_json_schema_wraps_invoices(self):
+        schema = batch_json_schema()
+        assert schema['properties']['invoices']['type'] == 'array'
+
+
+class TestCoercers:
+    def test_to_float_currency(self):
+        assert to_float("$1,234.50") == 1234.5
+
+    def test_to_float_negative_parentheses(self):
+        assert to_float("(5.00)") == -5.0
+
+    def test_to_float_sums_lists(self):
+        assert to_float("10.00, 5.00") == 15.0
+
+    def test_to_float_empty(self):
+        assert to_float("") == ""
+        assert to_float(None) == ""
+
+    def test_to_float_invalid(self):
+        with pytest.raises(Invalid):
+            to_float("N/A")
+
+    def test_to_int_words(self):
+        assert to_int("two") == 2
+        assert to_int("a dozen") == 12
+
+    def test_to_int_multi_word_numbers_add_up(self):
+        assert to_int("twenty one") == 21
+        assert to_int("twenty-two") == 22
+        assert to_int("one hundred and five") == 105
+        assert to_int("three hundred forty-two") == 342
+        assert to_int("two thousand five hundred") == 2500
+
+    def test_to_int_multipliers(self):
+        assert to_int("two dozen") == 24
+        assert to_int("a pair") == 2
+        assert to_int("three pair") == 6
+
+    def test_to_int_unparseable_phrase_invalid(self):
+        for phrase in ("three four", "twenty twenty", "twenty twelve", "a few", "and"):
+            with pytest.raises(Invalid):
+                to_int(phrase)
+
+    def test_to_float_spaced_thousands_separator(self):
+        assert to_float("1, 234.50") == 1234.5
+        assert to_float("$12, 345, 678") == 12345678.0
+        assert to_float("10.00, 234.50") == 244.5
+
+    def test_to_int_numeric_string(self):
+        assert to_int("3") == 3
+        assert to_int(4.0) == 4
+
+    def test_to_int_fraction_invalid(self):
+        with pytest.raises(Invalid):
+            to_int(2.5)
+
+    def test_to_date_formats(self):
+        assert to_date("01/15/24") == "2024-01-15"
+        assert to_date("January 15, 2024") == "2024-01-15"
+
+    def test_to_date_invalid(self):
+        with pytest.raises(Invalid):
+            to_date("sometime last week")
+
+
+class TestValidate:
+    def test_validate_valid_invoice(self, sample_invoice_data):
+        clean, errors = validate(sample_invoice_data)
+        assert errors == []
+        assert clean['total_price'] == 150.0
+        assert clean['other_expenses'] == 10.0
+
+    def test_validate_maps_misspelled_key(self):
+        clean, errors = validate({'company_name': 'A', 'total_price': 1, 'sum of other_expanses': '$2.00'})
+        assert clean['other_expenses'] == 2.0
+        assert 'sum of other_expanses' not in clean
+
+    def test_validate_reports_missing_required(self):
+        _, errors = validate({'company_name': 'A'})
+        assert 'total_price: missing' in errors
+
+    def test_validate_reports_bad_item(self):
+        _, errors = validate({'company_name': 'A', 'total_price': 1, 'items': [{'quantity': 'lots'}]})
+        assert any(e.startswith('items[0].quantity') for e in errors)
+
+    def test_validate_non_dict(self):
+        clean, errors = validate(None)
+        assert clean is None
+        assert errors
+
+    def test_validate_keeps_private_keys(self):
+        clean, _ = validate({'company_name': 'A', 'total_price': 1, '_file_paths': ['a.txt']})
+        assert clean['_file_paths'] == ['a.txt']
+
+    def test_compile_validator_custom_required(self):
+        check = compile_validator(required=())
+        _, errors = check({})
+        assert errors == []
+
+
+class TestRecordRejection:
+    def test_record_rejection_appends_jsonl(self):
+        record_rejection({'total_price': 'N/A'}, ['total_price: bad'], source='llm')
+        with open(settings.REJECTED_FILE, encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        assert entry['source'] == 'llm'
+        assert entry['errors'] == ['total_price: bad']
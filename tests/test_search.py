@@ -0,0 +1,113 @@
+"""Tests for src/storage/search.py and the store's full-text index"""
+import os
+import time
+import pytest
+from src.storage.invoice_store import InvoiceStore
+from src.storage.search import build_query, search, reindex_archive, run_search
+
+
+@pytest.fixture
+def store():
+    s = InvoiceStore(":memory:")
+    yield s
+    s.close()
+
+
+def _add(store, tid, vendor, items, content, day='2024-01-15', total=10.0, group=''):
+    invoice_id, _ = store.save_invoice({
+        'mail_thread_id': tid, 'company_name': vendor, 'purchase_date': day, 'total_price': total,
+        'items': [{'item_name': n, 'quantity': 1, 'price': 1} for n in items],
+    }, group)
+    store.index_text(invoice_id, content, [f'/archive/{tid}.pdf'])
+    return invoice_id
+
+
+@pytest.fixture
+def populated(store):
+    _add(store, 't1', 'McMaster-Carr', ['Socket Head Screw 8-32 x 1/2"', 'Hex Nut 8-32'],
+         'McMaster-Carr packing list. Alloy steel socket head screws, black-oxide, 8-32 thread.')
+    _add(store, 't2', 'Home Depot', ['PVC Pipe 1/2 in'], 'Home Depot receipt for PVC pipe and cement.')
+    _add(store, 't3', 'Digi-Key', ['Capacitor 10uF'], 'Digi-Key order of ceramic capacitors and screws.')
+    return store
+
+
+class TestBuildQuery:
+    def test_quotes_each_term(self):
+        assert build_query('socket head 8-32') == '"socket" "head" "8-32"'
+
+    def test_keeps_phrases(self):
+        assert build_query('"socket head" screw') == '"socket head" "screw"'
+
+    def test_drops_stray_quotes(self):
+        assert build_query('a"b') == '"ab"'
+
+
+class TestSearch:
+    def test_finds_line_item(self, populated):
+        hits = search('8-32 socket head screws', store=populated)
+        assert [h['mail_thread_id'] for h in hits] == ['t1']
+        assert hits[0]['company_name'] == 'McMaster-Carr'
+        assert hits[0]['purchase_date'] == '2024-01-15'
+        assert '[' in hits[0]['snippet']
+        assert hits[0]['files'] == ['/archive/t1.pdf']
+
+    def test_item_matches_rank_above_content_matches(self, populated):
+        hits = search('screws', store=populated)
+        assert [h['mail_thread_id'] for h in hits] == ['t1', 't3']
+
+    def test_stemming(self, populated):
+        assert search('capacitor', store=populated)[0]['mail_thread_id'] == 't3'
+
+    def test_raw_query(self, populated):
+        hits = search('vendor:depot', raw=True, store=populated)
+        assert [h['mail_thread_id'] for h in hits] == ['t2']
+
+    def test_reindex_replaces_entry(self, populated):
+        invoice_id = search('pvc', store=populated)[0]['invoice_id']
+        populated.index_text(invoice_id, 'solar panel mounting hardware')
+        assert search('cement', store=populated) == []
+        assert search('solar panel', store=populated)[0]['invoice_id'] == invoice_id
+
+    def test_duplicates_hidden(self, populated):
+        copy = _add(populated, 't4', 'Home Depot', ['PVC Pipe 1/2 in'], 'Fwd: Home Depot receipt for PVC pipe')
+        populated.mark_duplicate(copy, 2, 'text')
+        assert [h['mail_thread_id'] for h in search('pvc', store=populated)] == ['t2']
+
+    def test_fast_on_large_index(self, store):
+        with store.conn:
+            for i in range(3000):
+                _add(store, f't{i}', f'Vendor {i % 50}', [f'Part {i}'], f'generic invoice text number {i} bolts')
+        start = time.perf_counter()
+        hits = search('part 2999', store=store)
+        assert hits[0]['mail_thread_id'] == 't2999'
+        assert time.perf_counter() - start < 0.5
+
+
+class TestReindexArchive:
+    def test_indexes_from_archived_files(self, store, temp_dir):
+        path = os.path.join(temp_dir, 'mcmaster_1700000000000.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('Carbon fiber tube 25mm')
+        store.save_invoice({'mail_thread_id': 't1', 'company_name': 'McMaster-Carr'}, 'mcmaster_1700000000000')
+        store.save_invoice({'mail_thread_id': 't2', 'company_name': 'Home Depot'})
+
+        assert reindex_archive(store, temp_dir) == 2
+        assert search('carbon fiber', store=store)[0]['files'] == [path]
+        assert search('depot', store=store)[0]['mail_thread_id'] == 't2'
+        assert reindex_archive(store, temp_dir) == 0
+
+
+class TestCli:
+    def test_run_search_prints_hits(self, populated, capsys):
+        from unittest.mock import patch
+        with patch('src.storage.search.invoice_store.get_store', return_value=populated):
+            hits = run_search(['pvc', 'pipe'])
+        assert len(hits) == 1
+        out = capsys.readouterr().out
+        assert 'Home Depot' in out and 'hit(s) in' in out
+
+    def test_invalid_raw_query_reports_error(self, populated, capsys):
+        from unittest.mock import patch
+        with patch('src.storage.search.invoice_store.get_store', return_value=populated):
+            assert run_search(['--raw', 'vendor:(']) == []
+        assert 'Invalid query' in capsys.readouterr().out
@@ -0,0 +1,195 @@
+"""Tests for src/writers/sheet_sync.py"""
+import re
+import pytest
+from unittest.mock import patch, MagicMock
+from src.config import settings
+from src.storage.invoice_store import InvoiceStore
+from src.writers import sheet_sync
+from src.writers.sheet_sync import row_hash, sync, audit
+
+
+class FakeSheet:
+    """In-memory stand-in for the Sheets values API (UNFORMATTED_VALUE reads)."""
+
+    def __init__(self, rows=None):
+        self.rows = [list(r) for r in (rows or [settings.SHEET_HEADERS])]
+        self.batch_updates = 0
+        self.fail_updates = 0
+        values = MagicMock()
+        values.get.side_effect = self._get
+        values.batchGet.side_effect = self._batch_get
+        values.batchUpdate.side_effect = self._batch_update
+        self.service = MagicMock()
+        self.service.spreadsheets.return_value.values.return_value = values
+
+    def _row(self, n):
+        return self.rows[n - 1] if n - 1 < len(self.rows) else []
+
+    def _call(self, result):
+        request = MagicMock()
+        request.execute.return_value = result
+        return request
+
+    def _get(self, spreadsheetId, range, **kwargs):
+        m = re.match(r".*!A(\d+):A$", range)
+        if m:
+            tail = [r[:1] for r in self.rows[int(m.group(1)) - 1:]]
+            return self._call({"values": tail})
+        return self._call({"values": [r for r in self.rows]})
+
+    def _batch_get(self, spreadsheetId, ranges, **kwargs):
+        out = []
+        for r in ranges:
+            n = int(re.match(r".*!A(\d+):", r).group(1))
+            row = self._row(n)
+            out.append({"values": [row]} if row else {})
+        return self._call({"valueRanges": out})
+
+    def _batch_update(self, spreadsheetId, body):
+        self.batch_updates += 1
+        if self.fail_updates:
+            self.fail_updates -= 1
+            raise Exception("quota exceeded")
+        for entry in body["data"]:
+            n = int(re.match(r".*!A(\d+):", entry["range"]).group(1))
+            while len(self.rows) < n:
+                self.rows.append([])
+            self.rows[n - 1] = list(entry["values"][0])
+        return self._call({})
+
+
+@pytest.fixture
+def store():
+    s = InvoiceStore(":memory:")
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def sheet():
+    fake = FakeSheet()
+    with patch('src.writers.sheet_sync.get_sheets_service', return_value=fake.service), \
+            patch.object(settings, 'SPREADSHEET_ID', 'sheet_id'):
+        yield fake
+
+
+class TestRowHash:
+    def test_numbers_and_numeric_strings_match(self):
+        assert row_hash(['t1', 'A', '', '', '', 150.0]) == row_hash(['t1', 'A', '', '', '', '150'])
+
+    def test_trailing_blanks_and_timestamp_ignored(self):
+        full = ['t1', 'A', '', '', '', '', '', '', '', '', '2024-01-01']
+        assert row_hash(full) == row_hash(['t1', 'A'])
+
+    def test_content_change_detected(self):
+        assert row_hash(['t1', 'A']) != row_hash(['t1', 'B'])
+
+
+class TestSync:
+    def test_inserts_new_invoices_in_one_batch(self, store, sheet):
+        store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A', 'total_price': 5.0})
+        store.save_invoice({'mail_thread_id': 't2', 'company_name': 'B'})
+
+        stats = sync(store)
+        assert stats["inserted"] == 2
+        assert sheet.batch_updates == 1
+        assert [r[0] for r in sheet.rows[1:]] == ['t1', 't2']
+        assert store.unsynced_ids() == []
+
+    def test_nothing_to_do_makes_no_writes(self, store, sheet):
+        store.save_invoice({'mail_thread_id': 't1'})
+        sync(store)
+        sync(store)
+        assert sheet.batch_updates == 1
+
+    def test_correction_updates_row_in_place(self, store, sheet):
+        invoice_id, _ = store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A'})
+        store.save_invoice({'mail_thread_id': 't2', 'company_name': 'B'})
+        sync(store)
+
+        store.update_invoice(invoice_id, {'mail_thread_id': 't1', 'company_name': 'A Corp'})
+        stats = sync(store)
+        assert stats["updated"] == 1
+        assert len(sheet.rows) == 3
+        assert sheet.rows[1][1] == 'A Corp'
+
+    def test_hand_edited_row_not_overwritten(self, store, sheet):
+        invoice_id, _ = store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A'})
+        sync(store)
+        sheet.rows[1][1] = 'Edited by treasurer'
+
+        store.update_invoice(invoice_id, {'mail_thread_id': 't1', 'company_name': 'A Corp'})
+        stats = sync(store)
+        assert stats["conflicts"] == 1
+        assert sheet.rows[1][1] == 'Edited by treasurer'
+        assert store.conflict_ids() == [invoice_id]
+
+        store.clear_sheet_conflict(invoice_id)
+        sync(store)
+        assert sheet.rows[1][1] == 'A Corp'
+
+    def test_bootstraps_from_existing_sheet(self, store, sheet):
+        sheet.rows.append(['legacy', 'Old Row'])
+        sheet.rows.append(['t1', 'A'])
+        store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A'})
+        store.save_invoice({'mail_thread_id': 't2', 'company_name': 'B'})
+
+        stats = sync(store)
+        assert stats == dict(stats, inserted=1, unchanged=1)
+        assert [r[0] for r in sheet.rows] == ['mail_thread_id', 'legacy', 't1', 't2']
+
+    def test_rows_appended_elsewhere_not_overwritten(self, store, sheet):
+        store.save_invoice({'mail_thread_id': 't1'})
+        sync(store)
+        sheet.rows.append(['manual', 'Typed in'])
+
+        store.save_invoice({'mail_thread_id': 't2'})
+        sync(store)
+        assert [r[0] for r in sheet.rows[1:]] == ['t1', 'manual', 't2']
+
+    def test_resumes_after_failed_batch(self, store, sheet):
+        store.save_invoice({'mail_thread_id': 't1'})
+        sheet.fail_updates = 1
+
+        assert sync(store)["failed"] == 1
+        assert store.pending_sheet_writes()
+
+        sync(store)
+        assert store.pending_sheet_writes() == []
+        assert store.unsynced_ids() == []
+        assert [r[0] for r in sheet.rows[1:]] == ['t1']
+
+    def test_write_that_landed_is_confirmed_on_resume(self, store, sheet):
+        store.save_invoice({'mail_thread_id': 't1'})
+        with patch.object(store, 'confirm_sheet_writes'):
+            sync(store)
+        updates = sheet.batch_updates
+
+        stats = sync(store)
+        assert stats["resumed"] == 1
+        assert sheet.batch_updates == updates
+
+    def test_chunks_large_syncs(self, store, sheet):
+        for i in range(5):
+            store.save_invoice({'mail_thread_id': f't{i}'})
+        with patch.object(settings, 'SHEETS_SYNC_BATCH_ROWS', 2):
+            sync(store)
+        assert sheet.batch_updates == 3
+
+    @patch('src.writers.sheet_sync.get_sheets_service')
+    def test_no_spreadsheet_id(self, mock_service, store):
+        store.save_invoice({'mail_thread_id': 't1'})
+        with patch.object(settings, 'SPREADSHEET_ID', 'YOUR_SPREADSHEET_ID_HERE'):
+            assert sync(store)["inserted"] == 0
+        mock_service.assert_not_called()
+
+
+class TestAudit:
+    def test_flags_hand_edited_rows(self, store, sheet):
+        store.save_invoice({'mail_thread_id': 't1', 'company_name': 'A'})
+        invoice_id, _ = store.save_invoice({'mail_thread_id': 't2', 'company_name': 'B'})
+        sync(store)
+        sheet.rows[2][5] = 99
+
+        assert audit(store) == [invoice_id]
+        assert audit(store) == []
@@ -1,7 +1,8 @@
 """Tests for src/writers/sheets_writer.py"""
 import pytest
 from unittest.mock import patch, Mock, MagicMock
-from src.writers.sheets_writer import init_sheet, get_existing_thread_ids, write_invoice_data
+from src.config import settings
+from src.writers.sheets_writer import init_sheet, get_existing_thread_ids, write_invoice_data, format_row
 
 
 class TestInitSheet:
@@ -130,3 +131,20 @@ class TestWriteInvoiceData:
         mock_get_ids.return_value = set()
         mock_get_service.side_effect = Exception("API Error")
         assert write_invoice_data({'mail_thread_id': 't1'}) is False
+
+    @patch('src.writers.sheets_writer.get_sheets_service')
+    @patch('src.writers.sheets_writer.get_existing_thread_ids')
+    @patch('src.writers.sheets_writer.settings')
+    def test_write_uses_given_existing_ids(self, mock_settings, mock_get_ids, mock_get_service):
+        mock_settings.SPREADSHEET_ID = 'valid_id'
+        assert write_invoice_data({'mail_thread_id': 't1'}, existing_ids={'t1'}) is False
+        mock_get_ids.assert_not_called()
+
+
+class TestFormatRow:
+    def test_format_row_matches_headers(self, sample_invoice_data):
+        row = format_row(sample_invoice_data, processed_at="2024-01-01 00:00:00")
+        assert len(row) == len(settings.SHEET_HEADERS)
+        assert row[0] == 'thread_123'
+        assert row[6] == 'Widget A, Widget B'
+        assert row[-1] == "2024-01-01 00:00:00"
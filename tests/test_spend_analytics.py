@@ -0,0 +1,107 @@
+"""Tests for src/analytics/spend.py"""
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from src.storage.invoice_store import InvoiceStore
+from src.analytics.spend import SpendAnalytics, run_report
+
+
+@pytest.fixture
+def store():
+    s = InvoiceStore(":memory:")
+    yield s
+    s.close()
+
+
+def _save(store, tid, vendor, day, total, items=()):
+    return store.save_invoice({
+        'mail_thread_id': tid, 'company_name': vendor, 'purchase_date': day, 'total_price': total,
+        'items': [{'item_name': n, 'quantity': q, 'price': p} for n, q, p in items],
+    })[0]
+
+
+@pytest.fixture
+def populated(store):
+    _save(store, 't1', 'Home Depot', '2024-01-05', 30.0, [('Bolt', 10, 1.0), ('Nut', 20, 1.0)])
+    _save(store, 't2', 'Home Depot', '2024-01-20', 12.0, [('Bolt', 12, 1.0)])
+    _save(store, 't3', 'McMaster-Carr', '2024-02-01', 100.0, [('Bearing', 2, 50.0)])
+    _save(store, 't4', 'McMaster-Carr', '', 8.0, [('Nut', 8, '')])
+    return store
+
+
+class TestReports:
+    def test_spend_by_vendor_month(self, populated):
+        df = SpendAnalytics(populated).spend_by_vendor_month()
+        rows = {(r.vendor, str(r.month)): (r.invoices, r.spend) for r in df.itertuples()}
+        assert rows[('Home Depot', '2024-01')] == (2, 42.0)
+        assert rows[('McMaster-Carr', '2024-02')] == (1, 100.0)
+
+    def test_missing_purchase_date_uses_created_at(self, populated):
+        months = SpendAnalytics(populated).monthly_spend()["month"].astype(str).tolist()
+        assert len(months) == 3
+
+    def test_top_items(self, populated):
+        df = SpendAnalytics(populated).top_items(2)
+        assert df["item_name"].tolist() == ['Bearing', 'Bolt']
+        assert df.iloc[1]["quantity"] == 22
+        assert df.iloc[1]["orders"] == 2
+
+    def test_top_items_by_quantity(self, populated):
+        df = SpendAnalytics(populated).top_items(1, by="quantity")
+        assert df.iloc[0]["item_name"] == 'Nut'
+
+    def test_outlier_totals(self, store):
+        for i, total in enumerate([10, 11, 9, 10, 12, 10, 500]):
+            _save(store, f't{i}', 'A', '2024-01-01', total)
+        _save(store, 'other', 'B', '2024-01-01', 1000)
+
+        df = SpendAnalytics(store).outlier_totals()
+        assert df["total"].tolist() == [500.0]
+        assert df.iloc[0]["vendor_median"] == 10.0
+
+    def test_empty_store(self, store):
+        analytics = SpendAnalytics(store)
+        assert analytics.spend_by_vendor_month().empty
+        assert analytics.top_items().empty
+
+
+class TestCaching:
+    def test_results_cached_until_new_invoice(self, populated):
+        analytics = SpendAnalytics(populated)
+        first = analytics.spend_by_vendor_month()
+        assert analytics.spend_by_vendor_month() is first
+
+        _save(populated, 't5', 'Digikey', '2024-03-01', 5.0)
+        refreshed = analytics.spend_by_vendor_month()
+        assert refreshed is not first
+        assert 'Digikey' in set(refreshed["vendor"])
+
+    def test_edit_invalidates_cache(self, store):
+        invoice_id = _save(store, 't1', 'A', '2024-01-01', 5.0)
+        analytics = SpendAnalytics(store)
+        analytics.monthly_spend()
+        store.conn.execute("UPDATE invoices SET updated_at = '2099-01-01 00:00:00' WHERE id = ?", (invoice_id,))
+        store.conn.execute("UPDATE invoices SET total_price = 7 WHERE id = ?", (invoice_id,))
+        assert analytics.monthly_spend()["spend"].tolist() == [7.0]
+
+    def test_from_frames(self):
+        invoices = pd.DataFrame({
+            'invoice_id': [1, 2], 'vendor': ['A', 'B'], 'purchase_date': ['2024-01-01', '2024-02-01'],
+            'created_at': ['', ''], 'total': [1.5, 2.5], 'other_expenses': [None, None],
+        })
+        items = pd.DataFrame({'invoice_id': [1, 2, 3], 'item_name': ['x', 'y', 'orphan'],
+                              'quantity': [1, 2, 1], 'price': [1.5, 1.25, 9.0]})
+        analytics = SpendAnalytics.from_frames(invoices, items)
+        assert analytics.top_items()["item_name"].tolist() == ['y', 'x']
+
+
+class TestCli:
+    def test_run_report_prints_and_writes_csv(self, populated, temp_dir, capsys):
+        import os
+        from unittest.mock import patch
+        path = os.path.join(temp_dir, 'out.csv')
+        with patch('src.analytics.spend.invoice_store.get_store', return_value=populated):
+            run_report(['top-items', '--top', '1', '--csv', path])
+        assert 'Bearing' in capsys.readouterr().out
+        assert os.path.exists(path)